@@ -0,0 +1,328 @@
+"""
+Syslog handler for asyncio applications
+
+logging.handlers.SysLogHandler connects and sends from the thread logging
+the record: in an asyncio application, a slow or unreachable collector
+stalls the event loop. AsyncSysLogHandler only encodes the record (a
+lib/encoder.SyslogEncoder) and appends it to a bounded queue. A task of the
+running loop writes the queue through an asyncio transport (UDP, TCP or
+UNIX socket): the messages waiting are written as one batch and a stream
+write waits for the transport to drain. When the queue is full, the new
+records are dropped and counted (dropped): the application never waits on
+the collector.
+
+The task is started by the first record logged from a running loop (or by
+start()). Records may be logged from other threads. When the loop shuts
+down (asyncio.run cancels the remaining tasks), the task writes the queue
+before closing the transport, within SHUTDOWN_TIMEOUT; aclose() does the
+same explicitly. The records of a stream transport still buffered when
+the timeout expires are lost: they are moved from sent to dropped. The
+records still queued once the loop is gone (e.g. the task was cancelled
+before it ran) are written by close(), called by logging.shutdown at
+exit, with a blocking socket.
+
+Contains:
+- AsyncSysLogHandler
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import asyncio
+import collections
+import logging
+import socket
+import sys
+import threading
+import time
+from logging import handlers
+
+from fruafr.log.lib import encoder
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+QUEUE_SIZE = 10000
+BATCH_SIZE = 1000
+BACKOFF_MIN = 0.1
+BACKOFF_MAX = 30.0
+SHUTDOWN_TIMEOUT = 2.0
+
+
+class AsyncSysLogHandler(encoder.FastSysLogHandler):
+    """SysLogHandler writing from the running event loop"""
+
+    def __init__(self,
+                 address=('localhost', handlers.SYSLOG_UDP_PORT),
+                 facility: int = handlers.SysLogHandler.LOG_USER,
+                 socktype: int = socket.SOCK_DGRAM,
+                 queue_size: int = QUEUE_SIZE,
+                 batch_size: int = BATCH_SIZE,
+                 header: dict = None) -> None:
+        """AsyncSysLogHandler constructor. Does not connect until the task runs
+        Args:
+            address (str or tuple, optional): UNIX socket path or (host, port)
+            facility (int, optional): the syslog facility [default: LOG_USER]
+            socktype (int, optional): socket.SOCK_DGRAM or socket.SOCK_STREAM
+             [default: socket.SOCK_DGRAM]
+            queue_size (int, optional): maximum number of records waiting.
+             The records beyond are dropped [default: QUEUE_SIZE]
+            batch_size (int, optional): maximum number of records per write
+             [default: BATCH_SIZE]
+            header (dict, optional): rfc, hostname, app_name and procid of the
+             encoder (see encoder.SyslogEncoder) [default: None]
+        """
+        if not isinstance(address, (str, tuple)):
+            if RAISEEXCEPTIONS:
+                raise TypeError("address must be a string or a (host, port) tuple")
+            else:
+                return
+        logging.Handler.__init__(self)  # pylint: disable=non-parent-init-called
+        self.address = address
+        self.facility = facility
+        self.socktype = socktype
+        self.unixsocket = isinstance(address, str)
+        self.socket = None
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.sent = 0
+        self.dropped = 0
+        self._queue = collections.deque()
+        self._loop = None
+        self._loop_thread = None
+        self._task = None
+        self._wakeup = None
+        self._transport = None
+        self._writer = None
+        self._backoff = BACKOFF_MIN
+        # lengths of the last records written to the stream, maybe still buffered
+        self._unflushed = collections.deque()
+        self._unflushed_bytes = 0
+        self._prepare_encoder(**(header or {}))
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of records waiting in the queue"""
+        return len(self._queue)
+
+    def start(self, loop: asyncio.AbstractEventLoop = None) -> None:
+        """Start the writing task (done by the first record logged from a running loop)
+        Args:
+            loop (asyncio.AbstractEventLoop, optional): the loop [default: the running loop]
+        """
+        loop = loop or asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._wakeup = asyncio.Event()
+        self._transport = None
+        self._writer = None
+        self._task = loop.create_task(self._run())
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Queue the record, never waits
+        Args:
+            record (logging.LogRecord): the record
+        """
+        try:
+            msg = self.encode_record(record)
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+            return
+        if len(self._queue) >= self.queue_size:
+            self.dropped += 1
+            return
+        self._queue.append(msg)
+        loop = self._loop
+        if loop is None or loop.is_closed() or self._task.done():
+            try:
+                self.start()
+            except RuntimeError:
+                # no running loop yet: sent once a loop logs or calls start()
+                return
+            loop = self._loop
+        if threading.get_ident() == self._loop_thread:
+            self._wakeup.set()
+        else:
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _connect(self) -> None:
+        """Open the transport"""
+        if self.socktype == socket.SOCK_STREAM:
+            if self.unixsocket:
+                _, self._writer = await asyncio.open_unix_connection(self.address)
+            else:
+                _, self._writer = await asyncio.open_connection(*self.address)
+            self._transport = self._writer.transport
+            return
+        options = {'family': socket.AF_UNIX} if self.unixsocket else {}
+        self._transport, _ = await self._loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=self.address, **options)
+
+    def _reset(self) -> None:
+        """Close the transport"""
+        if self._transport is not None:
+            self._transport.abort()
+        self._transport = None
+        self._writer = None
+        self._unflushed.clear()
+        self._unflushed_bytes = 0
+
+    def _unflushed_records(self) -> int:
+        """Returns the records written to the stream transport and not flushed yet"""
+        buffered = self._transport.get_write_buffer_size()
+        while self._unflushed and self._unflushed_bytes - self._unflushed[0] >= buffered:
+            self._unflushed_bytes -= self._unflushed.popleft()
+        return len(self._unflushed)
+
+    async def _send_batch(self) -> None:
+        """Write the next batch, reconnecting with backoff until it is written"""
+        batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))]
+        written = False
+        try:
+            while True:
+                try:
+                    if self._transport is None or self._transport.is_closing():
+                        await self._connect()
+                    if self._writer is not None:
+                        self._writer.write(b''.join(batch))
+                        written = True
+                        self._unflushed.extend(len(msg) for msg in batch)
+                        self._unflushed_bytes += sum(len(msg) for msg in batch)
+                        # backpressure: the queue fills (and drops) while the collector is slow
+                        await self._writer.drain()
+                        self._unflushed_records()
+                    else:
+                        for msg in batch:
+                            self._transport.sendto(msg)
+                        written = True
+                    self._backoff = BACKOFF_MIN
+                    return
+                except OSError:
+                    written = False
+                    self._reset()
+                    await asyncio.sleep(self._backoff)
+                    self._backoff = min(self._backoff * 2, BACKOFF_MAX)
+        except asyncio.CancelledError:
+            if not written:
+                # interrupted before the write: written by the shutdown
+                self._queue.extendleft(reversed(batch))
+            raise
+        finally:
+            if written:
+                self.sent += len(batch)
+
+    async def _shutdown(self) -> None:
+        """Write the queue and close the transport"""
+        while self._queue:
+            await self._send_batch()
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+    async def _run(self) -> None:
+        """Task writing the queue"""
+        try:
+            while True:
+                self._wakeup.clear()
+                if not self._queue:
+                    await self._wakeup.wait()
+                await self._send_batch()
+        except asyncio.CancelledError:
+            # loop shutdown: write what is queued before closing
+            try:
+                await asyncio.wait_for(self._shutdown(), SHUTDOWN_TIMEOUT)
+            except (asyncio.TimeoutError, OSError):
+                pass
+            raise
+        finally:
+            lost = self._unflushed_records() if self._writer is not None else 0
+            if lost:
+                # a close would wait for the flush, after the loop is gone
+                self.sent -= lost
+                self.dropped += lost
+                self._reset()
+            elif self._transport is not None:
+                self._transport.close()
+            self._transport = None
+            self._writer = None
+
+    async def aclose(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        """Write the queue and stop the task (from the loop of the handler)
+        Args:
+            timeout (float, optional): maximum time in seconds given to the
+             writes [default: SHUTDOWN_TIMEOUT]
+        """
+        if self._task is not None and not self._task.done():
+            try:
+                await asyncio.wait_for(self._shutdown(), timeout)
+            except (asyncio.TimeoutError, OSError):
+                pass
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.close()
+
+    def _write_blocking(self) -> None:
+        """Write the queue from the calling thread, once the loop is gone,
+        within SHUTDOWN_TIMEOUT"""
+        batch = []
+        try:
+            if self.unixsocket:
+                sock = socket.socket(socket.AF_UNIX, self.socktype)
+            else:
+                family = socket.getaddrinfo(*self.address, 0, self.socktype)[0][0]
+                sock = socket.socket(family, self.socktype)
+            deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+            with sock:
+                sock.settimeout(SHUTDOWN_TIMEOUT)
+                sock.connect(self.address)
+                while self._queue and time.monotonic() < deadline:
+                    sock.settimeout(max(deadline - time.monotonic(), 0.001))
+                    batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))]
+                    if self.socktype == socket.SOCK_STREAM:
+                        sock.sendall(b''.join(batch))
+                    else:
+                        for msg in batch:
+                            sock.send(msg)
+                    self.sent += len(batch)
+                    batch = []
+        except OSError:
+            self.dropped += len(batch)
+
+    def flush(self) -> None:
+        """Nothing to do: the task writes as soon as possible (see aclose)"""
+
+    def close(self) -> None:
+        """Close the handler. When the loop is gone, the records still queued are
+        written with a blocking socket, those which cannot be are counted in
+        dropped and reported on stderr"""
+        with self.lock:
+            loop = self._loop
+            running = loop is not None and loop.is_running()
+            if running and self._task is not None and not self._task.done():
+                # the task writes the queue when it is cancelled
+                if threading.get_ident() == self._loop_thread:
+                    self._task.cancel()
+                else:
+                    loop.call_soon_threadsafe(self._task.cancel)
+            elif self._queue:
+                if not running:
+                    self._write_blocking()
+                if self._queue:
+                    self.dropped += len(self._queue)
+                    self._queue.clear()
+                if self.dropped and logging.raiseExceptions and sys.stderr:
+                    sys.stderr.write(f"{self.dropped} syslog messages not sent to {self.address}\n")
+            logging.Handler.close(self)
@@ -0,0 +1,196 @@
+"""
+Atomic appends to a log file shared between processes
+
+logging.FileHandler writes through buffered text and binary streams:
+whether a record reaches the file in one write call depends on their
+buffering and on how they complete short writes, and the writes of other
+processes appending to the same file can land in between (torn lines).
+AtomicAppendHandler formats each record (or batch of records) in memory
+and appends it with a single os.write on an O_APPEND descriptor: the
+kernel positions and writes it at the end of the file in one step.
+
+POSIX only promises this for writes of at most PIPE_BUF bytes, so the
+records (and batches) larger than ATOMIC_SIZE are written under an
+exclusive fcntl.flock of the file: they do not interleave with each other,
+and the small records stay lock-free.
+
+With durability fsync or group, the records are synced to disk once
+written (see durability.py), none and flush are the same here.
+
+Contains:
+- AtomicAppendHandler
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import fcntl
+import logging
+import os
+import select
+
+from fruafr.log.lib import durability as durable
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+# the largest write POSIX guarantees to be atomic (4096 on Linux)
+ATOMIC_SIZE = getattr(select, 'PIPE_BUF', 512)
+
+
+class AtomicAppendHandler(durable.GroupCommitMixin, logging.Handler):
+    """Handler appending each record with a single write on an O_APPEND descriptor"""
+
+    terminator = '\n'
+
+    def __init__(self,
+                 filename: str,
+                 mode: str = 'a',
+                 encoding: str = None,
+                 errors: str = 'backslashreplace',
+                 durability: str = 'flush') -> None:
+        """AtomicAppendHandler constructor
+        Args:
+            filename (str): the log file path
+            mode (str, optional): 'a' to append, 'w' to truncate the file first [default: 'a']
+            encoding (str, optional): the encoding [default: 'utf-8']
+            errors (str, optional): the encoding error handler [default: 'backslashreplace']
+            durability (str, optional): one of durability.DURABILITY [default: 'flush']
+        """
+        if mode not in ('a', 'w'):
+            if RAISEEXCEPTIONS:
+                raise ValueError("mode must be 'a' or 'w'")
+            else:
+                return
+        if not durable.check_durability(durability):
+            return
+        super().__init__()
+        self.baseFilename = os.path.abspath(filename)
+        self.encoding = encoding or 'utf-8'
+        self.errors = errors
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC
+        if mode == 'w':
+            flags |= os.O_TRUNC
+        self.fd = os.open(self.baseFilename, flags, 0o644)
+        self.durability = durability
+        if durability == 'group':
+            self.group = durable.GroupCommit(self._sync)
+
+    def _sync(self) -> None:
+        """Sync the data of the file"""
+        if self.fd is not None:
+            os.fdatasync(self.fd)
+
+    def _encode(self, record: logging.LogRecord) -> bytes:
+        """Returns the formatted record, terminator included"""
+        return (self.format(record) + self.terminator).encode(self.encoding, self.errors)
+
+    def write(self, data: bytes) -> None:
+        """Append data with a single write, under the file lock if larger than ATOMIC_SIZE,
+        and sync it with durability fsync
+        Args:
+            data (bytes): complete lines
+        """
+        self._append(data)
+        if self.durability == 'fsync':
+            os.fdatasync(self.fd)
+
+    def _append(self, data: bytes) -> None:
+        """Append data with a single write, under the file lock if larger than ATOMIC_SIZE"""
+        if len(data) <= ATOMIC_SIZE:
+            written = os.write(self.fd, data)
+            # short write (e.g. interrupted, disk full): finish it under the lock
+            data = data[written:]
+        if data:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self.fd, view):]
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Append the record
+        Args:
+            record (logging.LogRecord): the record
+        """
+        try:
+            self.write(self._encode(record))
+        except RecursionError:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def emit_batch(self, records: list) -> None:
+        """Append several records, packed in writes of at most ATOMIC_SIZE bytes
+        (a larger record is written alone). The batch is synced once with durability
+        fsync, and is one write of the group commit with durability group
+        Args:
+            records (list): the logging.LogRecord to append, in order
+        """
+        if not records:
+            return
+        if self.group is None:
+            with self.lock:
+                self._emit_batch(records)
+            return
+        try:
+            with self.group.commit():
+                with self.lock:
+                    self._emit_batch(records)
+        except OSError:
+            self.handleError(records[-1])
+
+    def _emit_batch(self, records: list) -> None:
+        """Append the records of a batch"""
+        chunk = []
+        size = 0
+        for record in records:
+            if record.levelno < self.level or not self.filter(record):
+                continue
+            try:
+                data = self._encode(record)
+            except RecursionError:
+                raise
+            except Exception:  # pylint: disable=broad-except
+                self.handleError(record)
+                continue
+            if chunk and size + len(data) > ATOMIC_SIZE:
+                self._write_chunk(chunk, record)
+                chunk = []
+                size = 0
+            chunk.append(data)
+            size += len(data)
+        if chunk:
+            self._write_chunk(chunk, record)
+        if self.durability == 'fsync':
+            try:
+                os.fdatasync(self.fd)
+            except OSError:
+                self.handleError(record)
+
+    def _write_chunk(self, chunk: list, record: logging.LogRecord) -> None:
+        """Write the records of a batch, errors are reported with record"""
+        try:
+            self._append(b''.join(chunk))
+        except RecursionError:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def close(self) -> None:
+        """Close the file"""
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+            super().close()
@@ -0,0 +1,426 @@
+"""
+Load balancing and failover over several syslog destinations
+
+DestinationPool keeps one persistent SyslogConnection per destination and
+picks the destination of each message with a strategy:
+- roundrobin: smooth weighted round robin
+- leastoutstanding: the destination with the fewest bytes buffered or sent
+  but not yet acknowledged (TIOCOUTQ), relative to its weight
+- hash: weighted rendezvous hashing of a key (e.g. the program), so a key
+  always goes to the same destination and only the keys of a failed
+  destination move
+
+Stream messages are batched per destination. When a destination fails, it
+is marked down and its batch is sent to the other destinations straight
+away (fast failover). A down destination is retried after a cooldown that
+doubles on each consecutive failure (re-admission).
+
+Contains:
+- parse_destination
+- Destination
+- DestinationPool
+- BalancedSysLogHandler
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import logging
+import math
+import socket
+import threading
+import time
+import zlib
+from logging import handlers
+
+from fruafr.log.lib import syslogclient
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+STRATEGIES = ('roundrobin', 'leastoutstanding', 'hash')
+STRATEGY = 'roundrobin'
+COOLDOWN = 1.0
+COOLDOWN_MAX = 30.0
+DEFAULT_PORT = 514
+
+
+def parse_destination(text: str, default_port: int = DEFAULT_PORT) -> tuple:
+    """Parse a destination
+    Args:
+        text (str): host[:port[:weight]], [ipv6][:port[:weight]] or /unix/path[:weight]
+        default_port (int, optional): port used when none is given [default: DEFAULT_PORT]
+    Returns:
+        tuple: (address, weight) where address is a path or a (host, port) tuple
+    """
+    try:
+        return _parse_destination(text, default_port)
+    except ValueError as e:
+        raise ValueError(f"invalid destination {text}. Use host[:port[:weight]] ({e})") from e
+
+
+def _parse_destination(text: str, default_port: int) -> tuple:
+    """See parse_destination"""
+    weight = 1
+    if text.startswith('/'):
+        path, _, weight_text = text.partition(':')
+        if weight_text:
+            weight = int(weight_text)
+        address = path
+    else:
+        if text.startswith('['):
+            host, _, rest = text[1:].partition(']')
+            parts = rest.lstrip(':').split(':') if rest else []
+        else:
+            host, *parts = text.split(':')
+        if not host:
+            raise ValueError("missing host")
+        if len(parts) > 2:
+            raise ValueError("too many fields")
+        port = int(parts[0]) if parts and parts[0] else int(default_port)
+        if len(parts) == 2:
+            weight = int(parts[1])
+        address = (host, port)
+    if weight < 1:
+        raise ValueError("the weight must be a positive integer")
+    return address, weight
+
+
+class Destination:
+    """One destination of a DestinationPool"""
+
+    def __init__(self, address, weight: int, connection: syslogclient.SyslogConnection) -> None:
+        """Destination constructor
+        Args:
+            address (str or tuple): UNIX socket path or (host, port)
+            weight (int): the weight
+            connection (SyslogConnection): the connection
+        """
+        self.address = address
+        self.weight = weight
+        self.connection = connection
+        self.sent = 0
+        self.failures = 0
+        self.down_until = 0.0
+        # pending batch: list of (data, key)
+        self.pending = []
+        self.pending_bytes = 0
+        # smooth weighted round robin state
+        self.current = 0
+
+    @property
+    def name(self) -> str:
+        """Returns host:port or the path"""
+        if isinstance(self.address, str):
+            return self.address
+        return f"{self.address[0]}:{self.address[1]}"
+
+    def healthy(self, now: float) -> bool:
+        """Returns True if the destination is up or its cooldown is over"""
+        return now >= self.down_until
+
+    @property
+    def outstanding(self) -> float:
+        """Returns the bytes buffered or not yet acknowledged, relative to the weight"""
+        return (self.pending_bytes + self.connection.inflight) / self.weight
+
+    def state(self) -> dict:
+        """Returns the state of the destination"""
+        return {
+            'destination': self.name,
+            'weight': self.weight,
+            'up': self.healthy(time.monotonic()),
+            'sent': self.sent,
+            'failures': self.failures,
+            'pending': len(self.pending),
+        }
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self.name})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
+
+
+class DestinationPool:
+    """Persistent connections to several destinations with a balancing strategy"""
+
+    def __init__(self,
+                 destinations: list,
+                 socktype: int = socket.SOCK_DGRAM,
+                 strategy: str = STRATEGY,
+                 flush_interval: float = syslogclient.FLUSH_INTERVAL,
+                 buffer_size: int = syslogclient.BUFFER_SIZE,
+                 cooldown: float = COOLDOWN) -> None:
+        """DestinationPool constructor. Connects lazily
+        Args:
+            destinations (list): (address, weight) tuples (see parse_destination)
+            socktype (int, optional): socket.SOCK_DGRAM or socket.SOCK_STREAM
+             [default: socket.SOCK_DGRAM]
+            strategy (str, optional): one of STRATEGIES [default: STRATEGY]
+            flush_interval (float, optional): maximum time in seconds a stream
+             message is batched. 0 disables the timer [default: FLUSH_INTERVAL]
+            buffer_size (int, optional): a stream batch is sent once it reaches
+             this size [default: BUFFER_SIZE]
+            cooldown (float, optional): time in seconds before a failed
+             destination is retried, doubled on each consecutive failure
+             [default: COOLDOWN]
+        """
+        if not isinstance(destinations, list) or not destinations:
+            if RAISEEXCEPTIONS:
+                raise ValueError("destinations must be a non empty list")
+            else:
+                return
+        if strategy not in STRATEGIES:
+            if RAISEEXCEPTIONS:
+                raise ValueError(f"strategy must be one of {', '.join(STRATEGIES)}")
+            else:
+                return
+        self.socktype = socktype
+        self.strategy = strategy
+        self.buffer_size = buffer_size
+        self.cooldown = cooldown
+        self.dropped = 0
+        self.failovers = 0
+        # each send goes straight to the socket: batching is done here so a
+        # failed batch can be sent to another destination
+        self.destinations = [
+            Destination(address, weight,
+                        syslogclient.SyslogConnection(address, socktype, flush_interval=0,
+                                                      buffer_size=0, retries=0))
+            for address, weight in destinations
+        ]
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._timer = None
+        if flush_interval > 0 and socktype == socket.SOCK_STREAM:
+            self._timer = threading.Thread(target=self._flush_periodically,
+                                           args=(flush_interval,), daemon=True)
+            self._timer.start()
+
+    def _candidates(self, exclude: Destination = None) -> list:
+        """Returns the healthy destinations, or the one retried the soonest if none is"""
+        now = time.monotonic()
+        candidates = [d for d in self.destinations if d is not exclude and d.healthy(now)]
+        if not candidates:
+            others = [d for d in self.destinations if d is not exclude]
+            if others:
+                candidates = [min(others, key=lambda d: d.down_until)]
+        return candidates
+
+    def _choose(self, candidates: list, key) -> Destination:
+        """Pick a destination with the strategy"""
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == 'hash' and key is not None:
+            key = str(key).encode()
+            return max(candidates, key=lambda d: self._score(d, key))
+        if self.strategy == 'leastoutstanding':
+            lowest = min(d.outstanding for d in candidates)
+            candidates = [d for d in candidates if d.outstanding == lowest]
+            if len(candidates) == 1:
+                return candidates[0]
+        # smooth weighted round robin (also breaks the ties of leastoutstanding)
+        total = 0
+        best = None
+        for destination in candidates:
+            destination.current += destination.weight
+            total += destination.weight
+            if best is None or destination.current > best.current:
+                best = destination
+        best.current -= total
+        return best
+
+    @staticmethod
+    def _score(destination: Destination, key: bytes) -> float:
+        """Weighted rendezvous hashing score of a key for a destination"""
+        digest = zlib.crc32(destination.name.encode(), zlib.crc32(key))
+        # uniform in ]0, 1[
+        uniform = (digest + 1) / (2 ** 32 + 1)
+        return -destination.weight / math.log(uniform)
+
+    def _fail(self, destination: Destination) -> None:
+        """Mark a destination down"""
+        destination.failures += 1
+        delay = min(self.cooldown * 2 ** (destination.failures - 1), COOLDOWN_MAX)
+        destination.down_until = time.monotonic() + delay
+
+    def send(self, data: bytes, key=None) -> None:
+        """Send a message to one destination. Stream messages are batched
+        Args:
+            data (bytes): the message, framing included
+            key (optional): the key of the hash strategy
+        """
+        with self._lock:
+            destination = None
+            for _ in range(len(self.destinations)):
+                candidates = self._candidates(destination)
+                if not candidates:
+                    break
+                destination = self._choose(candidates, key)
+                if self.socktype != socket.SOCK_STREAM:
+                    try:
+                        destination.connection.send(data)
+                    except OSError:
+                        self._fail(destination)
+                        self.failovers += 1
+                        continue
+                    destination.failures = 0
+                    destination.sent += 1
+                    return
+                destination.pending.append((data, key))
+                destination.pending_bytes += len(data)
+                if destination.pending_bytes >= self.buffer_size:
+                    self._flush_destination(destination)
+                return
+            self.dropped += 1
+            raise OSError("no syslog destination available")
+
+    def _flush_destination(self, destination: Destination) -> None:
+        """Send the batch of a destination. On failure, the batch goes to the others"""
+        if not destination.pending:
+            return
+        batch = destination.pending
+        destination.pending = []
+        destination.pending_bytes = 0
+        try:
+            destination.connection.send(b''.join([data for data, _ in batch]))
+        except OSError:
+            destination.connection.discard()
+            self._fail(destination)
+            self.failovers += 1
+            others = [d for d in self.destinations if d is not destination]
+            if not others:
+                self.dropped += len(batch)
+                raise
+            for data, key in batch:
+                self._resend(data, key, destination)
+            return
+        destination.failures = 0
+        destination.sent += len(batch)
+
+    def _resend(self, data: bytes, key, failed: Destination) -> None:
+        """Queue a message of a failed batch on another destination"""
+        candidates = self._candidates(failed)
+        destination = self._choose(candidates, key)
+        destination.pending.append((data, key))
+        destination.pending_bytes += len(data)
+
+    def flush(self) -> None:
+        """Send the batches of every destination"""
+        with self._lock:
+            # a failed batch moves to other destinations: loop until all are sent
+            for _ in range(len(self.destinations) + 1):
+                pending = [d for d in self.destinations if d.pending]
+                if not pending:
+                    return
+                for destination in pending:
+                    self._flush_destination(destination)
+            left = sum(len(d.pending) for d in self.destinations)
+            for destination in self.destinations:
+                destination.pending = []
+                destination.pending_bytes = 0
+            self.dropped += left
+            raise OSError(f"no syslog destination available: {left} messages dropped")
+
+    def _flush_periodically(self, interval: float) -> None:
+        """Timer thread flushing the batches"""
+        while not self._closed.wait(interval):
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def state(self) -> list:
+        """Returns the state of every destination
+        Returns:
+            list: one dict per destination
+        """
+        with self._lock:
+            return [destination.state() for destination in self.destinations]
+
+    def close(self) -> None:
+        """Flush and close the connections"""
+        self._closed.set()
+        with self._lock:
+            try:
+                self.flush()
+            finally:
+                for destination in self.destinations:
+                    try:
+                        destination.connection.close()
+                    except OSError:
+                        pass
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({', '.join(d.name for d in self.destinations)})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
+
+
+class BalancedSysLogHandler(syslogclient.StreamingSysLogHandler):
+    """SysLogHandler sending through a DestinationPool"""
+
+    def __init__(self,
+                 pool: DestinationPool,
+                 facility: int = handlers.SysLogHandler.LOG_USER,
+                 key_attribute: str = 'hashkey',
+                 header: dict = None) -> None:
+        """BalancedSysLogHandler constructor
+        Args:
+            pool (DestinationPool): the destinations
+            facility (int, optional): the syslog facility [default: LOG_USER]
+            key_attribute (str, optional): attribute of the record holding the
+             key of the hash strategy (logger.log(..., extra={'hashkey': key}))
+             [default: 'hashkey']
+            header (dict, optional): see syslogclient.StreamingSysLogHandler
+        """
+        if not isinstance(pool, DestinationPool):
+            if RAISEEXCEPTIONS:
+                raise TypeError("pool must be a DestinationPool")
+            else:
+                return
+        logging.Handler.__init__(self)  # pylint: disable=non-parent-init-called
+        self.address = [d.address for d in pool.destinations]
+        self.facility = facility
+        self.socktype = pool.socktype
+        self.unixsocket = False
+        self.socket = None
+        self.connection = pool
+        self.key_attribute = key_attribute
+        self._prepare_encoder(**(header or {}))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Send the record
+        Args:
+            record (logging.LogRecord): the record
+        """
+        try:
+            self.connection.send(self.encode_record(record), getattr(record, self.key_attribute, None))
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
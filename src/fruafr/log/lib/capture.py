@@ -0,0 +1,189 @@
+"""
+Compact binary capture of received syslog traffic
+
+A capture file starts with a magic string followed by records:
+- <dBBHI header: receive timestamp (time.time()), protocol, source address
+  length, source port, data length
+- the source address (ASCII) and the data (datagram or TCP frame)
+
+Contains:
+- CaptureWriter
+- CaptureReader
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import struct
+import time
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+MAGIC = b'FLCAP001'
+RECORD = struct.Struct('<dBBHI')
+BUFFER_SIZE = 1024 * 1024
+FLUSH_INTERVAL = 1.0
+
+# Protocols
+UDP = 1
+TCP = 2
+UNIX = 3
+PROTOCOLS = {'udp': UDP, 'tcp': TCP, 'unix': UNIX}
+
+
+class CaptureWriter:
+    """Appends received messages to a capture file"""
+
+    def __init__(self, path: str, flush_interval: float = FLUSH_INTERVAL) -> None:
+        """CaptureWriter constructor
+        Args:
+            path (str): path of the capture file. Appended to if it exists
+            flush_interval (float, optional): maximum time in seconds a record
+             stays in the write buffer [default: FLUSH_INTERVAL]
+        """
+        if not isinstance(path, str):
+            if RAISEEXCEPTIONS:
+                raise TypeError("path must be a string")
+            else:
+                return
+        self._path = path
+        self._file = open(path, 'ab', buffering=BUFFER_SIZE)  # pylint: disable=consider-using-with
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._flush_interval = flush_interval
+        self._next_flush = time.monotonic() + flush_interval
+
+    @property
+    def path(self) -> str:
+        """Returns the path of the capture file"""
+        return self._path
+
+    def write(self, data: bytes, protocol: int = UDP, address: tuple = ('', 0),
+              timestamp: float = None) -> None:
+        """Append a record
+        Args:
+            data (bytes): the datagram or frame
+            protocol (int, optional): UDP, TCP or UNIX [default: UDP]
+            address (tuple, optional): the source (address, port)
+            timestamp (float, optional): receive time [default: now]
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        host = address[0].encode() if address and address[0] else b''
+        port = address[1] if address and len(address) > 1 else 0
+        write = self._file.write
+        write(RECORD.pack(timestamp, protocol, len(host), port, len(data)))
+        write(host)
+        write(data)
+        now = time.monotonic()
+        if now >= self._next_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """Flush the write buffer to the file"""
+        self._file.flush()
+        self._next_flush = time.monotonic() + self._flush_interval
+
+    def close(self) -> None:
+        """Flush and close the capture file"""
+        self._file.close()
+
+
+class CaptureReader:
+    """Iterates over the records of a capture file"""
+
+    def __init__(self, path: str) -> None:
+        """CaptureReader constructor
+        Args:
+            path (str): path of the capture file
+        """
+        self._path = path
+        with open(path, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a capture file")
+
+    def __iter__(self):
+        """Iterate over the records
+        Returns:
+            Iterator of (timestamp, protocol, (address, port), data) tuples
+        """
+        return self.records()
+
+    def records(self, offsets: list = None, count: int = None):
+        """Iterate over the records, or over the records following some offsets
+        Args:
+            offsets (list, optional): file offsets of records (see index())
+             [default: None, from the first record]
+            count (int, optional): maximum number of records read from each
+             offset [default: None, up to the end of the file]
+        Returns:
+            Iterator of (timestamp, protocol, (address, port), data) tuples
+        """
+        with open(self._path, 'rb', buffering=BUFFER_SIZE) as file:
+            for offset in (len(MAGIC),) if offsets is None else offsets:
+                file.seek(offset)
+                yield from _read_records(file.read, count)
+
+    def index(self, every: int = 1) -> list:
+        """Returns the file offsets of the records 0, every, 2 * every...
+        Only the record headers are decoded, the addresses and the data are
+        skipped.
+        Args:
+            every (int, optional): number of records between two offsets [default: 1]
+        Returns:
+            list: the offsets, to be passed to records()
+        """
+        if every < 1:
+            if RAISEEXCEPTIONS:
+                raise ValueError("every must be at least 1")
+            else:
+                return []
+        offsets = []
+        with open(self._path, 'rb', buffering=BUFFER_SIZE) as file:
+            size = file.seek(0, 2)
+            offset = len(MAGIC)
+            number = 0
+            while offset + RECORD.size <= size:
+                file.seek(offset)
+                _, _, host_len, _, data_len = RECORD.unpack(file.read(RECORD.size))
+                end = offset + RECORD.size + host_len + data_len
+                if end > size:
+                    # truncated last record
+                    break
+                if number % every == 0:
+                    offsets.append(offset)
+                offset = end
+                number += 1
+        return offsets
+
+
+def _read_records(read, count: int = None):
+    """Iterate over the records from the current position of a capture file
+    Args:
+        read (function): the read method of the file
+        count (int, optional): maximum number of records [default: None, all]
+    Returns:
+        Iterator of (timestamp, protocol, (address, port), data) tuples
+    """
+    number = 0
+    while count is None or number < count:
+        header = read(RECORD.size)
+        if len(header) < RECORD.size:
+            return
+        timestamp, protocol, host_len, port, data_len = RECORD.unpack(header)
+        host = read(host_len)
+        data = read(data_len)
+        if len(data) < data_len:
+            # truncated last record
+            return
+        number += 1
+        yield timestamp, protocol, (host.decode(), port), data
@@ -0,0 +1,505 @@
+"""
+Columnar binary log file
+
+A columnar log file is a sequence of blocks of up to MAX_RECORDS records,
+appended by ColumnarFileHandler. A block stores each field of its records
+in a column, so that counting the records by level, facility, host, app or
+time reads the columns as arrays instead of parsing text lines. The block
+(little-endian) is:
+- the HEADER (48 bytes): MAGIC, VERSION, the number of records, the sizes
+  of the host and app dictionaries and of the messages, the time of the
+  first record and the minimum and maximum times (nanoseconds since the epoch)
+- the times: int64 deltas, each record from the previous one (the first is 0)
+- the levels (logging level) and the syslog facilities (FACILITY_NONE if
+  none): uint8
+- the hosts and the apps: uint16 codes in the dictionaries of the block
+- the dictionaries: the host names, then the app names, NUL separated
+- the messages: the uint32 end offsets of the messages, then their UTF-8 text
+The columns of 4 and 8 bytes are aligned (zero padding). Each block is
+written with a file lock (fcntl.flock) on an O_APPEND descriptor, so several
+processes (e.g. the UDP and TCP receivers of tinysyslogserver) can append
+to the same file. A reader stops at an incomplete last block.
+
+The aggregation functions (count_by, top) work per block on memoryviews of
+the columns: with NumPy, if installed, the columns are counted with
+bincount and cumsum; without it, the uint8 columns and the dictionary
+codes are counted with collections.Counter, and only the time buckets and
+the time range filter iterate over the records. No object is created per
+record besides the counted integers.
+
+Contains:
+- BlockBuilder
+- Block
+- ColumnarFileHandler
+- parse_syslog
+- read_blocks
+- count_by
+- top
+- records
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import array
+import collections
+import fcntl
+import itertools
+import logging
+import os
+import re
+import socket
+import struct
+import sys
+import time
+from logging import handlers
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+MAGIC = b'FRLC'
+VERSION = 1
+HEADER = struct.Struct('<4sB3xIIIIqqq')
+MAX_RECORDS = 65535
+BLOCK_RECORDS = 8192
+MAX_DELAY = 1.0
+FACILITY_NONE = 255
+KEYS = ('time', 'level', 'facility', 'host', 'app')
+INTERVAL = 60
+LITTLE = sys.byteorder == 'little'
+# syslog severities to logging levels
+SEVERITY_LEVELS = (logging.CRITICAL, logging.CRITICAL, logging.CRITICAL, logging.ERROR,
+                   logging.WARNING, logging.INFO, logging.INFO, logging.DEBUG)
+FACILITY_NAMES = {code: name for name, code in handlers.SysLogHandler.facility_names.items()
+                  if name != 'security'}
+SYSLOG = re.compile(r'<(\d{1,3})>'
+                    # RFC 5424: VERSION TIMESTAMP HOSTNAME APP-NAME PROCID MSGID SD
+                    r'(?:1 \S+ (\S+) (\S+) \S+ \S+ (?:-|\[.*?\]) ?'
+                    # RFC 3164: TIMESTAMP HOSTNAME TAG[PID]:
+                    r'|[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d (\S+) ([^\s:\[]+)(?:\[\d+\])?: ?)?')
+
+
+def _little(column: array.array) -> bytes:
+    """Returns the little-endian bytes of an array"""
+    if not LITTLE:
+        column.byteswap()
+    return column.tobytes()
+
+
+def _column(view: memoryview, typecode: str):
+    """Returns a column of a block: a memoryview cast (an array on big-endian hosts)"""
+    if typecode == 'B':
+        return view
+    if LITTLE:
+        return view.cast(typecode)
+    column = array.array(typecode, view.tobytes())
+    column.byteswap()
+    return column
+
+
+def _block_size(count: int, hosts_size: int, apps_size: int, text_size: int) -> tuple:
+    """Returns the offsets (from the block start) of the dictionaries, the message ends,
+    the text and the block end"""
+    dictionaries = HEADER.size + 14 * count
+    ends = dictionaries + hosts_size + apps_size
+    ends += -ends % 4
+    text = ends + 4 * count
+    end = text + text_size
+    return dictionaries, ends, text, end + -end % 8
+
+
+class BlockBuilder:
+    """Accumulates the columns of a block"""
+
+    def __init__(self) -> None:
+        self.deltas = array.array('q')
+        self.levels = bytearray()
+        self.facilities = bytearray()
+        self.hosts = array.array('H')
+        self.apps = array.array('H')
+        self.host_codes = {}
+        self.app_codes = {}
+        self.ends = array.array('I')
+        self.text = bytearray()
+        self.base = self.last = self.low = self.high = None
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def add(self, created: int, level: int, facility: int, host: str, app: str, message: bytes) -> None:
+        """Add a record
+        Args:
+            created (int): the time in nanoseconds since the epoch
+            level (int): the logging level (0 to 255)
+            facility (int): the syslog facility, FACILITY_NONE if none
+            host (str): the host
+            app (str): the app
+            message (bytes): the UTF-8 message
+        """
+        if self.base is None:
+            self.base = self.last = self.low = self.high = created
+        self.deltas.append(created - self.last)
+        self.last = created
+        if created < self.low:
+            self.low = created
+        elif created > self.high:
+            self.high = created
+        self.levels.append(min(max(level, 0), 255))
+        self.facilities.append(facility)
+        self.hosts.append(self.host_codes.setdefault(host, len(self.host_codes)))
+        self.apps.append(self.app_codes.setdefault(app, len(self.app_codes)))
+        self.text += message
+        self.ends.append(len(self.text))
+
+    def encode(self) -> bytes:
+        """Returns the block (without a record interrupted in add, e.g. by a signal:
+        the message end is its last column)"""
+        count = len(self.ends)
+        del self.deltas[count:], self.levels[count:], self.facilities[count:]
+        del self.hosts[count:], self.apps[count:], self.text[self.ends[-1] if count else 0:]
+        hosts = '\0'.join(self.host_codes).encode('utf-8', 'backslashreplace')
+        apps = '\0'.join(self.app_codes).encode('utf-8', 'backslashreplace')
+        dictionaries, ends, text, end = _block_size(count, len(hosts), len(apps), len(self.text))
+        return b''.join([
+            HEADER.pack(MAGIC, VERSION, count, len(hosts), len(apps), len(self.text),
+                        self.base, self.low, self.high),
+            _little(self.deltas), self.levels, self.facilities, _little(self.hosts), _little(self.apps),
+            hosts, apps, bytes(ends - dictionaries - len(hosts) - len(apps)),
+            _little(self.ends), self.text, bytes(end - text - len(self.text)),
+        ])
+
+
+class Block:
+    """The columns of a block read from a columnar file"""
+
+    def __init__(self, data: bytes) -> None:
+        """Block constructor
+        Args:
+            data (bytes): the block
+        Raises:
+            ValueError: not a block of this VERSION
+        """
+        magic, version, count, hosts_size, apps_size, text_size, self.base, self.low, self.high = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a columnar log block")
+        dictionaries, ends, text, _ = _block_size(count, hosts_size, apps_size, text_size)
+        view = memoryview(data)
+        self.count = count
+        position = HEADER.size
+        self.deltas = _column(view[position:position + 8 * count], 'q')
+        position += 8 * count
+        self.levels = view[position:position + count]
+        self.facilities = view[position + count:position + 2 * count]
+        position += 2 * count
+        self.hosts = _column(view[position:position + 2 * count], 'H')
+        self.apps = _column(view[position + 2 * count:position + 4 * count], 'H')
+        self.host_names = bytes(view[dictionaries:dictionaries + hosts_size]).decode('utf-8', 'replace').split('\0')
+        self.app_names = bytes(view[dictionaries + hosts_size:dictionaries + hosts_size + apps_size]) \
+            .decode('utf-8', 'replace').split('\0')
+        self.ends = _column(view[ends:ends + 4 * count], 'I')
+        self.text = view[text:text + text_size]
+
+    def times(self):
+        """Returns an iterator over the times of the records (nanoseconds since the epoch)"""
+        return itertools.islice(itertools.accumulate(self.deltas, initial=self.base), 1, None)
+
+    def message(self, index: int) -> str:
+        """Returns the message of a record"""
+        start = self.ends[index - 1] if index else 0
+        return bytes(self.text[start:self.ends[index]]).decode('utf-8', 'replace')
+
+
+def parse_syslog(data: str) -> tuple:
+    """Returns the columns of a syslog message: <PRI> followed by an optional RFC 5424
+    or RFC 3164 header
+    Args:
+        data (str): the message
+    Returns:
+        tuple: (facility, logging level, host, app, message without the header), the
+         host and the app are None if not in the header. (FACILITY_NONE, None, None, None,
+         data) without <PRI>
+    """
+    match = SYSLOG.match(data)
+    if match is None:
+        return FACILITY_NONE, None, None, None, data
+    priority = int(match.group(1))
+    host = match.group(2) or match.group(4)
+    app = match.group(3) or match.group(5)
+    return (min(priority >> 3, FACILITY_NONE - 1), SEVERITY_LEVELS[priority & 7],
+            None if host == '-' else host, None if app == '-' else app, data[match.end():])
+
+
+class ColumnarFileHandler(logging.Handler):
+    """Handler appending the records to a columnar log file, in blocks
+    (the formatter is not used: the message is a column)"""
+
+    def __init__(self,
+                 filename: str,
+                 mode: str = 'a',
+                 host: str = None,
+                 app: str = None,
+                 block_records: int = BLOCK_RECORDS,
+                 max_delay: float = MAX_DELAY) -> None:
+        """ColumnarFileHandler constructor
+        Args:
+            filename (str): the log file path
+            mode (str, optional): 'a' to append, 'w' to truncate the file first [default: 'a']
+            host (str, optional): the host of the records without a host attribute
+             [default: None, the host name]
+            app (str, optional): the app of the records without an app attribute
+             [default: None, the logger name]
+            block_records (int, optional): records per block, at most MAX_RECORDS
+             [default: BLOCK_RECORDS]
+            max_delay (float, optional): maximum time in seconds a record waits for its
+             block to be written (checked on the next record and by service())
+             [default: MAX_DELAY]
+        """
+        if mode not in ('a', 'w'):
+            if RAISEEXCEPTIONS:
+                raise ValueError("mode must be 'a' or 'w'")
+            else:
+                return
+        if not isinstance(block_records, int) or not 0 < block_records <= MAX_RECORDS:
+            if RAISEEXCEPTIONS:
+                raise ValueError(f"block_records must be between 1 and {MAX_RECORDS}")
+            else:
+                return
+        super().__init__()
+        self.baseFilename = os.path.abspath(filename)
+        self.host = socket.gethostname() if host is None else host
+        self.app = app
+        self.block_records = block_records
+        self.max_delay = max_delay
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC
+        self.fd = os.open(self.baseFilename, flags | (os.O_TRUNC if mode == 'w' else 0), 0o644)
+        self.builder = BlockBuilder()
+        self.deadline = None
+
+    def columns(self, record: logging.LogRecord) -> tuple:
+        """Returns the columns of a record
+        Args:
+            record (logging.LogRecord): the record
+        Returns:
+            tuple: (facility, level, host, app, message)
+        """
+        return (FACILITY_NONE, record.levelno, getattr(record, 'host', None) or self.host,
+                getattr(record, 'app', None) or self.app or record.name, record.getMessage())
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Add the record to the block, written once full or after max_delay
+        Args:
+            record (logging.LogRecord): the record
+        """
+        try:
+            facility, level, host, app, message = self.columns(record)
+            if not self.builder:
+                self.deadline = time.monotonic() + self.max_delay
+            self.builder.add(int(record.created * 1e9), level, facility, host.replace('\0', ' '),
+                             app.replace('\0', ' '), message.encode('utf-8', 'backslashreplace'))
+            if len(self.builder) >= self.block_records or time.monotonic() >= self.deadline:
+                self._write_block()
+        except RecursionError:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def _write_block(self) -> None:
+        """Append the block under the file lock"""
+        if not self.builder or self.fd is None:
+            return
+        data = memoryview(self.builder.encode())
+        self.builder = BlockBuilder()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            while data:
+                data = data[os.write(self.fd, data):]
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def flush(self) -> None:
+        """Write the current block"""
+        with self.lock:
+            self._write_block()
+
+    def service(self) -> None:
+        """Write the current block if its records waited max_delay (e.g. from a server loop)"""
+        with self.lock:
+            if self.builder and time.monotonic() >= self.deadline:
+                self._write_block()
+
+    def sync(self) -> None:
+        """Write the current block and sync the file to disk"""
+        with self.lock:
+            self._write_block()
+            if self.fd is not None:
+                os.fdatasync(self.fd)
+
+    def close(self) -> None:
+        """Write the current block and close the file"""
+        with self.lock:
+            if self.fd is not None:
+                self._write_block()
+                os.close(self.fd)
+                self.fd = None
+            super().close()
+
+
+def read_blocks(filename: str):
+    """Yield the blocks of a columnar log file, one in memory at a time
+    Args:
+        filename (str): the file path
+    Yields:
+        Block: the blocks, until the end of the file or an incomplete block
+    Raises:
+        ValueError: not a columnar log file
+    """
+    with open(filename, 'rb') as file:
+        while True:
+            header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            magic, _, count, hosts_size, apps_size, text_size, _, _, _ = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"{filename} is not a columnar log file")
+            size = _block_size(count, hosts_size, apps_size, text_size)[3]
+            rest = file.read(size - HEADER.size)
+            if len(rest) < size - HEADER.size:
+                # being written
+                return
+            yield Block(header + rest)
+
+
+def _key_names(block: Block, key: str) -> list:
+    """Returns the names of the codes of a column"""
+    if key == 'host':
+        return block.host_names
+    if key == 'app':
+        return block.app_names
+    if key == 'level':
+        return [logging.getLevelName(level) for level in range(256)]
+    return [FACILITY_NAMES.get(facility, '-') for facility in range(256)]
+
+
+def _count_numpy(block: Block, key: str, step: int, since: int, until: int, whole: bool,
+                 counts: collections.Counter) -> None:
+    """Count the records of a block with NumPy"""
+    mask = None
+    times = None
+    if key == 'time' or not whole:
+        times = numpy.cumsum(numpy.frombuffer(block.deltas, dtype='<i8')) + block.base
+    if not whole:
+        mask = numpy.ones(block.count, dtype=bool)
+        if since is not None:
+            mask &= times >= since
+        if until is not None:
+            mask &= times < until
+    if key == 'time':
+        buckets, numbers = numpy.unique((times if mask is None else times[mask]) // step, return_counts=True)
+        for bucket, number in zip(buckets.tolist(), numbers.tolist()):
+            counts[bucket * step // 1000000000] += number
+        return
+    dtype = 'u1' if key in ('level', 'facility') else '<u2'
+    column = numpy.frombuffer({'level': block.levels, 'facility': block.facilities,
+                               'host': block.hosts, 'app': block.apps}[key], dtype=dtype)
+    numbers = numpy.bincount(column if mask is None else column[mask])
+    names = _key_names(block, key)
+    for code in numpy.flatnonzero(numbers).tolist():
+        counts[names[code]] += int(numbers[code])
+
+
+def _count_python(block: Block, key: str, step: int, since: int, until: int, whole: bool,
+                  counts: collections.Counter) -> None:
+    """Count the records of a block with collections.Counter over the columns"""
+    selected = None
+    if not whole:
+        selected = [(since is None or created >= since) and (until is None or created < until)
+                    for created in block.times()]
+    if key == 'time':
+        buckets = collections.Counter(created // step for created in
+                                      (block.times() if selected is None else itertools.compress(block.times(), selected)))
+        for bucket, number in buckets.items():
+            counts[bucket * step // 1000000000] += number
+        return
+    column = {'level': block.levels, 'facility': block.facilities, 'host': block.hosts, 'app': block.apps}[key]
+    codes = collections.Counter(column if selected is None else itertools.compress(column, selected))
+    names = _key_names(block, key)
+    for code, number in codes.items():
+        counts[names[code]] += number
+
+
+def count_by(blocks, key: str, interval: int = INTERVAL, since: float = None, until: float = None) -> dict:
+    """Count the records by a column
+    Args:
+        blocks (iterable): the blocks (read_blocks)
+        key (str): one of KEYS: time (the start of the interval, seconds since the epoch),
+         level (name), facility (name, '-' if none), host or app
+        interval (int, optional): with time, the seconds of the buckets [default: INTERVAL]
+        since (float, optional): count the records from this time (seconds since the epoch)
+         [default: None]
+        until (float, optional): count the records before this time [default: None]
+    Returns:
+        dict: {key: number of records}
+    """
+    if key not in KEYS or not isinstance(interval, int) or interval < 1:
+        if RAISEEXCEPTIONS:
+            raise ValueError(f"key must be one of {', '.join(KEYS)} and interval a positive integer")
+        else:
+            return None
+    since = None if since is None else int(since * 1e9)
+    until = None if until is None else int(until * 1e9)
+    count = _count_python if numpy is None else _count_numpy
+    counts = collections.Counter()
+    for block in blocks:
+        if (since is not None and block.high < since) or (until is not None and block.low >= until):
+            continue
+        whole = (since is None or block.low >= since) and (until is None or block.high < until)
+        count(block, key, interval * 1000000000, since, until, whole, counts)
+    return dict(counts)
+
+
+def top(counts: dict, number: int = None) -> list:
+    """Returns the keys with the most records
+    Args:
+        counts (dict): the count_by result
+        number (int, optional): the number of keys [default: None, all]
+    Returns:
+        list: (key, count), by decreasing count
+    """
+    return sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))[:number]
+
+
+def records(blocks, since: float = None, until: float = None):
+    """Yield the records (one tuple per record: for export, not aggregation)
+    Args:
+        blocks (iterable): the blocks (read_blocks)
+        since (float, optional): the records from this time (seconds since the epoch)
+         [default: None]
+        until (float, optional): the records before this time [default: None]
+    Yields:
+        tuple: (time in seconds, level, facility, host, app, message)
+    """
+    since = None if since is None else int(since * 1e9)
+    until = None if until is None else int(until * 1e9)
+    for block in blocks:
+        if (since is not None and block.high < since) or (until is not None and block.low >= until):
+            continue
+        for index, created in enumerate(block.times()):
+            if (since is not None and created < since) or (until is not None and created >= until):
+                continue
+            yield (created / 1e9, block.levels[index], block.facilities[index],
+                   block.host_names[block.hosts[index]], block.app_names[block.apps[index]],
+                   block.message(index))
@@ -0,0 +1,227 @@
+"""
+Durability policy of the log file handlers
+
+The durability of a record once the logging call returns:
+- none: the record may still be in the buffer of the process (written when
+  the buffer is full or the handler closed): lost if the process crashes
+- flush: the record is handed over to the OS (the FileHandler behaviour):
+  lost on power loss
+- fsync: the record is on disk (fdatasync after each record)
+- group: the record is on disk, but the threads logging at the same time
+  share one fdatasync (group commit, GroupCommit)
+
+With group, the first thread to wait for the disk leads the commit: it
+waits for the threads that are about to write (at most max_delay seconds
+and max_batch records), syncs once for all of them and wakes them up. The
+threads arriving meanwhile form the next group. A lone thread does not
+wait, so group is never slower than fsync by more than the bookkeeping.
+
+Contains:
+- check_durability
+- GroupCommit
+- GroupCommitMixin
+- DurableFileHandler
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import contextlib
+import logging
+import os
+import threading
+import time
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+DURABILITY = ('none', 'flush', 'fsync', 'group')
+MAX_DELAY = 0.005
+MAX_BATCH = 1000
+
+
+def check_durability(durability: str) -> bool:
+    """Check a durability policy
+    Args:
+        durability (str): the policy
+    Returns:
+        bool: True if it is one of DURABILITY, False otherwise (ValueError with RAISEEXCEPTIONS)
+    """
+    if durability in DURABILITY:
+        return True
+    if RAISEEXCEPTIONS:
+        raise ValueError(f"durability must be one of {', '.join(DURABILITY)}")
+    return False
+
+
+class GroupCommit:
+    """Shares one sync between the threads writing at the same time"""
+
+    def __init__(self, sync, max_delay: float = MAX_DELAY, max_batch: int = MAX_BATCH) -> None:
+        """GroupCommit constructor
+        Args:
+            sync (callable): makes the written records durable (e.g. os.fdatasync of the file)
+            max_delay (float, optional): maximum time in seconds the leader waits for the
+             writers about to write [default: MAX_DELAY]
+            max_batch (int, optional): the leader syncs without waiting once this many
+             records are pending [default: MAX_BATCH]
+        """
+        self.sync = sync
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.syncs = 0
+        self._cond = threading.Condition()
+        self._writing = 0
+        self._written = 0
+        self._synced = 0
+        self._leading = False
+
+    @contextlib.contextmanager
+    def commit(self):
+        """Write the record in the body, then wait until a sync covers it
+        Raises:
+            OSError: the sync failed
+        """
+        with self._cond:
+            self._writing += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing -= 1
+                self._written += 1
+                target = self._written
+                # wake up the leader waiting for this write
+                self._cond.notify_all()
+        self._wait(target)
+
+    def _wait(self, target: int) -> None:
+        """Wait until the records up to target are synced, leading the sync if nobody does"""
+        with self._cond:
+            while self._synced < target:
+                if self._leading:
+                    self._cond.wait()
+                    continue
+                self._leading = True
+                try:
+                    deadline = time.monotonic() + self.max_delay
+                    while self._writing and self._written - self._synced < self.max_batch:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    upto = self._written
+                    self._cond.release()
+                    try:
+                        self.sync()
+                    finally:
+                        self._cond.acquire()
+                    self._synced = max(self._synced, upto)
+                    self.syncs += 1
+                finally:
+                    self._leading = False
+                    self._cond.notify_all()
+
+
+class GroupCommitMixin:
+    """Handler mixin waiting for the group commit (self.group) outside of the handler lock"""
+
+    group = None
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        """Emit the record under the handler lock, then wait for the group commit outside of it
+        Args:
+            record (logging.LogRecord): the record
+        Returns:
+            bool: whether the record passed the filters
+        """
+        if self.group is None:
+            return super().handle(record)
+        passed = self.filter(record)
+        if isinstance(passed, logging.LogRecord):
+            record = passed
+        if passed:
+            try:
+                with self.group.commit():
+                    with self.lock:
+                        self.emit(record)
+            except OSError:
+                self.handleError(record)
+        return passed
+
+
+class DurableFileHandler(GroupCommitMixin, logging.FileHandler):
+    """FileHandler with a durability policy (none, flush, fsync, group), and an optional
+    time index"""
+
+    def __init__(self,
+                 filename: str,
+                 mode: str = 'a',
+                 encoding: str = None,
+                 durability: str = 'flush',
+                 max_delay: float = MAX_DELAY,
+                 max_batch: int = MAX_BATCH,
+                 index=None) -> None:
+        """DurableFileHandler constructor
+        Args:
+            filename (str): the log file path
+            mode (str, optional): the file mode [default: 'a']
+            encoding (str, optional): the encoding [default: None]
+            durability (str, optional): one of DURABILITY [default: 'flush']
+            max_delay (float, optional): with group, see GroupCommit [default: MAX_DELAY]
+            max_batch (int, optional): with group, see GroupCommit [default: MAX_BATCH]
+            index (timeindex.TimeIndexWriter, optional): indexes the time of the records,
+             which are then always flushed (their offset is needed) [default: None]
+        """
+        if not check_durability(durability):
+            return
+        super().__init__(filename, mode, encoding)
+        self.durability = durability
+        self.group = GroupCommit(self._sync, max_delay, max_batch) if durability == 'group' else None
+        self.index = index
+
+    def close(self) -> None:
+        """Close the file and the index"""
+        with self.lock:
+            if self.index is not None:
+                self.index.close()
+            super().close()
+
+    def _sync(self) -> None:
+        """Sync the data of the file (group commit)"""
+        stream = self.stream
+        if stream is not None:
+            os.fdatasync(stream.fileno())
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Write the record, then flush and sync it according to the durability
+        Args:
+            record (logging.LogRecord): the record
+        """
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            msg = self.format(record) + self.terminator
+            self.stream.write(msg)
+            if self.durability != 'none' or self.index is not None:
+                self.stream.flush()
+            if self.durability == 'fsync':
+                os.fdatasync(self.stream.fileno())
+            if self.index is not None:
+                # the file position is the end of the file after an append
+                end = os.lseek(self.stream.fileno(), 0, os.SEEK_CUR)
+                if self.index.due(end):
+                    size = len(msg) if msg.isascii() else len(msg.encode(self.stream.encoding, self.stream.errors))
+                    self.index.add(record.created, end - size)
+        except RecursionError:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
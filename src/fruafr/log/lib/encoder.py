@@ -0,0 +1,298 @@
+"""
+Fast syslog wire encoder
+
+logging.handlers.SysLogHandler computes the priority of every record
+(encodePriority, mapPriority), builds the message with several str
+concatenations and encodes it. SyslogEncoder precomputes the <PRI> bytes of
+every facility/severity (PRI_PREFIXES) and the static parts of the header,
+so a message is assembled with a single bytes join.
+
+Header formats (rfc):
+- None: <PRI>ident + message, the format of SysLogHandler
+- '3164': <PRI>Mmm dd hh:mm:ss HOSTNAME APP-NAME[PROCID]: message (RFC 3164)
+- '5424': <PRI>1 TIMESTAMP HOSTNAME APP-NAME PROCID MSGID - message (RFC 5424)
+The timestamp is formatted once per second.
+
+FastSysLogHandler is a SysLogHandler sending the messages built by a
+SyslogEncoder.
+
+References:
+https://datatracker.ietf.org/doc/html/rfc3164
+https://datatracker.ietf.org/doc/html/rfc5424
+
+Contains:
+- PRI_PREFIXES
+- SyslogEncoder
+- FastSysLogHandler
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import logging
+import os
+import socket
+import sys
+import time
+from logging import handlers
+
+from fruafr.log.lib import common
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+RFCS = ('3164', '5424')
+NILVALUE = '-'
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+# <PRI> of every facility of common.SYSLOG_FACILITIES and every severity
+PRI_PREFIXES = {
+    (getattr(handlers.SysLogHandler, name), severity):
+        b'<%d>' % ((getattr(handlers.SysLogHandler, name) << 3) | severity)
+    for name in common.SYSLOG_FACILITIES.values()
+    for severity in range(8)
+}
+
+
+def _pri(facility: int, severity: int) -> bytes:
+    """Returns the <PRI> bytes (facilities outside common.SYSLOG_FACILITIES included)"""
+    prefix = PRI_PREFIXES.get((facility, severity))
+    if prefix is None:
+        prefix = b'<%d>' % ((facility << 3) | severity)
+    return prefix
+
+
+class SyslogEncoder:
+    """Builds syslog messages from precomputed bytes"""
+
+    def __init__(self,
+                 facility: int = handlers.SysLogHandler.LOG_USER,
+                 rfc: str = None,
+                 ident: str = '',
+                 append_nul: bool = True,
+                 hostname: str = None,
+                 app_name: str = None,
+                 procid: str = None,
+                 msgid: str = None) -> None:
+        """SyslogEncoder constructor
+        Args:
+            facility (int, optional): the facility [default: LOG_USER]
+            rfc (str, optional): header format: None, '3164' or '5424' [default: None]
+            ident (str, optional): prepended to every message [default: '']
+            append_nul (bool, optional): terminate the messages with a NUL [default: True]
+            hostname (str, optional): HOSTNAME [default: socket.gethostname()]
+            app_name (str, optional): APP-NAME [default: the program name]
+            procid (str, optional): PROCID [default: the pid at construction]
+            msgid (str, optional): MSGID (RFC 5424) [default: NILVALUE]
+        """
+        if not isinstance(facility, int):
+            if RAISEEXCEPTIONS:
+                raise TypeError("facility must be an integer")
+            else:
+                return
+        if rfc is not None and rfc not in RFCS:
+            if RAISEEXCEPTIONS:
+                raise ValueError(f"rfc must be one of {', '.join(RFCS)}")
+            else:
+                return
+        self.facility = facility
+        self.rfc = rfc
+        hostname = hostname or socket.gethostname() or NILVALUE
+        app_name = app_name or os.path.basename(sys.argv[0]) or NILVALUE
+        procid = str(procid if procid is not None else os.getpid())
+        msgid = msgid or NILVALUE
+        # <PRI> (+ version) of each level name, unknown levels are warnings
+        version = b'1 ' if rfc == '5424' else b''
+        self._prefixes = {
+            levelname: _pri(facility, handlers.SysLogHandler.priority_names[priority]) + version
+            for levelname, priority in handlers.SysLogHandler.priority_map.items()
+        }
+        self._default_prefix = self._prefixes['WARNING']
+        # everything between the timestamp and the message
+        if rfc == '3164':
+            static = f" {hostname} {app_name}[{procid}]: {ident}"
+        elif rfc == '5424':
+            static = f" {hostname} {app_name} {procid} {msgid} - {ident}"
+        else:
+            static = ident
+        self._static = static.encode('utf-8')
+        self._trailer = b'\000' if append_nul else b''
+        # (second, date, time zone) of the last timestamp, replaced as a whole
+        # so concurrent threads never mix two seconds
+        self._stamp = (None, b'', b'')
+
+    def _timestamp(self, created: float) -> bytes:
+        """Returns the timestamp of the header"""
+        second = int(created)
+        stamp = self._stamp
+        if stamp[0] != second:
+            local = time.localtime(second)
+            if self.rfc == '3164':
+                date = f"{MONTHS[local.tm_mon - 1]} {local.tm_mday:2d} {local.tm_hour:02d}:{local.tm_min:02d}:{local.tm_sec:02d}"
+                zone = ''
+            else:
+                offset = local.tm_gmtoff // 60
+                date = time.strftime('%Y-%m-%dT%H:%M:%S', local)
+                zone = f"{'+' if offset >= 0 else '-'}{abs(offset) // 60:02d}:{abs(offset) % 60:02d}"
+            stamp = self._stamp = (second, date.encode(), zone.encode())
+        if self.rfc == '3164':
+            return stamp[1]
+        return b'%s.%06d%s' % (stamp[1], int((created - second) * 1e6), stamp[2])
+
+    def prefix(self, levelname: str) -> bytes:
+        """Returns the <PRI> (and version) bytes of a level
+        Args:
+            levelname (str): the level name (e.g. 'INFO')
+        Returns:
+            bytes: the prefix
+        """
+        return self._prefixes.get(levelname, self._default_prefix)
+
+    def encode(self, levelname: str, message: str, created: float = None) -> bytes:
+        """Returns a message as it is sent on the wire
+        Args:
+            levelname (str): the level name (e.g. 'INFO')
+            message (str): the formatted message
+            created (float, optional): time of the message [default: now]
+        Returns:
+            bytes: the syslog message
+        """
+        prefix = self._prefixes.get(levelname, self._default_prefix)
+        if self.rfc is None:
+            return b''.join((prefix, self._static, message.encode('utf-8'), self._trailer))
+        stamp = self._timestamp(time.time() if created is None else created)
+        return b''.join((prefix, stamp, self._static, message.encode('utf-8'), self._trailer))
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self.facility}, {self.rfc})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
+
+
+class FastSysLogHandler(handlers.SysLogHandler):
+    """SysLogHandler encoding the records with a SyslogEncoder"""
+
+    # see the properties below
+    _ident = ''
+    _append_nul = True
+    _facility = handlers.SysLogHandler.LOG_USER
+    encoder = None
+
+    def __init__(self,
+                 address=('localhost', handlers.SYSLOG_UDP_PORT),
+                 facility: int = handlers.SysLogHandler.LOG_USER,
+                 socktype: int = None,
+                 rfc: str = None,
+                 hostname: str = None,
+                 app_name: str = None,
+                 procid: str = None) -> None:
+        """FastSysLogHandler constructor
+        Args:
+            address (str or tuple, optional): UNIX socket path or (host, port)
+            facility (int, optional): the syslog facility [default: LOG_USER]
+            socktype (int, optional): socket.SOCK_DGRAM or socket.SOCK_STREAM
+            rfc (str, optional): header format (see SyslogEncoder) [default: None]
+            hostname (str, optional): see SyslogEncoder
+            app_name (str, optional): see SyslogEncoder
+            procid (str, optional): see SyslogEncoder
+        """
+        super().__init__(address, facility, socktype)
+        self._prepare_encoder(rfc, hostname, app_name, procid)
+
+    def _prepare_encoder(self, rfc: str = None, hostname: str = None,
+                         app_name: str = None, procid: str = None) -> None:
+        """Build the encoder (subclasses not calling __init__ call it once the facility is set)"""
+        self._options = {'rfc': rfc, 'hostname': hostname, 'app_name': app_name, 'procid': procid}
+        self._update_encoder()
+
+    def _update_encoder(self) -> None:
+        """Build the encoder from the current ident, append_nul and facility"""
+        self.encoder = SyslogEncoder(self._facility, ident=self._ident,
+                                     append_nul=self._append_nul, **self._options)
+
+    # ident, append_nul and facility may be changed after the construction
+    # (like the attributes of SysLogHandler): the encoder is rebuilt
+
+    @property
+    def ident(self) -> str:
+        """Returns the string prepended to every message"""
+        return self._ident
+
+    @ident.setter
+    def ident(self, value: str) -> None:
+        self._ident = value
+        if self.encoder is not None:
+            self._update_encoder()
+
+    @property
+    def append_nul(self) -> bool:
+        """Returns True if the messages are terminated with a NUL"""
+        return self._append_nul
+
+    @append_nul.setter
+    def append_nul(self, value: bool) -> None:
+        self._append_nul = value
+        if self.encoder is not None:
+            self._update_encoder()
+
+    @property
+    def facility(self) -> int:
+        """Returns the facility"""
+        return self._facility
+
+    @facility.setter
+    def facility(self, value: int) -> None:
+        self._facility = value
+        if self.encoder is not None:
+            self._update_encoder()
+
+    def encode_record(self, record: logging.LogRecord) -> bytes:
+        """Returns the record as it is sent on the wire
+        Args:
+            record (logging.LogRecord): the record
+        Returns:
+            bytes: the syslog message
+        """
+        return self.encoder.encode(record.levelname, self.format(record), record.created)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Send the record (the sending part of SysLogHandler.emit)
+        Args:
+            record (logging.LogRecord): the record
+        """
+        try:
+            msg = self.encode_record(record)
+            if not self.socket:
+                # Python >= 3.11 creates the socket lazily
+                self.createSocket()
+            if self.unixsocket:
+                try:
+                    self.socket.send(msg)
+                except OSError:
+                    self.socket.close()
+                    self._connect_unixsocket(self.address)
+                    self.socket.send(msg)
+            elif self.socktype == socket.SOCK_DGRAM:
+                self.socket.sendto(msg, self.address)
+            else:
+                self.socket.sendall(msg)
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
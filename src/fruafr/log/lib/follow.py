@@ -0,0 +1,271 @@
+"""
+Follow (tail) log files with durable read checkpoints
+
+FileFollower reads the complete lines appended to a file in large blocks.
+The offset only moves past complete lines, so a partial last line is read
+again once it is terminated. Rotation is detected when the path points to a
+new inode: the old file is read to its end before switching to the new one
+from its beginning. A truncated file is read again from its beginning.
+
+Checkpoints stores the (device, inode, offset) of every followed file in a
+JSON file, replaced atomically (write to a temporary file, fsync, rename),
+so a restart resumes after the last committed line. A file rotated while
+the follower was stopped is found again by its inode in the same directory.
+
+Contains:
+- Checkpoints
+- FileFollower
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import json
+import os
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+BLOCK_SIZE = 1024 * 1024
+
+
+class Checkpoints:
+    """Committed read positions of the followed files"""
+
+    def __init__(self, path: str) -> None:
+        """Checkpoints constructor. Loads the file if it exists
+        Args:
+            path (str): path of the checkpoint file
+        """
+        if not isinstance(path, str):
+            if RAISEEXCEPTIONS:
+                raise TypeError("path must be a string")
+            else:
+                return
+        self.path = path
+        self._positions = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                self._positions = json.load(file)
+
+    def get(self, name: str) -> dict:
+        """Returns the committed position of a file
+        Args:
+            name (str): the followed path
+        Returns:
+            dict: dev, ino and offset, or None
+        """
+        return self._positions.get(os.path.abspath(name))
+
+    def set(self, name: str, position: dict) -> None:
+        """Set the position of a file (see save())
+        Args:
+            name (str): the followed path
+            position (dict): dev, ino and offset
+        """
+        self._positions[os.path.abspath(name)] = dict(position)
+
+    def save(self) -> None:
+        """Write the positions atomically"""
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as file:
+            json.dump(self._positions, file, indent=1, sort_keys=True)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self.path)
+        directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self.path})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
+
+
+class FileFollower:
+    """Reads the lines appended to a file, across rotations and truncations"""
+
+    def __init__(self, path: str, position: dict = None, block_size: int = BLOCK_SIZE) -> None:
+        """FileFollower constructor. The file may not exist yet
+        Args:
+            path (str): the followed path
+            position (dict, optional): committed position (see Checkpoints.get)
+            block_size (int, optional): size of the reads [default: BLOCK_SIZE]
+        """
+        if not isinstance(path, str):
+            if RAISEEXCEPTIONS:
+                raise TypeError("path must be a string")
+            else:
+                return
+        self.path = path
+        self.block_size = block_size
+        self.rotations = 0
+        self.truncations = 0
+        self._file = None
+        self._offset = 0
+        self._id = None
+        if position is not None:
+            self._resume(position)
+
+    def _resume(self, position: dict) -> None:
+        """Reopen the file of a committed position"""
+        wanted = (position['dev'], position['ino'])
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and (stat.st_dev, stat.st_ino) == wanted:
+            candidate = self.path
+        else:
+            # rotated while stopped: look for the inode next to the path
+            candidate = None
+            directory = os.path.dirname(os.path.abspath(self.path))
+            for name in sorted(os.listdir(directory)):
+                other = os.path.join(directory, name)
+                try:
+                    other_stat = os.stat(other)
+                except OSError:
+                    continue
+                if (other_stat.st_dev, other_stat.st_ino) == wanted:
+                    candidate = other
+                    break
+            if candidate is None:
+                return
+        self._open(candidate)
+        if position['offset'] <= os.fstat(self._file.fileno()).st_size:
+            self._offset = position['offset']
+
+    def _open(self, path: str) -> bool:
+        """Open a file from its beginning"""
+        try:
+            file = open(path, 'rb')  # pylint: disable=consider-using-with
+        except FileNotFoundError:
+            return False
+        if self._file is not None:
+            self._file.close()
+        self._file = file
+        stat = os.fstat(file.fileno())
+        self._id = (stat.st_dev, stat.st_ino)
+        self._offset = 0
+        return True
+
+    @property
+    def offset(self) -> int:
+        """Returns the offset after the last line read"""
+        return self._offset
+
+    @property
+    def position(self) -> dict:
+        """Returns the position to commit (dev, ino, offset)"""
+        if self._id is None:
+            return None
+        return {'dev': self._id[0], 'ino': self._id[1], 'offset': self._offset}
+
+    @property
+    def lag(self) -> int:
+        """Returns the number of bytes not read yet (the new file included after a rotation)"""
+        if self._file is None:
+            try:
+                return os.stat(self.path).st_size
+            except FileNotFoundError:
+                return 0
+        lag = max(os.fstat(self._file.fileno()).st_size - self._offset, 0)
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return lag
+        if (stat.st_dev, stat.st_ino) != self._id:
+            lag += stat.st_size
+        return lag
+
+    def read(self) -> list:
+        """Returns the next complete lines (up to block_size bytes)
+        Returns:
+            list: the lines (bytes, without the line feed), empty if there is nothing new
+        """
+        if self._file is None and not self._open(self.path):
+            return []
+        size = os.fstat(self._file.fileno()).st_size
+        if size < self._offset:
+            self.truncations += 1
+            self._offset = 0
+        if size == self._offset:
+            if self._rotated():
+                return self.read()
+            return []
+        self._file.seek(self._offset)
+        data = self._file.read(self.block_size)
+        end = data.rfind(b'\n')
+        if end < 0:
+            if len(data) < self.block_size:
+                if self._path_changed():
+                    # the file was rotated: its unterminated last line is complete
+                    self._offset += len(data)
+                    return [data]
+                # partial last line
+                return []
+            # line longer than block_size: read up to its end
+            while end < 0:
+                more = self._file.read(self.block_size)
+                if not more:
+                    return []
+                end = more.find(b'\n')
+                data += more
+            end = data.rfind(b'\n')
+        self._offset += end + 1
+        return data[:end].split(b'\n')
+
+    def _path_changed(self) -> bool:
+        """Returns True if the path points to another file than the one read"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_dev, stat.st_ino) != self._id
+
+    def _rotated(self) -> bool:
+        """Switch to the new file if the path points to a new inode"""
+        if not self._path_changed():
+            return False
+        self.rotations += 1
+        return self._open(self.path)
+
+    def close(self) -> None:
+        """Close the file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self.path})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
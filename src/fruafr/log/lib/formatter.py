@@ -5,15 +5,25 @@ Uses standards python logging logger objects to template the formatter \
 Reference:
 https://docs.python.org/3/library/logging.html#logger-objects
 
+The JSON Lines output (--output-format jsonl) formats each record as a
+JSON object on one line with JsonFormatter: the keys and the static fields
+are encoded once, in a template filled with the encoded values of the
+record.
+
 Contains:
 - FormatterClass
+- JsonFormatter
+- format_fields
 
 """
 # Copyright 2023 by David Heurtevent.
 # SPDX_LICENSE: MIT
 # License: MIT License
 # Author: David HEURTEVENT <david@heurtevent.org>
+import json
 import logging
+import math
+import re
 
 from fruafr.log.lib import common
 
@@ -26,6 +36,16 @@ from fruafr.log.lib import common
 #
 RAISEEXCEPTIONS = True
 
+# Defaults
+JSON_FIELDS = ['asctime', 'levelname', 'message']
+# the string fields with few distinct values, their encoding is cached
+CACHED_FIELDS = ('levelname', 'name', 'module', 'filename', 'funcName', 'pathname',
+                 'processName', 'threadName', 'taskName')
+CACHE_SIZE = 1024
+FIELD = re.compile(r'%\((\w+)\)')
+# json.encoder uses the C implementation when available
+encode_string = json.encoder.encode_basestring
+
 
 class FormatterClass(logging.Formatter):
     """FormatterClass
@@ -248,3 +268,121 @@ class FormatterClass(logging.Formatter):
             The representation of the object
         """
         return f"{self.__class__}({self.__dict__})"
+
+
+def format_fields(fmt: str) -> list:
+    """Returns the logging fields of a format string, in order
+    Args:
+        fmt (str): the format string ('%' style)
+    Returns:
+        list: the fields supported by JsonFormatter (common.LOGGING_OPTIONS)
+    """
+    fields = []
+    for field in FIELD.findall(fmt or ''):
+        if field in common.LOGGING_OPTIONS and field not in fields:
+            fields.append(field)
+    return fields
+
+
+def encode_value(value) -> str:
+    """Returns the JSON encoding of a record attribute
+    Args:
+        value: the attribute
+    Returns:
+        str: the JSON value (a string for the types without JSON equivalent, null for
+         the non finite numbers)
+    """
+    if value.__class__ is str:
+        return encode_string(value)
+    if value is None or value is True or value is False:
+        return 'null' if value is None else ('true' if value else 'false')
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        return float.__repr__(value) if math.isfinite(value) else 'null'
+    return encode_string(str(value))
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats the records as JSON objects, one per line (JSON Lines)
+    """
+
+    def __init__(self,
+                 fields: list = None,
+                 datefmt: str = None,
+                 static: dict = None) -> None:
+        """JsonFormatter constructor
+        Args:
+            fields (list, optional): the record fields, from common.LOGGING_OPTIONS
+             [default: JSON_FIELDS]
+            datefmt (str, optional): the date format of asctime [default: None]
+            static (dict, optional): fields with the same value in every record (e.g. the
+             app, user, host, ip, interface, clientlevel and service CLI options), a record
+             field with the same name is replaced [default: None]
+        """
+        fields = JSON_FIELDS if fields is None else fields
+        for field in fields:
+            if field not in common.LOGGING_OPTIONS:
+                if RAISEEXCEPTIONS:
+                    raise ValueError(f"{field} is not supported")
+                else:
+                    return
+        super().__init__(None, datefmt)
+        static = static or {}
+        self.fields = [field for field in fields if field not in static]
+        self.static = dict(static)
+        # the template of the object: the encoded keys and static fields, and one
+        # placeholder per record field
+        parts = [f"{encode_string(field)}:%s" for field in self.fields]
+        parts += [f"{encode_string(str(key))}:{encode_value(value)}".replace('%', '%%')
+                  for key, value in self.static.items()]
+        self._template = '{' + ','.join(parts) + '}'
+        self._open = self._template[:-1] + (',' if parts else '')
+        # the encodings of the values of the cached fields (the same for every field)
+        self._cache = {}
+        self._getters = [self._getter(field) for field in self.fields]
+
+    def _getter(self, field: str):
+        """Returns the function encoding a field of a record"""
+        if field == 'message':
+            return lambda record: encode_string(record.message)
+        if field == 'asctime':
+            return lambda record: encode_string(self.formatTime(record, self.datefmt))
+        if field in CACHED_FIELDS:
+            cache = self._cache
+
+            def cached(record):
+                value = getattr(record, field, None)
+                try:
+                    return cache[value]
+                except KeyError:
+                    if len(cache) >= CACHE_SIZE:
+                        cache.clear()
+                    encoded = cache[value] = encode_value(value)
+                    return encoded
+                except TypeError:
+                    # not hashable
+                    return encode_value(value)
+            return cached
+        return lambda record: encode_value(getattr(record, field, None))
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format a record as a JSON object
+        Args:
+            record (logging.LogRecord): the record
+        Returns:
+            str: the JSON object, without newline (the exception and the stack, if
+             any, are in the exc_info and stack_info fields)
+        """
+        record.message = record.getMessage()
+        values = tuple([getter(record) for getter in self._getters])
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if not record.exc_text and not record.stack_info:
+            return self._template % values
+        extra = []
+        if record.exc_text:
+            extra.append('"exc_info":' + encode_string(record.exc_text))
+        if record.stack_info:
+            extra.append('"stack_info":' + encode_string(self.formatStack(record.stack_info)))
+        return (self._open % values) + ','.join(extra) + '}'
@@ -0,0 +1,114 @@
+"""
+Syslog over TCP framing (RFC 6587)
+
+Supports both framing methods found on the wire:
+- octet counting: "<length> <message>"
+- non-transparent framing: messages separated by LF or NUL
+  (the standard logging.handlers.SysLogHandler appends a NUL)
+
+Reference:
+https://datatracker.ietf.org/doc/html/rfc6587
+
+Contains:
+- FrameDecoder
+- encode_octet_counted
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import re
+
+# Defaults
+MAX_FRAME = 64 * 1024
+_OCTET_COUNT = re.compile(rb'([1-9][0-9]{0,9}) ')
+_TRAILER = re.compile(rb'[\n\x00]')
+
+
+def encode_octet_counted(message: bytes) -> bytes:
+    """Frame a message with octet counting
+    Args:
+        message (bytes): the syslog message
+    Returns:
+        bytes: the framed message
+    """
+    return b'%d %s' % (len(message), message)
+
+
+class FrameDecoder:
+    """Incremental decoder of a syslog TCP stream"""
+
+    def __init__(self, max_frame: int = MAX_FRAME) -> None:
+        """FrameDecoder constructor
+        Args:
+            max_frame (int, optional): maximum frame size. Longer frames are cut
+             [default: MAX_FRAME]
+        """
+        self._buf = bytearray()
+        self._max_frame = max_frame
+        # bytes of a cut octet counted frame still to discard
+        self._skip = 0
+
+    def feed(self, data: bytes) -> list:
+        """Feed received data and return the complete frames
+        Args:
+            data (bytes): data read from the socket
+        Returns:
+            list: the complete frames (bytes), without framing
+        """
+        buf = self._buf
+        buf += data
+        frames = []
+        pos = 0
+        size = len(buf)
+        while pos < size:
+            if self._skip:
+                skipped = min(self._skip, size - pos)
+                self._skip -= skipped
+                pos += skipped
+                continue
+            match = _OCTET_COUNT.match(buf, pos)
+            if match is not None:
+                start = match.end()
+                end = start + int(match.group(1))
+                if end - start > self._max_frame:
+                    # keep the first max_frame bytes, discard the rest as it arrives
+                    if start + self._max_frame > size:
+                        break
+                    frames.append(bytes(buf[start:start + self._max_frame]))
+                    self._skip = end - start - self._max_frame
+                    pos = start + self._max_frame
+                    continue
+                if end > size:
+                    break
+                frames.append(bytes(buf[start:end]))
+                pos = end
+                # tolerate a separator after an octet counted frame
+                if pos < size and buf[pos] in (0x0a, 0x00):
+                    pos += 1
+                continue
+            if buf[pos] in (0x0a, 0x00):
+                pos += 1
+                continue
+            match = _TRAILER.search(buf, pos)
+            if match is None:
+                if size - pos >= self._max_frame:
+                    frames.append(bytes(buf[pos:pos + self._max_frame]))
+                    pos += self._max_frame
+                    continue
+                break
+            frames.append(bytes(buf[pos:match.start()]))
+            pos = match.end()
+        del buf[:pos]
+        return frames
+
+    def flush(self) -> list:
+        """Returns the incomplete frame left at the end of the stream
+        Returns:
+            list: the last frame (if any)
+        """
+        frames = [bytes(self._buf)] if self._buf.strip(b'\n\x00 ') else []
+        self._buf.clear()
+        self._skip = 0
+        return frames
@@ -0,0 +1,266 @@
+"""
+End-to-end latency measurement
+
+The client appends a trailer to each message: " lat=RUN:SEQ:NS", RUN
+identifies the sending run (a hexadecimal string), SEQ is the sequence
+number of the message in the run and NS the wall clock time of the log
+call in nanoseconds. The server removes the trailer and measures three
+stages:
+- network: from the log call to the kernel receive timestamp of the
+  datagram or the read (SO_TIMESTAMPNS), client buffering included. Across
+  hosts, it is only meaningful with synchronized clocks
+- queue: from the kernel receive timestamp to the hand over of the message
+  to the log file (socket buffer and parsing)
+- write: from the hand over to the write of the log file (or the commit of
+  the write-ahead log batch with --wal)
+
+The latencies are counted in log2 histograms (bucket i counts the latencies
+below 2**i microseconds) kept as server statistics counters, so that the
+processes add them without locking. The sequence numbers of each run reveal
+the gaps (messages not received yet) and the late messages (reordered or
+duplicated).
+
+Contains:
+- LatencyStamp
+- LatencyTracker
+- stamp
+- split
+- enable_timestamps
+- receive_time
+- summarize
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import logging
+import os
+import re
+import socket
+import struct
+import threading
+import time
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+TRAILER = re.compile(rb' lat=([0-9a-f]+):(\d+):(\d+)\x00?$')
+STAGES = ('network', 'queue', 'write')
+BUCKETS = 32
+MAX_RUNS = 10000
+# not exported by the socket module (Linux value)
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+CMSG_SIZE = socket.CMSG_SPACE(struct.calcsize('qq'))
+SEQUENCE_COUNTERS = ('latency_messages', 'latency_gaps', 'latency_late')
+COUNTERS = tuple(f"latency_{stage}_{i}" for stage in STAGES for i in range(BUCKETS)) + \
+    tuple(f"latency_{stage}_{name}" for stage in STAGES for name in ('count', 'sum_us')) + \
+    SEQUENCE_COUNTERS
+
+
+def stamp(message: str, run: str, seq: int, sent_ns: int = None) -> str:
+    """Returns the message with the latency trailer
+    Args:
+        message (str): the message
+        run (str): the run identifier (hexadecimal)
+        seq (int): the sequence number of the message in the run
+        sent_ns (int, optional): the log call time [default: time.time_ns()]
+    Returns:
+        str: the stamped message
+    """
+    if sent_ns is None:
+        sent_ns = time.time_ns()
+    return f"{message} lat={run}:{seq}:{sent_ns}"
+
+
+def split(data: bytes) -> tuple:
+    """Remove the latency trailer of a received message
+    Args:
+        data (bytes): the message, without the trailing new line (the trailing NUL is removed
+         with the trailer)
+    Returns:
+        tuple: (message, (run, seq, sent_ns)), or (data, None) if the message is not stamped
+    """
+    match = TRAILER.search(data)
+    if match is None:
+        return data, None
+    return data[:match.start()], (match.group(1), int(match.group(2)), int(match.group(3)))
+
+
+def enable_timestamps(sock: socket.socket) -> bool:
+    """Ask the kernel for the receive timestamp of the data (SO_TIMESTAMPNS).
+    The sockets accepted from a listening socket inherit the option
+    Args:
+        sock (socket.socket): the socket
+    Returns:
+        bool: False if the platform does not support it
+    """
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+    except OSError:
+        return False
+    return True
+
+
+def receive_time(ancdata: list) -> int:
+    """Returns the kernel receive timestamp of a recvmsg
+    Args:
+        ancdata (list): the ancillary data returned by recvmsg (CMSG_SIZE bytes)
+    Returns:
+        int: the wall clock time in nanoseconds, the current time without timestamp
+    """
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+            seconds, nanoseconds = struct.unpack('qq', data[:struct.calcsize('qq')])
+            return seconds * 1000000000 + nanoseconds
+    return time.time_ns()
+
+
+class LatencyStamp(logging.Filter):
+    """Logger filter appending the latency trailer to the messages of a run"""
+
+    def __init__(self, run: str = None) -> None:
+        """LatencyStamp constructor
+        Args:
+            run (str, optional): the run identifier [default: the pid and the time, hexadecimal]
+        """
+        super().__init__()
+        self.run = run or f"{os.getpid():x}{time.time_ns() & 0xffffffff:08x}"
+        self.seq = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = stamp(record.getMessage(), self.run, self.seq)
+        record.args = None
+        self.seq += 1
+        return True
+
+
+class LatencyTracker:
+    """Adds the stage latencies and the sequence gaps to the server counters"""
+
+    def __init__(self, counters=None) -> None:
+        """LatencyTracker constructor
+        Args:
+            counters (stats.StatsSlot, optional): the counters of the process,
+             with COUNTERS (set in the server process) [default: None]
+        """
+        self.counters = counters
+        self._expected = {}
+        # the TCP connections are handled by several threads
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, nanoseconds: int) -> None:
+        """Count a latency in the histogram of a stage
+        Args:
+            stage (str): one of STAGES
+            nanoseconds (int): the latency (negative with unsynchronized clocks: counted as 0)
+        """
+        microseconds = max(nanoseconds // 1000, 0)
+        add = self.counters.add
+        add(f"latency_{stage}_{min(microseconds.bit_length(), BUCKETS - 1)}")
+        add(f"latency_{stage}_count")
+        add(f"latency_{stage}_sum_us", microseconds)
+
+    def sequence(self, source: str, run: bytes, seq: int) -> None:
+        """Count the gaps and the late messages of a run
+        Args:
+            source (str): the client address
+            run (bytes): the run identifier
+            seq (int): the sequence number received
+        """
+        key = (source, run)
+        with self._lock:
+            expected = self._expected.pop(key, None)
+            if expected is None and len(self._expected) >= MAX_RUNS:
+                # forget the oldest run
+                del self._expected[next(iter(self._expected))]
+            if expected is None or seq >= expected:
+                # the first message of a run is expected to be 0
+                self._expected[key] = seq + 1
+            else:
+                self._expected[key] = expected
+        self.counters.add('latency_messages')
+        if seq > (expected or 0):
+            self.counters.add('latency_gaps', seq - (expected or 0))
+        elif expected is not None and seq < expected:
+            self.counters.add('latency_late')
+
+    def received(self, data: bytes, source: str, received_ns: int = None) -> tuple:
+        """Measure a message handed over to the log file
+        Args:
+            data (bytes): the message, see split()
+            source (str): the client address
+            received_ns (int, optional): the kernel receive timestamp [default: None]
+        Returns:
+            tuple: (message without trailer, token of written()), the token is
+             None if the message is not stamped
+        """
+        data, trailer = split(data)
+        if trailer is None or self.counters is None:
+            return data, None
+        run, seq, sent_ns = trailer
+        now = time.time_ns()
+        if received_ns is not None:
+            self.observe('network', received_ns - sent_ns)
+            self.observe('queue', now - received_ns)
+        else:
+            self.observe('network', now - sent_ns)
+        self.sequence(source, run, seq)
+        return data, now
+
+    def written(self, token: int) -> None:
+        """Measure the write of a message
+        Args:
+            token (int): the token returned by received()
+        """
+        self.observe('write', time.time_ns() - token)
+
+
+def _quantile(buckets: list, count: int, fraction: float) -> int:
+    """Returns the upper bound in microseconds of the bucket of a quantile"""
+    rank = fraction * count
+    total = 0
+    for i, value in enumerate(buckets):
+        total += value
+        if total >= rank:
+            return 2 ** i
+    return 2 ** (len(buckets) - 1)
+
+
+def summarize(snapshot: dict) -> dict:
+    """Replace the latency counters of a statistics snapshot with a summary
+    Args:
+        snapshot (dict): counter name to value (stats.ServerStats.snapshot)
+    Returns:
+        dict: the snapshot with a 'latency' dict: count, mean_us, p50_us, p90_us,
+         p99_us and histogram (upper bound in microseconds to count) per stage,
+         and messages, gaps, late and lost (gaps not filled by late messages)
+    """
+    if 'latency_messages' not in snapshot:
+        return snapshot
+    result = {name: value for name, value in snapshot.items() if name not in COUNTERS}
+    summary = {}
+    for stage in STAGES:
+        buckets = [snapshot[f"latency_{stage}_{i}"] for i in range(BUCKETS)]
+        count = snapshot[f"latency_{stage}_count"]
+        summary[stage] = {
+            'count': count,
+            'mean_us': round(snapshot[f"latency_{stage}_sum_us"] / count, 1) if count else None,
+            'p50_us': _quantile(buckets, count, 0.5) if count else None,
+            'p90_us': _quantile(buckets, count, 0.9) if count else None,
+            'p99_us': _quantile(buckets, count, 0.99) if count else None,
+            'histogram': {str(2 ** i): value for i, value in enumerate(buckets) if value},
+        }
+    summary['messages'] = snapshot['latency_messages']
+    summary['gaps'] = snapshot['latency_gaps']
+    summary['late'] = snapshot['latency_late']
+    summary['lost'] = max(summary['gaps'] - summary['late'], 0)
+    result['latency'] = summary
+    return result
@@ -0,0 +1,235 @@
+"""
+Memory-mapped log file writer
+
+MmapFileHandler removes the write system call of each record: the log file
+is preallocated in extents (posix_fallocate), the region being written is
+memory-mapped and the encoded records are copied into it. The file stays a
+plain text log file.
+
+The committed length (the end of the last complete record) is kept in a
+sidecar FILE.mmlen file of 8 bytes (little-endian), also memory-mapped and
+advanced after each record: the preallocated tail of the log file is
+zeroed and not part of the log. On close, the log file is truncated to the
+committed length and the sidecar file removed. If the writer crashed, the
+sidecar file is left: the next writer (or recover()) truncates the log
+file to the committed length.
+
+Readers find the live end of the file with live_end(): the committed
+length while the sidecar file exists, the file size otherwise.
+
+A log file has a single MmapFileHandler writer (an exclusive lock of the
+sidecar file, other writers get BlockingIOError). The records are written
+to the page cache: they survive a crash of the process, sync() writes them
+to disk.
+
+Contains:
+- MmapFileHandler
+- live_end
+- recover
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import fcntl
+import logging
+import mmap
+import os
+import struct
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+EXTENT_SIZE = 64 * 1024 * 1024
+MARKER_SUFFIX = '.mmlen'
+MARKER = struct.Struct('<Q')
+
+
+def _read_marker(path: str) -> int:
+    """Returns the committed length of a sidecar file, None if it does not exist
+    (or was created by a writer that crashed before writing it)"""
+    try:
+        with open(path, 'rb') as file:
+            data = file.read(MARKER.size)
+    except FileNotFoundError:
+        return None
+    return MARKER.unpack(data)[0] if len(data) == MARKER.size else None
+
+
+def live_end(filename: str) -> int:
+    """Returns the end of the log records of a file written by MmapFileHandler
+    (the file size for any other file)
+    Args:
+        filename (str): the log file path
+    Returns:
+        int: the offset following the last complete record
+    """
+    size = os.path.getsize(filename)
+    committed = _read_marker(filename + MARKER_SUFFIX)
+    return size if committed is None else min(committed, size)
+
+
+def recover(filename: str) -> int:
+    """Truncate a log file left by a crashed MmapFileHandler to its committed length
+    and remove the sidecar file (nothing to do if it does not exist)
+    Args:
+        filename (str): the log file path
+    Returns:
+        int: the length of the log file
+    Raises:
+        BlockingIOError: a MmapFileHandler writes the file
+    """
+    marker = filename + MARKER_SUFFIX
+    committed = _read_marker(marker)
+    if committed is None:
+        return os.path.getsize(filename)
+    with open(marker, 'rb') as lock:
+        # not while a writer is running
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        length = min(committed, os.path.getsize(filename))
+        os.truncate(filename, length)
+        os.unlink(marker)
+    return length
+
+
+class MmapFileHandler(logging.Handler):
+    """Handler copying the records into a preallocated, memory-mapped log file"""
+
+    terminator = '\n'
+
+    def __init__(self,
+                 filename: str,
+                 mode: str = 'a',
+                 encoding: str = None,
+                 extent_size: int = EXTENT_SIZE) -> None:
+        """MmapFileHandler constructor
+        Args:
+            filename (str): the log file path
+            mode (str, optional): 'a' to append, 'w' to truncate the file first [default: 'a']
+            encoding (str, optional): the encoding [default: 'utf-8']
+            extent_size (int, optional): size in bytes of the preallocated and mapped
+             regions, a multiple of mmap.ALLOCATIONGRANULARITY [default: EXTENT_SIZE]
+        Raises:
+            BlockingIOError: another MmapFileHandler writes the file
+        """
+        if mode not in ('a', 'w'):
+            if RAISEEXCEPTIONS:
+                raise ValueError("mode must be 'a' or 'w'")
+            else:
+                return
+        if not isinstance(extent_size, int) or extent_size <= 0 or extent_size % mmap.ALLOCATIONGRANULARITY:
+            if RAISEEXCEPTIONS:
+                raise ValueError(f"extent_size must be a positive multiple of {mmap.ALLOCATIONGRANULARITY}")
+            else:
+                return
+        super().__init__()
+        self.baseFilename = os.path.abspath(filename)
+        self.encoding = encoding or 'utf-8'
+        self.extent_size = extent_size
+        self.marker_path = self.baseFilename + MARKER_SUFFIX
+        self._marker_fd = self._lock_marker()
+        self.fd = os.open(self.baseFilename, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        if mode == 'w':
+            os.ftruncate(self.fd, 0)
+        # recovery: a crashed writer left the sidecar file and a preallocated tail
+        size = os.fstat(self.fd).st_size
+        data = os.pread(self._marker_fd, MARKER.size, 0)
+        committed = MARKER.unpack(data)[0] if len(data) == MARKER.size else None
+        self.committed = size if committed is None or mode == 'w' else min(committed, size)
+        if self.committed < size:
+            os.ftruncate(self.fd, self.committed)
+        if os.fstat(self._marker_fd).st_size < MARKER.size:
+            os.ftruncate(self._marker_fd, MARKER.size)
+        self._marker = mmap.mmap(self._marker_fd, MARKER.size)
+        MARKER.pack_into(self._marker, 0, self.committed)
+        self._map = None
+        self._map_start = 0
+        self._map_end = 0
+
+    def _lock_marker(self) -> int:
+        """Create and lock the sidecar file
+        Returns:
+            int: the file descriptor of the sidecar file
+        """
+        while True:
+            fd = os.open(self.marker_path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                # the previous writer may have removed it before releasing the lock
+                if os.path.samestat(os.fstat(fd), os.stat(self.marker_path)):
+                    return fd
+            except FileNotFoundError:
+                pass
+            except OSError:
+                os.close(fd)
+                raise
+            os.close(fd)
+
+    def _remap(self, needed: int) -> None:
+        """Preallocate and map the region receiving the next needed bytes"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        start = self.committed - self.committed % mmap.ALLOCATIONGRANULARITY
+        length = max(self.extent_size, self.committed + needed - start)
+        length += -length % mmap.ALLOCATIONGRANULARITY
+        if os.fstat(self.fd).st_size < start + length:
+            os.posix_fallocate(self.fd, start, length)
+        self._map = mmap.mmap(self.fd, length, offset=start)
+        self._map_start = start
+        self._map_end = start + length
+
+    def write(self, data: bytes) -> None:
+        """Copy data to the file and advance the committed length
+        Args:
+            data (bytes): complete lines
+        """
+        end = self.committed + len(data)
+        if end > self._map_end:
+            self._remap(len(data))
+        self._map[self.committed - self._map_start:end - self._map_start] = data
+        self.committed = end
+        MARKER.pack_into(self._marker, 0, end)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Write the record
+        Args:
+            record (logging.LogRecord): the record
+        """
+        try:
+            self.write((self.format(record) + self.terminator).encode(self.encoding))
+        except RecursionError:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def sync(self) -> None:
+        """Write the mapped records and the committed length to disk"""
+        with self.lock:
+            if self._map is not None:
+                self._map.flush()
+            if self._marker is not None:
+                self._marker.flush()
+
+    def close(self) -> None:
+        """Unmap, truncate the file to the committed length and remove the sidecar file"""
+        with self.lock:
+            if self._marker is not None:
+                if self._map is not None:
+                    self._map.close()
+                    self._map = None
+                os.ftruncate(self.fd, self.committed)
+                os.close(self.fd)
+                self._marker.close()
+                self._marker = None
+                os.unlink(self.marker_path)
+                os.close(self._marker_fd)
+            super().close()
@@ -0,0 +1,229 @@
+"""
+Client side pacing
+
+A sender writing datagrams faster than the receiver drains its socket
+buffer loses them silently. TokenBucket spaces the messages to a target
+rate, with bursts of up to burst messages. The sleeps are only taken once
+the debt reaches MIN_SLEEP, so high rates do not pay a sleep per message,
+and a late wake up is compensated by the next messages.
+
+AdaptivePacer looks for the highest loss-free rate: every interval, the
+messages received by the destination (a feedback callable, e.g. the
+udp_messages counter of the tinysyslogserver stats socket) are compared
+with the messages sent. Without loss the rate grows by increase, with a
+loss above tolerance it is multiplied by decrease (AIMD like). The report
+gives the sustained rate: the highest rate received over a loss-free
+interval.
+
+Contains:
+- TokenBucket
+- AdaptivePacer
+- stats_feedback
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import json
+import time
+
+from fruafr.log.lib import stats
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+MIN_SLEEP = 0.001
+BURST_SECONDS = 0.1
+START_RATE = 1000.0
+MIN_RATE = 10.0
+MAX_RATE = 1000000.0
+INTERVAL = 0.25
+LOSS_TOLERANCE = 0.01
+INCREASE = 1.25
+DECREASE = 0.7
+SETTLE = 0.2
+
+
+class TokenBucket:
+    """Spaces the messages to a target rate"""
+
+    def __init__(self, rate: float, burst: int = None) -> None:
+        """TokenBucket constructor
+        Args:
+            rate (float): messages per second. 0 is unlimited
+            burst (int, optional): messages sent without waiting
+             [default: BURST_SECONDS of messages, at least 1]
+        """
+        if not isinstance(rate, (int, float)) or rate < 0:
+            if RAISEEXCEPTIONS:
+                raise ValueError("rate must be a positive number")
+            else:
+                return
+        self._fixed_burst = burst
+        self.rate = rate
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        """Returns the rate in messages per second"""
+        return self._rate
+
+    @rate.setter
+    def rate(self, value: float) -> None:
+        self._rate = float(value)
+        self.burst = self._fixed_burst or max(1, int(self._rate * BURST_SECONDS))
+
+    def wait(self, count: int = 1) -> None:
+        """Wait until count messages may be sent
+        Args:
+            count (int, optional): number of messages [default: 1]
+        """
+        if not self._rate:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self._rate) - count
+        self._last = now
+        if self._tokens < 0:
+            delay = -self._tokens / self._rate
+            if delay >= MIN_SLEEP:
+                time.sleep(delay)
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self._rate}, {self.burst})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
+
+
+class AdaptivePacer(TokenBucket):
+    """Token bucket whose rate follows the loss reported by the destination"""
+
+    def __init__(self,
+                 feedback,
+                 rate: float = START_RATE,
+                 burst: int = None,
+                 min_rate: float = MIN_RATE,
+                 max_rate: float = MAX_RATE,
+                 interval: float = INTERVAL,
+                 tolerance: float = LOSS_TOLERANCE,
+                 increase: float = INCREASE,
+                 decrease: float = DECREASE) -> None:
+        """AdaptivePacer constructor
+        Args:
+            feedback (callable): returns the number of messages received so far
+             by the destination (any origin: only the differences are used)
+            rate (float, optional): start rate [default: START_RATE]
+            burst (int, optional): see TokenBucket
+            min_rate (float, optional): lowest rate [default: MIN_RATE]
+            max_rate (float, optional): highest rate [default: MAX_RATE]
+            interval (float, optional): time in seconds between two adjustments
+             [default: INTERVAL]
+            tolerance (float, optional): loss ratio of an interval still considered
+             loss-free (messages in flight) [default: LOSS_TOLERANCE]
+            increase (float, optional): rate factor after a loss-free interval
+             [default: INCREASE]
+            decrease (float, optional): rate factor after a lossy interval
+             [default: DECREASE]
+        """
+        if not callable(feedback):
+            if RAISEEXCEPTIONS:
+                raise TypeError("feedback must be callable")
+            else:
+                return
+        super().__init__(rate or START_RATE, burst)
+        self.feedback = feedback
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.interval = interval
+        self.tolerance = tolerance
+        self.increase = increase
+        self.decrease = decrease
+        self.sent = 0
+        self.received = 0
+        self.sustained_rate = 0.0
+        self.adjustments = 0
+        self._start_received = feedback()
+        self._checkpoint = (time.monotonic(), 0, self._start_received)
+
+    def wait(self, count: int = 1) -> None:
+        """Wait until count messages may be sent, adjusting the rate every interval
+        Args:
+            count (int, optional): number of messages [default: 1]
+        """
+        super().wait(count)
+        self.sent += count
+        if time.monotonic() - self._checkpoint[0] >= self.interval:
+            self._adjust()
+
+    def _measure(self) -> tuple:
+        """Returns the elapsed time, messages sent and received since the checkpoint"""
+        now = time.monotonic()
+        received = self.feedback()
+        last_time, last_sent, last_received = self._checkpoint
+        self._checkpoint = (now, self.sent, received)
+        self.received = received - self._start_received
+        return now - last_time, self.sent - last_sent, received - last_received
+
+    def _adjust(self) -> None:
+        """Change the rate after the loss of the last interval"""
+        elapsed, sent, received = self._measure()
+        if not sent:
+            return
+        self.adjustments += 1
+        if received < sent * (1.0 - self.tolerance):
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            return
+        self.sustained_rate = max(self.sustained_rate, received / max(elapsed, 1e-6))
+        self.rate = min(self.max_rate, self.rate * self.increase)
+
+    def report(self, settle: float = SETTLE) -> dict:
+        """Returns the pacing report, once the messages in flight had time to arrive
+        Args:
+            settle (float, optional): time in seconds waited before the last
+             measure [default: SETTLE]
+        Returns:
+            dict: rate, sustained_rate, sent, received, lost and loss_percent
+        """
+        time.sleep(settle)
+        self._measure()
+        lost = max(self.sent - self.received, 0)
+        return {
+            'rate': round(self.rate, 1),
+            'sustained_rate': round(self.sustained_rate, 1),
+            'sent': self.sent,
+            'received': self.received,
+            'lost': lost,
+            'loss_percent': round(100.0 * lost / self.sent, 3) if self.sent else 0.0,
+        }
+
+
+def stats_feedback(path: str, counter: str = 'udp_messages'):
+    """Returns a feedback callable reading a counter of a tinysyslogserver stats socket
+    (the datagrams dropped by a full ring buffer are not counted as received)
+    Args:
+        path (str): path of the stats socket (tinysyslogserver --stats)
+        counter (str, optional): the counter [default: 'udp_messages']
+    Returns:
+        callable: returns the number of messages received
+    """
+    def feedback() -> int:
+        counters = json.loads(stats.query(path, 'stats'))
+        return counters[counter] - counters.get('ring_dropped', 0)
+    return feedback
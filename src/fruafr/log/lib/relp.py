@@ -0,0 +1,526 @@
+"""
+Reliable delivery with acknowledgements (RELP)
+
+UDP drops messages silently and plain TCP syslog is never acknowledged. RELP
+(the Reliable Event Logging Protocol of rsyslog) numbers every message with
+a transaction number and the server answers each one with a response once
+it has stored the message.
+
+Frames: TXNR SP COMMAND SP DATALEN [SP DATA] LF
+- the client opens the session (open), sends the messages (syslog) and
+  closes it (close)
+- the server answers every command with a rsp frame of the same TXNR
+  ("200 OK", or "500 <reason>")
+
+RelpClient keeps a window of messages sent but not acknowledged yet: it
+only waits for the server when the window is full. The frames are written
+in batches. When the connection fails (or the server answers with
+serverclose), the client reconnects, opens a new session and sends the
+unacknowledged messages again: the delivery is at-least-once.
+
+RelpSession is the server side of a connection. The messages of the frames
+read from the socket are accepted, made durable with a single call to the
+sync callable (e.g. write-ahead log commit or fdatasync), then all the
+responses are returned at once: the acknowledgements are batched and only
+sent after a durable write.
+
+RelpSysLogHandler is the logging handler sending through a RelpClient.
+
+Reference:
+https://github.com/rsyslog/librelp/blob/master/doc/relp.html
+
+Contains:
+- encode_frame
+- FrameParser
+- RelpError
+- RelpClient
+- RelpSession
+- RelpSysLogHandler
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import collections
+import logging
+import re
+import socket
+import sys
+import threading
+import time
+from logging import handlers
+
+from fruafr.log.lib import encoder
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+WINDOW = 128
+BUFFER_SIZE = 64 * 1024
+FLUSH_INTERVAL = 0.2
+RETRIES = 3
+RETRY_DELAY = 0.1
+TIMEOUT = 10.0
+RECV_SIZE = 65536
+MAX_FRAME = 128 * 1024
+MAX_TXNR = 999999999
+OFFERS = b'relp_version=0\nrelp_software=fruafr.log\ncommands=syslog'
+OK = b'200 OK'
+_HEADER = re.compile(rb'([0-9]{1,9}) ([a-z]{1,32}) ([0-9]{1,9})')
+_PARTIAL_HEADER = re.compile(rb'[0-9]{0,9}( [a-z]{0,32}( [0-9]{0,9})?)?')
+
+
+def encode_frame(txnr: int, command: str, data: bytes = b'') -> bytes:
+    """Returns a RELP frame
+    Args:
+        txnr (int): the transaction number
+        command (str): the command (open, syslog, close, rsp, serverclose)
+        data (bytes, optional): the data [default: b'']
+    Returns:
+        bytes: the frame
+    """
+    if not data:
+        return b'%d %s 0\n' % (txnr, command.encode())
+    return b'%d %s %d %s\n' % (txnr, command.encode(), len(data), data)
+
+
+class FrameParser:
+    """Incremental decoder of a RELP stream"""
+
+    def __init__(self, max_frame: int = MAX_FRAME) -> None:
+        """FrameParser constructor
+        Args:
+            max_frame (int, optional): maximum DATALEN accepted [default: MAX_FRAME]
+        """
+        self._buf = bytearray()
+        self._max_frame = max_frame
+
+    def feed(self, data: bytes) -> list:
+        """Feed received data and return the complete frames
+        Args:
+            data (bytes): data read from the socket
+        Returns:
+            list: the (txnr, command, data) of the complete frames
+        Raises:
+            ValueError: the stream is not RELP
+        """
+        buf = self._buf
+        buf += data
+        frames = []
+        pos = 0
+        size = len(buf)
+        while pos < size:
+            match = _HEADER.match(buf, pos)
+            if match is None:
+                if _PARTIAL_HEADER.fullmatch(buf, pos) is None:
+                    raise ValueError(f"invalid RELP header: {bytes(buf[pos:pos + 32])!r}")
+                break
+            if match.end() == size:
+                # DATALEN may not be complete
+                break
+            length = int(match.group(3))
+            if length > self._max_frame:
+                raise ValueError(f"RELP frame of {length} bytes (maximum {self._max_frame})")
+            start = match.end()
+            if length == 0:
+                end = start
+            else:
+                if buf[start] != 0x20:
+                    raise ValueError("missing space before the RELP data")
+                start += 1
+                end = start + length
+            if end >= size:
+                break
+            if buf[end] != 0x0a:
+                raise ValueError("missing line feed after the RELP frame")
+            frames.append((int(match.group(1)), match.group(2).decode(), bytes(buf[start:end])))
+            pos = end + 1
+        del buf[:pos]
+        return frames
+
+
+class RelpError(OSError):
+    """The server refused the session or broke the protocol"""
+
+
+class RelpClient:
+    """RELP client with a window of unacknowledged messages"""
+
+    def __init__(self,
+                 address: tuple,
+                 window: int = WINDOW,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 buffer_size: int = BUFFER_SIZE,
+                 retries: int = RETRIES,
+                 timeout: float = TIMEOUT) -> None:
+        """RelpClient constructor. Connects lazily
+        Args:
+            address (tuple): (host, port) of the server
+            window (int, optional): maximum number of messages sent and not
+             acknowledged [default: WINDOW]
+            flush_interval (float, optional): maximum time in seconds a message
+             waits in the write buffer. 0 disables the timer [default: FLUSH_INTERVAL]
+            buffer_size (int, optional): the frames are written once the buffer
+             reaches this size [default: BUFFER_SIZE]
+            retries (int, optional): reconnection attempts per operation [default: RETRIES]
+            timeout (float, optional): socket timeout in seconds [default: TIMEOUT]
+        """
+        if not isinstance(address, tuple):
+            if RAISEEXCEPTIONS:
+                raise TypeError("address must be a (host, port) tuple")
+            else:
+                return
+        if window < 1:
+            if RAISEEXCEPTIONS:
+                raise ValueError("window must be at least 1")
+            else:
+                return
+        self.address = address
+        self.window = window
+        self.buffer_size = buffer_size
+        self.retries = retries
+        self.timeout = timeout
+        self.acked = 0
+        self.rejected = 0
+        self.retransmitted = 0
+        self.reconnections = 0
+        self.dropped = 0
+        self._sock = None
+        self._parser = None
+        self._next = 1
+        # txnr -> message of the current session, in sending order
+        self._unacked = {}
+        # messages not numbered in a session yet (no session, or window full)
+        self._backlog = collections.deque()
+        self._out = []
+        self._out_size = 0
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._timer = None
+        if flush_interval > 0:
+            self._timer = threading.Thread(target=self._flush_periodically,
+                                           args=(flush_interval,), daemon=True)
+            self._timer.start()
+
+    @property
+    def connected(self) -> bool:
+        """Returns True if a session is open"""
+        return self._sock is not None
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of messages not acknowledged yet"""
+        return len(self._unacked) + len(self._backlog)
+
+    def _txnr(self) -> int:
+        """Returns the next transaction number"""
+        txnr = self._next
+        self._next = txnr % MAX_TXNR + 1
+        return txnr
+
+    def _fill(self) -> None:
+        """Number the messages of the backlog that fit in the window and
+        add their frames to the write buffer"""
+        while self._backlog and len(self._unacked) < self.window:
+            message = self._backlog.popleft()
+            txnr = self._txnr()
+            self._unacked[txnr] = message
+            frame = encode_frame(txnr, 'syslog', message)
+            self._out.append(frame)
+            self._out_size += len(frame)
+
+    def _receive(self) -> list:
+        """Read the socket and return the frames"""
+        data = self._sock.recv(RECV_SIZE)
+        if not data:
+            raise ConnectionError(f"connection closed by {self.address}")
+        try:
+            return self._parser.feed(data)
+        except ValueError as e:
+            raise RelpError(str(e)) from e
+
+    def _open_session(self) -> None:
+        """Connect, open the session and put the unacknowledged messages back
+        in front of the backlog"""
+        self._sock = socket.create_connection(self.address, self.timeout)
+        self._parser = FrameParser()
+        txnr = 1
+        self._sock.sendall(encode_frame(txnr, 'open', OFFERS))
+        while True:
+            frames = self._receive()
+            if frames:
+                break
+        rsp_txnr, command, data = frames[0]
+        if command != 'rsp' or rsp_txnr != txnr or not data.startswith(b'200'):
+            raise RelpError(f"session refused by {self.address}: {command} {data[:64]!r}")
+        # the messages are numbered again in the new session
+        self.retransmitted += len(self._unacked)
+        self._backlog.extendleft(reversed(self._unacked.values()))
+        self._unacked = {}
+        self._next = txnr + 1
+        self._out = []
+        self._out_size = 0
+
+    def _handle(self, frames: list) -> None:
+        """Process the responses of the server"""
+        for txnr, command, data in frames:
+            if command == 'serverclose':
+                raise ConnectionError(f"session closed by {self.address}")
+            if command != 'rsp' or txnr not in self._unacked:
+                raise RelpError(f"unexpected {command} {txnr} from {self.address}")
+            del self._unacked[txnr]
+            if data.startswith(b'200'):
+                self.acked += 1
+            else:
+                self.rejected += 1
+
+    def _write(self) -> None:
+        """Write the buffered frames"""
+        if self._out:
+            self._sock.sendall(b''.join(self._out))
+            self._out = []
+            self._out_size = 0
+
+    def _drain(self, limit: int) -> None:
+        """Send and read the responses until at most limit messages are pending"""
+        self._fill()
+        self._write()
+        while self.pending > limit:
+            self._handle(self._receive())
+            self._fill()
+            self._write()
+
+    def _reset(self) -> None:
+        """Close the socket after an error"""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def _run(self, operation) -> None:
+        """Run an operation, reopening the session (and sending the
+        unacknowledged messages again) on failure"""
+        attempt = 0
+        while True:
+            try:
+                if self._sock is None:
+                    self._open_session()
+                    if attempt:
+                        self.reconnections += 1
+                operation()
+                return
+            except OSError:
+                self._reset()
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                time.sleep(RETRY_DELAY * attempt)
+
+    def send(self, message: bytes) -> None:
+        """Send a message. Waits for the server only when the window is full.
+        A message that cannot be delivered stays pending (see flush)
+        Args:
+            message (bytes): the syslog message
+        """
+        with self._lock:
+            self._backlog.append(message)
+            if self._sock is not None and len(self._unacked) < self.window:
+                self._fill()
+                if self._out_size >= self.buffer_size:
+                    self._run(self._write)
+                return
+            self._run(lambda: self._drain(self.window))
+
+    def flush(self) -> None:
+        """Send the buffered messages and wait until they are all acknowledged"""
+        with self._lock:
+            if self.pending:
+                self._run(lambda: self._drain(0))
+
+    def _flush_periodically(self, interval: float) -> None:
+        """Timer thread writing the buffered frames"""
+        while not self._closed.wait(interval):
+            with self._lock:
+                if not self._out or self._sock is None:
+                    continue
+                try:
+                    self._run(self._write)
+                except OSError:
+                    # still pending: the next send, flush or close retries
+                    pass
+
+    def close(self) -> None:
+        """Wait for the acknowledgements and close the session. The messages
+        never acknowledged are counted in dropped before the error is raised"""
+        self._closed.set()
+        with self._lock:
+            try:
+                self.flush()
+            except OSError:
+                self.dropped += self.pending
+                self._unacked = {}
+                self._backlog.clear()
+                self._reset()
+                raise
+            if self._sock is None:
+                return
+            try:
+                self._sock.sendall(encode_frame(self._txnr(), 'close'))
+                # the server answers and closes the connection
+                while self._sock.recv(RECV_SIZE):
+                    pass
+            except OSError:
+                pass
+            finally:
+                self._reset()
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self.address}, {self.window})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
+
+
+class RelpSession:
+    """Server side of a RELP connection"""
+
+    def __init__(self, accept, sync=None, max_frame: int = MAX_FRAME) -> None:
+        """RelpSession constructor
+        Args:
+            accept (callable): called with the data of each syslog frame
+            sync (callable, optional): makes the accepted messages durable,
+             called once per feed before the acknowledgements [default: None]
+            max_frame (int, optional): maximum DATALEN accepted [default: MAX_FRAME]
+        """
+        self._accept = accept
+        self._sync = sync
+        self._parser = FrameParser(max_frame)
+        self.opened = False
+        self.closed = False
+
+    def feed(self, data: bytes) -> bytes:
+        """Process received data
+        Args:
+            data (bytes): data read from the socket
+        Returns:
+            bytes: the responses to send (after the messages were synced)
+        Raises:
+            ValueError: the stream is not RELP
+        """
+        responses = []
+        accepted = False
+        for txnr, command, payload in self._parser.feed(data):
+            if command == 'open':
+                self.opened = True
+                responses.append(encode_frame(txnr, 'rsp', OK + b'\n' + OFFERS))
+            elif not self.opened:
+                responses.append(encode_frame(txnr, 'rsp', b'500 session not open'))
+            elif command == 'syslog':
+                self._accept(payload)
+                accepted = True
+                responses.append(encode_frame(txnr, 'rsp', OK))
+            elif command == 'close':
+                responses.append(encode_frame(txnr, 'rsp'))
+                self.closed = True
+                break
+            else:
+                responses.append(encode_frame(txnr, 'rsp', f"500 unknown command {command}".encode()))
+        if accepted and self._sync is not None:
+            self._sync()
+        return b''.join(responses)
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self.opened}, {self.closed})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
+
+
+class RelpSysLogHandler(encoder.FastSysLogHandler):
+    """SysLogHandler sending over RELP, every message is acknowledged"""
+
+    # RELP frames are length delimited
+    _append_nul = False
+
+    def __init__(self,
+                 address: tuple = ('localhost', handlers.SYSLOG_TCP_PORT),
+                 facility: int = handlers.SysLogHandler.LOG_USER,
+                 window: int = WINDOW,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 header: dict = None) -> None:
+        """RelpSysLogHandler constructor. Does not connect until the first record
+        Args:
+            address (tuple, optional): (host, port) of the RELP server
+            facility (int, optional): the syslog facility [default: LOG_USER]
+            window (int, optional): see RelpClient
+            flush_interval (float, optional): see RelpClient
+            header (dict, optional): rfc, hostname, app_name and procid of the
+             encoder (see encoder.SyslogEncoder) [default: None]
+        """
+        logging.Handler.__init__(self)  # pylint: disable=non-parent-init-called
+        self.address = address
+        self.facility = facility
+        self.socktype = socket.SOCK_STREAM
+        self.unixsocket = False
+        self.socket = None
+        self.connection = RelpClient(address, window, flush_interval)
+        self._prepare_encoder(**(header or {}))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Send the record
+        Args:
+            record (logging.LogRecord): the record
+        """
+        try:
+            self.connection.send(self.encode_record(record))
+        except OSError:
+            # pending: sent again by the next record, flush or close
+            pass
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def flush(self) -> None:
+        """Wait until the records sent are acknowledged (they stay pending on failure)"""
+        with self.lock:
+            try:
+                self.connection.flush()
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        """Wait for the acknowledgements and close the session. The records
+        never acknowledged are reported on stderr"""
+        with self.lock:
+            try:
+                self.connection.close()
+            except OSError as e:
+                if logging.raiseExceptions and sys.stderr:
+                    sys.stderr.write(f"{self.connection.dropped} syslog messages not acknowledged by "
+                                     f"{self.address}: {e}\n")
+            logging.Handler.close(self)
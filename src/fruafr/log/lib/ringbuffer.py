@@ -0,0 +1,258 @@
+"""
+Shared-memory ring buffer used to hand raw datagrams from a receiver process
+to a pool of parser processes without pickling.
+
+Layout of the shared memory block:
+- header: head (bytes written), tail (bytes consumed), dropped (records
+  refused because the ring was full), as three little-endian uint64
+- data area: records aligned on 8 bytes. Each record is a <II header
+  (meta length, data length) followed by the meta and the data bytes.
+  A record never wraps: when the remaining space at the end of the data
+  area is too small, a wrap marker is written and the record starts at
+  offset 0.
+
+There is a single producer per ring. Consumers claim records under a
+lock, so several parser processes can share the same ring.
+
+Reference:
+https://docs.python.org/3/library/multiprocessing.shared_memory.html
+
+Contains:
+- RingBuffer
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import multiprocessing
+import struct
+import time
+from multiprocessing import shared_memory
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+DEFAULT_CAPACITY = 8 * 1024 * 1024
+ALIGN = 8
+HEADER = struct.Struct('<QQQ')
+RECORD = struct.Struct('<II')
+WRAP_MARKER = 0xFFFFFFFF
+POLL_INTERVAL = 0.05
+
+
+def _align(size: int) -> int:
+    """Round a size up to the record alignment
+    Args:
+        size (int): the size in bytes
+    Returns:
+        int: the aligned size
+    """
+    return (size + ALIGN - 1) & ~(ALIGN - 1)
+
+
+class RingBuffer:
+    """Single producer / multiple consumers ring buffer in shared memory"""
+
+    def __init__(self,
+                 capacity: int = DEFAULT_CAPACITY,
+                 name: str = None,
+                 create: bool = True,
+                 lock=None,
+                 event=None) -> None:
+        """RingBuffer constructor
+        Args:
+            capacity (int, optional): size of the data area in bytes
+             [default: DEFAULT_CAPACITY]
+            name (str, optional): name of the shared memory block
+            create (bool, optional): create the block (True) or attach
+             to an existing one (False) [default: True]
+            lock (multiprocessing.Lock, optional): lock shared by the consumers
+            event (multiprocessing.Event, optional): event set by the producer
+             when data is available
+        """
+        if not isinstance(capacity, int) or capacity < 4 * ALIGN:
+            if RAISEEXCEPTIONS:
+                raise ValueError(f"capacity must be an integer >= {4 * ALIGN}")
+            else:
+                return
+        self._capacity = _align(capacity)
+        if create:
+            self._shm = shared_memory.SharedMemory(name=name, create=True,
+                                                   size=HEADER.size + self._capacity)
+            HEADER.pack_into(self._shm.buf, 0, 0, 0, 0)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._owner = create
+        self._buf = self._shm.buf
+        self._lock = lock if lock is not None else multiprocessing.Lock()
+        self._event = event if event is not None else multiprocessing.Event()
+
+    def __getstate__(self) -> dict:
+        """Only the name and the synchronisation primitives travel to child processes"""
+        return {'name': self._shm.name, 'capacity': self._capacity,
+                'lock': self._lock, 'event': self._event}
+
+    def __setstate__(self, state: dict) -> None:
+        """Attach to the shared memory block in the child process"""
+        self.__init__(state['capacity'], state['name'], False,
+                      state['lock'], state['event'])
+
+    @property
+    def name(self) -> str:
+        """Returns the name of the shared memory block"""
+        return self._shm.name
+
+    @property
+    def capacity(self) -> int:
+        """Returns the size of the data area in bytes"""
+        return self._capacity
+
+    @property
+    def dropped(self) -> int:
+        """Returns the number of records refused because the ring was full"""
+        return HEADER.unpack_from(self._buf, 0)[2]
+
+    @property
+    def used(self) -> int:
+        """Returns the number of bytes waiting to be consumed"""
+        head, tail, _ = HEADER.unpack_from(self._buf, 0)
+        return head - tail
+
+    def put(self, data: bytes, meta: bytes = b'') -> bool:
+        """Write a record. Must only be called by the producer.
+        Args:
+            data (bytes): the payload (e.g. the raw datagram)
+            meta (bytes, optional): metadata (e.g. the client address)
+        Returns:
+            bool: False if the ring was full and the record has been dropped
+        """
+        buf = self._buf
+        head, tail, dropped = HEADER.unpack_from(buf, 0)
+        size = _align(RECORD.size + len(meta) + len(data))
+        capacity = self._capacity
+        pos = head % capacity
+        # the record does not fit before the end of the data area: wrap
+        skip = capacity - pos if pos + size > capacity else 0
+        if head + skip + size - tail > capacity:
+            struct.pack_into('<Q', buf, 16, dropped + 1)
+            return False
+        base = HEADER.size
+        if skip:
+            struct.pack_into('<I', buf, base + pos, WRAP_MARKER)
+            pos = 0
+        offset = base + pos
+        RECORD.pack_into(buf, offset, len(meta), len(data))
+        offset += RECORD.size
+        buf[offset:offset + len(meta)] = meta
+        offset += len(meta)
+        buf[offset:offset + len(data)] = data
+        was_empty = head == tail
+        # publish the record once its content is written
+        struct.pack_into('<Q', buf, 0, head + skip + size)
+        if was_empty:
+            self._event.set()
+        return True
+
+    def _pop(self):
+        """Claim the oldest record. The consumer lock must be held.
+        Returns:
+            (bytes, bytes) : the meta and the data, or None if empty
+        """
+        buf = self._buf
+        head, tail, _ = HEADER.unpack_from(buf, 0)
+        if head == tail:
+            return None
+        capacity = self._capacity
+        base = HEADER.size
+        pos = tail % capacity
+        if capacity - pos < RECORD.size or \
+                struct.unpack_from('<I', buf, base + pos)[0] == WRAP_MARKER:
+            tail += capacity - pos
+            pos = 0
+        offset = base + pos
+        meta_len, data_len = RECORD.unpack_from(buf, offset)
+        offset += RECORD.size
+        meta = bytes(buf[offset:offset + meta_len])
+        offset += meta_len
+        data = bytes(buf[offset:offset + data_len])
+        tail += _align(RECORD.size + meta_len + data_len)
+        struct.pack_into('<Q', buf, 8, tail)
+        return meta, data
+
+    def get(self, timeout: float = None):
+        """Read the oldest record, waiting for one if the ring is empty
+        Args:
+            timeout (float, optional): maximum time to wait in seconds
+             (None waits forever, 0 does not wait)
+        Returns:
+            (bytes, bytes) : the meta and the data, or None on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                record = self._pop()
+            if record is not None:
+                return record
+            # nothing to read: sleep until the producer signals new data
+            self._event.clear()
+            if self.used:
+                continue
+            if deadline is None:
+                wait = POLL_INTERVAL
+            else:
+                wait = min(POLL_INTERVAL, deadline - time.monotonic())
+                if wait <= 0:
+                    return None
+            self._event.wait(wait)
+
+    def get_batch(self, max_records: int = 64, timeout: float = None) -> list:
+        """Read up to max_records records in one lock acquisition
+        Args:
+            max_records (int, optional): maximum number of records [default: 64]
+            timeout (float, optional): maximum time to wait for the first record
+        Returns:
+            list: list of (meta, data) tuples (empty on timeout)
+        """
+        first = self.get(timeout)
+        if first is None:
+            return []
+        records = [first]
+        with self._lock:
+            while len(records) < max_records:
+                record = self._pop()
+                if record is None:
+                    break
+                records.append(record)
+        return records
+
+    def close(self) -> None:
+        """Release the local view of the shared memory block"""
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Destroy the shared memory block. Only called by the creator"""
+        if self._owner:
+            self._shm.unlink()
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self._shm.name})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
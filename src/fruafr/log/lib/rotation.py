@@ -0,0 +1,272 @@
+"""
+Log file rotation shared between processes
+
+ConcurrentRotatingFileHandler rotates the log file by size (max_bytes)
+and/or by period (when and interval), while several processes (e.g.
+concurrent logtofile invocations) append to it. Every record is written
+under an exclusive lock of the FILE.lock file (fcntl.flock): the process
+holding it reopens the file if another process rotated it (the inode
+changed), rotates it if needed and writes the record. The period of the
+file is the one of its last write (mtime), so no rotation state is kept
+outside the file.
+
+The rotated files are named FILE.YYYYmmdd-HHMMSS (the start of the period
+for a rotation by period, the rotation time otherwise) and never renamed
+again, so a rotation does not race with a compression in progress. With
+compress, a detached process (this module run as a script) gzips them:
+the writing process does not wait. With backup_count, the oldest rotated
+files beyond the count are removed.
+
+Contains:
+- ConcurrentRotatingFileHandler
+- rotated_files
+- compress_file
+- spawn_compressor
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import contextlib
+import fcntl
+import gzip
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+WHEN = {'S': 1, 'M': 60, 'H': 3600, 'D': 86400}
+SUFFIX_FORMAT = '%Y%m%d-%H%M%S'
+COMPRESSED = '.gz'
+_COUNT = re.compile(r'(?:\.(\d+))?(?:\.gz)?$')
+
+# running compressors, reaped by the next spawn_compressor
+_compressors = []
+
+
+def rotated_files(filename: str) -> list:
+    """Returns the rotated files of a log file, oldest first
+    Args:
+        filename (str): the log file path
+    Returns:
+        list: the paths of the rotated files (compressed or not)
+    """
+    directory, base = os.path.split(os.path.abspath(filename))
+    pattern = re.compile(re.escape(base) + r'\.(\d{8}-\d{6})(?:\.(\d+))?(\.gz)?$')
+    found = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match:
+            found.append(((match.group(1), int(match.group(2) or 0)), os.path.join(directory, name)))
+    return [path for _, path in sorted(found)]
+
+
+def compress_file(path: str) -> str:
+    """Gzip a rotated file, then remove it
+    Args:
+        path (str): the rotated file
+    Returns:
+        str: the compressed file
+    """
+    target = path + COMPRESSED
+    partial = target + '.tmp'
+    with open(path, 'rb') as source, gzip.open(partial, 'wb') as destination:
+        shutil.copyfileobj(source, destination)
+    os.replace(partial, target)
+    os.unlink(path)
+    return target
+
+
+def spawn_compressor(path: str) -> subprocess.Popen:
+    """Compress a rotated file in a detached process
+    Args:
+        path (str): the rotated file
+    Returns:
+        subprocess.Popen: the process (never waited by the caller)
+    """
+    _compressors[:] = [process for process in _compressors if process.poll() is None]
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), path],
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+    _compressors.append(process)
+    return process
+
+
+class ConcurrentRotatingFileHandler(logging.FileHandler):
+    """FileHandler rotating the file by size and/or period, safely between processes"""
+
+    def __init__(self,
+                 filename: str,
+                 mode: str = 'a',
+                 encoding: str = None,
+                 max_bytes: int = 0,
+                 when: str = None,
+                 interval: int = 1,
+                 backup_count: int = 0,
+                 compress: bool = False) -> None:
+        """ConcurrentRotatingFileHandler constructor
+        Args:
+            filename (str): the log file path
+            mode (str, optional): the file mode, always 'a' when rotating [default: 'a']
+            encoding (str, optional): the encoding [default: None]
+            max_bytes (int, optional): size in bytes that a record may not make the file
+             exceed. 0 disables the rotation by size [default: 0]
+            when (str, optional): unit of the rotation period, one of WHEN (second, minute,
+             hour, day; days start at local midnight). None disables it [default: None]
+            interval (int, optional): number of units of the period [default: 1]
+            backup_count (int, optional): number of rotated files kept. 0 keeps them all
+             [default: 0]
+            compress (bool, optional): gzip the rotated files in a detached process
+             [default: False]
+        """
+        if not isinstance(max_bytes, int) or max_bytes < 0 or \
+           not isinstance(backup_count, int) or backup_count < 0:
+            if RAISEEXCEPTIONS:
+                raise ValueError("max_bytes and backup_count must be positive integers")
+            else:
+                return
+        if when is not None and (when not in WHEN or not isinstance(interval, int) or interval < 1):
+            if RAISEEXCEPTIONS:
+                raise ValueError(f"when must be one of {', '.join(WHEN)} and interval a positive integer")
+            else:
+                return
+        self.max_bytes = max_bytes
+        self.when = when
+        self.period = WHEN[when] * interval if when is not None else 0
+        self.backup_count = backup_count
+        self.compress = compress
+        if max_bytes or when is not None:
+            mode = 'a'
+        super().__init__(filename, mode, encoding)
+        self.lockfile = f"{self.baseFilename}.lock"
+        self._lockfd = None
+
+    @contextlib.contextmanager
+    def _interprocess_lock(self):
+        """Hold the exclusive lock of the lock file"""
+        if self._lockfd is None:
+            self._lockfd = os.open(self.lockfile, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._lockfd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lockfd, fcntl.LOCK_UN)
+
+    def _reopen_if_rotated(self) -> None:
+        """Reopen the file if another process rotated (or removed) it"""
+        if self.stream is not None:
+            try:
+                current = os.stat(self.baseFilename)
+            except FileNotFoundError:
+                current = None
+            opened = os.fstat(self.stream.fileno())
+            if current is None or (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+                self.stream.close()
+                self.stream = None
+        if self.stream is None:
+            self.stream = self._open()
+
+    def _period_index(self, timestamp: float) -> int:
+        """Returns the index of the period of a time (local time)"""
+        return int((timestamp + time.localtime(timestamp).tm_gmtoff) // self.period)
+
+    def _rotation_suffix(self, size: int, created: float) -> str:
+        """Returns the suffix of the rotated file if the record must go to a new file
+        Args:
+            size (int): size in bytes of the formatted record
+            created (float): creation time of the record
+        Returns:
+            str: the suffix, None if the file is not rotated
+        """
+        status = os.fstat(self.stream.fileno())
+        if status.st_size == 0:
+            return None
+        if self.period:
+            last = self._period_index(status.st_mtime)
+            if last != self._period_index(created):
+                # named after the start of the period of the file (local time)
+                return time.strftime(SUFFIX_FORMAT, time.gmtime(last * self.period))
+        if self.max_bytes and status.st_size + size > self.max_bytes:
+            return time.strftime(SUFFIX_FORMAT)
+        return None
+
+    def _rotate(self, suffix: str) -> None:
+        """Rename the file, reopen it, remove the oldest rotated files and compress"""
+        self.stream.close()
+        self.stream = None
+        target = f"{self.baseFilename}.{suffix}"
+        # several rotations in the same second: number them after the last one (the first may be
+        # pruned already), so that they stay in order
+        same = [path for path in rotated_files(self.baseFilename)
+                if path.startswith(target) and path[len(target):len(target) + 1] in ('', '.')]
+        if same:
+            count = int(_COUNT.match(same[-1][len(target):]).group(1) or 0) + 1
+            target = f"{target}.{count}"
+        os.rename(self.baseFilename, target)
+        self.stream = self._open()
+        if self.backup_count:
+            backups = rotated_files(self.baseFilename)
+            for path in backups[:max(len(backups) - self.backup_count, 0)]:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(path)
+        if self.compress:
+            spawn_compressor(target)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Write the record under the lock, rotating the file first if needed
+        Args:
+            record (logging.LogRecord): the record
+        """
+        if not self.max_bytes and not self.period:
+            super().emit(record)
+            return
+        try:
+            msg = self.format(record) + self.terminator
+            with self._interprocess_lock():
+                self._reopen_if_rotated()
+                suffix = self._rotation_suffix(len(msg.encode(self.encoding or 'utf-8', 'replace')),
+                                               record.created)
+                if suffix is not None:
+                    self._rotate(suffix)
+                self.stream.write(msg)
+                self.stream.flush()
+        except RecursionError:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def close(self) -> None:
+        """Close the file and the lock file"""
+        with self.lock:
+            if self._lockfd is not None:
+                os.close(self._lockfd)
+                self._lockfd = None
+            super().close()
+
+
+def main():
+    """Compress the rotated files given as arguments (detached compressor)"""
+    for path in sys.argv[1:]:
+        try:
+            compress_file(path)
+        except OSError:
+            # removed by backup_count meanwhile
+            pass
+
+
+if __name__ == "__main__":
+    main()
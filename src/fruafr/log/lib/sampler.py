@@ -0,0 +1,162 @@
+"""
+Low overhead statistical stack sampler
+
+A SIGPROF interval timer (signal.setitimer) interrupts the process every
+interval seconds of CPU time. The signal handler walks the stack of every
+thread (sys._current_frames) and counts the collapsed stacks.
+An idle process is not sampled as ITIMER_PROF only counts CPU time.
+
+The output uses the collapsed stack format ("frame;frame;frame count"),
+ready for flamegraph.pl or speedscope.
+
+Signals are only handled by the main thread of a process, so a sampler must
+be started from the main thread.
+
+Contains:
+- StackSampler
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import os
+import signal
+import sys
+import time
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+INTERVAL = 0.01
+MAX_DEPTH = 128
+
+
+class StackSampler:
+    """Samples the stacks of all the threads of the process"""
+
+    def __init__(self, interval: float = INTERVAL) -> None:
+        """StackSampler constructor
+        Args:
+            interval (float, optional): sampling interval in seconds of CPU time
+             [default: INTERVAL]
+        """
+        if not isinstance(interval, (int, float)) or interval <= 0:
+            if RAISEEXCEPTIONS:
+                raise ValueError("interval must be a positive number")
+            else:
+                return
+        self._interval = interval
+        self._counts = {}
+        self._labels = {}
+        self._samples = 0
+        self._sampling_time = 0.0
+        self._started = None
+        self._previous = None
+
+    @property
+    def running(self) -> bool:
+        """Returns True if the sampler is started"""
+        return self._started is not None
+
+    @property
+    def samples(self) -> int:
+        """Returns the number of samples taken"""
+        return self._samples
+
+    @property
+    def overhead(self) -> float:
+        """Returns the time spent sampling as a percentage of the wall time"""
+        if self._started is None:
+            return 0.0
+        elapsed = time.perf_counter() - self._started
+        return 100.0 * self._sampling_time / elapsed if elapsed > 0 else 0.0
+
+    def start(self) -> None:
+        """Install the SIGPROF handler and start the interval timer"""
+        if self._started is not None:
+            return
+        self._previous = signal.signal(signal.SIGPROF, self._sample)
+        self._started = time.perf_counter()
+        signal.setitimer(signal.ITIMER_PROF, self._interval, self._interval)
+
+    def stop(self) -> None:
+        """Stop the interval timer and restore the previous SIGPROF handler"""
+        if self._started is None:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous or signal.SIG_DFL)
+        self._started = None
+
+    def reset(self) -> None:
+        """Forget the samples taken so far"""
+        self._counts = {}
+        self._samples = 0
+        self._sampling_time = 0.0
+        if self._started is not None:
+            self._started = time.perf_counter()
+
+    def _label(self, code) -> str:
+        """Returns the label of a code object (cached)"""
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _sample(self, signum, frame) -> None:  # pylint: disable=unused-argument
+        """SIGPROF handler: count the stack of every thread"""
+        start = time.perf_counter()
+        counts = self._counts
+        label = self._label
+        handler_code = self._sample.__code__
+        for thread_frame in sys._current_frames().values():  # pylint: disable=protected-access
+            stack = []
+            while thread_frame is not None and len(stack) < MAX_DEPTH:
+                if thread_frame.f_code is not handler_code:
+                    stack.append(label(thread_frame.f_code))
+                thread_frame = thread_frame.f_back
+            key = ';'.join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+        self._samples += 1
+        self._sampling_time += time.perf_counter() - start
+
+    def collapsed(self) -> str:
+        """Returns the samples in the collapsed stack format
+        Returns:
+            str: one "frame;frame;frame count" line per distinct stack
+        """
+        counts = dict(self._counts)
+        return ''.join(f"{stack} {count}\n" for stack, count in
+                       sorted(counts.items(), key=lambda item: -item[1]))
+
+    def dump(self, path: str) -> None:
+        """Write the collapsed stacks to a file (atomically)
+        Args:
+            path (str): the output file
+        """
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as file:
+            file.write(self.collapsed())
+        os.replace(tmp, path)
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self._interval})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
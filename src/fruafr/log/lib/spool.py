@@ -0,0 +1,305 @@
+"""
+On-disk segmented FIFO of records (spool)
+
+Records are appended to the tail segment file of a directory. A new segment
+is started once the tail grows past segment_size. The reader consumes the
+head segment: the consumed offset is kept in the segment header and a fully
+consumed segment is deleted, so the spool survives a restart and resumes
+where the previous run stopped (at least once delivery).
+
+Older records can be put back in front of the spool with prepend() (they go
+to a new segment sorting before the head).
+
+Segment layout (same records as lib/wal.py):
+- header: magic (8 bytes) + consumed offset (little-endian uint64)
+- records: <II header (payload length, CRC32 of the payload) + payload
+
+Contains:
+- SegmentSpool
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import os
+import struct
+import threading
+import zlib
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+MAGIC = b'FLSPL001'
+HEADER = struct.Struct('<8sQ')
+RECORD = struct.Struct('<II')
+SEGMENT_SIZE = 16 * 1024 * 1024
+SUFFIX = '.seg'
+# the first segment number leaves room for prepend()
+FIRST_SEGMENT = 1 << 32
+READ_SIZE = 1024 * 1024
+
+
+class SegmentSpool:
+    """On-disk FIFO of records split in segment files"""
+
+    def __init__(self, directory: str, segment_size: int = SEGMENT_SIZE, sync: bool = False) -> None:
+        """SegmentSpool constructor. Opens the segments left by a previous run
+        Args:
+            directory (str): the spool directory (created if needed)
+            segment_size (int, optional): a new segment is started once the tail
+             segment is larger than this size [default: SEGMENT_SIZE]
+            sync (bool, optional): fdatasync after each append [default: False]
+        """
+        if not isinstance(directory, str):
+            if RAISEEXCEPTIONS:
+                raise TypeError("directory must be a string")
+            else:
+                return
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._segment_size = segment_size
+        self._sync = sync
+        self._lock = threading.RLock()
+        self._count = 0
+        # segment numbers, oldest first
+        self._segments = []
+        self._tail_fd = None
+        self._tail_end = 0
+        self._head_offset = 0
+        self._next_offset = None
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(SUFFIX):
+                self._open_segment(int(name[:-len(SUFFIX)]))
+
+    def _path(self, number: int) -> str:
+        """Returns the path of a segment"""
+        return os.path.join(self._directory, f"{number:020d}{SUFFIX}")
+
+    def _open_segment(self, number: int) -> None:
+        """Validate a segment left by a previous run and count its records"""
+        path = self._path(number)
+        with open(path, 'r+b') as file:
+            header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                file.close()
+                os.unlink(path)
+                return
+            magic, offset = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a spool segment")
+            file.seek(offset)
+            data = file.read()
+            count, end = self._scan(data)
+            if end != len(data):
+                # torn tail
+                file.truncate(offset + end)
+        if count == 0:
+            os.unlink(path)
+            return
+        if not self._segments:
+            self._head_offset = offset
+        self._segments.append(number)
+        self._count += count
+
+    @staticmethod
+    def _scan(data: bytes, limit: int = None) -> tuple:
+        """Returns the number of valid records of data and the end of the last one"""
+        count = offset = 0
+        while offset + RECORD.size <= len(data) and (limit is None or count < limit):
+            length, crc = RECORD.unpack_from(data, offset)
+            start = offset + RECORD.size
+            if start + length > len(data) or zlib.crc32(data[start:start + length]) != crc:
+                break
+            offset = start + length
+            count += 1
+        return count, offset
+
+    @property
+    def directory(self) -> str:
+        """Returns the spool directory"""
+        return self._directory
+
+    def __len__(self) -> int:
+        """Returns the number of records not consumed"""
+        return self._count
+
+    @staticmethod
+    def _encode(payloads: list) -> bytes:
+        """Returns the records of the payloads"""
+        parts = []
+        for payload in payloads:
+            parts.append(RECORD.pack(len(payload), zlib.crc32(payload)))
+            parts.append(payload)
+        return b''.join(parts)
+
+    def _write_segment(self, number: int, data: bytes) -> None:
+        """Write a complete segment"""
+        path = self._path(number)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, HEADER.size) + data)
+            if self._sync:
+                os.fdatasync(file.fileno())
+        os.replace(tmp, path)
+
+    def append(self, payload: bytes) -> None:
+        """Append a record
+        Args:
+            payload (bytes): the record content
+        """
+        self.extend([payload])
+
+    def extend(self, payloads: list) -> None:
+        """Append records with a single write
+        Args:
+            payloads (list): the records content (bytes)
+        """
+        if not payloads:
+            return
+        data = self._encode(payloads)
+        with self._lock:
+            if self._tail_fd is None or self._tail_end > self._segment_size:
+                self._start_tail()
+            written = 0
+            while written < len(data):
+                written += os.pwrite(self._tail_fd, data[written:], self._tail_end + written)
+            self._tail_end += len(data)
+            if self._sync:
+                os.fdatasync(self._tail_fd)
+            self._count += len(payloads)
+
+    def _start_tail(self) -> None:
+        """Start a new tail segment"""
+        if self._tail_fd is not None:
+            os.close(self._tail_fd)
+        number = self._segments[-1] + 1 if self._segments else FIRST_SEGMENT
+        path = self._path(number)
+        self._tail_fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o640)
+        os.pwrite(self._tail_fd, HEADER.pack(MAGIC, HEADER.size), 0)
+        self._tail_end = HEADER.size
+        if not self._segments:
+            self._head_offset = HEADER.size
+        self._segments.append(number)
+
+    def prepend(self, payloads: list) -> None:
+        """Put records back in front of the spool
+        Args:
+            payloads (list): the records content (bytes), oldest first
+        """
+        if not payloads:
+            return
+        with self._lock:
+            if not self._segments:
+                self.extend(payloads)
+                return
+            number = self._segments[0] - 1
+            self._write_segment(number, self._encode(payloads))
+            self._segments.insert(0, number)
+            self._head_offset = HEADER.size
+            self._next_offset = None
+            self._count += len(payloads)
+
+    def read(self, max_records: int = 1000) -> list:
+        """Returns the oldest records without consuming them (see consume())
+        Args:
+            max_records (int, optional): maximum number of records [default: 1000]
+        Returns:
+            list: the records content (bytes), empty if the spool is empty
+        """
+        with self._lock:
+            while self._segments:
+                number = self._segments[0]
+                with open(self._path(number), 'rb') as file:
+                    file.seek(self._head_offset)
+                    data = file.read(READ_SIZE)
+                    size = RECORD.size + RECORD.unpack_from(data)[0] if len(data) >= RECORD.size else 0
+                    if len(data) < size:
+                        # record larger than READ_SIZE
+                        data += file.read(size - len(data))
+                count, end = self._scan(data, max_records)
+                if count:
+                    self._next_offset = (number, self._head_offset + end, count)
+                    payloads = []
+                    offset = 0
+                    for _ in range(count):
+                        length = RECORD.unpack_from(data, offset)[0]
+                        payloads.append(bytes(data[offset + RECORD.size:offset + RECORD.size + length]))
+                        offset += RECORD.size + length
+                    return payloads
+                if len(self._segments) == 1 and self._tail_fd is not None:
+                    # the tail segment is empty: keep it for the next appends
+                    return []
+                self._drop_head()
+            return []
+
+    def consume(self) -> None:
+        """Mark the records returned by the last read() as consumed"""
+        with self._lock:
+            if self._next_offset is None:
+                return
+            number, offset, count = self._next_offset
+            self._next_offset = None
+            if not self._segments or self._segments[0] != number:
+                return
+            self._count -= count
+            self._head_offset = offset
+            if len(self._segments) > 1 or self._tail_fd is None:
+                with open(self._path(number), 'rb') as file:
+                    file.seek(0, os.SEEK_END)
+                    if file.tell() <= offset:
+                        self._drop_head()
+                        return
+            elif offset >= self._tail_end:
+                # everything consumed: restart the tail segment
+                os.ftruncate(self._tail_fd, HEADER.size)
+                os.pwrite(self._tail_fd, HEADER.pack(MAGIC, HEADER.size), 0)
+                self._tail_end = self._head_offset = HEADER.size
+                return
+            with open(self._path(number), 'r+b') as file:
+                file.write(HEADER.pack(MAGIC, offset))
+
+    def _drop_head(self) -> None:
+        """Delete the head segment"""
+        number = self._segments.pop(0)
+        if not self._segments and self._tail_fd is not None:
+            os.close(self._tail_fd)
+            self._tail_fd = None
+        os.unlink(self._path(number))
+        self._head_offset = HEADER.size
+        if self._segments:
+            # a segment moved behind a prepended one may be partly consumed
+            with open(self._path(self._segments[0]), 'rb') as file:
+                self._head_offset = HEADER.unpack(file.read(HEADER.size))[1]
+
+    def close(self) -> None:
+        """Close the tail segment"""
+        with self._lock:
+            if self._tail_fd is not None:
+                os.close(self._tail_fd)
+                self._tail_fd = None
+            if self._count == 0:
+                for number in self._segments:
+                    os.unlink(self._path(number))
+                self._segments = []
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self._directory})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
@@ -0,0 +1,207 @@
+"""
+Server statistics shared between processes and the stats socket
+
+The counters live in a shared array with one row (slot) per process, so
+each process increments its own counters without locking between
+processes. A process updating its slot from several threads (threaded TCP
+server) uses a locked slot. A snapshot sums the rows.
+
+The stats socket is a UNIX stream socket answering one command per line
+(e.g. "stats"), handled by a thread of the parent process.
+
+Contains:
+- ServerStats
+- StatsSlot
+- StatsServer
+- query
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import threading
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+COUNTERS = (
+    'udp_messages',
+    'udp_bytes',
+    'tcp_messages',
+    'tcp_bytes',
+    'tcp_connections',
+    'relp_messages',
+    'relp_bytes',
+    'relp_connections',
+)
+
+
+class StatsSlot:
+    """Counters of one process"""
+
+    def __init__(self, array, offset: int, index: dict, threaded: bool = False) -> None:
+        """StatsSlot constructor
+        Args:
+            array (multiprocessing.RawArray): the shared array
+            offset (int): offset of the row of this slot
+            index (dict): counter name to column
+            threaded (bool, optional): the slot is updated by several threads
+             of the process: the increments are locked [default: False]
+        """
+        self._array = array
+        self._offset = offset
+        self._index = index
+        self._lock = threading.Lock() if threaded else None
+
+    def add(self, counter: str, value: int = 1) -> None:
+        """Increment a counter
+        Args:
+            counter (str): the counter name
+            value (int, optional): the increment [default: 1]
+        """
+        if self._lock is None:
+            self._array[self._offset + self._index[counter]] += value
+            return
+        # the read-modify-write of the array is not atomic
+        with self._lock:
+            self._array[self._offset + self._index[counter]] += value
+
+
+class ServerStats:
+    """Counters shared between the server processes"""
+
+    def __init__(self, slots: int, counters: tuple = COUNTERS) -> None:
+        """ServerStats constructor. Must be created before the processes are forked
+        Args:
+            slots (int): number of processes
+            counters (tuple, optional): the counter names [default: COUNTERS]
+        """
+        if not isinstance(slots, int) or slots < 1:
+            if RAISEEXCEPTIONS:
+                raise ValueError("slots must be a positive integer")
+            else:
+                return
+        self._counters = tuple(counters)
+        self._index = {name: i for i, name in enumerate(self._counters)}
+        self._slots = slots
+        self._array = multiprocessing.RawArray('Q', slots * len(self._counters))
+
+    @property
+    def counters(self) -> tuple:
+        """Returns the counter names"""
+        return self._counters
+
+    def slot(self, index: int, threaded: bool = False) -> StatsSlot:
+        """Returns the counters of a process
+        Args:
+            index (int): the slot index (0 to slots - 1)
+            threaded (bool, optional): see StatsSlot [default: False]
+        Returns:
+            StatsSlot: the counters
+        """
+        if not 0 <= index < self._slots:
+            raise IndexError(f"slot must be between 0 and {self._slots - 1}")
+        return StatsSlot(self._array, index * len(self._counters), self._index, threaded)
+
+    def snapshot(self) -> dict:
+        """Returns the sum of the counters of all the processes
+        Returns:
+            dict: counter name to value
+        """
+        width = len(self._counters)
+        values = self._array[:]
+        return {name: sum(values[i::width]) for i, name in enumerate(self._counters)}
+
+
+class _StatsRequestHandler(socketserver.StreamRequestHandler):
+    """Answers one command per line"""
+
+    def handle(self):
+        for line in self.rfile:
+            command = line.decode(errors='replace').strip()
+            if not command:
+                continue
+            self.wfile.write(self.server.execute(command).encode())
+            self.wfile.flush()
+
+
+class StatsServer(socketserver.ThreadingUnixStreamServer):
+    """UNIX stream socket answering stats commands"""
+    daemon_threads = True
+
+    def __init__(self, path: str, commands: dict) -> None:
+        """StatsServer constructor. Removes a stale socket file
+        Args:
+            path (str): path of the socket
+            commands (dict): command name to a callable returning a str or a dict
+        """
+        if os.path.exists(path):
+            os.unlink(path)
+        self.commands = commands
+        super().__init__(path, _StatsRequestHandler)
+
+    def execute(self, command: str) -> str:
+        """Execute a command
+        Args:
+            command (str): the command name
+        Returns:
+            str: the answer (a dict is encoded as one JSON line)
+        """
+        function = self.commands.get(command)
+        if function is None:
+            names = ', '.join(sorted(self.commands))
+            return json.dumps({'error': f"unknown command {command}. Commands: {names}"}) + '\n'
+        result = function()
+        if isinstance(result, dict):
+            return json.dumps(result) + '\n'
+        return result
+
+    def start(self) -> threading.Thread:
+        """Serve the socket in a daemon thread
+        Returns:
+            threading.Thread: the thread
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def query(path: str, command: str, timeout: float = 5.0) -> str:
+    """Send a command to a stats socket and return the answer
+    Args:
+        path (str): path of the socket
+        command (str): the command
+        timeout (float, optional): timeout in seconds [default: 5.0]
+    Returns:
+        str: the answer
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(f"{command}\n".encode())
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b''.join(chunks).decode()
@@ -0,0 +1,711 @@
+"""
+Long-lived syslog client connection and the matching logging handler
+
+SyslogConnection keeps one UDP, TCP or UNIX socket open for the lifetime of
+the client. Stream writes are buffered and flushed when the buffer is full
+or by a timer thread. A failed send closes the socket, reconnects and
+retries, so a restarted collector is picked up transparently. The buffer
+is kept until it is sent (up to max_buffered bytes, the oldest messages are
+dropped beyond): a collector down for longer than the retries only delays
+the messages. What is still buffered when the connection is closed is lost
+and reported.
+
+StreamingSysLogHandler encodes the records like
+logging.handlers.SysLogHandler (<PRI>, ident, NUL terminator over TCP), or
+with an RFC 3164/5424 header, with a lib/encoder.SyslogEncoder and sends
+them through a SyslogConnection.
+
+FileShipper reads a file in large chunks and sends each line as a message,
+framed with octet counting (RFC 6587) over TCP. Many frames are coalesced
+into each sendall and the bytes not yet acknowledged by the peer (the
+socket send queue, TIOCOUTQ) are kept under a limit. A pacer
+(lib/pacing.py) may space the messages.
+
+BackgroundSender delivers the messages from a thread so the caller never
+waits on the network. The messages go into a bounded queue. When the queue
+is full or the destination is unreachable, they spill to an on-disk
+segment spool (lib/spool.py), drained with exponential backoff once the
+destination is back. A spool left over by a previous run is resumed on
+startup. Delivery order is kept: memory first, then the spool.
+SpoolingSysLogHandler is the matching logging handler.
+
+Contains:
+- SyslogConnection
+- StreamingSysLogHandler
+- FileShipper
+- BackgroundSender
+- SpoolingSysLogHandler
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import fcntl
+import logging
+import os
+import queue
+import socket
+import sys
+import termios
+import threading
+import time
+from logging import handlers
+
+from fruafr.log.lib import encoder
+from fruafr.log.lib import framing
+from fruafr.log.lib import spool
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+FLUSH_INTERVAL = 0.2
+BUFFER_SIZE = 64 * 1024
+RETRIES = 3
+RETRY_DELAY = 0.1
+CHUNK_SIZE = 1024 * 1024
+MAX_INFLIGHT = 4 * 1024 * 1024
+INFLIGHT_POLL = 0.001
+QUEUE_SIZE = 10000
+SEND_BATCH = 1000
+BACKOFF_MIN = 0.1
+BACKOFF_MAX = 30.0
+DRAIN_TIMEOUT = 5.0
+MAX_BUFFERED = 16 * 1024 * 1024
+
+
+class SyslogConnection:
+    """Persistent connection to a syslog destination"""
+
+    def __init__(self,
+                 address,
+                 socktype: int = socket.SOCK_DGRAM,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 buffer_size: int = BUFFER_SIZE,
+                 retries: int = RETRIES,
+                 max_inflight: int = 0,
+                 max_buffered: int = MAX_BUFFERED) -> None:
+        """SyslogConnection constructor. Connects lazily
+        Args:
+            address (str or tuple): UNIX socket path or (host, port)
+            socktype (int, optional): socket.SOCK_DGRAM or socket.SOCK_STREAM
+             [default: socket.SOCK_DGRAM]
+            flush_interval (float, optional): maximum time in seconds buffered
+             stream data waits before being sent. 0 disables the timer
+             [default: FLUSH_INTERVAL]
+            buffer_size (int, optional): stream data is sent once the buffer
+             reaches this size [default: BUFFER_SIZE]
+            retries (int, optional): reconnection attempts per send [default: RETRIES]
+            max_inflight (int, optional): stream only, maximum number of bytes
+             sent but not yet acknowledged by the peer. 0 is unlimited [default: 0]
+            max_buffered (int, optional): stream only, maximum number of bytes
+             kept while the destination is unreachable [default: MAX_BUFFERED]
+        """
+        if not isinstance(address, (str, tuple)):
+            if RAISEEXCEPTIONS:
+                raise TypeError("address must be a string or a (host, port) tuple")
+            else:
+                return
+        self.address = address
+        self.socktype = socktype
+        self.buffer_size = buffer_size
+        self.retries = retries
+        self.max_inflight = max_inflight
+        self.max_buffered = max_buffered
+        self.reconnections = 0
+        self.dropped = 0
+        self._sock = None
+        self._buffer = []
+        self._buffered = 0
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._timer = None
+        if flush_interval > 0 and socktype == socket.SOCK_STREAM:
+            self._timer = threading.Thread(target=self._flush_periodically,
+                                           args=(flush_interval,), daemon=True)
+            self._timer.start()
+
+    @property
+    def connected(self) -> bool:
+        """Returns True if the socket is open"""
+        return self._sock is not None
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of buffered messages"""
+        return len(self._buffer)
+
+    @property
+    def inflight(self) -> int:
+        """Returns the number of bytes in the socket send queue (not yet acknowledged)"""
+        if self._sock is None:
+            return 0
+        try:
+            return int.from_bytes(fcntl.ioctl(self._sock.fileno(), termios.TIOCOUTQ, b'\0' * 4),
+                                  'little', signed=True)
+        except OSError:
+            return 0
+
+    def _wait_inflight(self, size: int) -> None:
+        """Wait until size more bytes fit under max_inflight"""
+        while self._sock is not None:
+            inflight = self.inflight
+            if inflight == 0 or inflight + size <= self.max_inflight:
+                return
+            time.sleep(INFLIGHT_POLL)
+
+    def connect(self) -> None:
+        """Open the socket"""
+        with self._lock:
+            if self._sock is not None:
+                return
+            if isinstance(self.address, str):
+                self._sock = self._connect_unix()
+                return
+            host, port = self.address
+            error = None
+            for family, _, proto, _, sockaddr in socket.getaddrinfo(host, int(port), 0, self.socktype):
+                sock = socket.socket(family, self.socktype, proto)
+                try:
+                    sock.connect(sockaddr)
+                except OSError as e:
+                    error = e
+                    sock.close()
+                    continue
+                self._sock = sock
+                return
+            raise error if error is not None else OSError(f"getaddrinfo returned no address for {host}")
+
+    def _connect_unix(self) -> socket.socket:
+        """Connect to a UNIX socket, trying the other socket type on failure
+        (the way logging.handlers.SysLogHandler does)"""
+        sock = socket.socket(socket.AF_UNIX, self.socktype)
+        try:
+            sock.connect(self.address)
+            return sock
+        except OSError:
+            sock.close()
+        other = socket.SOCK_STREAM if self.socktype == socket.SOCK_DGRAM else socket.SOCK_DGRAM
+        sock = socket.socket(socket.AF_UNIX, other)
+        try:
+            sock.connect(self.address)
+        except OSError:
+            sock.close()
+            raise
+        self.socktype = other
+        return sock
+
+    def _reset(self) -> None:
+        """Close the socket after an error"""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def _peer_closed(self) -> bool:
+        """Returns True if the peer of the stream socket has closed the connection
+        (a syslog collector never writes, so a readable socket means EOF or reset)"""
+        try:
+            return self._sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+
+    def _send_now(self, data: bytes) -> None:
+        """Send data, reconnecting and retrying on failure
+        Args:
+            data (bytes): the data
+        """
+        attempt = 0
+        while True:
+            try:
+                if self._sock is None:
+                    self.connect()
+                    if attempt:
+                        self.reconnections += 1
+                if self.socktype == socket.SOCK_STREAM and self._peer_closed():
+                    # do not write into a connection the collector has closed
+                    self._reset()
+                    self.connect()
+                    self.reconnections += 1
+                if self.socktype == socket.SOCK_STREAM:
+                    if self.max_inflight:
+                        self._wait_inflight(len(data))
+                    self._sock.sendall(data)
+                else:
+                    self._sock.send(data)
+                return
+            except OSError:
+                self._reset()
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                time.sleep(RETRY_DELAY * attempt)
+
+    def send(self, data: bytes) -> None:
+        """Send a message. Stream data is buffered
+        Args:
+            data (bytes): the message, framing included
+        """
+        with self._lock:
+            if self.socktype != socket.SOCK_STREAM:
+                self._send_now(data)
+                return
+            self._buffer.append(data)
+            self._buffered += len(data)
+            if self._buffered >= self.buffer_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """Send the buffered stream data. It stays buffered if the send fails"""
+        with self._lock:
+            if not self._buffer:
+                return
+            try:
+                self._send_now(b''.join(self._buffer))
+            except OSError:
+                while self._buffered > self.max_buffered and self._buffer:
+                    self._buffered -= len(self._buffer.pop(0))
+                    self.dropped += 1
+                raise
+            self._buffer = []
+            self._buffered = 0
+
+    def discard(self) -> list:
+        """Empty the buffer, for callers delivering a failed batch again themselves
+        Returns:
+            list: the buffered messages
+        """
+        with self._lock:
+            buffer = self._buffer
+            self._buffer = []
+            self._buffered = 0
+            return buffer
+
+    def _flush_periodically(self, interval: float) -> None:
+        """Timer thread flushing the buffer"""
+        while not self._closed.wait(interval):
+            try:
+                self.flush()
+            except OSError:
+                # still buffered: the next send, flush or close retries
+                pass
+
+    def close(self) -> None:
+        """Flush and close the connection. The messages that could not be
+        sent are counted in dropped before the error is raised"""
+        self._closed.set()
+        with self._lock:
+            try:
+                self.flush()
+            except OSError:
+                self.dropped += len(self.discard())
+                raise
+            finally:
+                self._reset()
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self.address})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
+
+
+class StreamingSysLogHandler(encoder.FastSysLogHandler):
+    """SysLogHandler sending through one persistent, buffered connection"""
+
+    def __init__(self,
+                 address=('localhost', handlers.SYSLOG_UDP_PORT),
+                 facility: int = handlers.SysLogHandler.LOG_USER,
+                 socktype: int = socket.SOCK_DGRAM,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 header: dict = None) -> None:
+        """StreamingSysLogHandler constructor. Does not connect until the first record
+        Args:
+            address (str or tuple, optional): UNIX socket path or (host, port)
+            facility (int, optional): the syslog facility [default: LOG_USER]
+            socktype (int, optional): socket.SOCK_DGRAM or socket.SOCK_STREAM
+            flush_interval (float, optional): see SyslogConnection
+            header (dict, optional): rfc, hostname, app_name and procid of the
+             encoder (see encoder.SyslogEncoder) [default: None]
+        """
+        logging.Handler.__init__(self)  # pylint: disable=non-parent-init-called
+        self.address = address
+        self.facility = facility
+        self.socktype = socktype
+        self.unixsocket = isinstance(address, str)
+        self.socket = None
+        self.connection = SyslogConnection(address, socktype, flush_interval)
+        self._prepare_encoder(**(header or {}))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Send the record
+        Args:
+            record (logging.LogRecord): the record
+        """
+        try:
+            self.connection.send(self.encode_record(record))
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def flush(self) -> None:
+        """Send the buffered records (they stay buffered if the send fails)"""
+        with self.lock:
+            try:
+                self.connection.flush()
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        """Flush and close the connection. The records lost are reported on stderr"""
+        with self.lock:
+            try:
+                self.connection.close()
+            except OSError as e:
+                if logging.raiseExceptions and sys.stderr:
+                    sys.stderr.write(f"{self.connection.dropped} syslog messages not sent to "
+                                     f"{self.address}: {e}\n")
+            logging.Handler.close(self)
+
+
+class SpoolingSysLogHandler(StreamingSysLogHandler):
+    """SysLogHandler that never blocks on the network (see BackgroundSender)"""
+
+    def __init__(self,
+                 address=('localhost', handlers.SYSLOG_UDP_PORT),
+                 facility: int = handlers.SysLogHandler.LOG_USER,
+                 socktype: int = socket.SOCK_DGRAM,
+                 spool_directory: str = None,
+                 queue_size: int = QUEUE_SIZE,
+                 drain_timeout: float = DRAIN_TIMEOUT,
+                 header: dict = None) -> None:
+        """SpoolingSysLogHandler constructor
+        Args:
+            address (str or tuple, optional): UNIX socket path or (host, port)
+            facility (int, optional): the syslog facility [default: LOG_USER]
+            socktype (int, optional): socket.SOCK_DGRAM or socket.SOCK_STREAM
+            spool_directory (str, optional): see BackgroundSender
+            queue_size (int, optional): see BackgroundSender
+            drain_timeout (float, optional): on close, time in seconds given to
+             the delivery of the pending messages before they are left in the
+             spool for the next run [default: DRAIN_TIMEOUT]
+            header (dict, optional): see StreamingSysLogHandler
+        """
+        super().__init__(address, facility, socktype, flush_interval=0, header=header)
+        self.connection.retries = 0
+        self.drain_timeout = drain_timeout
+        self.sender = BackgroundSender(self.connection, spool_directory, queue_size)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Queue the record
+        Args:
+            record (logging.LogRecord): the record
+        """
+        try:
+            self.sender.submit(self.encode_record(record))
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def flush(self) -> None:
+        """Nothing to do: the records are sent by the background thread"""
+
+    def close(self) -> None:
+        """Deliver or spool the pending records and stop the background thread"""
+        with self.lock:
+            self.sender.close(self.drain_timeout)
+            logging.Handler.close(self)
+
+
+class BackgroundSender:
+    """Delivers messages from a thread, through a bounded queue and a disk spool"""
+
+    def __init__(self,
+                 connection: SyslogConnection,
+                 spool_directory: str = None,
+                 queue_size: int = QUEUE_SIZE) -> None:
+        """BackgroundSender constructor. Starts the sender thread
+        Args:
+            connection (SyslogConnection): the connection (its own retries should be 0)
+            spool_directory (str, optional): directory of the spool. Without a
+             spool, the messages are dropped when the queue is full [default: None]
+            queue_size (int, optional): maximum number of messages kept in memory
+             [default: QUEUE_SIZE]
+        """
+        if not isinstance(connection, SyslogConnection):
+            if RAISEEXCEPTIONS:
+                raise TypeError("connection must be a SyslogConnection")
+            else:
+                return
+        self.connection = connection
+        self.spool = spool.SegmentSpool(spool_directory) if spool_directory else None
+        self.sent = 0
+        self.dropped = 0
+        self.failures = 0
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        # once a message is in the spool, the next ones go to the spool too
+        self._spilling = self.spool is not None and len(self.spool) > 0
+        self._pending = []
+        self._closed = threading.Event()
+        self._idle = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def backlog(self) -> int:
+        """Returns the number of messages not delivered yet"""
+        return len(self._pending) + self._queue.qsize() + (len(self.spool) if self.spool else 0)
+
+    def submit(self, data: bytes) -> None:
+        """Queue a message. Never waits on the network
+        Args:
+            data (bytes): the message, framing included
+        """
+        with self._lock:
+            if not self._spilling:
+                try:
+                    self._queue.put_nowait(data)
+                    return
+                except queue.Full:
+                    pass
+            if self.spool is None:
+                self.dropped += 1
+                return
+            self._spilling = True
+            self.spool.append(data)
+
+    def _next_batch(self) -> tuple:
+        """Returns the next messages to send and whether they come from the spool"""
+        if self._pending:
+            return self._pending, False
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=0.1))
+            while len(batch) < SEND_BATCH:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        if batch:
+            return batch, False
+        if self.spool is not None:
+            with self._lock:
+                batch = self.spool.read(SEND_BATCH)
+                if not batch:
+                    self._spilling = False
+            return batch, True
+        return [], False
+
+    def _deliver(self, batch: list) -> None:
+        """Send a batch (raises OSError)"""
+        for data in batch:
+            self.connection.send(data)
+        self.connection.flush()
+
+    def _run(self) -> None:
+        """Sender thread"""
+        backoff = BACKOFF_MIN
+        while not self._closed.is_set():
+            batch, spooled = self._next_batch()
+            if not batch:
+                with self._idle:
+                    self._idle.notify_all()
+                continue
+            try:
+                self._deliver(batch)
+            except OSError:
+                # the batch is kept here, not in the connection
+                self.connection.discard()
+                self.failures += 1
+                if not spooled:
+                    self._pending = batch
+                    with self._lock:
+                        self._spilling = self.spool is not None
+                self._closed.wait(backoff)
+                backoff = min(backoff * 2, BACKOFF_MAX)
+                continue
+            backoff = BACKOFF_MIN
+            self.sent += len(batch)
+            if spooled:
+                self.spool.consume()
+            else:
+                self._pending = []
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait until every message is delivered
+        Args:
+            timeout (float, optional): timeout in seconds
+        Returns:
+            bool: True if nothing is left to deliver
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self.backlog == 0, timeout)
+
+    def close(self, timeout: float = DRAIN_TIMEOUT) -> None:
+        """Try to deliver the pending messages, spool the others and stop the thread
+        Args:
+            timeout (float, optional): time in seconds given to the delivery
+             [default: DRAIN_TIMEOUT]
+        """
+        if self._closed.is_set():
+            return
+        self.wait(timeout)
+        self._closed.set()
+        self._thread.join()
+        left, self._pending = self._pending, []
+        while True:
+            try:
+                left.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if left:
+            if self.spool is not None:
+                # older than the spooled messages
+                self.spool.prepend(left)
+            else:
+                self.dropped += len(left)
+        if self.spool is not None:
+            self.spool.close()
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self.connection})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
+
+
+class FileShipper:
+    """Sends the lines of a file through a SyslogConnection"""
+
+    def __init__(self,
+                 connection: SyslogConnection,
+                 header: bytes = b'',
+                 chunk_size: int = CHUNK_SIZE,
+                 pacer=None) -> None:
+        """FileShipper constructor
+        Args:
+            connection (SyslogConnection): the connection. Its buffer_size sets
+             how many bytes of frames are coalesced into each sendall
+            header (bytes, optional): prepended to every line (e.g. b'<13>prog ')
+            chunk_size (int, optional): size of the file reads [default: CHUNK_SIZE]
+            pacer (pacing.TokenBucket, optional): spaces the messages [default: None]
+        """
+        if not isinstance(connection, SyslogConnection):
+            if RAISEEXCEPTIONS:
+                raise TypeError("connection must be a SyslogConnection")
+            else:
+                return
+        self.connection = connection
+        self.header = header
+        self.chunk_size = chunk_size
+        self.pacer = pacer
+
+    def send_lines(self, lines: list) -> int:
+        """Send lines, as one block of frames over a stream
+        Args:
+            lines (list): the lines (bytes, without the line feed)
+        Returns:
+            int: the number of messages sent
+        """
+        header = self.header
+        messages = [header + line for line in (line.rstrip(b'\r') for line in lines) if line]
+        pacer = self.pacer
+        if self.connection.socktype == socket.SOCK_STREAM:
+            encode = framing.encode_octet_counted
+            if messages:
+                if pacer is not None:
+                    pacer.wait(len(messages))
+                self.connection.send(b''.join([encode(message) for message in messages]))
+        elif pacer is not None:
+            for message in messages:
+                pacer.wait()
+                self.connection.send(message)
+        else:
+            for message in messages:
+                self.connection.send(message)
+        return len(messages)
+
+    def ship(self, path: str, progress=None, interval: float = 1.0) -> dict:
+        """Send the file
+        Args:
+            path (str): the file
+            progress (callable, optional): called with the current report
+             every interval seconds
+            interval (float, optional): progress interval in seconds [default: 1.0]
+        Returns:
+            dict: messages, bytes (read from the file), elapsed, rate and throughput (MB/s)
+        """
+        total = os.path.getsize(path)
+        messages = nbytes = 0
+        start = last = time.perf_counter()
+        pending = b''
+        with open(path, 'rb') as file:
+            while True:
+                chunk = file.read(self.chunk_size)
+                if not chunk:
+                    break
+                nbytes += len(chunk)
+                lines = (pending + chunk).split(b'\n')
+                pending = lines.pop()
+                messages += self.send_lines(lines)
+                if progress is not None and time.perf_counter() - last >= interval:
+                    last = time.perf_counter()
+                    progress(self._report(messages, nbytes, total, last - start))
+            messages += self.send_lines([pending])
+        self.connection.flush()
+        return self._report(messages, nbytes, total, time.perf_counter() - start)
+
+    def _report(self, messages: int, nbytes: int, total: int, elapsed: float) -> dict:
+        """Build the report"""
+        elapsed = max(elapsed, 1e-6)
+        return {
+            'messages': messages,
+            'bytes': nbytes,
+            'percent': round(100.0 * nbytes / total, 1) if total else 100.0,
+            'elapsed': round(elapsed, 3),
+            'rate': round(messages / elapsed, 1),
+            'throughput': round(nbytes / elapsed / 1e6, 2),
+        }
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self.connection})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
@@ -0,0 +1,279 @@
+"""
+Sidecar time index of a log file
+
+The FILE.idx sidecar file maps the time of the records to their offset in
+the log file, so that a reader jumps close to a time range instead of
+scanning the file. It starts with the 16 bytes MAGIC header, followed by
+fixed-width entries of 16 bytes (little-endian): the creation time of a
+record in nanoseconds and the offset of its first byte. An entry is added
+for the first record, then every `every_records` records (counted by each
+writer) or `every_bytes` bytes. The entries are appended with single
+O_APPEND writes, so several processes (e.g. logtofile invocations) can
+index the same file.
+
+The index is a hint: records are assumed to be written in time order, and
+the index can be removed at any time. rebuild() recreates it from the log
+file with a TimestampParser, which parses the time of a line written with
+a logging format and date format (%(asctime)s or %(created)f).
+
+Contains:
+- TimestampParser
+- TimeIndexWriter
+- index_path
+- load
+- lookup
+- rebuild
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import bisect
+import datetime
+import logging
+import os
+import re
+import struct
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+INDEX_SUFFIX = '.idx'
+MAGIC = b'FRLOGIDX\x01\x00\x00\x00\x00\x00\x00\x00'
+ENTRY = struct.Struct('<qQ')
+EVERY_RECORDS = 1000
+EVERY_BYTES = 1024 * 1024
+TIME_FIELD = re.compile(r'%\((asctime|created)\)[-#0 +]*\d*(?:\.\d+)?[sfdge]')
+OTHER_FIELD = re.compile(r'%\(\w+\)[-#0 +]*\d*(?:\.\d+)?[sdfrgeixXoc]|%%')
+# strftime directives to regular expressions
+DIRECTIVES = {
+    'Y': r'\d{4}', 'y': r'\d{2}', 'm': r'\d{1,2}', 'd': r'\d{1,2}', 'H': r'\d{1,2}',
+    'I': r'\d{1,2}', 'M': r'\d{1,2}', 'S': r'\d{1,2}', 'f': r'\d{1,6}', 'j': r'\d{1,3}',
+    'b': r'[A-Za-z]+', 'B': r'[A-Za-z]+', 'a': r'[A-Za-z]+', 'A': r'[A-Za-z]+', 'p': r'[AaPp][Mm]',
+    'z': r'[+-]\d{2}:?\d{2}|Z', 'Z': r'[A-Za-z]+', '%': '%',
+}
+
+
+def index_path(filename: str) -> str:
+    """Returns the path of the index of a log file"""
+    return filename + INDEX_SUFFIX
+
+
+class TimestampParser:
+    """Parses the time of the lines written with a logging format"""
+
+    def __init__(self, fmt: str, datefmt: str = None) -> None:
+        """TimestampParser constructor
+        Args:
+            fmt (str): the logging format, with %(asctime)s or %(created)f
+            datefmt (str, optional): the date format of %(asctime)s [default: None, the
+             logging default '%Y-%m-%d %H:%M:%S,mmm']
+        """
+        match = TIME_FIELD.search(fmt)
+        if match is None:
+            if RAISEEXCEPTIONS:
+                raise ValueError("the format has no %(asctime)s or %(created)f field")
+            else:
+                return
+        # the fields before the time field are skipped
+        prefix = ''
+        position = 0
+        for field in OTHER_FIELD.finditer(fmt, 0, match.start()):
+            prefix += re.escape(fmt[position:field.start()]) + ('%' if field.group() == '%%' else '.*?')
+            position = field.end()
+        prefix += re.escape(fmt[position:match.start()])
+        self.created = match.group(1) == 'created'
+        self.datefmt = datefmt
+        # the logging default time format adds the milliseconds
+        self.msecs = False
+        if self.created:
+            pattern = r'\d+(?:\.\d+)?'
+        elif datefmt is None:
+            self.datefmt = logging.Formatter.default_time_format
+            self.msecs = True
+            pattern = r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}'
+        else:
+            pattern = re.sub(r'%(.)', lambda directive: DIRECTIVES.get(directive.group(1), '.+?'),
+                             re.escape(datefmt).replace(r'\%', '%'))
+        self.regex = re.compile(f"^{prefix}({pattern})".encode())
+
+    def __call__(self, line: bytes) -> float:
+        """Returns the time of a line
+        Args:
+            line (bytes): the line
+        Returns:
+            float: the time (seconds since the epoch), None if the line does not start
+             with the format (e.g. the continuation of a multiline message)
+        """
+        match = self.regex.match(line)
+        if match is None:
+            return None
+        text = match.group(1).decode('ascii', 'replace')
+        try:
+            if self.created:
+                return float(text)
+            if self.msecs:
+                text, msecs = text.rsplit(',', 1)
+                return datetime.datetime.strptime(text, self.datefmt).timestamp() + int(msecs) / 1000
+            return datetime.datetime.strptime(text, self.datefmt).timestamp()
+        except ValueError:
+            return None
+
+
+class TimeIndexWriter:
+    """Appends the entries of the index of a log file"""
+
+    def __init__(self,
+                 filename: str,
+                 every_records: int = EVERY_RECORDS,
+                 every_bytes: int = EVERY_BYTES,
+                 truncate: bool = False) -> None:
+        """TimeIndexWriter constructor
+        Args:
+            filename (str): the log file path (the index is index_path(filename))
+            every_records (int, optional): records between two entries [default: EVERY_RECORDS]
+            every_bytes (int, optional): bytes between two entries [default: EVERY_BYTES]
+            truncate (bool, optional): start a new index (the log file is truncated), always
+             done if the log file is missing or empty [default: False]
+        """
+        if not isinstance(every_records, int) or every_records < 1 or \
+           not isinstance(every_bytes, int) or every_bytes < 1:
+            if RAISEEXCEPTIONS:
+                raise ValueError("every_records and every_bytes must be positive integers")
+            else:
+                return
+        self.path = index_path(os.path.abspath(filename))
+        self.every_records = every_records
+        self.every_bytes = every_bytes
+        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+            # a new log file: the entries of a previous one are wrong
+            truncate = True
+        if truncate or not os.path.exists(self.path):
+            _publish(self.path, MAGIC, replace=truncate)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CLOEXEC)
+        # the last entry, possibly written by another process
+        size = os.fstat(self.fd).st_size
+        size -= (size - len(MAGIC)) % ENTRY.size
+        self.last_offset = None
+        if size > len(MAGIC):
+            self.last_offset = ENTRY.unpack(os.pread(self.fd, ENTRY.size, size - ENTRY.size))[1]
+        self.records = 0
+
+    def due(self, end: int) -> bool:
+        """Count a record, returns True if it must be indexed
+        Args:
+            end (int): the offset following the record in the log file
+        Returns:
+            bool: call add() with the record
+        """
+        self.records += 1
+        return self.last_offset is None or self.records >= self.every_records or \
+            end - self.last_offset > self.every_bytes
+
+    def add(self, created: float, offset: int) -> None:
+        """Append an entry
+        Args:
+            created (float): the creation time of the record (seconds since the epoch)
+            offset (int): the offset of its first byte in the log file
+        """
+        os.write(self.fd, ENTRY.pack(int(created * 1e9), offset))
+        self.last_offset = offset
+        self.records = 0
+
+    def close(self) -> None:
+        """Close the index"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _publish(path: str, data: bytes, replace: bool) -> None:
+    """Create a file with its content atomically (concurrent writers see it complete)"""
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, 'wb') as file:
+        file.write(data)
+    try:
+        if replace:
+            os.replace(partial, path)
+        else:
+            try:
+                os.link(partial, path)
+            except FileExistsError:
+                pass
+    finally:
+        if os.path.exists(partial):
+            os.unlink(partial)
+
+
+def load(filename: str) -> list:
+    """Returns the entries of the index of a log file
+    Args:
+        filename (str): the log file path
+    Returns:
+        list: (time in nanoseconds, offset) sorted by offset, the entries beyond the end
+         of the log file are ignored. None if there is no valid index
+    """
+    try:
+        with open(index_path(filename), 'rb') as file:
+            data = file.read()
+        size = os.path.getsize(filename)
+    except FileNotFoundError:
+        return None
+    if not data.startswith(MAGIC):
+        return None
+    end = len(data) - (len(data) - len(MAGIC)) % ENTRY.size
+    entries = [entry for entry in ENTRY.iter_unpack(data[len(MAGIC):end]) if entry[1] < size]
+    entries.sort(key=lambda entry: entry[1])
+    return entries
+
+
+def lookup(entries: list, timestamp: float) -> int:
+    """Returns the offset where to start reading the records from a time
+    Args:
+        entries (list): the entries returned by load()
+        timestamp (float): the time (seconds since the epoch)
+    Returns:
+        int: the offset of the last indexed record older than timestamp (0 if none)
+    """
+    times = [entry[0] for entry in entries]
+    position = bisect.bisect_left(times, int(timestamp * 1e9))
+    return entries[position - 1][1] if position else 0
+
+
+def rebuild(filename: str,
+            parser: TimestampParser,
+            every_records: int = EVERY_RECORDS,
+            every_bytes: int = EVERY_BYTES) -> int:
+    """Recreate the index of a log file from its lines
+    Args:
+        filename (str): the log file path
+        parser (TimestampParser): parses the time of the lines
+        every_records (int, optional): records between two entries [default: EVERY_RECORDS]
+        every_bytes (int, optional): bytes between two entries [default: EVERY_BYTES]
+    Returns:
+        int: the number of entries
+    """
+    entries = []
+    last = None
+    records = 0
+    offset = 0
+    with open(filename, 'rb') as file:
+        for line in file:
+            created = parser(line)
+            if created is not None:
+                records += 1
+                if last is None or records >= every_records or offset + len(line) - last > every_bytes:
+                    entries.append(ENTRY.pack(int(created * 1e9), offset))
+                    last = offset
+                    records = 0
+            offset += len(line)
+    _publish(index_path(filename), MAGIC + b''.join(entries), replace=True)
+    return len(entries)
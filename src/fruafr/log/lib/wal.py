@@ -0,0 +1,193 @@
+"""
+Append-only, checksummed write-ahead log (WAL)
+
+Messages are appended to an in-memory batch and written to the WAL file
+with a single sequential write followed by fdatasync. Once the output has
+durably committed the messages, the writer commits the WAL up to the
+matching log sequence number (LSN, the byte offset of the end of a record).
+The committed offset is kept in the file header and the file is truncated
+when everything is committed and it has grown past truncate_size.
+
+On startup, recover() replays the records after the committed offset,
+verifying the CRC32 of each record and discarding a torn tail.
+
+File layout:
+- header: magic (8 bytes) + committed offset (little-endian uint64)
+- records: <II header (payload length, CRC32 of the payload) + payload
+
+Contains:
+- WriteAheadLog
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import mmap
+import os
+import struct
+import zlib
+
+# ---------------------------------------------------------------------------
+#   Miscellaneous module data
+# ---------------------------------------------------------------------------
+#
+# RAISEEXCEPTIONS is used to see if exceptions during handling should be
+# propagated
+#
+RAISEEXCEPTIONS = True
+
+# Defaults
+MAGIC = b'FLWAL001'
+HEADER = struct.Struct('<8sQ')
+RECORD = struct.Struct('<II')
+TRUNCATE_SIZE = 64 * 1024 * 1024
+
+
+class WriteAheadLog:
+    """Append-only checksummed write-ahead log"""
+
+    def __init__(self, path: str, truncate_size: int = TRUNCATE_SIZE, sync: bool = True) -> None:
+        """WriteAheadLog constructor. Opens or creates the WAL file
+        Args:
+            path (str): path of the WAL file
+            truncate_size (int, optional): the file is truncated on commit once it
+             is larger than this size [default: TRUNCATE_SIZE]
+            sync (bool, optional): fdatasync after each batch [default: True]
+        """
+        if not isinstance(path, str):
+            if RAISEEXCEPTIONS:
+                raise TypeError("path must be a string")
+            else:
+                return
+        self._path = path
+        self._truncate_size = truncate_size
+        self._sync = sync
+        self._batch = []
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o640)
+        size = os.fstat(self._fd).st_size
+        if size < HEADER.size:
+            os.ftruncate(self._fd, 0)
+            os.pwrite(self._fd, HEADER.pack(MAGIC, HEADER.size), 0)
+            size = HEADER.size
+            self._committed = HEADER.size
+        else:
+            magic, self._committed = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+            if magic != MAGIC:
+                os.close(self._fd)
+                raise ValueError(f"{path} is not a write-ahead log file")
+        # the end offset is only known after recover() has validated the records
+        self._end = size
+
+    @property
+    def path(self) -> str:
+        """Returns the path of the WAL file"""
+        return self._path
+
+    @property
+    def committed(self) -> int:
+        """Returns the committed offset"""
+        return self._committed
+
+    @property
+    def end(self) -> int:
+        """Returns the LSN of the last record appended (written or not)"""
+        return self._end + sum(RECORD.size + len(payload) for payload in self._batch)
+
+    def append(self, payload: bytes) -> None:
+        """Append a record to the current batch
+        Args:
+            payload (bytes): the record content
+        """
+        self._batch.append(payload)
+
+    def extend(self, payloads: list) -> None:
+        """Append records to the current batch
+        Args:
+            payloads (list): the records content (bytes)
+        """
+        self._batch.extend(payloads)
+
+    def write(self) -> int:
+        """Write the current batch with a single write and sync it
+        Returns:
+            int: the LSN of the last record written
+        """
+        if self._batch:
+            pack = RECORD.pack
+            crc32 = zlib.crc32
+            data = b''.join([pack(len(payload), crc32(payload)) + payload for payload in self._batch])
+            self._batch = []
+            written = 0
+            while written < len(data):
+                written += os.pwrite(self._fd, data[written:], self._end + written)
+            self._end += len(data)
+            if self._sync:
+                os.fdatasync(self._fd)
+        return self._end
+
+    def commit(self, lsn: int) -> None:
+        """Mark the records up to lsn as durably written to the outputs
+        Args:
+            lsn (int): log sequence number returned by write()
+        """
+        if lsn == self._end and self._end > self._truncate_size:
+            os.ftruncate(self._fd, HEADER.size)
+            self._end = HEADER.size
+            lsn = HEADER.size
+        os.pwrite(self._fd, HEADER.pack(MAGIC, lsn), 0)
+        self._committed = lsn
+
+    def recover(self):
+        """Iterate over the records written but not committed.
+        Scanning stops at the first record with a bad checksum: the torn
+        tail is truncated.
+        Returns:
+            Iterator over the payloads (bytes)
+        """
+        size = os.fstat(self._fd).st_size
+        offset = self._committed
+        if size > offset:
+            with mmap.mmap(self._fd, size, access=mmap.ACCESS_READ) as view:
+                while offset + RECORD.size <= size:
+                    length, crc = RECORD.unpack_from(view, offset)
+                    start = offset + RECORD.size
+                    if start + length > size:
+                        break
+                    payload = view[start:start + length]
+                    if zlib.crc32(payload) != crc:
+                        break
+                    offset = start + length
+                    yield payload
+        if offset != size:
+            os.ftruncate(self._fd, offset)
+        self._end = offset
+
+    def reset(self) -> None:
+        """Discard every record (after a successful recovery)"""
+        self._batch = []
+        os.ftruncate(self._fd, HEADER.size)
+        os.pwrite(self._fd, HEADER.pack(MAGIC, HEADER.size), 0)
+        if self._sync:
+            os.fdatasync(self._fd)
+        self._end = self._committed = HEADER.size
+
+    def close(self) -> None:
+        """Close the WAL file"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __str__(self) -> str:
+        """String representation of the object
+        Returns:
+            The string representation of the object
+        """
+        return f"{self.__class__}({self._path})"
+
+    def __repr__(self) -> str:
+        """Representation of the object
+        Returns:
+            The representation of the object
+        """
+        return f"{self.__class__}({self.__dict__})"
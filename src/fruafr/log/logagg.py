@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# pylint: disable=line-too-long
+"""
+CLI - Aggregate columnar log files
+
+Counts the records of columnar log files (logtofile or tinysyslogserver
+--output-format columnar) by time interval (histogram), level, facility,
+host or app, from the columns of each block: no line is parsed and no
+object is created per record (NumPy is used if installed). The blocks out
+of the --since/--until range are skipped with their minimum and maximum
+times. With --dump, the records are printed as text lines instead.
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from fruafr.log import logread
+from fruafr.log.lib import columnar
+
+# Defaults
+BY = 'time'
+DATEFORMAT = '%Y-%m-%d %H:%M:%S'
+WRITE_SIZE = 1024 * 1024
+
+
+class Console(object):
+    """Class Console
+    Parses the command line arguments
+    """
+
+    def parse_args(self, args) -> argparse.Namespace:
+        """Parse the arguments from the command line
+        Args:
+            args (list): the list of arguments from the command line
+        Returns:
+            the argparse.Namespace object containing the parsed arguments
+        """
+        parser = argparse.ArgumentParser(
+            prog='CLI - Aggregate columnar log files\n',
+            description='Counts the records of columnar log files by time, level, facility, host or app.',
+            epilog='e.g. logagg /var/log/syslog.col --by host --top 10 --since 2023-10-13T08:00')
+        parser.add_argument('files', nargs='+',
+                            help='The columnar log files (--output-format columnar)')
+        parser.add_argument('-b', '--by', dest='by', choices=columnar.KEYS, default=BY,
+                            help=f"Count the records by time interval (histogram), level, facility, host or app [Default: {BY}]")
+        parser.add_argument('-i', '--interval', dest='interval', type=int, default=columnar.INTERVAL,
+                            help=f"With --by time, the seconds of the intervals [Default: {columnar.INTERVAL}]")
+        parser.add_argument('-n', '--top', dest='top', type=int,
+                            help='Only the N keys with the most records [Default: all, by time for --by time, by count otherwise]')
+        parser.add_argument('--since', dest='since',
+                            help='Count the records from this time: seconds since the epoch, YYYY-MM-DD[ HH:MM[:SS]] or HH:MM[:SS] (today)')
+        parser.add_argument('--until', dest='until',
+                            help='Count the records before this time: seconds since the epoch, YYYY-MM-DD[ HH:MM[:SS]] or HH:MM[:SS] (today)')
+        parser.add_argument('--json', dest='json', action='store_true', default=False,
+                            help='Print a JSON object {key: count} instead of lines')
+        parser.add_argument('--dump', dest='dump', action='store_true', default=False,
+                            help='Print the records as text lines instead of counting them')
+        return parser.parse_args(args)
+
+    def _time_range(self, args: argparse.Namespace) -> tuple:
+        """Returns the (since, until) times, None if not set"""
+        bounds = []
+        for text in (args.since, args.until):
+            try:
+                bounds.append(None if text is None else logread.parse_time(text))
+            except ValueError:
+                print(f"Invalid time: {text}", file=sys.stderr)
+                sys.exit(1)
+        return tuple(bounds)
+
+    def _blocks(self, files: list):
+        """Yield the blocks of the files"""
+        for path in files:
+            yield from columnar.read_blocks(path)
+
+    def _dump(self, args: argparse.Namespace, since: float, until: float) -> int:
+        """Print the records, returns their number"""
+        count = 0
+        output = open(sys.stdout.fileno(), 'w', encoding='utf-8', buffering=WRITE_SIZE, closefd=False)
+        try:
+            for created, level, facility, host, app, message in \
+                    columnar.records(self._blocks(args.files), since, until):
+                stamp = time.strftime(DATEFORMAT, time.localtime(created))
+                output.write(f"{stamp},{int(created % 1 * 1000):03d} {logging.getLevelName(level)} "
+                             f"{columnar.FACILITY_NAMES.get(facility, '-')} {host or '-'} {app or '-'} {message}\n")
+                count += 1
+            output.flush()
+        except BrokenPipeError:
+            # e.g. piped to head
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return count
+
+    def process(self, args: argparse.Namespace) -> dict:
+        """Process the command line arguments
+        Args:
+            args (argparser.Namespace): Command line arguments
+        Returns:
+            dict: the counts by key (None with --dump)
+        """
+        if args.interval < 1 or (args.top is not None and args.top < 1):
+            print("--interval and --top must be at least 1", file=sys.stderr)
+            sys.exit(1)
+        for path in args.files:
+            if not os.access(path, os.R_OK):
+                print(f"Cannot read {path}", file=sys.stderr)
+                sys.exit(1)
+        since, until = self._time_range(args)
+        try:
+            if args.dump:
+                self._dump(args, since, until)
+                return None
+            counts = columnar.count_by(self._blocks(args.files), args.by, args.interval, since, until)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        items = columnar.top(counts, args.top)
+        if args.by == 'time':
+            # a histogram
+            items.sort()
+            items = [(time.strftime(DATEFORMAT, time.localtime(bucket)), number) for bucket, number in items]
+        if args.json:
+            print(json.dumps(dict(items)))
+        else:
+            width = len(str(max(counts.values(), default=0)))
+            sys.stdout.writelines(f"{number:>{width}} {key}\n" for key, number in items)
+        return dict(items)
+
+
+def main():
+    """Main : CLI logic"""
+    # parse arguments
+    args = Console().parse_args(sys.argv[1:])
+    # process arguments
+    Console().process(args)
+
+
+if __name__ == "__main__":
+    main()
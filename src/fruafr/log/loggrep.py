@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+# pylint: disable=line-too-long
+"""
+CLI - Search log files in parallel
+
+The lines matching a regular expression are searched in the log files (and
+with --rotated, in their rotated files, e.g. a month of logs rotated and
+compressed by logtofile) by a pool of --jobs processes. Each gzip file is
+a task (the decompression dominates), the uncompressed files are split in
+--chunksize tasks cut at line starts and searched through a memory mapping.
+The regular expression is compiled once per process, on bytes: the lines
+are not decoded, and the search runs over whole blocks, a line being
+extracted only around a match.
+
+With --since and/or --until, the lines are parsed with --format and
+--dateformat (the ones of the writer):
+- an uncompressed file is cut to the time range by bisection, starting
+  from its FILE.idx time index (logtofile --index) if any
+- the files of a rotation are in time order (their names): a gzip file is
+  skipped when its first time is after the range or when the first time
+  of the next file is before it. The other gzip files are filtered line by
+  line (a line without a time has the time of the previous line), and
+  their search stops at the end of the range
+
+The results are written in file order, then offset order. At most 2 x
+--jobs tasks are in flight, and a task holding more than RESULT_SIZE bytes
+of matching lines spills them to a temporary file: the memory is bounded
+whatever the number of files and matches.
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import collections
+import mmap
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+from fruafr.log import logmerge
+from fruafr.log import logread
+from fruafr.log.lib import mmapfile
+from fruafr.log.lib import rotation
+from fruafr.log.lib import timeindex
+
+# Defaults
+FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+CHUNK_SIZE = 64 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+RESULT_SIZE = 8 * 1024 * 1024
+FIRST_LINES = 1000
+WRITE_SIZE = 1024 * 1024
+
+# Task of the search of a file: (path, start, end, compressed, prefix),
+# end is None for a gzip file
+Task = collections.namedtuple('Task', 'path start end compressed prefix')
+
+# the search settings of a worker process (init_worker)
+_search = {}
+
+
+def init_worker(pattern: bytes, flags: int, fmt: str, datefmt: str, since: float, until: float) -> None:
+    """Compile the search settings of the process
+    Args:
+        pattern (bytes): the regular expression
+        flags (int): the re flags
+        fmt (str): the logging format of the files (with since or until)
+        datefmt (str): the date format of the files (with since or until)
+        since (float): the start of the time range, None for none
+        until (float): the end of the time range, None for none
+    """
+    _search['regex'] = re.compile(pattern, flags | re.MULTILINE)
+    _search['parser'] = timeindex.TimestampParser(fmt, datefmt) if since is not None or until is not None else None
+    _search['since'] = since
+    _search['until'] = until
+
+
+class Results:
+    """The matching lines of a task, spilled to a temporary file beyond RESULT_SIZE bytes"""
+
+    def __init__(self) -> None:
+        self.pieces = []
+        self.size = 0
+        self.lines = 0
+        self.spill = None
+
+    def add(self, prefix: bytes, line: bytes) -> None:
+        """Add a matching line"""
+        self.pieces.append(prefix)
+        self.pieces.append(line if line.endswith(b'\n') else line + b'\n')
+        self.size += len(prefix) + len(line) + 1
+        self.lines += 1
+        if self.size > RESULT_SIZE:
+            if self.spill is None:
+                self.spill = tempfile.NamedTemporaryFile(prefix='loggrep-', delete=False)
+            self.spill.write(b''.join(self.pieces))
+            self.pieces = []
+            self.size = 0
+
+    def result(self) -> tuple:
+        """Returns (lines, data, spill file path or None)"""
+        data = b''.join(self.pieces)
+        if self.spill is None:
+            return self.lines, data, None
+        self.spill.write(data)
+        self.spill.close()
+        return self.lines, b'', self.spill.name
+
+
+def match_lines(regex, data, start: int, end: int):
+    """Yield the lines of data containing a match
+    Args:
+        regex (re.Pattern): the compiled bytes regular expression
+        data (bytes or mmap.mmap): the lines
+        start (int): a line start
+        end (int): the end of the lines
+    Yields:
+        tuple: (line start, line end) of each matching line
+    """
+    position = start
+    while position < end:
+        match = regex.search(data, position, end)
+        if match is None:
+            return
+        newline = data.rfind(b'\n', start, match.start())
+        line_start = start if newline == -1 else newline + 1
+        newline = data.find(b'\n', max(match.start(), match.end() - 1), end)
+        position = end if newline == -1 else newline + 1
+        yield line_start, position
+
+
+def record_time(parser: timeindex.TimestampParser, data, line_start: int, start: int, previous: float) -> float:
+    """Returns the time of the record containing a line: the time of the line, or of the
+    previous lines for a continuation line
+    Args:
+        parser (timeindex.TimestampParser): parses the time of the lines
+        data (bytes): the lines
+        line_start (int): the start of the line
+        start (int): the start of the lines
+        previous (float): the time before the lines, None if unknown
+    Returns:
+        float: the time, previous if no line has one
+    """
+    while True:
+        created = parser(data[line_start:logread.next_line(data, line_start, len(data))])
+        if created is not None:
+            return created
+        if line_start <= start:
+            return previous
+        newline = data.rfind(b'\n', start, line_start - 1)
+        line_start = start if newline == -1 else newline + 1
+
+
+def _search_mapped(task: Task, results: Results) -> None:
+    """Search a chunk of an uncompressed file"""
+    regex = _search['regex']
+    with open(task.path, 'rb') as file, mmap.mmap(file.fileno(), task.end, access=mmap.ACCESS_READ) as data:
+        for line_start, line_end in match_lines(regex, data, task.start, task.end):
+            results.add(task.prefix, data[line_start:line_end])
+
+
+def _search_compressed(task: Task, results: Results) -> None:
+    """Search a gzip file, block by block of complete lines"""
+    regex, parser = _search['regex'], _search['parser']
+    since, until = _search['since'], _search['until']
+    previous = None
+    carry = b''
+    with logmerge.open_log(task.path) as file:
+        while True:
+            block = file.read(READ_SIZE)
+            data = carry + block
+            end = len(data) if not block else data.rfind(b'\n') + 1
+            carry = data[end:]
+            for line_start, line_end in match_lines(regex, data, 0, end):
+                if parser is not None:
+                    created = record_time(parser, data, line_start, 0, previous)
+                    if created is not None and ((since is not None and created < since) or
+                                                (until is not None and created >= until)):
+                        continue
+                results.add(task.prefix, data[line_start:line_end])
+            if not block:
+                return
+            if parser is not None and end:
+                previous = record_time(parser, data, data.rfind(b'\n', 0, end - 1) + 1, 0, previous)
+                if until is not None and previous is not None and previous >= until:
+                    # the next lines are later
+                    return
+
+
+def search(task: Task) -> tuple:
+    """Search a task (in a worker process, after init_worker)
+    Args:
+        task (Task): the file or file chunk
+    Returns:
+        tuple: (lines, data, spill file path or None) the matching lines, in memory or in a
+         temporary file to remove
+    """
+    results = Results()
+    if task.compressed:
+        _search_compressed(task, results)
+    else:
+        _search_mapped(task, results)
+    return results.result()
+
+
+def is_compressed(path: str) -> bool:
+    """Returns True if the file is gzipped"""
+    with open(path, 'rb') as file:
+        return file.read(2) == logmerge.GZIP_MAGIC
+
+
+def first_time(path: str, parser: timeindex.TimestampParser) -> float:
+    """Returns the time of the first line with a time in the first lines of a file (plain or gzip), None if none"""
+    with logmerge.open_log(path) as file:
+        for _, line in zip(range(FIRST_LINES), file):
+            created = parser(line)
+            if created is not None:
+                return created
+    return None
+
+
+class Console(object):
+    """Class Console
+    Parses the command line arguments
+    """
+
+    def parse_args(self, args) -> argparse.Namespace:
+        """Parse the arguments from the command line
+        Args:
+            args (list): the list of arguments from the command line
+        Returns:
+            the argparse.Namespace object containing the parsed arguments
+        """
+        parser = argparse.ArgumentParser(
+            prog='CLI - Search log files in parallel\n',
+            description='Searches log files, rotated and compressed or not, with a pool of processes.',
+            epilog='e.g. loggrep "timeout|refused" app.log --rotated --since 2023-10-01 --until 2023-10-08')
+        parser.add_argument('pattern',
+                            help='Python regular expression searched in the lines')
+        parser.add_argument('files', nargs='+',
+                            help='The log files (plain or gzip)')
+        parser.add_argument('-i', '--ignore-case', dest='ignore_case', action='store_true', default=False,
+                            help='Ignore case distinctions (ASCII)')
+        parser.add_argument('-F', '--fixed-strings', dest='fixed', action='store_true', default=False,
+                            help='The pattern is a string, not a regular expression')
+        parser.add_argument('-r', '--rotated', dest='rotated', action='store_true', default=False,
+                            help='Search the rotated files of each file (FILE.YYYYmmdd-HHMMSS[.gz], logtofile --maxbytes/--when) before it')
+        parser.add_argument('--since', dest='since',
+                            help='Search the lines from this time: seconds since the epoch, YYYY-MM-DD[ HH:MM[:SS]] or HH:MM[:SS] (today)')
+        parser.add_argument('--until', dest='until',
+                            help='Search the lines before this time (same syntax as --since)')
+        parser.add_argument('-f', '--format', dest='format', default=FORMAT,
+                            help=f"Python logging format of the writer, with %%(asctime)s or %%(created)f [Default: {FORMAT.replace('%', '%%')}]")
+        parser.add_argument('-df', '--dateformat', dest='dateformat',
+                            help='Datetime format of the writer [Default: the logging default, %%Y-%%m-%%d %%H:%%M:%%S,mmm]')
+        parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=os.cpu_count() or 1,
+                            help='Number of search processes, 1 to search in this process [Default: the number of CPUs]')
+        parser.add_argument('--chunksize', dest='chunksize', type=int, default=CHUNK_SIZE,
+                            help=f"Size in bytes of the chunks of the uncompressed files searched by each process [Default: {CHUNK_SIZE}]")
+        parser.add_argument('--no-filename', dest='no_filename', action='store_true', default=False,
+                            help='Do not prefix the lines with the file name (the default with a single file)')
+        return parser.parse_args(args)
+
+    def _time_range(self, args: argparse.Namespace) -> tuple:
+        """Returns the (since, until) times, None if not set"""
+        bounds = []
+        for text in (args.since, args.until):
+            try:
+                bounds.append(None if text is None else logread.parse_time(text))
+            except ValueError:
+                print(f"Invalid time: {text}", file=sys.stderr)
+                sys.exit(1)
+        return tuple(bounds)
+
+    def _file_tasks(self, path: str, prefix: bytes, args: argparse.Namespace, parser, since: float, until: float):
+        """Yield the tasks of an uncompressed file: the chunks of its time range"""
+        end = mmapfile.live_end(path)
+        if end == 0:
+            return
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), end, access=mmap.ACCESS_READ) as data:
+            # the bytes after the last newline are a line being written
+            start, end = 0, data.rfind(b'\n', 0, end) + 1
+            if until is not None:
+                end = logread.bisect_time(data, logread.index_start(path, data, until, start, end), end, until, parser)
+            if since is not None:
+                start = logread.bisect_time(data, logread.index_start(path, data, since, start, end), end, since, parser)
+            while start < end:
+                chunk_end = logread.next_line(data, min(start + args.chunksize, end) - 1, end)
+                yield Task(path, start, chunk_end, False, prefix)
+                start = chunk_end
+
+    def _tasks(self, args: argparse.Namespace, parser, since: float, until: float) -> list:
+        """Returns the tasks, in output order (files given, their rotated files first)"""
+        groups = [(rotation.rotated_files(path) if args.rotated else []) + [path] for path in args.files]
+        paths = [path for group in groups for path in group]
+        for path in paths:
+            if not os.access(path, os.R_OK):
+                print(f"Cannot read {path}", file=sys.stderr)
+                sys.exit(1)
+        tag = not args.no_filename and len(paths) > 1
+        tasks = []
+        for group in groups:
+            firsts = [first_time(path, parser) for path in group] if parser is not None else None
+            for position, path in enumerate(group):
+                prefix = f"{path}:".encode() if tag else b''
+                if not is_compressed(path):
+                    tasks.extend(self._file_tasks(path, prefix, args, parser, since, until))
+                    continue
+                if firsts is not None:
+                    # the times of a file are between its first time and the first time of the next file
+                    lower = firsts[position]
+                    upper = next((first for first in firsts[position + 1:] if first is not None), None)
+                    if (until is not None and lower is not None and lower >= until) or \
+                       (since is not None and upper is not None and upper < since):
+                        continue
+                tasks.append(Task(path, 0, None, True, prefix))
+        return tasks
+
+    def _write(self, result: tuple, output) -> int:
+        """Write the result of a task, returns its number of lines"""
+        lines, data, spill = result
+        if spill is None:
+            output.write(data)
+            return lines
+        try:
+            with open(spill, 'rb') as file:
+                shutil.copyfileobj(file, output, WRITE_SIZE)
+        finally:
+            os.unlink(spill)
+        return lines
+
+    def process(self, args: argparse.Namespace) -> int:
+        """Process the command line arguments
+        Args:
+            args (argparser.Namespace): Command line arguments
+        Returns:
+            int: the number of matching lines
+        """
+        if args.jobs < 1 or args.chunksize < 1:
+            print("--jobs and --chunksize must be positive", file=sys.stderr)
+            sys.exit(1)
+        pattern = re.escape(args.pattern) if args.fixed else args.pattern
+        flags = re.IGNORECASE if args.ignore_case else 0
+        try:
+            re.compile(pattern.encode(), flags)
+        except re.error as e:
+            print(f"Invalid pattern: {e}", file=sys.stderr)
+            sys.exit(1)
+        since, until = self._time_range(args)
+        parser = None
+        if since is not None or until is not None:
+            try:
+                parser = timeindex.TimestampParser(args.format, args.dateformat)
+            except ValueError:
+                print("--since and --until require %(asctime)s or %(created)f in the format", file=sys.stderr)
+                sys.exit(1)
+        settings = (pattern.encode(), flags, args.format, args.dateformat, since, until)
+        count = 0
+        output = open(sys.stdout.fileno(), 'wb', buffering=WRITE_SIZE, closefd=False)
+        try:
+            tasks = self._tasks(args, parser, since, until)
+            if args.jobs == 1 or len(tasks) <= 1:
+                init_worker(*settings)
+                for task in tasks:
+                    count += self._write(search(task), output)
+            else:
+                with multiprocessing.Pool(args.jobs, init_worker, settings) as pool:
+                    # the results are written in order, with at most 2 x jobs tasks in flight
+                    pending = collections.deque()
+                    try:
+                        for task in tasks:
+                            if len(pending) >= 2 * args.jobs:
+                                count += self._write(pending.popleft().get(), output)
+                            pending.append(pool.apply_async(search, (task,)))
+                        while pending:
+                            count += self._write(pending.popleft().get(), output)
+                    finally:
+                        # the spill files of the results not written (e.g. broken pipe)
+                        for result in pending:
+                            if result.ready() and result.successful() and result.get()[2] is not None:
+                                os.unlink(result.get()[2])
+            output.flush()
+        except BrokenPipeError:
+            # e.g. piped to head
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        except (OSError, EOFError) as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        return count
+
+
+def main():
+    """Main : CLI logic"""
+    # parse arguments
+    args = Console().parse_args(sys.argv[1:])
+    # process arguments
+    Console().process(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# pylint: disable=line-too-long
+"""
+CLI - Merge log files by time
+
+The inputs (e.g. the logs of several services) are merged into a single
+time-ordered stream, each line prefixed with the tag of its input. The time
+of the lines of each input is parsed with its own --format and
+--dateformat. The inputs are read lazily and merged with a heap: the
+memory used is one record per input, whatever their size. The gzip inputs
+(e.g. rotated by logtofile --compress) are decompressed on the fly, and with
+--rotated the rotated files of each input are read before it.
+
+Each input is assumed to be in time order. The lines that do not start with
+the format (e.g. the continuation of a multiline message) stay with the
+previous line.
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import gzip
+import heapq
+import itertools
+import operator
+import os
+import sys
+
+from fruafr.log.lib import rotation
+from fruafr.log.lib import timeindex
+
+# Defaults
+FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+TAGSEP = ' '
+READ_SIZE = 1024 * 1024
+WRITE_SIZE = 1024 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def open_log(path: str):
+    """Open a log file for reading, decompressing it if it is gzipped
+    Args:
+        path (str): the file path
+    Returns:
+        a binary file object
+    """
+    file = open(path, 'rb', buffering=READ_SIZE)
+    if file.peek(2)[:2] == GZIP_MAGIC:
+        file.close()
+        return gzip.open(path, 'rb')
+    return file
+
+
+def read_records(paths: list, parser: timeindex.TimestampParser, index: int):
+    """Yield the records of an input: a line with a time and its continuation lines
+    Args:
+        paths (list): the files of the input, read in turn (e.g. the rotated files, then the log file)
+        parser (timeindex.TimestampParser): parses the time of the lines
+        index (int): the index of the input
+    Yields:
+        tuple: (time, index, lines). The lines before the first time get the time 0
+    """
+    created = 0.0
+    lines = []
+    for path in paths:
+        with open_log(path) as file:
+            for line in file:
+                if not line.endswith(b'\n'):
+                    line += b'\n'
+                parsed = parser(line)
+                if parsed is not None:
+                    if lines:
+                        yield created, index, lines
+                    created = parsed
+                    lines = []
+                lines.append(line)
+    if lines:
+        yield created, index, lines
+
+
+def merge(inputs: list):
+    """Merge the records of the inputs by time
+    Args:
+        inputs (list): the record iterators (read_records)
+    Returns:
+        iterator: the records in time order (the records with the same time in input order)
+    """
+    return heapq.merge(*inputs, key=operator.itemgetter(0, 1))
+
+
+def _per_input(values: list, count: int, default):
+    """Returns one value per input: the i-th value, the last one for the others"""
+    values = values or [default]
+    return values + values[-1:] * (count - len(values))
+
+
+class Console(object):
+    """Class Console
+    Parses the command line arguments
+    """
+
+    def parse_args(self, args) -> argparse.Namespace:
+        """Parse the arguments from the command line
+        Args:
+            args (list): the list of arguments from the command line
+        Returns:
+            the argparse.Namespace object containing the parsed arguments
+        """
+        parser = argparse.ArgumentParser(
+            prog='CLI - Merge log files by time\n',
+            description='Merges log files written with different formats into a single time-ordered stream.',
+            epilog='e.g. logmerge api.log worker.log -f "%%(asctime)s - %%(levelname)s - %%(message)s" -f "%%(created)f %%(message)s"')
+        parser.add_argument('files', nargs='+',
+                            help='The log files (plain or gzip)')
+        parser.add_argument('-f', '--format', dest='formats', action='append',
+                            help=f"Python logging format of the i-th file (the last one for the next files), with %%(asctime)s or %%(created)f [Default: {FORMAT.replace('%', '%%')}]")
+        parser.add_argument('-df', '--dateformat', dest='dateformats', action='append',
+                            help='Datetime format of the i-th file (the last one for the next files) [Default: the logging default, %%Y-%%m-%%d %%H:%%M:%%S,mmm]')
+        parser.add_argument('-t', '--tag', dest='tags', action='append',
+                            help='Tag of the lines of the i-th file [Default: the file name]')
+        parser.add_argument('--tagsep', dest='tagsep', default=TAGSEP,
+                            help=f"Separator between the tag and the line [Default: '{TAGSEP}']")
+        parser.add_argument('--notag', dest='notag', action='store_true', default=False,
+                            help='Do not tag the lines')
+        parser.add_argument('-r', '--rotated', dest='rotated', action='store_true', default=False,
+                            help='Read the rotated files of each file (FILE.YYYYmmdd-HHMMSS[.gz], logtofile --maxbytes/--when) before it')
+        return parser.parse_args(args)
+
+    def _prepare_inputs(self, args: argparse.Namespace) -> tuple:
+        """Returns the record iterators and the tags of the inputs"""
+        count = len(args.files)
+        formats = _per_input(args.formats, count, FORMAT)
+        dateformats = _per_input(args.dateformats, count, None)
+        tags = (args.tags or []) + [os.path.basename(path) for path in args.files[len(args.tags or []):]]
+        inputs = []
+        for index, path in enumerate(args.files):
+            try:
+                parser = timeindex.TimestampParser(formats[index], dateformats[index])
+            except ValueError:
+                print(f"The format of {path} has no %(asctime)s or %(created)f field", file=sys.stderr)
+                sys.exit(1)
+            paths = (rotation.rotated_files(path) if args.rotated else []) + [path]
+            for name in paths:
+                if not os.access(name, os.R_OK):
+                    print(f"Cannot read {name}", file=sys.stderr)
+                    sys.exit(1)
+            inputs.append(read_records(paths, parser, index))
+        prefixes = [b''] * count if args.notag else \
+            [f"{tag}{args.tagsep}".encode() for tag in tags[:count]]
+        return inputs, prefixes
+
+    def process(self, args: argparse.Namespace) -> int:
+        """Process the command line arguments
+        Args:
+            args (argparser.Namespace): Command line arguments
+        Returns:
+            int: the number of records written
+        """
+        inputs, prefixes = self._prepare_inputs(args)
+        count = 0
+        output = open(sys.stdout.fileno(), 'wb', buffering=WRITE_SIZE, closefd=False)
+        try:
+            for _, index, lines in merge(inputs):
+                prefix = prefixes[index]
+                output.write(prefix.join(itertools.chain((b'',), lines)) if prefix else b''.join(lines))
+                count += 1
+            output.flush()
+        except BrokenPipeError:
+            # e.g. piped to head
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        except (OSError, EOFError) as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        return count
+
+
+def main():
+    """Main : CLI logic"""
+    # parse arguments
+    args = Console().parse_args(sys.argv[1:])
+    # process arguments
+    Console().process(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# pylint: disable=line-too-long
+"""
+CLI - Read the last lines or a time range of a large log file
+
+The file is memory-mapped: the last N lines are found by scanning it
+backwards from its end, and the boundaries of a time range are found by
+bisecting it, parsing the time of the lines with the --format and
+--dateformat used by the writer (logtofile or tinysyslogserver). Only the
+pages around the probes are read: O(log n) seeks instead of a full scan.
+The FILE.idx time index (logtofile --index), if any, narrows the bisection.
+
+The lines are written to stdout with large writes straight from the
+mapping. The file is assumed to be written in time order. The lines that do
+not start with the format (e.g. the continuation of a multiline message)
+belong to the previous line.
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import datetime
+import mmap
+import os
+import sys
+
+from fruafr.log.lib import mmapfile
+from fruafr.log.lib import timeindex
+
+# Defaults
+FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+WRITE_SIZE = 1024 * 1024
+
+
+def parse_time(text: str) -> float:
+    """Returns the time of a --since/--until argument
+    Args:
+        text (str): seconds since the epoch, an ISO 8601 date and time, or a time of
+         the current day (HH:MM[:SS])
+    Returns:
+        float: the time (seconds since the epoch)
+    Raises:
+        ValueError: the text is not a time
+    """
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        pass
+    clock = datetime.time.fromisoformat(text)
+    return datetime.datetime.combine(datetime.date.today(), clock).timestamp()
+
+
+def next_line(data, offset: int, end: int) -> int:
+    """Returns the start of the line following the one containing offset (end if none)"""
+    newline = data.find(b'\n', offset, end)
+    return end if newline == -1 else newline + 1
+
+
+def first_timed_line(data, offset: int, end: int, parser: timeindex.TimestampParser) -> tuple:
+    """Returns the time and the start of the first line starting with a time from offset
+    Args:
+        data (mmap.mmap): the file
+        offset (int): a line start
+        end (int): the end of the lines
+        parser (timeindex.TimestampParser): parses the time of the lines
+    Returns:
+        tuple: (time, line start), (None, end) if there is none
+    """
+    while offset < end:
+        following = next_line(data, offset, end)
+        created = parser(data[offset:following])
+        if created is not None:
+            return created, offset
+        offset = following
+    return None, end
+
+
+def bisect_time(data, start: int, end: int, target: float, parser: timeindex.TimestampParser) -> int:
+    """Returns the start of the first line with a time at or after target
+    Args:
+        data (mmap.mmap): the file
+        start (int): a line start, not after the result
+        end (int): the end of the lines, not before the result
+        target (float): the time (seconds since the epoch)
+        parser (timeindex.TimestampParser): parses the time of the lines
+    Returns:
+        int: the line start (end if all the lines are older)
+    """
+    low, high = start, end
+    while low < high:
+        middle = (low + high) // 2
+        probe = low if middle == low else next_line(data, middle - 1, high)
+        if probe >= high:
+            # within the last line of the range
+            probe = low
+        created, line = first_timed_line(data, probe, high, parser)
+        if created is None or created >= target:
+            high = probe
+        else:
+            low = next_line(data, line, high)
+    # the continuation lines at low belong to an older record
+    return first_timed_line(data, low, end, parser)[1]
+
+
+def tail_start(data, start: int, end: int, count: int) -> int:
+    """Returns the start of the last count lines between start and end
+    Args:
+        data (mmap.mmap): the file
+        start (int): a line start
+        end (int): the end of the lines
+        count (int): the number of lines
+    Returns:
+        int: the line start
+    """
+    position = end
+    # the newline ending the last line
+    if position > start and data[position - 1:position] == b'\n':
+        position -= 1
+    for _ in range(count):
+        newline = data.rfind(b'\n', start, position)
+        if newline == -1:
+            return start
+        position = newline
+    return position + 1
+
+
+def index_start(filename: str, data, target: float, start: int, end: int) -> int:
+    """Returns where to start the bisection of a time, with the time index of the file
+    (the indexed times are more precise than the parsed ones: only the records older
+    than the time are skipped)
+    Args:
+        filename (str): the log file
+        data (mmap.mmap): the file
+        target (float): the time (seconds since the epoch)
+        start (int): a line start
+        end (int): the end of the lines
+    Returns:
+        int: a line start, not before start
+    """
+    entries = timeindex.load(filename)
+    if not entries:
+        return start
+    offset = min(timeindex.lookup(entries, target), end)
+    if offset > start and data[offset - 1:offset] != b'\n':
+        # not written by the index writer of this file
+        offset = next_line(data, offset, end)
+    return max(offset, start)
+
+
+def write_range(data, start: int, end: int, output) -> None:
+    """Write the bytes of the file between start and end with large writes
+    Args:
+        data (mmap.mmap): the file
+        start (int): the first byte
+        end (int): the end
+        output (io.BufferedWriter): the output
+    """
+    view = memoryview(data)
+    try:
+        for offset in range(start, end, WRITE_SIZE):
+            output.write(view[offset:min(offset + WRITE_SIZE, end)])
+    finally:
+        view.release()
+
+
+class Console(object):
+    """Class Console
+    Parses the command line arguments
+    """
+
+    def parse_args(self, args) -> argparse.Namespace:
+        """Parse the arguments from the command line
+        Args:
+            args (list): the list of arguments from the command line
+        Returns:
+            the argparse.Namespace object containing the parsed arguments
+        """
+        parser = argparse.ArgumentParser(
+            prog='CLI - Read the last lines or a time range of a log file\n',
+            description='Reads a log file written by logtofile or tinysyslogserver without scanning it.',
+            epilog='e.g. logread app.log -n 1000, logread app.log --since 10:02 --until 10:07')
+        parser.add_argument('file',
+                            help='The log file')
+        parser.add_argument('-n', '--lines', dest='lines', type=int,
+                            help='Output the last N lines (of the time range with --since/--until) [Default: all the lines]')
+        parser.add_argument('--since', dest='since',
+                            help='Output the lines from this time: seconds since the epoch, YYYY-MM-DD[ HH:MM[:SS]] or HH:MM[:SS] (today)')
+        parser.add_argument('--until', dest='until',
+                            help='Output the lines before this time (same syntax as --since)')
+        parser.add_argument('-f', '--format', dest='format', default=FORMAT,
+                            help=f"Python logging format of the writer, with %%(asctime)s or %%(created)f [Default: {FORMAT.replace('%', '%%')}]")
+        parser.add_argument('-df', '--dateformat', dest='dateformat',
+                            help='Datetime format of the writer [Default: the logging default, %%Y-%%m-%%d %%H:%%M:%%S,mmm]')
+        return parser.parse_args(args)
+
+    def _time_bound(self, args: argparse.Namespace, data, start: int, end: int, text: str,
+                    parser: timeindex.TimestampParser) -> int:
+        """Returns the start of the first line at or after the time of a --since/--until argument"""
+        try:
+            target = parse_time(text)
+        except ValueError:
+            print(f"Invalid time: {text}", file=sys.stderr)
+            sys.exit(1)
+        return bisect_time(data, index_start(args.file, data, target, start, end), end, target, parser)
+
+    def process(self, args: argparse.Namespace) -> tuple:
+        """Process the command line arguments
+        Args:
+            args (argparser.Namespace): Command line arguments
+        Returns:
+            tuple: the (start, end) offsets of the lines written
+        """
+        if args.lines is not None and args.lines < 0:
+            print("--lines must be positive", file=sys.stderr)
+            sys.exit(1)
+        parser = None
+        if args.since is not None or args.until is not None:
+            try:
+                parser = timeindex.TimestampParser(args.format, args.dateformat)
+            except ValueError:
+                print("--since and --until require %(asctime)s or %(created)f in the format", file=sys.stderr)
+                sys.exit(1)
+        try:
+            end = mmapfile.live_end(args.file)
+            with open(args.file, 'rb') as file:
+                if end == 0:
+                    return 0, 0
+                data = mmap.mmap(file.fileno(), end, access=mmap.ACCESS_READ)
+        except OSError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        with data:
+            # the bytes after the last newline are a line being written
+            end = data.rfind(b'\n', 0, end) + 1
+            start = 0
+            if args.until is not None:
+                end = self._time_bound(args, data, start, end, args.until, parser)
+            if args.since is not None:
+                start = self._time_bound(args, data, start, end, args.since, parser)
+            if args.lines is not None:
+                start = max(start, tail_start(data, start, end, args.lines))
+            try:
+                write_range(data, start, end, sys.stdout.buffer)
+                sys.stdout.buffer.flush()
+            except BrokenPipeError:
+                # e.g. piped to head
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return start, end
+
+
+def main():
+    """Main : CLI logic"""
+    # parse arguments
+    args = Console().parse_args(sys.argv[1:])
+    # process arguments
+    Console().process(args)
+
+
+if __name__ == "__main__":
+    main()
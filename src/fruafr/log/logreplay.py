@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# pylint: disable=line-too-long
+"""
+CLI - Replay a syslog capture file (written by tinysyslogserver --capture)
+
+The datagrams/frames are sent back over UDP, TCP (octet counted framing) or
+a UNIX socket, at the original pacing, N times faster, or as fast as
+possible. The capture is indexed once (record headers only) and cut into
+chunks of SHARE_RECORDS records dealt round-robin to the sender processes,
+each one reading only its own chunks.
+
+The achieved rate is reported as JSON on stdout. With --verify, the lines
+appended to the server log file are counted to report the loss.
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import sys
+import time
+
+from fruafr.log.lib import capture
+from fruafr.log.lib import framing
+
+# Defaults
+DEFAULT_ADDR = '127.0.0.1'
+DEFAULT_PORT = '514'
+SPEED = 1.0
+PROCESSES = 1
+SETTLE = 2.0
+TCP_BATCH = 64 * 1024
+SHARE_RECORDS = 256
+START_DELAY = 0.2
+RESULT_POLL = 0.5
+
+
+def open_socket(addr: str, port: str, socktype: int) -> socket.socket:
+    """Open a connected socket to the destination
+    Args:
+        addr (str): host, IP address or UNIX socket path (starting with /)
+        port (str): the port (ignored for UNIX sockets)
+        socktype (int): socket.SOCK_DGRAM or socket.SOCK_STREAM
+    Returns:
+        socket.socket: the connected socket
+    """
+    if addr[0] == '/':
+        sock = socket.socket(socket.AF_UNIX, socktype)
+        sock.connect(addr)
+        return sock
+    for family, _, proto, _, sockaddr in socket.getaddrinfo(addr, int(port), 0, socktype):
+        sock = socket.socket(family, socktype, proto)
+        try:
+            sock.connect(sockaddr)
+            return sock
+        except OSError:
+            sock.close()
+    raise OSError(f"Could not connect to {addr}:{port}")
+
+
+def count_lines(path: str) -> int:
+    """Count the lines of a file
+    Args:
+        path (str): path of the file
+    Returns:
+        int: the number of lines (0 if the file does not exist)
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb') as file:
+        return sum(buf.count(b'\n') for buf in iter(lambda: file.read(1 << 20), b''))
+
+
+def send_share(path: str, offsets: list, destination: tuple,
+               speed: float, start_at: float, first: float, results) -> None:
+    """Send the chunks of SHARE_RECORDS records starting at offsets
+    Args:
+        path (str): the capture file
+        offsets (list): file offsets of the chunks of this sender (CaptureReader.index)
+        destination (tuple): (addr, port, socktype)
+        speed (float): pacing factor (0 sends as fast as possible)
+        start_at (float): time.time() at which the first record of the capture is sent
+        first (float): timestamp of the first record of the capture
+        results (multiprocessing.Queue): queue receiving (sent, errors, bytes, begin, end)
+    """
+    addr, port, socktype = destination
+    stream = socktype == socket.SOCK_STREAM
+    sent = errors = nbytes = 0
+    begin = None
+    try:
+        sock = open_socket(addr, port, socktype)
+    except OSError as e:
+        print(e, file=sys.stderr)
+        results.put((0, 1, 0, None, None))
+        return
+    # frames not sent yet (TCP), with their number of messages and bytes
+    pending = []
+    pending_size = 0
+
+    def send_pending():
+        nonlocal sent, errors, nbytes, pending, pending_size
+        frames, size = pending, pending_size
+        pending, pending_size = [], 0
+        try:
+            sock.sendall(b''.join(frames))
+            sent += len(frames)
+            nbytes += size
+        except OSError:
+            errors += len(frames)
+
+    try:
+        for timestamp, _, _, data in capture.CaptureReader(path).records(offsets, SHARE_RECORDS):
+            if speed > 0:
+                delay = start_at + (timestamp - first) / speed - time.time()
+                if delay > 0:
+                    if pending:
+                        send_pending()
+                    time.sleep(delay)
+            if begin is None:
+                begin = time.time()
+            if stream:
+                frame = framing.encode_octet_counted(data)
+                pending.append(frame)
+                pending_size += len(data)
+                if pending_size >= TCP_BATCH:
+                    send_pending()
+            else:
+                try:
+                    sock.send(data)
+                    sent += 1
+                    nbytes += len(data)
+                except OSError:
+                    errors += 1
+        if pending:
+            send_pending()
+    finally:
+        sock.close()
+        # always report, even if the capture could not be read
+        results.put((sent, errors, nbytes, begin, time.time()))
+
+
+class Console(object):
+    """Class Console
+    Parses the command line arguments
+    """
+
+    def parse_args(self, args) -> argparse.Namespace:
+        """Parse the arguments from the command line
+        Args:
+            args (list): the list of arguments from the command line
+        Returns:
+            the argparse.Namespace object containing the parsed arguments
+        """
+        parser = argparse.ArgumentParser(
+            prog='CLI - Replay a syslog capture file\n',
+            description='Sends the datagrams/frames stored by tinysyslogserver --capture back to a syslog server.',
+            epilog='The achieved rate (and the loss with --verify) is written to stdout as JSON')
+        parser.add_argument('capture',
+                            help='The capture file')
+        parser.add_argument('-a', '--addr', dest='addr',
+                            default=DEFAULT_ADDR,
+                            help=f"syslog address. can be localhost or a DNS name or an IP address or a UNIX socket path. [Default: {DEFAULT_ADDR}]")
+        parser.add_argument('-p', '--port', dest='port',
+                            default=DEFAULT_PORT,
+                            help=f"syslog port [Default: {DEFAULT_PORT}]")
+        parser.add_argument('-t', '--tcp', dest='tcp', action='store_true',
+                            default=False,
+                            help='replay over tcp [Default is udp]')
+        parser.add_argument('-S', '--speed', dest='speed', type=float,
+                            default=SPEED,
+                            help=f"Pacing factor: 1 replays at the original pace, 10 ten times faster [Default: {SPEED}]")
+        parser.add_argument('--asap', dest='asap', action='store_true',
+                            default=False,
+                            help='Replay as fast as possible (ignores --speed)')
+        parser.add_argument('-j', '--processes', dest='processes', type=int,
+                            default=PROCESSES,
+                            help=f"Number of sender processes [Default: {PROCESSES}]")
+        parser.add_argument('--verify', dest='verify',
+                            help='Server log file: the lines appended during the replay are counted to report the loss')
+        parser.add_argument('--settle', dest='settle', type=float,
+                            default=SETTLE,
+                            help=f"Time in seconds without new lines in the --verify file before counting stops [Default: {SETTLE}]")
+        return parser.parse_args(args)
+
+    def _wait_for_lines(self, path: str, before: int, settle: float) -> int:
+        """Wait until the server log file stops growing
+        Args:
+            path (str): the server log file
+            before (int): number of lines before the replay
+            settle (float): time in seconds without new lines
+        Returns:
+            int: the number of lines appended
+        """
+        count = count_lines(path)
+        stable_since = time.monotonic()
+        while time.monotonic() - stable_since < settle:
+            time.sleep(min(0.1, settle))
+            new_count = count_lines(path)
+            if new_count != count:
+                count = new_count
+                stable_since = time.monotonic()
+        return count - before
+
+    def process(self, args: argparse.Namespace) -> dict:
+        """Process the command line arguments
+        Args:
+            args (argparser.Namespace): Command line arguments
+        Returns:
+            dict: the replay report
+        """
+        if args.processes < 1:
+            print("--processes must be at least 1", file=sys.stderr)
+            sys.exit(1)
+        try:
+            reader = capture.CaptureReader(args.capture)
+            offsets = reader.index(SHARE_RECORDS)
+            records = list(reader.records(offsets[:1], 1))
+        except (OSError, ValueError) as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        first = records[0][0] if records else 0.0
+        socktype = socket.SOCK_STREAM if args.tcp else socket.SOCK_DGRAM
+        speed = 0 if args.asap else args.speed
+        before = count_lines(args.verify) if args.verify else 0
+        results = multiprocessing.Queue()
+        start_at = time.time() + START_DELAY
+        senders = [multiprocessing.Process(target=send_share,
+                                           args=(args.capture, offsets[i::args.processes],
+                                                 (args.addr, args.port, socktype),
+                                                 speed, start_at, first, results))
+                   for i in range(args.processes)]
+        for sender in senders:
+            sender.start()
+        totals = []
+        while len(totals) < len(senders):
+            try:
+                totals.append(results.get(timeout=RESULT_POLL))
+            except queue.Empty:
+                # a sender that died without reporting counts as one error
+                if all(not sender.is_alive() for sender in senders) and results.empty():
+                    totals += [(0, 1, 0, None, None)] * (len(senders) - len(totals))
+        for sender in senders:
+            sender.join()
+        begins = [total[3] for total in totals if total[3] is not None]
+        ends = [total[4] for total in totals if total[4] is not None]
+        elapsed = max(max(ends) - min(begins), 1e-6) if begins else 0.0
+        sent = sum(total[0] for total in totals)
+        report = {
+            'sent': sent,
+            'errors': sum(total[1] for total in totals),
+            'bytes': sum(total[2] for total in totals),
+            'elapsed': round(elapsed, 3),
+            'rate': round(sent / elapsed, 1) if elapsed else 0.0,
+        }
+        if args.verify:
+            received = self._wait_for_lines(args.verify, before, args.settle)
+            report['received'] = received
+            report['loss'] = max(sent - received, 0)
+            report['loss_percent'] = round(100.0 * report['loss'] / sent, 2) if sent else 0.0
+        print(json.dumps(report))
+        return report
+
+
+def main():
+    """Main : CLI logic"""
+    # parse arguments
+    args = Console().parse_args(sys.argv[1:])
+    # process arguments
+    Console().process(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,17 +17,24 @@ import sys
 
 from fruafr.log.lib import templating
 from fruafr.log.lib import common
+from fruafr.log.lib import formatter as formatterlib
 
 # Defaults
 LEVEL = 'info'
 SEP = ' - '
 OPTSEP = SEP
+OUTPUT_FORMATS = ('text', 'jsonl')
+OUTPUT_FORMAT = 'text'
 
 class Console(object):
     """Class Console
     Parses the command line arguments
     """
 
+    # the output format and the static JSON fields (_prepare_message)
+    output_format = OUTPUT_FORMAT
+    static_fields = None
+
     def parse_args(self, args) -> argparse.Namespace:
         """Parse the arguments from the command line
         Args:
@@ -57,6 +64,11 @@ class Console(object):
         parser.add_argument('-df', '--dateformat',
                             dest='dateformat',
                             help='Datetime format')
+        parser.add_argument('--output-format',
+                            dest='output_format',
+                            choices=OUTPUT_FORMATS,
+                            default=OUTPUT_FORMAT,
+                            help=f"text: the --format line, jsonl: a JSON object per line with the fields of the format and the options (not templated in the message) [Default: {OUTPUT_FORMAT}]")
         # Additional flags
         parser.add_argument('--noasctime',
                             dest='noasctime',
@@ -162,7 +174,7 @@ class Console(object):
         # set the level of the root logger
         logger.setLevel(logging.DEBUG)
         # set the formatter
-        formatter = logging.Formatter(fmt, datefmt)
+        formatter = self._prepare_formatter(fmt, datefmt)
         # set up logging to console
         console = logging.StreamHandler()
         # set logging level to lowest
@@ -174,6 +186,38 @@ class Console(object):
         # return the root logger with the console attached to it
         return logger
 
+    def _prepare_formatter(self, fmt: str, datefmt: str) -> logging.Formatter:
+        """Prepares the formatter of the handlers for the output format
+        Args:
+            fmt (str): the template format (the fields of the JSON objects with jsonl)
+            datefmt (str): the date format
+        Returns:
+            logging.Formatter: the formatter
+        """
+        if self.output_format == 'jsonl':
+            return formatterlib.JsonFormatter(formatterlib.format_fields(fmt), datefmt, self.static_fields)
+        return logging.Formatter(fmt, datefmt)
+
+    def _prepare_message(self, args: argparse.Namespace, options: list) -> str:
+        """Prepares the message and the output format. With jsonl (or columnar), the
+        options are static fields of the JSON objects (or the host and app columns)
+        instead of being templated in the message
+        Args:
+            args(argparse.Namespace): The CLI arguments
+            options(list): list of options to template
+        Returns:
+            str: the message
+        """
+        self.output_format = getattr(args, 'output_format', OUTPUT_FORMAT)
+        if options is None or options == []:
+            return args.message
+        variables = self._prepare_variables_to_render(args)
+        if self.output_format != 'text':
+            self.static_fields = {option: variables[option] for option in options
+                                  if option != 'message' and option in variables}
+            return args.message
+        return self._apply_template(options, variables, args.optsep)
+
     def _determine_list_options_to_template(self, args: argparse.Namespace) -> list:
         """Determine the list of options provided to template (in the message section of the log record)
         Args:
@@ -270,12 +314,8 @@ class Console(object):
             options = self._determine_list_options_to_template(args)
         else:
             options = self._validate_list_options_to_template(args.options)
-        # prepate the variables
-        if options is not None and options != []:
-            variables = self._prepare_variables_to_render(args)
-            message= self._apply_template(options, variables, args.optsep)
-        else:
-            message = args.message
+        # prepare the message
+        message = self._prepare_message(args, options)
         # determine the format
         fmt = self._prepare_fmt(args)
         # determine the date format
@@ -5,6 +5,22 @@ CLI - Save a log message to a log file
 
 No output is written to the console by default (otherwise, use verbose)
 
+With --maxbytes and/or --when, the log file is rotated by size and/or
+period, safely between concurrent invocations. With --compress, the rotated
+files are gzipped by a detached process.
+
+With --atomic, the message is appended with a single write on an O_APPEND
+descriptor, so that concurrent invocations never interleave their lines.
+
+With --durability fsync (or group), the message is on disk when the CLI
+exits.
+
+With --index, the time of the messages is indexed in the FILE.idx sidecar
+file (rebuilt from the log file if missing), used by readers to jump to a
+time range.
+
+With --output-format columnar, the messages are appended in the blocks of a
+binary columnar file (lib/columnar.py) aggregated by logagg.
 """
 # Copyright 2023 by David Heurtevent.
 # SPDX_LICENSE: MIT
@@ -13,9 +29,15 @@ No output is written to the console by default (otherwise, use verbose)
 
 import argparse
 import logging
+import os
 import sys
 
+from fruafr.log.lib import atomicappend
+from fruafr.log.lib import columnar
 from fruafr.log.lib import common
+from fruafr.log.lib import durability
+from fruafr.log.lib import rotation
+from fruafr.log.lib import timeindex
 from fruafr.log import logtoconsole
 
 # Defaults
@@ -25,6 +47,7 @@ MODE = 'a'
 ENCODING = 'utf-8'
 SEP = ' - '
 OPTSEP = SEP
+OUTPUT_FORMATS = logtoconsole.OUTPUT_FORMATS + ('columnar',)
 
 class Console(logtoconsole.Console):
     """Class Console
@@ -62,6 +85,55 @@ class Console(logtoconsole.Console):
                             dest='encoding',
                             help=f"Encoding. [Default: {ENCODING}]",
                             default=f"{ENCODING}")
+        parser.add_argument('--maxbytes',
+                            dest='maxbytes',
+                            type=int,
+                            default=0,
+                            help='Rotate the log file before a message makes it exceed this size in bytes. 0 disables it [Default: 0]')
+        parser.add_argument('--when',
+                            dest='when',
+                            choices=list(rotation.WHEN),
+                            help='Rotate the log file every --interval seconds (S), minutes (M), hours (H) or days (D, at local midnight) [Default: no rotation by period]')
+        parser.add_argument('--interval',
+                            dest='interval',
+                            type=int,
+                            default=1,
+                            help='With --when, number of units of the rotation period [Default: 1]')
+        parser.add_argument('--backupcount',
+                            dest='backupcount',
+                            type=int,
+                            default=0,
+                            help='Number of rotated files kept (FILE.YYYYmmdd-HHMMSS[.gz]). 0 keeps them all [Default: 0]')
+        parser.add_argument('--compress',
+                            dest='compress',
+                            action='store_true',
+                            default=False,
+                            help='Gzip the rotated files in a detached process [Default: False]')
+        parser.add_argument('--atomic',
+                            dest='atomic',
+                            action='store_true',
+                            default=False,
+                            help='Append each message with a single write (O_APPEND), under a file lock above the PIPE_BUF size, so that concurrent invocations never interleave their lines [Default: False]')
+        parser.add_argument('--durability',
+                            dest='durability',
+                            choices=durability.DURABILITY,
+                            default='flush',
+                            help='none: buffered, flush: handed over to the OS, fsync: synced to disk (fdatasync), group: synced to disk, one sync shared by the threads logging at the same time (the same as fsync for a single message) [Default: flush]')
+        parser.add_argument('--index',
+                            dest='index',
+                            action='store_true',
+                            default=False,
+                            help='Index the time of the messages in the FILE.idx sidecar file, rebuilt from the log file with --format and --dateformat if missing [Default: False]')
+        parser.add_argument('--indexrecords',
+                            dest='indexrecords',
+                            type=int,
+                            default=timeindex.EVERY_RECORDS,
+                            help=f"With --index, messages between two index entries [Default: {timeindex.EVERY_RECORDS}]")
+        parser.add_argument('--indexbytes',
+                            dest='indexbytes',
+                            type=int,
+                            default=timeindex.EVERY_BYTES,
+                            help=f"With --index, bytes between two index entries [Default: {timeindex.EVERY_BYTES}]")
         parser.add_argument('-s', '--sep',
                             dest='sep',
                             help=f"Separator [Default: {SEP}]",
@@ -72,6 +144,11 @@ class Console(logtoconsole.Console):
         parser.add_argument('-df', '--dateformat',
                             dest='dateformat',
                             help='Datetime format')
+        parser.add_argument('--output-format',
+                            dest='output_format',
+                            choices=OUTPUT_FORMATS,
+                            default=logtoconsole.OUTPUT_FORMAT,
+                            help=f"text: the --format line, jsonl: a JSON object per line with the fields of the format and the options (not templated in the message), columnar: binary blocks of time, level, host (--host), app (--app) and message columns (see logagg) [Default: {logtoconsole.OUTPUT_FORMAT}]")
         parser.add_argument('-v', '--verbose',
                             action='store_true',
                             dest='verbose',
@@ -112,7 +189,11 @@ class Console(logtoconsole.Console):
                              fmt: str,
                              datefmt: str,
                              mode:str ='a',
-                             encoding:str ='utf-8') -> logging.Logger:
+                             encoding:str ='utf-8',
+                             rotating: dict = None,
+                             atomic: bool = False,
+                             durable: str = 'flush',
+                             index: timeindex.TimeIndexWriter = None) -> logging.Logger:
         """Prepares the file logger
         Args:
             filename (str): The filepath to the log file
@@ -121,6 +202,11 @@ class Console(logtoconsole.Console):
             mode (str): The mode to use for the log file ('a' for append, 'w' for writing)\
                   [default: 'a']
             encoding (str): the encoding [default: 'utf-8']
+            rotating (dict): the rotation options of rotation.ConcurrentRotatingFileHandler
+             [default: None]
+            atomic (bool): append with atomicappend.AtomicAppendHandler [default: False]
+            durable (str): the durability policy, one of durability.DURABILITY [default: 'flush']
+            index (timeindex.TimeIndexWriter): the time index writer [default: None]
         Returns:
             The logger instance
         """
@@ -128,10 +214,24 @@ class Console(logtoconsole.Console):
         logger = logging.getLogger('')
         # set the level of the root logger
         logger.setLevel(logging.DEBUG)
+        # add the columnar handler: the time and the level are columns, not formatted
+        if self.output_format == 'columnar':
+            static = self.static_fields or {}
+            fileh = columnar.ColumnarFileHandler(filename, mode, static.get('host'), static.get('app'))
+            fileh.setLevel(logging.DEBUG)
+            logger.addHandler(fileh)
+            return logger
         # set the formatter
-        formatter = logging.Formatter(fmt, datefmt)
+        formatter = self._prepare_formatter(fmt, datefmt)
         # add the file handler
-        fileh = logging.FileHandler(filename, mode, encoding)
+        if atomic:
+            fileh = atomicappend.AtomicAppendHandler(filename, mode, encoding, durability=durable)
+        elif rotating:
+            fileh = rotation.ConcurrentRotatingFileHandler(filename, mode, encoding, **rotating)
+        elif durable != 'flush' or index is not None:
+            fileh = durability.DurableFileHandler(filename, mode, encoding, durable, index=index)
+        else:
+            fileh = logging.FileHandler(filename, mode, encoding)
         fileh.setFormatter(formatter)
         fileh.setLevel(logging.DEBUG)
         logger.addHandler(fileh)
@@ -149,12 +249,8 @@ class Console(logtoconsole.Console):
             options = self._determine_list_options_to_template(args)
         else:
             options = self._validate_list_options_to_template(args.options)
-        # prepate the variables
-        if options is not None and options != []:
-            variables = self._prepare_variables_to_render(args)
-            message= self._apply_template(options, variables, args.optsep)
-        else:
-            message = args.message
+        # prepare the message
+        message = self._prepare_message(args, options)
         # determine the format
         fmt = self._prepare_fmt(args)
         # determine the date format
@@ -162,13 +258,76 @@ class Console(logtoconsole.Console):
         # determine the levelint
         levelint = self._prepare_level(args)
         # create the file logger and obtain it
-        logger = self._prepare_file_logger(args.file, fmt, date_format, args.mode, args.encoding)
+        rotating = self._prepare_rotating(args)
+        if args.atomic and rotating:
+            # the rotation already writes each message under the lock of the log file
+            print("--atomic is not supported with --maxbytes or --when", file=sys.stderr)
+            sys.exit(1)
+        if args.durability != 'flush' and rotating:
+            print("--durability is not supported with --maxbytes or --when", file=sys.stderr)
+            sys.exit(1)
+        if args.output_format == 'columnar' and (args.atomic or rotating or args.durability != 'flush'):
+            # the blocks are appended under a file lock
+            print("--output-format columnar is not supported with --atomic, --maxbytes, --when or --durability", file=sys.stderr)
+            sys.exit(1)
+        index = self._prepare_index(args, fmt, date_format, rotating)
+        logger = self._prepare_file_logger(args.file, fmt, date_format, args.mode, args.encoding,
+                                           rotating, args.atomic, args.durability, index)
         if args.verbose:
             # create the logger and obtain it
             logger = self._prepare_console_logger(fmt, date_format)
         # log the message
         logger.log(levelint, message)
 
+    def _prepare_rotating(self, args: argparse.Namespace) -> dict:
+        """Returns the rotation options (--maxbytes, --when)
+        Args:
+            args (argparser.Namespace): Command line arguments
+        Returns:
+            dict: the ConcurrentRotatingFileHandler keyword arguments, None without rotation
+        """
+        if args.maxbytes < 0 or args.interval < 1 or args.backupcount < 0:
+            print("--maxbytes and --backupcount must be positive, --interval at least 1", file=sys.stderr)
+            sys.exit(1)
+        if not args.maxbytes and args.when is None:
+            return None
+        return {
+            'max_bytes': args.maxbytes,
+            'when': args.when,
+            'interval': args.interval,
+            'backup_count': args.backupcount,
+            'compress': args.compress,
+        }
+
+    def _prepare_index(self, args: argparse.Namespace, fmt: str, datefmt: str,
+                       rotating: dict) -> timeindex.TimeIndexWriter:
+        """Returns the time index writer (--index), after rebuilding a missing index
+        Args:
+            args (argparser.Namespace): Command line arguments
+            fmt (str): the template format
+            datefmt (str): the date format
+            rotating (dict): the rotation options
+        Returns:
+            timeindex.TimeIndexWriter: the writer, None without --index
+        """
+        if not args.index:
+            return None
+        if args.atomic or rotating or args.output_format != 'text':
+            print("--index is not supported with --atomic, --maxbytes, --when or --output-format jsonl/columnar", file=sys.stderr)
+            sys.exit(1)
+        if args.indexrecords < 1 or args.indexbytes < 1:
+            print("--indexrecords and --indexbytes must be at least 1", file=sys.stderr)
+            sys.exit(1)
+        try:
+            parser = timeindex.TimestampParser(fmt, datefmt)
+        except ValueError:
+            print("--index requires %(asctime)s or %(created)f in the format", file=sys.stderr)
+            sys.exit(1)
+        if args.mode != 'w' and os.path.exists(args.file) and os.path.getsize(args.file) and \
+           timeindex.load(args.file) is None:
+            timeindex.rebuild(args.file, parser, args.indexrecords, args.indexbytes)
+        return timeindex.TimeIndexWriter(args.file, args.indexrecords, args.indexbytes, args.mode == 'w')
+
 def main():
     """Main : CLI logic"""
     # parse arguments
@@ -5,6 +5,31 @@ CLI - Save a log message to a log file
 
 No output is written to the console by default (otherwise, use verbose)
 
+With --stdin, the lines read from the standard input are sent one by one
+through a single long-lived connection.
+
+With --dest (several times), the messages are balanced over persistent
+connections to several destinations, with failover.
+
+With --relp, the messages are sent over RELP (tcp) and acknowledged by the
+server. The unacknowledged ones are sent again after a reconnection.
+
+With --rate (and --burst), --stdin and --file-input space the messages to
+avoid overrunning a UDP receiver. With --adaptive, the rate follows the
+loss reported by the stats socket of tinysyslogserver.
+
+With --async, the messages are delivered by a background thread and kept in
+an on-disk spool (--spool) while the destination is unreachable.
+
+With --latency, each message ends with a trailer carrying the run, its
+sequence number and the log call time, measured by tinysyslogserver --latency.
+
+With --follow, the lines appended to files are shipped the same way and the
+read offsets are committed to a checkpoint file once sent.
+
+With --file-input, the lines of a file are shipped as they are (prefixed
+with <PRI> and the program), framed with octet counting over tcp. A JSON
+report is written to stdout.
 """
 # Copyright 2023 by David Heurtevent.
 # SPDX_LICENSE: MIT
@@ -14,10 +39,22 @@ No output is written to the console by default (otherwise, use verbose)
 import argparse
 import logging
 from logging import handlers
+import json
+import os
+import signal
 import sys
 import socket
+import time
 
+from fruafr.log.lib import balancer
 from fruafr.log.lib import common
+from fruafr.log.lib import encoder
+from fruafr.log.lib import follow
+from fruafr.log.lib import latency
+from fruafr.log.lib import pacing
+from fruafr.log.lib import relp
+from fruafr.log.lib import syslogclient
+from fruafr.log.lib import templating
 from fruafr.log import logtoconsole
 
 # Defaults
@@ -27,6 +64,10 @@ SEP = ' - '
 OPTSEP = SEP
 DEFAULT_SYSLOG_ADDR = '/dev/log'
 DEFAULT_SYSLOG_PORT = '514'
+PROGRESS_INTERVAL = 1.0
+DEFAULT_CHECKPOINT = '/tmp/logtosyslog-follow.checkpoint'
+POLL_INTERVAL = 0.2
+RETRY_MAX = 30.0
 
 
 class Console(logtoconsole.Console):
@@ -46,8 +87,8 @@ class Console(logtoconsole.Console):
                         description = 'Options after --nolevel modify the content of the message before it is logged.',
                         epilog = 'No output is written to the console by default (to override, use -v or --verbose)')
         # arguments
-        parser.add_argument('message',
-            help='The message to log. Ignored if -MES or --message is specified (please set it to . to avoid error messsages)')
+        parser.add_argument('message', nargs='?',
+            help='The message to log. Ignored if -MES or --message is specified (please set it to . to avoid error messsages). Not used with --stdin')
         parser.add_argument('-L', '--level',
                             dest='level',
                             choices=['debug', 'info', 'warning', 'error', 'critical'],
@@ -76,12 +117,79 @@ class Console(logtoconsole.Console):
             help='Python logging format')
         parser.add_argument('-df', '--dateformat', dest='dateformat',
             help='Datetime format')
+        parser.add_argument('--output-format', dest='output_format',
+            choices=logtoconsole.OUTPUT_FORMATS,
+            default=logtoconsole.OUTPUT_FORMAT,
+            help=f"text: the --format line, jsonl: a JSON object per line with the fields of the format, the program (without --rfc) and the options (not templated in the message). Not supported with --file-input, --follow and --latency [Default: {logtoconsole.OUTPUT_FORMAT}]")
         parser.add_argument('-v', '--verbose', action='store_true', dest='verbose',
             default=False,
             help='Verbose output')
         parser.add_argument('-d', '--dryrun', action='store_true', dest='dryrun',
             default=False,
             help='Dry run - Generate log message on console without sending it over syslog. Used for debugging')
+        parser.add_argument('--rfc', dest='rfc', choices=encoder.RFCS,
+            help='Syslog header: 3164 (timestamp hostname program[pid]:) or 5424 (version, timestamp, hostname, program, pid). Not used by --file-input and --follow [Default: <PRI> and the message, like logging.handlers.SysLogHandler]')
+        parser.add_argument('--stdin', action='store_true', dest='stdin',
+            default=False,
+            help='Read the messages from the standard input (one per line) and send them through one long-lived connection')
+        parser.add_argument('--flushinterval', dest='flushinterval', type=float,
+            default=syslogclient.FLUSH_INTERVAL,
+            help=f"With --stdin over tcp or --relp, maximum time in seconds a message is buffered [Default: {syslogclient.FLUSH_INTERVAL}]")
+        parser.add_argument('--dest', dest='dest', action='append',
+            help='Destination host[:port[:weight]] (repeat the option for several destinations). Replaces --addr and --port. The messages are balanced over persistent connections with failover')
+        parser.add_argument('--strategy', dest='strategy',
+            choices=balancer.STRATEGIES,
+            default=balancer.STRATEGY,
+            help=f"With --dest, balancing strategy [Default: {balancer.STRATEGY}]")
+        parser.add_argument('--hashkey', dest='hashkey',
+            default='program',
+            help='With --strategy hash, the value sending the messages to the same destination: message, program or an option of --options (e.g. host) [Default: program]')
+        parser.add_argument('--relp', dest='relp', action='store_true',
+            default=False,
+            help='Send over RELP (--port is the RELP port of the server): every message is acknowledged and the unacknowledged ones are sent again after a reconnection')
+        parser.add_argument('--window', dest='window', type=int,
+            default=relp.WINDOW,
+            help=f"With --relp, maximum number of messages sent and not acknowledged yet [Default: {relp.WINDOW}]")
+        parser.add_argument('--async', dest='async_delivery', action='store_true',
+            default=False,
+            help='Never wait on the network: the messages are sent by a background thread through a bounded queue that spills to the --spool directory when the destination is unreachable')
+        parser.add_argument('--spool', dest='spool',
+            help='With --async, directory of the on-disk buffer. Messages left by a previous run are delivered first [Default: no spool, messages are dropped when the queue is full]')
+        parser.add_argument('--queuesize', dest='queuesize', type=int,
+            default=syslogclient.QUEUE_SIZE,
+            help=f"With --async, maximum number of messages kept in memory [Default: {syslogclient.QUEUE_SIZE}]")
+        parser.add_argument('--draintimeout', dest='draintimeout', type=float,
+            default=syslogclient.DRAIN_TIMEOUT,
+            help=f"With --async, time in seconds given to the delivery before exiting. The undelivered messages stay in the spool [Default: {syslogclient.DRAIN_TIMEOUT}]")
+        parser.add_argument('--file-input', dest='file_input',
+            help='Ship the lines of a file (one message per line, octet counted framing over tcp) and report the throughput as JSON')
+        parser.add_argument('--follow', dest='follow', action='append',
+            help='Follow a file (repeat the option for several files) and ship the appended lines, across rotations. The read offsets are committed to --checkpoint once sent')
+        parser.add_argument('--checkpoint', dest='checkpoint',
+            default=DEFAULT_CHECKPOINT,
+            help=f"With --follow, file storing the committed read offsets [Default: {DEFAULT_CHECKPOINT}]")
+        parser.add_argument('--pollinterval', dest='pollinterval', type=float,
+            default=POLL_INTERVAL,
+            help=f"With --follow, time in seconds between two checks when the files did not grow [Default: {POLL_INTERVAL}]")
+        parser.add_argument('--chunksize', dest='chunksize', type=int,
+            default=syslogclient.CHUNK_SIZE,
+            help=f"With --file-input or --follow, size in bytes of the file reads. The frames of a chunk are sent with one sendall [Default: {syslogclient.CHUNK_SIZE}]")
+        parser.add_argument('--inflight', dest='inflight', type=int,
+            default=syslogclient.MAX_INFLIGHT,
+            help=f"With --file-input or --follow over tcp, maximum number of bytes sent and not yet acknowledged. 0 is unlimited [Default: {syslogclient.MAX_INFLIGHT}]")
+        parser.add_argument('--rate', dest='rate', type=float,
+            default=0,
+            help='With --stdin or --file-input, maximum number of messages per second. 0 is unlimited [Default: 0]')
+        parser.add_argument('--burst', dest='burst', type=int,
+            help=f"With --rate or --adaptive, number of messages sent without waiting [Default: {pacing.BURST_SECONDS} s of messages]")
+        parser.add_argument('--adaptive', dest='adaptive',
+            help=f"With --stdin or --file-input, path of the stats socket of tinysyslogserver (--stats): the rate starts at --rate (or {pacing.START_RATE:g}) and is adapted to the loss to find the highest loss-free rate. The rate reached is reported as JSON")
+        parser.add_argument('--latency', dest='latency', action='store_true',
+            default=False,
+            help='Append " lat=RUN:SEQ:NS" to each message (run, sequence number and log call time in ns) for the end-to-end latency measurement of tinysyslogserver --latency. Not used by --file-input and --follow')
+        parser.add_argument('--progress', dest='progress', type=float,
+            default=PROGRESS_INTERVAL,
+            help=f"With --file-input or --follow, interval in seconds of the progress (lag) lines written to stderr. 0 disables them [Default: {PROGRESS_INTERVAL}]")
         # Additional flags
         parser.add_argument('--noasctime', dest='noasctime', action='store_true',
             default=False,
@@ -106,7 +214,11 @@ class Console(logtoconsole.Console):
                 default = option[1]['default']
             )
         # return
-        return parser.parse_args(args)
+        parsed = parser.parse_args(args)
+        if parsed.message is None and not parsed.stdin and parsed.file_input is None \
+           and parsed.follow is None:
+            parser.error('the following arguments are required: message')
+        return parsed
 
     def _prepare_sys_logger(self,
                              addr: str,
@@ -115,6 +227,7 @@ class Console(logtoconsole.Console):
                              datefmt: str,
                              socktype: int = socket.SOCK_DGRAM,
                              port: str = DEFAULT_SYSLOG_PORT,
+                             header: dict = None,
                             ) -> logging.Logger:
         """Prepares the file logger
         Args:
@@ -124,6 +237,7 @@ class Console(logtoconsole.Console):
             datefmt (str): the date format
             socktype (int): socket type [defaults to socket.SOCK_DGRAM]
             port (str): the port [defaults to DEFAULT_SYSLOG_PORT (normally 514)]
+            header (dict): with --rfc, the rfc and app_name of the encoder [defaults to None]
         Returns:
             The logger instance
         """
@@ -132,14 +246,14 @@ class Console(logtoconsole.Console):
         # set the level of the root logger
         logger.setLevel(logging.DEBUG)
         # set the formatter
-        formatter = logging.Formatter(fmt, datefmt)
+        formatter = self._prepare_formatter(fmt, datefmt)
         # handle address:
         if addr[0] == '/':
             address = addr
         else:
             address = (addr, int(port))
         # create the syslog handler
-        syslogh = handlers.SysLogHandler(address, facility, socktype)
+        syslogh = encoder.FastSysLogHandler(address, facility, socktype, **(header or {}))
         # set formatter
         syslogh.setFormatter(formatter)
         # set level
@@ -149,6 +263,217 @@ class Console(logtoconsole.Console):
         # return logger
         return logger
 
+    def _prepare_streaming_sys_logger(self,
+                                      addr: str,
+                                      facility: int,
+                                      fmt: str,
+                                      datefmt: str,
+                                      socktype: int = socket.SOCK_DGRAM,
+                                      port: str = DEFAULT_SYSLOG_PORT,
+                                      flush_interval: float = syslogclient.FLUSH_INTERVAL,
+                                      delivery: dict = None,
+                                      header: dict = None,
+                                     ) -> logging.Logger:
+        """Prepares the sys logger sending through one long-lived connection
+        Args:
+            addr (str): host or address in the /var/log format
+            facility (int): facility value found in common.SYSLOG_FACILITIES
+            fmt (str): the template format
+            datefmt (str): the date format
+            socktype (int): socket type [defaults to socket.SOCK_DGRAM]
+            port (str): the port [defaults to DEFAULT_SYSLOG_PORT (normally 514)]
+            flush_interval (float): maximum time in seconds a tcp message is buffered
+            delivery (dict): with --async, the spool_directory, queue_size and
+             drain_timeout of the background delivery [defaults to None]
+            header (dict): with --rfc, the rfc and app_name of the encoder [defaults to None]
+        Returns:
+            The logger instance
+        """
+        # get the root logger
+        logger = logging.getLogger('')
+        # set the level of the root logger
+        logger.setLevel(logging.DEBUG)
+        # set the formatter
+        formatter = self._prepare_formatter(fmt, datefmt)
+        # handle address:
+        if addr[0] == '/':
+            address = addr
+        else:
+            address = (addr, int(port))
+        # create the syslog handler
+        if delivery is not None:
+            syslogh = syslogclient.SpoolingSysLogHandler(address, facility, socktype,
+                                                         header=header, **delivery)
+        else:
+            syslogh = syslogclient.StreamingSysLogHandler(address, facility, socktype,
+                                                          flush_interval, header)
+        # set formatter
+        syslogh.setFormatter(formatter)
+        # set level
+        syslogh.setLevel(logging.DEBUG)
+        # add handler
+        logger.addHandler(syslogh)
+        # return logger
+        return logger
+
+    def _process_stdin(self, args: argparse.Namespace, options: list, logger: logging.Logger,
+                       levelint: int, pacer: pacing.TokenBucket = None) -> int:
+        """Log each line of the standard input
+        Args:
+            args (argparse.Namespace): the CLI arguments
+            options (list): the options to template in the message
+            logger (logging.Logger): the logger
+            levelint (int): the level
+            pacer (pacing.TokenBucket): spaces the messages [defaults to None]
+        Returns:
+            int: the number of lines logged
+        """
+        template = None
+        if options is not None and options != []:
+            # prepare the template once, only the message changes
+            args.message = ''
+            variables = self._prepare_variables_to_render(args)
+            template = templating.Templating.create_template(options, args.optsep)
+            validate = templating.Templating.validate_template(template, options)
+            if validate is not None:
+                raise ValueError(f"order must contain {validate}")
+        count = 0
+        for line in sys.stdin:
+            message = line.rstrip('\r\n')
+            if not message:
+                continue
+            if template is not None:
+                variables['message'] = message
+                message = templating.Templating.apply_template(template, variables)
+            if pacer is not None:
+                pacer.wait()
+            logger.log(levelint, self._program_message(args, message),
+                       extra={'hashkey': self._hash_key(args, message)})
+            count += 1
+        return count
+
+    def _prepare_header(self, args: argparse.Namespace) -> dict:
+        """Returns the header options of the syslog handlers (--rfc)
+        Args:
+            args (argparse.Namespace): the CLI arguments
+        Returns:
+            dict: the rfc and app_name of the encoder, None without --rfc
+        """
+        if args.rfc is None:
+            return None
+        return {'rfc': args.rfc, 'app_name': args.program}
+
+    def _program_message(self, args: argparse.Namespace, message: str) -> str:
+        """Returns the message logged: the program is in the header with --rfc
+        Args:
+            args (argparse.Namespace): the CLI arguments
+            message (str): the message
+        Returns:
+            str: the message prefixed with the program without --rfc
+        """
+        if args.rfc is not None or self.output_format == 'jsonl':
+            return message
+        return f"{args.program} {message}"
+
+    def _prepare_message(self, args: argparse.Namespace, options: list) -> str:
+        """Prepares the message and the output format, see logtoconsole.Console. With
+        jsonl, the program is a static field (without --rfc)
+        Args:
+            args(argparse.Namespace): The CLI arguments
+            options(list): list of options to template
+        Returns:
+            str: the message
+        """
+        message = super()._prepare_message(args, options)
+        if self.output_format == 'jsonl' and args.rfc is None:
+            self.static_fields = {'program': args.program, **(self.static_fields or {})}
+        return message
+
+    def _hash_key(self, args: argparse.Namespace, message: str) -> str:
+        """Returns the key of the hash balancing strategy
+        Args:
+            args (argparse.Namespace): the CLI arguments
+            message (str): the message
+        Returns:
+            str: the key
+        """
+        if args.hashkey == 'message':
+            return message
+        return getattr(args, args.hashkey, None)
+
+    def _prepare_balanced_sys_logger(self,
+                                     args: argparse.Namespace,
+                                     facility: int,
+                                     fmt: str,
+                                     datefmt: str,
+                                     socktype: int = socket.SOCK_DGRAM,
+                                    ) -> logging.Logger:
+        """Prepares the sys logger balancing the messages over the --dest destinations
+        Args:
+            args (argparse.Namespace): the CLI arguments
+            facility (int): facility value found in common.SYSLOG_FACILITIES
+            fmt (str): the template format
+            datefmt (str): the date format
+            socktype (int): socket type [defaults to socket.SOCK_DGRAM]
+        Returns:
+            The logger instance
+        """
+        try:
+            destinations = [balancer.parse_destination(dest, args.port or DEFAULT_SYSLOG_PORT)
+                            for dest in args.dest]
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        if args.hashkey != 'message' and not hasattr(args, args.hashkey):
+            print(f"--hashkey {args.hashkey} is not message, program or an option", file=sys.stderr)
+            sys.exit(1)
+        # get the root logger
+        logger = logging.getLogger('')
+        # set the level of the root logger
+        logger.setLevel(logging.DEBUG)
+        # create the syslog handler
+        pool = balancer.DestinationPool(destinations, socktype, args.strategy, args.flushinterval)
+        syslogh = balancer.BalancedSysLogHandler(pool, facility, header=self._prepare_header(args))
+        # set formatter
+        syslogh.setFormatter(self._prepare_formatter(fmt, datefmt))
+        # set level
+        syslogh.setLevel(logging.DEBUG)
+        # add handler
+        logger.addHandler(syslogh)
+        # return logger
+        return logger
+
+    def _prepare_relp_sys_logger(self,
+                                 args: argparse.Namespace,
+                                 facility: int,
+                                 fmt: str,
+                                 datefmt: str,
+                                ) -> logging.Logger:
+        """Prepares the sys logger sending over RELP (--relp)
+        Args:
+            args (argparse.Namespace): the CLI arguments
+            facility (int): facility value found in common.SYSLOG_FACILITIES
+            fmt (str): the template format
+            datefmt (str): the date format
+        Returns:
+            The logger instance
+        """
+        # get the root logger
+        logger = logging.getLogger('')
+        # set the level of the root logger
+        logger.setLevel(logging.DEBUG)
+        # create the syslog handler
+        syslogh = relp.RelpSysLogHandler((args.addr, int(args.port)), facility, args.window,
+                                         args.flushinterval, self._prepare_header(args))
+        # set formatter
+        syslogh.setFormatter(self._prepare_formatter(fmt, datefmt))
+        # set level
+        syslogh.setLevel(logging.DEBUG)
+        # add handler
+        logger.addHandler(syslogh)
+        # return logger
+        return logger
+
     def _determine_facility(self, args:argparse.Namespace) -> int:
         """Determine the facility from the given arguments
         Args:
@@ -190,12 +515,41 @@ class Console(logtoconsole.Console):
             options = self._determine_list_options_to_template(args)
         else:
             options = self._validate_list_options_to_template(args.options)
-        # prepare the variables
-        if options is not None and options != []:
-            variables = self._prepare_variables_to_render(args)
-            message = self._apply_template(options, variables, args.optsep)
-        else:
-            message = args.message
+        if args.dest and (args.async_delivery or args.file_input is not None or args.follow):
+            print("--dest cannot be used with --async, --file-input or --follow", file=sys.stderr)
+            sys.exit(1)
+        if args.rfc is not None and (args.file_input is not None or args.follow):
+            print("--rfc cannot be used with --file-input or --follow", file=sys.stderr)
+            sys.exit(1)
+        if (args.async_delivery or args.spool is not None) and (args.file_input is not None or args.follow):
+            # the shipper sends over its own connection, with --inflight as the bound
+            print("--async and --spool cannot be used with --file-input or --follow", file=sys.stderr)
+            sys.exit(1)
+        if args.latency and (args.file_input is not None or args.follow):
+            print("--latency cannot be used with --file-input or --follow", file=sys.stderr)
+            sys.exit(1)
+        if args.relp and (args.dest or args.async_delivery or args.file_input is not None
+                          or args.follow or args.addr[0] == '/'):
+            print("--relp cannot be used with a UNIX socket, --dest, --async, --file-input or --follow", file=sys.stderr)
+            sys.exit(1)
+        if args.window < 1:
+            print("--window must be at least 1", file=sys.stderr)
+            sys.exit(1)
+        if args.output_format != 'text' and (args.file_input is not None or args.follow or args.latency):
+            # the lines are shipped as they are, the latency trailer ends the message
+            print("--output-format jsonl cannot be used with --file-input, --follow or --latency", file=sys.stderr)
+            sys.exit(1)
+        if args.stdin:
+            self._process_stdin_args(args, options)
+            return
+        if args.file_input is not None:
+            self._process_file_input(args)
+            return
+        if args.follow:
+            self._process_follow(args)
+            return
+        # prepare the message
+        message = self._prepare_message(args, options)
         # determine the format
         fmt = self._prepare_fmt(args)
         # determine the date format
@@ -206,15 +560,246 @@ class Console(logtoconsole.Console):
         facility = self._determine_facility(args)
         socktype = self._determine_socktype(args)
         # create the syslogger if not dry run
-        if not args.dryrun:
+        if not args.dryrun and args.dest:
+            logger = self._prepare_balanced_sys_logger(args, facility, fmt, date_format, socktype)
+        elif not args.dryrun and args.relp:
+            logger = self._prepare_relp_sys_logger(args, facility, fmt, date_format)
+        elif not args.dryrun and args.async_delivery:
+            logger = self._prepare_streaming_sys_logger(args.addr, facility, fmt, date_format,
+                                                        socktype, args.port,
+                                                        delivery=self._prepare_delivery(args),
+                                                        header=self._prepare_header(args))
+        elif not args.dryrun:
             logger = self._prepare_sys_logger(args.addr, facility, fmt, date_format,
-                                            socktype, args.port)
+                                            socktype, args.port, self._prepare_header(args))
         if args.verbose:
             # create the logger and obtain it
             logger = self._prepare_console_logger(fmt, date_format)
+        if args.latency:
+            logger.addFilter(latency.LatencyStamp())
         # log the message
-        new_message = f"{args.program} {message}"
-        logger.log(levelint, new_message)
+        new_message = self._program_message(args, message)
+        logger.log(levelint, new_message, extra={'hashkey': self._hash_key(args, message)})
+        if args.async_delivery or args.dest or args.relp:
+            for hdlr in logger.handlers:
+                hdlr.close()
+
+    def _prepare_delivery(self, args: argparse.Namespace) -> dict:
+        """Returns the background delivery options (--async)
+        Args:
+            args (argparser.Namespace): Command line arguments
+        Returns:
+            dict: the SpoolingSysLogHandler keyword arguments, None without --async
+        """
+        if not args.async_delivery:
+            return None
+        return {
+            'spool_directory': args.spool,
+            'queue_size': args.queuesize,
+            'drain_timeout': args.draintimeout,
+        }
+
+    def _process_stdin_args(self, args: argparse.Namespace, options: list) -> None:
+        """Process the command line arguments in --stdin mode
+        Args:
+            args (argparser.Namespace): Command line arguments
+            options (list): the options to template in the message
+        """
+        if args.output_format == 'jsonl':
+            # the options are static fields, the lines are the messages
+            args.message = ''
+            self._prepare_message(args, options)
+            options = None
+        fmt = self._prepare_fmt(args)
+        date_format = self._prepare_date_format(args)
+        levelint = self._prepare_level(args)
+        facility = self._determine_facility(args)
+        socktype = self._determine_socktype(args)
+        logger = logging.getLogger('')
+        if not args.dryrun and args.dest:
+            logger = self._prepare_balanced_sys_logger(args, facility, fmt, date_format, socktype)
+        elif not args.dryrun and args.relp:
+            logger = self._prepare_relp_sys_logger(args, facility, fmt, date_format)
+        elif not args.dryrun:
+            logger = self._prepare_streaming_sys_logger(args.addr, facility, fmt, date_format,
+                                                        socktype, args.port, args.flushinterval,
+                                                        self._prepare_delivery(args),
+                                                        self._prepare_header(args))
+        if args.verbose:
+            logger = self._prepare_console_logger(fmt, date_format)
+        if args.latency:
+            logger.addFilter(latency.LatencyStamp())
+        pacer = self._prepare_pacer(args)
+        try:
+            self._process_stdin(args, options, logger, levelint, pacer)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for hdlr in logger.handlers:
+                hdlr.close()
+        if isinstance(pacer, pacing.AdaptivePacer):
+            print(json.dumps(pacer.report()), file=sys.stderr)
+        # the handlers report the messages they could not deliver on stderr
+        if any(getattr(getattr(hdlr, 'connection', None), 'dropped', 0) for hdlr in logger.handlers):
+            sys.exit(1)
+
+    def _prepare_pacer(self, args: argparse.Namespace) -> pacing.TokenBucket:
+        """Prepares the pacer of --rate and --adaptive
+        Args:
+            args (argparser.Namespace): Command line arguments
+        Returns:
+            pacing.TokenBucket: the pacer, None without --rate and --adaptive
+        """
+        if args.rate < 0 or (args.burst is not None and args.burst < 1):
+            print("--rate must be positive and --burst at least 1", file=sys.stderr)
+            sys.exit(1)
+        if args.adaptive is not None:
+            if args.addr[0] == '/':
+                # the server does not listen on UNIX sockets: no counter to read
+                print("--adaptive requires a UDP, TCP or RELP destination", file=sys.stderr)
+                sys.exit(1)
+            feedback = pacing.stats_feedback(args.adaptive, self._stats_counter(args))
+            try:
+                return pacing.AdaptivePacer(feedback, args.rate, args.burst)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"{args.adaptive}: {e}", file=sys.stderr)
+                sys.exit(1)
+        if args.rate:
+            return pacing.TokenBucket(args.rate, args.burst)
+        return None
+
+    def _stats_counter(self, args: argparse.Namespace) -> str:
+        """Returns the tinysyslogserver stats counter of the messages received over the transport
+        Args:
+            args (argparser.Namespace): Command line arguments
+        Returns:
+            str: relp_messages, tcp_messages or udp_messages
+        """
+        if args.relp:
+            return 'relp_messages'
+        if self._determine_socktype(args) == socket.SOCK_STREAM:
+            return 'tcp_messages'
+        return 'udp_messages'
+
+    def _prepare_shipper(self, args: argparse.Namespace) -> tuple:
+        """Prepares the connection and the line shipper of --file-input and --follow
+        Args:
+            args (argparser.Namespace): Command line arguments
+        Returns:
+            tuple: (syslogclient.SyslogConnection, syslogclient.FileShipper)
+        """
+        levelint = self._prepare_level(args)
+        facility = self._determine_facility(args)
+        socktype = self._determine_socktype(args)
+        prefix = encoder.SyslogEncoder(facility).prefix(logging.getLevelName(levelint))
+        header = prefix + f"{args.program} ".encode()
+        address = args.addr if args.addr[0] == '/' else (args.addr, int(args.port))
+        connection = syslogclient.SyslogConnection(address, socktype, flush_interval=0,
+                                                   buffer_size=args.chunksize,
+                                                   max_inflight=args.inflight)
+        pacer = self._prepare_pacer(args) if args.file_input is not None else None
+        return connection, syslogclient.FileShipper(connection, header, args.chunksize, pacer)
+
+    def _process_follow(self, args: argparse.Namespace) -> None:
+        """Follow the files of --follow until interrupted (Ctrl+C or SIGTERM)
+        The offsets are committed once the lines are sent.
+        Args:
+            args (argparser.Namespace): Command line arguments
+        """
+        try:
+            checkpoints = follow.Checkpoints(args.checkpoint)
+        except (OSError, ValueError) as e:
+            print(f"{args.checkpoint}: {e}", file=sys.stderr)
+            sys.exit(1)
+        connection, shipper = self._prepare_shipper(args)
+
+        def open_followers():
+            return [follow.FileFollower(path, checkpoints.get(path), args.chunksize)
+                    for path in args.follow]
+
+        followers = open_followers()
+        # stop between two batches: a batch sent is always committed.
+        # The handlers only record the signal (no lock may be taken in them)
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+
+        def pause(seconds):
+            deadline = time.monotonic() + seconds
+            while not stopping and time.monotonic() < deadline:
+                time.sleep(min(args.pollinterval, max(deadline - time.monotonic(), 0)))
+
+        sent = 0
+        retry = POLL_INTERVAL
+        last = time.monotonic()
+        try:
+            while not stopping:
+                count = 0
+                try:
+                    for follower in followers:
+                        lines = follower.read()
+                        if lines:
+                            count += shipper.send_lines(lines)
+                    if count:
+                        connection.flush()
+                except OSError as e:
+                    # read again from the committed offsets once the collector is back
+                    print(e, file=sys.stderr)
+                    connection.discard()
+                    for follower in followers:
+                        follower.close()
+                    followers = open_followers()
+                    pause(retry)
+                    retry = min(retry * 2, RETRY_MAX)
+                    continue
+                retry = POLL_INTERVAL
+                if count:
+                    sent += count
+                    for follower in followers:
+                        if follower.position is not None:
+                            checkpoints.set(follower.path, follower.position)
+                    checkpoints.save()
+                if args.progress > 0 and time.monotonic() - last >= args.progress:
+                    last = time.monotonic()
+                    print(json.dumps({'sent': sent,
+                                      'lag': {follower.path: follower.lag for follower in followers}}),
+                          file=sys.stderr, flush=True)
+                if not count:
+                    pause(args.pollinterval)
+        finally:
+            for follower in followers:
+                follower.close()
+            connection.close()
+
+    def _process_file_input(self, args: argparse.Namespace) -> dict:
+        """Ship the lines of a file in --file-input mode
+        Args:
+            args (argparser.Namespace): Command line arguments
+        Returns:
+            dict: the report
+        """
+        if not os.path.isfile(args.file_input):
+            print(f"{args.file_input} is not a file", file=sys.stderr)
+            sys.exit(1)
+        connection, shipper = self._prepare_shipper(args)
+
+        def progress(report):
+            print(f"{report['percent']}% - {report['messages']} messages - "
+                  f"{report['rate']} messages/s - {report['throughput']} MB/s", file=sys.stderr)
+
+        try:
+            report = shipper.ship(args.file_input, progress if args.progress > 0 else None,
+                                  args.progress)
+        except OSError as e:
+            print(e, file=sys.stderr)
+            connection.discard()
+            sys.exit(1)
+        finally:
+            connection.close()
+        if isinstance(shipper.pacer, pacing.AdaptivePacer):
+            report['pacing'] = shipper.pacer.report()
+        print(json.dumps(report))
+        return report
 
 def main():
     """Main : CLI logic"""
@@ -8,6 +8,28 @@ It saves the log messages to a file (specified with the -F --file option).
 It can display on the console using the --verbose (-v) option.
 It requires sudo permission to start the server.
 It uses two processes (one for UDP and one for TCP)
+With --workers N, the UDP/TCP processes only receive: they copy the raw
+datagrams into a shared-memory ring buffer consumed by N parser processes.
+With --wal PATH, accepted messages go through a write-ahead log before they are
+written to the log file, and are replayed on restart if the server died before
+the log file was synced.
+With --capture PATH, the received datagrams/frames are stored in a binary
+capture file that can be replayed with logreplay.
+TCP connections are handled by threads and read until closed; frames are
+delimited with octet counting, LF or NUL (RFC 6587).
+With --relp PORT, a RELP listener acknowledges the messages in batches, once
+they are written to the log file and synced (through the write-ahead log
+with --wal).
+With --stats PATH, a UNIX socket answers the "stats" command with the counters
+of all the processes as JSON.
+With --latency, the messages stamped by logtosyslog --latency are measured
+from the log call to the write of the log file: kernel receive timestamps
+(SO_TIMESTAMPNS), per stage histograms and sequence gaps in the stats.
+With --profile, a stack sampler runs in every process. SIGUSR2 (or the
+"profile" stats command) dumps the collapsed stacks (flamegraph format).
+With --output-format columnar, the messages are written in the blocks of a
+binary columnar file (lib/columnar.py) with the facility, the severity, the
+host and the app of their syslog header as columns, aggregated by logagg.
 
 Originally inspired by:
 - by: https://gist.github.com/marcelom/4218010 (pysyslog.py for UDP)
@@ -21,11 +43,25 @@ Originally inspired by:
 
 import logging
 import argparse
+import os
+import socket
 import socketserver
 import sys
+import signal
 import multiprocessing
+import threading
+import time
 
 from fruafr.log import logtoconsole
+from fruafr.log.lib import capture as capturelib
+from fruafr.log.lib import columnar
+from fruafr.log.lib import framing
+from fruafr.log.lib import latency
+from fruafr.log.lib import relp
+from fruafr.log.lib import ringbuffer
+from fruafr.log.lib import sampler
+from fruafr.log.lib import stats
+from fruafr.log.lib import wal
 
 # Defaults
 DEFAULT_LOG_FILE = '/tmp/fruafr-log-tinysyslogserver.log'
@@ -36,6 +72,15 @@ MODE = 'a'
 ENCODING = 'utf-8'
 POLL_INTERVAL = 0.1
 SEP = ' '
+WORKERS = 0
+RING_SIZE = ringbuffer.DEFAULT_CAPACITY
+MAX_DATAGRAM = 65535
+WAL_BATCH = 1000
+WAL_INTERVAL = 0.05
+WAL_COMMIT_INTERVAL = 1.0
+TCP_BUFFER = 65536
+PROFILE_DIR = '/tmp'
+OUTPUT_FORMATS = logtoconsole.OUTPUT_FORMATS + ('columnar',)
 
 class Console(logtoconsole.Console):
     """Class Console
@@ -79,6 +124,11 @@ class Console(logtoconsole.Console):
         parser.add_argument('-df', '--dateformat',
                             dest='dateformat',
                             help='Datetime format')
+        parser.add_argument('--output-format',
+                            dest='output_format',
+                            choices=OUTPUT_FORMATS,
+                            default=logtoconsole.OUTPUT_FORMAT,
+                            help=f"text: the --format line, jsonl: a JSON object per line with the fields of the format, columnar: binary blocks of time, facility, level, host, app and message columns (see logagg). Not supported with --workers [Default: {logtoconsole.OUTPUT_FORMAT}]")
         parser.add_argument('-L', '--level',
                             dest='level',
                             choices=['debug', 'info', 'warning', 'error', 'critical'],
@@ -108,6 +158,53 @@ class Console(logtoconsole.Console):
         parser.add_argument('-v', '--verbose', action='store_true', dest='verbose',
             default=False,
             help='Verbose output')
+        parser.add_argument('-w', '--workers',
+                            dest='workers',
+                            type=int,
+                            default=WORKERS,
+                            help=f"Number of parser processes fed through a shared memory ring buffer. 0 parses in the receiving process [Default: {WORKERS}]")
+        parser.add_argument('--ringsize',
+                            dest='ringsize',
+                            type=int,
+                            default=RING_SIZE,
+                            help=f"Size in bytes of each shared memory ring buffer [Default: {RING_SIZE}]")
+        parser.add_argument('--wal',
+                            dest='wal',
+                            help='Write-ahead log path prefix (.udp and .tcp are appended). Messages are replayed on restart if they were not synced to the log file. Not supported with --workers')
+        parser.add_argument('--walbatch',
+                            dest='walbatch',
+                            type=int,
+                            default=WAL_BATCH,
+                            help=f"Maximum number of messages per write-ahead log batch [Default: {WAL_BATCH}]")
+        parser.add_argument('--capture',
+                            dest='capture',
+                            help='Capture file path prefix (.udp and .tcp are appended). Every datagram or frame received is stored with its receive time and source address, to be replayed with logreplay')
+        parser.add_argument('--relp',
+                            dest='relp',
+                            type=int,
+                            help='Port of a RELP listener (tcp). The messages are acknowledged once written to the log file and synced (through the write-ahead log with --wal). Not supported with --workers')
+        parser.add_argument('--stats',
+                            dest='stats',
+                            help='Path of a UNIX socket answering the "stats" command (and "profile" with --profile)')
+        parser.add_argument('--latency',
+                            dest='latency',
+                            action='store_true',
+                            default=False,
+                            help='Measure the messages stamped by logtosyslog --latency: network, queue and write latency histograms and sequence gaps in the "stats" answer. Requires --stats. Not supported with --workers')
+        parser.add_argument('--profile',
+                            dest='profile',
+                            action='store_true',
+                            default=False,
+                            help='Run a stack sampler in every process. SIGUSR2 (or the "profile" stats command) dumps the collapsed stacks')
+        parser.add_argument('--profileinterval',
+                            dest='profileinterval',
+                            type=float,
+                            default=sampler.INTERVAL,
+                            help=f"Stack sampling interval in seconds of CPU time [Default: {sampler.INTERVAL}]")
+        parser.add_argument('--profiledir',
+                            dest='profiledir',
+                            default=PROFILE_DIR,
+                            help=f"Directory of the tinysyslogserver.PID.folded files written on SIGUSR2 [Default: {PROFILE_DIR}]")
         # return
         return parser.parse_args(args)
 
@@ -131,10 +228,16 @@ class Console(logtoconsole.Console):
         logger = logging.getLogger('')
         # set the level of the root logger
         logger.setLevel(logging.DEBUG)
+        if self.output_format == 'columnar':
+            # the time and the level are columns, not formatted
+            fileh = SyslogColumnarFileHandler(filename, mode)
+            fileh.setLevel(logging.DEBUG)
+            logger.addHandler(fileh)
+            return logger
         # set the formatter
-        formatter = logging.Formatter(fmt, datefmt)
+        formatter = self._prepare_formatter(fmt, datefmt)
         # add the file handler
-        fileh = logging.FileHandler(filename, mode, encoding)
+        fileh = BatchFileHandler(filename, mode, encoding)
         fileh.setFormatter(formatter)
         fileh.setLevel(logging.DEBUG)
         logger.addHandler(fileh)
@@ -146,8 +249,9 @@ class Console(logtoconsole.Console):
         Args:
             args (argparser.Namespace): Command line arguments
         Returns:
-            set: UDPServer, TCPserver
+            set: UDPServer, TCPserver, RELP server
         """
+        self.output_format = args.output_format
         # determine the format
         fmt = self._prepare_fmt(args)
         # determine the date format
@@ -157,87 +261,685 @@ class Console(logtoconsole.Console):
         if args.verbose:
             # create the logger and obtain it
             self._prepare_console_logger(fmt, date_format)
+        if args.wal is not None and args.workers > 0:
+            print("--wal is not supported with --workers", file=sys.stderr)
+            sys.exit(1)
+        if args.relp is not None and args.workers > 0:
+            print("--relp is not supported with --workers", file=sys.stderr)
+            sys.exit(1)
+        if args.latency and (args.workers > 0 or args.stats is None):
+            print("--latency requires --stats and is not supported with --workers", file=sys.stderr)
+            sys.exit(1)
+        if args.output_format == 'columnar' and args.workers > 0:
+            # the parser processes have no loop writing the pending blocks
+            print("--output-format columnar is not supported with --workers", file=sys.stderr)
+            sys.exit(1)
         # create the server object
         server_tcp = None
         server_udp = None
+        server_relp = None
         # if UDP server
         if not args.noudp:
-            server_udp = socketserver.UDPServer((args.address, int(args.port)), SyslogUDPHandler)
+            udp_class = LatencyUDPServer if args.latency else socketserver.UDPServer
+            server_udp = udp_class((args.address, int(args.port)), SyslogUDPHandler)
+            self._prepare_latency(server_udp, args.latency)
+            self._prepare_columnar(server_udp)
+            if args.wal is not None:
+                self._prepare_spool(server_udp, f"{args.wal}.udp", args.walbatch)
+            if args.capture is not None:
+                self._prepare_capture(server_udp, f"{args.capture}.udp")
         # if TCP server
         if args.tcp:
-            server_tcp = socketserver.TCPServer((args.address, int(args.port)), SyslogTCPHandler)
+            server_tcp = ThreadingTCPServer((args.address, int(args.port)), SyslogTCPHandler)
+            self._prepare_latency(server_tcp, args.latency)
+            self._prepare_columnar(server_tcp)
+            if args.wal is not None:
+                self._prepare_spool(server_tcp, f"{args.wal}.tcp", args.walbatch)
+            if args.capture is not None:
+                self._prepare_capture(server_tcp, f"{args.capture}.tcp")
+        # if RELP server
+        if args.relp is not None:
+            server_relp = ThreadingTCPServer((args.address, args.relp), SyslogRELPHandler)
+            self._prepare_latency(server_relp, args.latency)
+            self._prepare_columnar(server_relp)
+            if args.wal is not None:
+                self._prepare_spool(server_relp, f"{args.wal}.relp", args.walbatch)
         # return the server
-        return (server_udp, server_tcp)
+        return (server_udp, server_tcp, server_relp)
+
+    def _prepare_spool(self, server: socketserver.BaseServer, path: str,
+                       batch: int = WAL_BATCH) -> None:
+        """Attach a write-ahead log spool to a server.
+        Replays the messages left in the write-ahead log by a previous run
+        Args:
+            server (socketserver.BaseServer): the server
+            path (str): the write-ahead log path
+            batch (int): maximum number of messages per batch [default: WAL_BATCH]
+        """
+        spool = WalSpool(wal.WriteAheadLog(path), logging.getLogger(''), batch)
+        spool.latency = getattr(server, 'latency', None)
+        recovered = spool.recover()
+        if recovered:
+            print(f"SYSLOG server recovered {recovered} message(s) from {path}", file=sys.stdout)
+        server.spool = spool
+        # flush the batch from the serve_forever loop
+        add_service_action(server, spool.service)
+
+    def _prepare_latency(self, server: socketserver.BaseServer, enabled: bool) -> None:
+        """Attach a latency tracker to a server (--latency).
+        The listening socket asks for the kernel receive timestamps
+        Args:
+            server (socketserver.BaseServer): the server
+            enabled (bool): --latency
+        """
+        if not enabled:
+            return
+        latency.enable_timestamps(server.socket)
+        # the counters are attached in the server process
+        server.latency = latency.LatencyTracker()
+
+    def _prepare_columnar(self, server: socketserver.BaseServer) -> None:
+        """Write the pending block of the columnar file handlers from the
+        serve_forever loop once it waited columnar.MAX_DELAY
+        Args:
+            server (socketserver.BaseServer): the server
+        """
+        for hdlr in logging.getLogger('').handlers:
+            if isinstance(hdlr, columnar.ColumnarFileHandler):
+                add_service_action(server, hdlr.service)
+
+    def _prepare_capture(self, server: socketserver.BaseServer, path: str) -> None:
+        """Attach a capture writer to a server.
+        Every datagram or frame received is stored in the capture file
+        Args:
+            server (socketserver.BaseServer): the server
+            path (str): the capture file path
+        """
+        server.capture = LockedCaptureWriter(path)
+        add_service_action(server, server.capture.flush)
+
+class ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    """TCP server handling each connection in a thread"""
+    daemon_threads = True
+    # restart while the connections of the previous run are still closing
+    allow_reuse_address = True
+
+class LatencyUDPServer(socketserver.UDPServer):
+    """UDP server receiving the kernel receive timestamp of each datagram.
+    The request is (data, socket, receive time in nanoseconds)
+    """
+
+    def get_request(self):
+        data, ancdata, _, client_addr = self.socket.recvmsg(self.max_packet_size, latency.CMSG_SIZE)
+        return (data, self.socket, latency.receive_time(ancdata)), client_addr
+
+class LockedCaptureWriter(capturelib.CaptureWriter):
+    """Capture writer shared by the connection threads"""
+
+    def __init__(self, path: str) -> None:
+        """LockedCaptureWriter constructor
+        Args:
+            path (str): path of the capture file
+        """
+        super().__init__(path)
+        # write() may call flush()
+        self._lock = threading.RLock()
+
+    def write(self, data: bytes, protocol: int = capturelib.UDP, address: tuple = ('', 0),
+              timestamp: float = None) -> None:
+        with self._lock:
+            super().write(data, protocol, address, timestamp)
+
+    def flush(self) -> None:
+        with self._lock:
+            super().flush()
+
+class BatchFileHandler(logging.FileHandler):
+    """FileHandler that does not flush after each record while a batch is
+    logged (the write-ahead log spool flushes and syncs once per batch)"""
+    batching = False
+
+    def flush(self) -> None:
+        if not self.batching:
+            super().flush()
+
+class SyslogColumnarFileHandler(columnar.ColumnarFileHandler):
+    """ColumnarFileHandler storing the facility, the severity, the host and the
+    app of the syslog header of the CLIENTIP-<PRI>... messages (the client ip
+    is the host of the messages without a header)"""
+
+    def columns(self, record: logging.LogRecord) -> tuple:
+        clientip, _, data = record.getMessage().partition('-')
+        facility, level, host, app, message = columnar.parse_syslog(data)
+        return (facility, record.levelno if level is None else level,
+                host or clientip, app or '', message)
+
+def add_service_action(server: socketserver.BaseServer, action) -> None:
+    """Add an action called by the serve_forever loop of the server
+    Args:
+        server (socketserver.BaseServer): the server
+        action (callable): the action to call
+    """
+    previous = server.service_actions
+    def service_actions():
+        previous()
+        action()
+    server.service_actions = service_actions
+
+class WalSpool:
+    """Batches the accepted messages through the write-ahead log.
+    A batch is written and synced to the write-ahead log, then logged. The
+    write-ahead log makes the batch durable: the log files are synced and the
+    write-ahead log is committed every commit_interval only, so a batch costs
+    one fdatasync instead of two. After a crash, the messages logged since the
+    last commit are replayed (at least once delivery).
+    """
+
+    def __init__(self, log: wal.WriteAheadLog, logger: logging.Logger,
+                 batch: int = WAL_BATCH, interval: float = WAL_INTERVAL,
+                 commit_interval: float = WAL_COMMIT_INTERVAL) -> None:
+        """WalSpool constructor
+        Args:
+            log (wal.WriteAheadLog): the write-ahead log
+            logger (logging.Logger): the logger writing the messages
+            batch (int): maximum number of messages per batch [default: WAL_BATCH]
+            interval (float): maximum time in seconds a message waits in the batch
+             [default: WAL_INTERVAL]
+            commit_interval (float): maximum time in seconds between the sync of
+             the log files and the commit of the write-ahead log [default: WAL_COMMIT_INTERVAL]
+        """
+        self.wal = log
+        self.logger = logger
+        self.batch = batch
+        self.interval = interval
+        self.commit_interval = commit_interval
+        # LSN of the batches logged but not committed
+        self.lsn = None
+        self.commit_deadline = None
+        self.pending = []
+        # tokens of the messages measured by --latency
+        self.tokens = []
+        self.latency = None
+        self.deadline = None
+        # the TCP connections are handled by several threads
+        self.lock = threading.RLock()
+
+    def accept(self, message: str, token: int = None) -> None:
+        """Add a message to the batch
+        Args:
+            message (str): the message to log
+            token (int): the latency token of the message [default: None]
+        """
+        with self.lock:
+            if not self.pending:
+                self.deadline = time.monotonic() + self.interval
+            self.pending.append(message)
+            if token is not None:
+                self.tokens.append(token)
+            if len(self.pending) >= self.batch:
+                self.flush()
+
+    def service(self) -> None:
+        """Flush the batch and commit if their deadline is reached"""
+        with self.lock:
+            now = time.monotonic()
+            if self.pending and now >= self.deadline:
+                self.flush()
+            if self.lsn is not None and now >= self.commit_deadline:
+                self.commit()
+
+    def _batch_outputs(self, batching: bool) -> None:
+        """Defer the flush of each record of the batch file handlers"""
+        for hdlr in self.logger.handlers:
+            if isinstance(hdlr, BatchFileHandler):
+                hdlr.batching = batching
+
+    def _sync_outputs(self) -> None:
+        """Flush and fdatasync the file handlers of the logger"""
+        sync_outputs(self.logger)
+
+    def flush(self) -> None:
+        """Write the batch to the write-ahead log and log it"""
+        with self.lock:
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, []
+            # encoded per batch, not per message
+            self.wal.extend([message.encode() for message in pending])
+            lsn = self.wal.write()
+            self._batch_outputs(True)
+            try:
+                for message in pending:
+                    self.logger.info(message)
+            finally:
+                self._batch_outputs(False)
+            for hdlr in self.logger.handlers:
+                hdlr.flush()
+            if self.lsn is None:
+                self.commit_deadline = time.monotonic() + self.commit_interval
+            self.lsn = lsn
+            if self.tokens:
+                tokens, self.tokens = self.tokens, []
+                for token in tokens:
+                    self.latency.written(token)
+
+    def commit(self) -> None:
+        """Sync the log files and commit the write-ahead log up to the logged batches"""
+        with self.lock:
+            if self.lsn is None:
+                return
+            self._sync_outputs()
+            self.wal.commit(self.lsn)
+            self.lsn = None
+
+    def recover(self) -> int:
+        """Log the messages left in the write-ahead log by a previous run
+        Returns:
+            int: the number of messages recovered
+        """
+        count = 0
+        for payload in self.wal.recover():
+            self.logger.info(payload.decode())
+            count += 1
+        if count:
+            self._sync_outputs()
+        self.wal.reset()
+        return count
+
+def sync_outputs(logger: logging.Logger) -> None:
+    """Flush and fdatasync the file handlers of a logger
+    Args:
+        logger (logging.Logger): the logger
+    """
+    for hdlr in logger.handlers:
+        if isinstance(hdlr, logging.FileHandler) and hdlr.stream is not None:
+            hdlr.flush()
+            os.fdatasync(hdlr.stream.fileno())
+        elif isinstance(hdlr, columnar.ColumnarFileHandler):
+            hdlr.sync()
+
+def sync_messages(server: socketserver.BaseServer) -> None:
+    """Make the messages accepted by a server durable: write the batch of
+    the write-ahead log spool if any, sync the log files otherwise
+    Args:
+        server (socketserver.BaseServer): the server
+    """
+    spool = getattr(server, 'spool', None)
+    if spool is not None:
+        spool.flush()
+        return
+    sync_outputs(logging.getLogger(''))
+
+def accept_message(server: socketserver.BaseServer, message: str, token: int = None) -> None:
+    """Log a received message, through the write-ahead log spool if any
+    Args:
+        server (socketserver.BaseServer): the server that received the message
+        message (str): the message to log
+        token (int): the latency token of the message (--latency) [default: None]
+    """
+    spool = getattr(server, 'spool', None)
+    if spool is not None:
+        spool.accept(message, token)
+        return
+    logger = logging.getLogger('')
+    logger.info(message)
+    if token is not None:
+        server.latency.written(token)
+
+def receive(request, size: int, stamped: bool = False) -> tuple:
+    """Read a connected socket
+    Args:
+        request (socket.socket): the connected socket
+        size (int): maximum number of bytes
+        stamped (bool): return the kernel receive timestamp (--latency) [default: False]
+    Returns:
+        tuple: (data, receive time in nanoseconds or None)
+    """
+    if not stamped:
+        return request.recv(size), None
+    data, ancdata, _, _ = request.recvmsg(size, latency.CMSG_SIZE)
+    return data, latency.receive_time(ancdata)
+
+def read_frames(request, server: socketserver.BaseServer, address: tuple, stamped: bool = False):
+    """Read a syslog TCP stream until the connection is closed
+    Args:
+        request (socket.socket): the connected socket
+        server (socketserver.BaseServer): the server (its capture writer is used if any)
+        address (tuple): the client address
+        stamped (bool): yield (frame, receive time of the read) [default: False]
+    Returns:
+        Iterator over the frames (bytes)
+    """
+    capture = getattr(server, 'capture', None)
+    counters = getattr(server, 'stats', None)
+    if counters is not None:
+        counters.add('tcp_connections')
+    decoder = framing.FrameDecoder()
+    while True:
+        data, received = receive(request, TCP_BUFFER, stamped)
+        frames = decoder.feed(data) if data else decoder.flush()
+        for frame in frames:
+            if capture is not None:
+                capture.write(frame, capturelib.TCP, address)
+            if counters is not None:
+                counters.add('tcp_messages')
+                counters.add('tcp_bytes', len(frame))
+            yield (frame, received) if stamped else frame
+        if not data:
+            return
 
 class SyslogUDPHandler(socketserver.BaseRequestHandler):
     """Syslog UDP handler handles UDP requests"""
 
     def handle(self):
-        data = str(bytes.decode(self.request[0].strip()))
+        capture = getattr(self.server, 'capture', None)
+        if capture is not None:
+            capture.write(self.request[0], capturelib.UDP, self.client_address)
+        counters = getattr(self.server, 'stats', None)
+        if counters is not None:
+            counters.add('udp_messages')
+            counters.add('udp_bytes', len(self.request[0]))
         clientip = self.client_address[0]
+        data = self.request[0].strip()
+        token = None
+        tracker = getattr(self.server, 'latency', None)
+        if tracker is not None:
+            data, token = tracker.received(data, clientip, self.request[2])
+        data = str(bytes.decode(data))
         message = f"{clientip}-{data}"
         # log the message
-        logger = logging.getLogger('')
-        logger.info(message)
+        accept_message(self.server, message, token)
 
 class SyslogTCPHandler(socketserver.BaseRequestHandler):
-    """Syslog TCP handler handles TCP requests"""
+    """Syslog TCP handler handles TCP requests.
+    Reads the connection until it is closed and logs each frame (RFC 6587)
+    """
 
     def handle(self):
-        data = self.request.recv(1024).strip()
         clientip = self.client_address[0]
-        message = f"{clientip}-{data}"
-        # log the message
-        logger = logging.getLogger('')
-        logger.info(message)
+        tracker = getattr(self.server, 'latency', None)
+        if tracker is not None:
+            for frame, received in read_frames(self.request, self.server, self.client_address, True):
+                data, token = tracker.received(frame.strip(), clientip, received)
+                accept_message(self.server, f"{clientip}-{data.decode(errors='replace')}", token)
+            return
+        for frame in read_frames(self.request, self.server, self.client_address):
+            data = frame.strip().decode(errors='replace')
+            message = f"{clientip}-{data}"
+            # log the message
+            accept_message(self.server, message)
+
+class SyslogRELPHandler(socketserver.BaseRequestHandler):
+    """RELP handler. The messages of each read are logged and synced, then
+    acknowledged with a single write
+    """
+
+    def handle(self):
+        clientip = self.client_address[0]
+        counters = getattr(self.server, 'stats', None)
+        if counters is not None:
+            counters.add('relp_connections')
+        tracker = getattr(self.server, 'latency', None)
+        # receive time of the current read
+        received = None
+
+        def accept(frame):
+            if counters is not None:
+                counters.add('relp_messages')
+                counters.add('relp_bytes', len(frame))
+            data, token = frame.strip(b'\n\x00 '), None
+            if tracker is not None:
+                data, token = tracker.received(data, clientip, received)
+            accept_message(self.server, f"{clientip}-{data.decode(errors='replace')}", token)
+
+        session = relp.RelpSession(accept, lambda: sync_messages(self.server))
+        while not session.closed:
+            data, received = receive(self.request, TCP_BUFFER, tracker is not None)
+            if not data:
+                return
+            try:
+                response = session.feed(data)
+            except ValueError:
+                # not RELP: the client sends the unacknowledged messages again
+                return
+            if response:
+                self.request.sendall(response)
+
+class RingTCPHandler(socketserver.BaseRequestHandler):
+    """TCP handler copying the received frames to the ring buffer of the server"""
+
+    def handle(self):
+        meta = self.client_address[0].encode()
+        for frame in read_frames(self.request, self.server, self.client_address):
+            with self.server.ring_lock:
+                self.server.ring.put(frame, meta)
 
 def udp_listen(server):
     """Listen to udp traffic"""
     while True:
         server.serve_forever(poll_interval=POLL_INTERVAL)
 
+def udp_receive(server, ring: ringbuffer.RingBuffer):
+    """Receive udp datagrams and copy them to the ring buffer.
+    No parsing is done here so that the socket is drained as fast as possible
+    Args:
+        server (socketserver.UDPServer): the bound UDP server
+        ring (ringbuffer.RingBuffer): the ring buffer to write to
+    """
+    sock = server.socket
+    buf = bytearray(MAX_DATAGRAM)
+    view = memoryview(buf)
+    put = ring.put
+    capture = getattr(server, 'capture', None)
+    counters = getattr(server, 'stats', None)
+    if counters is None:
+        counters = stats.ServerStats(1).slot(0)
+    count = counters.add
+    if capture is None:
+        while True:
+            nbytes, address = sock.recvfrom_into(buf)
+            put(view[:nbytes], address[0].encode())
+            count('udp_messages')
+            count('udp_bytes', nbytes)
+    # with a capture file, wake up regularly to flush it
+    sock.settimeout(POLL_INTERVAL)
+    while True:
+        try:
+            nbytes, address = sock.recvfrom_into(buf)
+        except socket.timeout:
+            capture.flush()
+            continue
+        capture.write(view[:nbytes], capturelib.UDP, address)
+        put(view[:nbytes], address[0].encode())
+        count('udp_messages')
+        count('udp_bytes', nbytes)
+
+def tcp_receive(server, ring: ringbuffer.RingBuffer):
+    """Receive tcp data and copy it to the ring buffer
+    Args:
+        server (socketserver.TCPServer): the bound TCP server
+        ring (ringbuffer.RingBuffer): the ring buffer to write to
+    """
+    server.RequestHandlerClass = RingTCPHandler
+    server.ring = ring
+    # the connections are handled by several threads but the ring has a single producer
+    server.ring_lock = threading.Lock()
+    tcp_listen(server)
+
+def parse_worker(rings: list):
+    """Consume the ring buffers: decode, format and log the messages
+    Args:
+        rings (list): list of ring buffers fed with udp datagrams or tcp frames
+    """
+    logger = logging.getLogger('')
+    # only block on the ring when there is a single source
+    timeout = None if len(rings) == 1 else POLL_INTERVAL
+    while True:
+        for ring in rings:
+            for meta, data in ring.get_batch(timeout=timeout):
+                data = data.strip().decode(errors='replace')
+                logger.info(f"{meta.decode()}-{data}")
+
 def tcp_listen(server):
     """Listen to tcp traffic"""
     while True:
         server.serve_forever(poll_interval=POLL_INTERVAL)
 
+def run_child(target, args: tuple, server: socketserver.BaseServer = None,
+              stats_slot: stats.StatsSlot = None, profile: tuple = None) -> None:
+    """Entry point of the server child processes
+    Args:
+        target (callable): the function run by the process
+        args (tuple): the arguments of the function
+        server (socketserver.BaseServer, optional): the server used by the process
+        stats_slot (stats.StatsSlot, optional): the counters of the process
+        profile (tuple, optional): (interval, directory) to run the stack sampler
+    """
+    if server is not None:
+        server.stats = stats_slot
+        if getattr(server, 'latency', None) is not None:
+            server.latency.counters = stats_slot
+    if profile is not None:
+        interval, directory = profile
+        profiler = sampler.StackSampler(interval)
+        path = profile_path(directory, os.getpid())
+        signal.signal(signal.SIGUSR2, lambda signum, frame: profiler.dump(path))
+        profiler.start()
+    # exit cleanly when terminated, writing the pending columnar blocks and
+    # committing the write-ahead log
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        target(*args)
+    finally:
+        spool = getattr(server, 'spool', None)
+        if spool is not None:
+            spool.flush()
+            spool.commit()
+        logging.shutdown()
+
+def profile_path(directory: str, pid: int) -> str:
+    """Returns the path of the collapsed stacks of a process
+    Args:
+        directory (str): the profile directory
+        pid (int): the process id
+    Returns:
+        str: the path
+    """
+    return f"{directory}/tinysyslogserver.{pid}.folded"
+
+def collect_profiles(children: list, directory: str, timeout: float = 2.0) -> str:
+    """Ask the children to dump their samples and merge them
+    Args:
+        children (list): the child processes
+        directory (str): the profile directory
+        timeout (float, optional): maximum time to wait for the dumps
+    Returns:
+        str: the merged collapsed stacks
+    """
+    requested = time.time()
+    paths = [profile_path(directory, child.pid) for child in children]
+    for child in children:
+        os.kill(child.pid, signal.SIGUSR2)
+    deadline = time.monotonic() + timeout
+    pending = list(paths)
+    while pending and time.monotonic() < deadline:
+        pending = [path for path in pending
+                   if not os.path.exists(path) or os.path.getmtime(path) < requested]
+        time.sleep(0.01)
+    counts = {}
+    for path in paths:
+        if path in pending:
+            continue
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                counts[stack] = counts.get(stack, 0) + int(count)
+    return ''.join(f"{stack} {count}\n" for stack, count in
+                   sorted(counts.items(), key=lambda item: -item[1]))
+
 def main():
     """Main : CLI logic"""
     # parse arguments
     args = Console().parse_args(sys.argv[1:])
     # process arguments
     servers = Console().process(args)
+    children = []
+    rings = []
+    stats_server = None
     # start serving
     try:
         print("SYSLOG server starting...")
-        # prepare the UDP and the TCP threads
+        # prepare the UDP and the TCP processes
+        # (target, args, server) of each child process
+        specs = []
+        if args.workers > 0:
+            udp_rings = [] if args.noudp else [ringbuffer.RingBuffer(args.ringsize)]
+            tcp_rings = [ringbuffer.RingBuffer(args.ringsize)] if args.tcp else []
+            rings = udp_rings + tcp_rings
         if not args.noudp:
             print(f"SYSLOG server starting with : {args.address}:{args.port}/UDP ...", file=sys.stdout)
-            t1 = multiprocessing.Process(target=udp_listen, args=(servers[0],))
+            if args.workers > 0:
+                specs.append((udp_receive, (servers[0], udp_rings[0]), servers[0]))
+            else:
+                specs.append((udp_listen, (servers[0],), servers[0]))
         if args.tcp:
             print(f"SYSLOG server starting with : {args.address}:{args.port}/TCP ...", file=sys.stdout)
-            t2 = multiprocessing.Process(target=tcp_listen, args=(servers[1],))
+            if args.workers > 0:
+                specs.append((tcp_receive, (servers[1], tcp_rings[0]), servers[1]))
+            else:
+                specs.append((tcp_listen, (servers[1],), servers[1]))
+        if args.relp is not None:
+            print(f"SYSLOG server starting with : {args.address}:{args.relp}/RELP ...", file=sys.stdout)
+            specs.append((tcp_listen, (servers[2],), servers[2]))
+        if args.workers > 0:
+            print(f"SYSLOG server parsing with {args.workers} worker process(es) ...", file=sys.stdout)
+            specs += [(parse_worker, (rings,), None)] * args.workers
+        counters = stats.ServerStats(len(specs),
+                                     stats.COUNTERS + (latency.COUNTERS if args.latency else ()))
+        profile = (args.profileinterval, args.profiledir) if args.profile else None
+        for i, (target, target_args, server) in enumerate(specs):
+            children.append(multiprocessing.Process(
+                target=run_child,
+                args=(target, target_args, server,
+                      counters.slot(i, isinstance(server, socketserver.ThreadingMixIn)), profile)))
         # print  messages
         print("Do not forget to open the port in your firewall if necessary (if not running on localhost)")
         print("Waiting for connections...")
-        # start the threads
-        if not args.noudp:
-            t1.start()
-        if args.tcp:
-            t2.start()
-        # join the threads
-        if not args.noudp:
-            t1.join()
-        if args.tcp:
-            t2.join()
+        # start the processes
+        for child in children:
+            child.start()
+        # stop the children and release the ring buffers on SIGTERM as well
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        if args.profile:
+            # forward the dump request to the children
+            signal.signal(signal.SIGUSR2,
+                          lambda signum, frame: [os.kill(child.pid, signum) for child in children])
+        if args.stats is not None:
+            commands = {
+                'stats': lambda: latency.summarize(dict(counters.snapshot(),
+                                                        ring_dropped=sum(ring.dropped for ring in rings))),
+            }
+            if args.profile:
+                commands['profile'] = lambda: collect_profiles(children, args.profiledir)
+            stats_server = stats.StatsServer(args.stats, commands)
+            stats_server.start()
+        # join the processes
+        for child in children:
+            child.join()
     except (IOError, SystemExit) as e:
         raise IOError(str(e)) from e
     except KeyboardInterrupt:
-        if not args.noudp:
-            t1.terminate()
-        if args.tcp:
-            t2.terminate()
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for child in children:
+            child.terminate()
         print (" Crtl+C Pressed.\n SYSLOG server shutting down.")
+    finally:
+        if stats_server is not None:
+            stats_server.shutdown()
+            stats_server.server_close()
+        for ring in rings:
+            ring.close()
+            ring.unlink()
 
 if __name__ == "__main__":
     main()
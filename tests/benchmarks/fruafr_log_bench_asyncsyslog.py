@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of the event loop lag caused by syslog handlers
+
+An asyncio application logs records through logging.handlers.SysLogHandler
+over TCP and through AsyncSysLogHandler, to a slow collector (a thread
+reading a small receive buffer, then sleeping). A probe task sleeps TICK
+seconds in a loop and measures how late it wakes up: the loop lag. The
+blocking handler stalls the loop whenever the collector socket buffer is
+full; the asynchronous one drops (and counts) the records instead. Once
+the collector is idle, lost gives the records neither received nor counted
+as dropped (buffered by the transport when the shutdown timeout expired).
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_asyncsyslog.py --messages 20000 --read-delay 0.01`
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+from logging import handlers
+
+from fruafr_log_loadharness import HOST, percentile
+from fruafr.log.lib import asyncsyslog
+
+TICK = 0.005
+READ_SIZE = 4096
+IDLE = 1.0
+
+
+def collector(server: socket.socket, read_delay: float, received: list) -> None:
+    """Slow TCP collector: reads READ_SIZE bytes every read_delay seconds, until the client closes"""
+    while True:
+        try:
+            conn, _ = server.accept()
+        except OSError:
+            return
+        with conn:
+            while True:
+                chunk = conn.recv(READ_SIZE)
+                if not chunk:
+                    break
+                received[0] += chunk.count(b'\000')
+                time.sleep(read_delay)
+
+
+def wait_idle(received: list) -> int:
+    """Returns the messages received once the collector received nothing for IDLE seconds"""
+    last = -1
+    while received[0] != last:
+        last = received[0]
+        time.sleep(IDLE)
+    return last
+
+
+async def probe(lags: list, stop: asyncio.Event) -> None:
+    """Measure how late the loop wakes up a TICK sleep"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def produce(logger: logging.Logger, messages: int, size: int, batch: int) -> None:
+    """Log messages, yielding to the loop every batch records"""
+    payload = 'x' * size
+    for seq in range(messages):
+        logger.info("lag-%d %s", seq, payload)
+        if seq % batch == batch - 1:
+            await asyncio.sleep(0)
+
+
+def run(case: str, handler: logging.Handler, args: argparse.Namespace, received: list) -> dict:
+    """Log through handler while probing the loop lag"""
+    logger = logging.getLogger(f"bench.{case}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    lags = []
+
+    async def main():
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(lags, stop))
+        start = time.perf_counter()
+        await produce(logger, args.messages, args.size, args.batch)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await task
+        return elapsed
+
+    received[0] = 0
+    elapsed = asyncio.run(main())
+    logger.removeHandler(handler)
+    lags.sort()
+    result = {'case': case, 'messages': args.messages, 'log_seconds': round(elapsed, 3),
+              'lag_ms_p50': round(1000 * percentile(lags, 50), 2) if lags else None,
+              'lag_ms_p99': round(1000 * percentile(lags, 99), 2) if lags else None,
+              'lag_ms_max': round(1000 * lags[-1], 2) if lags else None,
+              'probes': len(lags)}
+    handler.close()
+    if isinstance(handler, asyncsyslog.AsyncSysLogHandler):
+        # the records the slow collector could not take before the shutdown timeouts
+        result['dropped'] = handler.dropped
+    return result
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='asyncio loop lag benchmark')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=100, help='records logged between two yields to the loop')
+    parser.add_argument('--read-delay', type=float, default=0.01, help='collector sleep between two reads')
+    parser.add_argument('--queue-size', type=int, default=asyncsyslog.QUEUE_SIZE)
+    args = parser.parse_args()
+    results = []
+    for case in ('SysLogHandler', 'AsyncSysLogHandler'):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, READ_SIZE)
+            server.bind((HOST, 0))
+            server.listen()
+            received = [0]
+            reader = threading.Thread(target=collector, args=(server, args.read_delay, received), daemon=True)
+            reader.start()
+            if case == 'SysLogHandler':
+                handler = handlers.SysLogHandler(server.getsockname(), socktype=socket.SOCK_STREAM)
+            else:
+                handler = asyncsyslog.AsyncSysLogHandler(server.getsockname(), socktype=socket.SOCK_STREAM,
+                                                         queue_size=args.queue_size)
+            result = run(case, handler, args, received)
+            result['received'] = wait_idle(received)
+            result['lost'] = args.messages - result['received'] - result.get('dropped', 0)
+            results.append(result)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
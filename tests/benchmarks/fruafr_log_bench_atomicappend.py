@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of concurrent appends to one log file
+
+Several processes log records of --size bytes to the same file through
+logging.FileHandler and through AtomicAppendHandler (one write per record,
+or per batch of --batch records with emit_batch). Reports the records per
+second and the torn lines: the lines that are not a complete record.
+emit_batch packs the records in writes of at most ATOMIC_SIZE bytes, so
+it only saves system calls for records well below that size.
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_atomicappend.py --processes 8 --records 20000 --size 200`
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import logging
+import multiprocessing
+import re
+import tempfile
+import time
+
+from fruafr.log.lib import atomicappend
+
+CASES = ('FileHandler', 'AtomicAppendHandler', 'AtomicAppendHandler.emit_batch')
+LINE = re.compile(r'^(\d+)-(\d+) (x*)$')
+
+
+def write(case: str, filename: str, writer: int, records: int, size: int, batch: int, start) -> None:
+    """Log records from a separate process, once all the processes are ready"""
+    if case == 'FileHandler':
+        handler = logging.FileHandler(filename, encoding='utf-8')
+    else:
+        handler = atomicappend.AtomicAppendHandler(filename, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger = logging.getLogger(f"bench.{writer}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    payload = 'x' * size
+    start.wait()
+    if case.endswith('emit_batch'):
+        for first in range(0, records, batch):
+            handler.emit_batch([logger.makeRecord(logger.name, logging.INFO, __file__, 0, "%d-%d %s", (writer, seq, payload), None)
+                                for seq in range(first, min(first + batch, records))])
+    else:
+        for seq in range(records):
+            logger.info("%d-%d %s", writer, seq, payload)
+    handler.close()
+
+
+def torn(filename: str, size: int) -> tuple:
+    """Returns the complete records and the torn lines of the log file"""
+    complete = broken = 0
+    with open(filename, 'r', encoding='utf-8', errors='replace') as file:
+        for line in file:
+            match = LINE.match(line.rstrip('\n'))
+            if match and len(match.group(3)) == size:
+                complete += 1
+            else:
+                broken += 1
+    return complete, broken
+
+
+def run(case: str, args: argparse.Namespace) -> dict:
+    """Run the writer processes of a case"""
+    context = multiprocessing.get_context('fork')
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = f"{tmp}/bench.log"
+        start = context.Barrier(args.processes + 1)
+        processes = [context.Process(target=write, args=(case, filename, writer, args.records, args.size, args.batch, start))
+                     for writer in range(args.processes)]
+        for process in processes:
+            process.start()
+        start.wait()
+        begin = time.perf_counter()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - begin
+        complete, broken = torn(filename, args.size)
+    total = args.processes * args.records
+    return {'case': case, 'processes': args.processes, 'records': total, 'size': args.size,
+            'seconds': round(elapsed, 3), 'records_per_second': round(total / elapsed),
+            'complete': complete, 'torn_lines': broken}
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='concurrent append benchmark')
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--records', type=int, default=20000, help='records per process')
+    parser.add_argument('--size', type=int, default=200, help='payload size')
+    parser.add_argument('--batch', type=int, default=50, help='records per emit_batch call')
+    args = parser.parse_args()
+    print(json.dumps([run(case, args) for case in CASES], indent=2))
+
+
+if __name__ == "__main__":
+    main()
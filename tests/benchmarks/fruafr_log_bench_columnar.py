@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of the aggregation of the columnar log files
+
+Writes --records records (4 levels, --hosts hosts, 10 apps, one per 10 ms)
+to a text log file and to a columnar log file, then counts them by level,
+by host and by minute:
+- text: the lines read and split, the time parsed with timeindex.TimestampParser
+- columnar: columnar.count_by on the blocks (NumPy if installed, reported)
+Reports the file sizes, the seconds and the records per second of each
+count. The counts of both files are checked to be the same.
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_columnar.py --records 1000000`
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import collections
+import json
+import logging
+import os
+import tempfile
+import time
+
+from fruafr.log.lib import columnar
+from fruafr.log.lib import timeindex
+
+FORMAT = '%(asctime)s - %(levelname)s - %(host)s - %(app)s - %(message)s'
+LEVELS = (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR)
+START = 1697184000.0
+INTERVAL = 60
+
+
+def write(text_path: str, columnar_path: str, count: int, hosts: int) -> None:
+    """Write the records to both files"""
+    formatter = logging.Formatter(FORMAT)
+    handler = columnar.ColumnarFileHandler(columnar_path, mode='w', block_records=columnar.MAX_RECORDS)
+    with open(text_path, 'w', encoding='utf-8') as file:
+        for seq in range(count):
+            record = logging.LogRecord('bench', LEVELS[seq % 7 % 4], __file__, 1,
+                                       'request /api/items/%d served in %d ms', (seq, seq % 100), None)
+            record.created = START + seq / 100
+            record.msecs = seq % 100 * 10
+            record.host = f"web-{seq % hosts:02d}"
+            record.app = f"app{seq % 10}"
+            file.write(formatter.format(record) + '\n')
+            handler.handle(record)
+    handler.close()
+
+
+def count_text(path: str, key: str) -> dict:
+    """Count the lines of the text file by level, host or minute"""
+    counts = collections.Counter()
+    if key == 'time':
+        parser = timeindex.TimestampParser(FORMAT)
+        with open(path, 'rb') as file:
+            counts.update(int(parser(line)) // INTERVAL * INTERVAL for line in file)
+        return dict(counts)
+    field = 1 if key == 'level' else 2
+    with open(path, 'rb') as file:
+        counts.update(line.split(b' - ', 3)[field].decode() for line in file)
+    return dict(counts)
+
+
+def run(function, *args) -> tuple:
+    """Time a count"""
+    begin = time.perf_counter()
+    counts = function(*args)
+    return counts, time.perf_counter() - begin
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='Columnar aggregation benchmark')
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--hosts', type=int, default=50)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        text_path, columnar_path = f"{tmp}/bench.log", f"{tmp}/bench.col"
+        write(text_path, columnar_path, args.records, args.hosts)
+        report = {'records': args.records, 'numpy': columnar.numpy is not None,
+                  'text_bytes': os.path.getsize(text_path), 'columnar_bytes': os.path.getsize(columnar_path),
+                  'counts': []}
+        for key in ('level', 'host', 'time'):
+            text_counts, text_seconds = run(count_text, text_path, key)
+            counts, seconds = run(columnar.count_by, columnar.read_blocks(columnar_path), key, INTERVAL)
+            if key == 'time':
+                counts = {int(bucket): number for bucket, number in counts.items()}
+            assert counts == text_counts, key
+            report['counts'].append({'key': key, 'text_seconds': round(text_seconds, 3),
+                                     'columnar_seconds': round(seconds, 3),
+                                     'text_records_per_second': round(args.records / text_seconds),
+                                     'columnar_records_per_second': round(args.records / seconds),
+                                     'speedup': round(text_seconds / seconds, 1)})
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of the durability policies of the log file handlers
+
+Threads log --records records each through one DurableFileHandler per
+durability policy (none, flush, fsync, group). Reports the records per
+second, the commit latency (duration of the logging call: the record is
+durable when it returns, for fsync and group) and, for group, the records
+per sync.
+
+The file is created in --dir: use a directory on the disk to measure (a
+tmpfs makes the syncs free).
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_durability.py --threads 8 --records 500 --dir .`
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import logging
+import tempfile
+import threading
+import time
+
+from fruafr_log_loadharness import percentile
+from fruafr.log.lib import durability
+
+
+def run(mode: str, args: argparse.Namespace) -> dict:
+    """Log from the threads through a handler with the durability mode"""
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        handler = durability.DurableFileHandler(f"{tmp}/bench.log", encoding='utf-8', durability=mode,
+                                                max_delay=args.max_delay)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger(f"bench.{mode}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        payload = 'x' * args.size
+        latencies = []
+        start = threading.Barrier(args.threads + 1)
+
+        def writer(n: int) -> None:
+            own = []
+            start.wait()
+            for seq in range(args.records):
+                begin = time.perf_counter()
+                logger.info("%d-%d %s", n, seq, payload)
+                own.append(time.perf_counter() - begin)
+            latencies.extend(own)
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        begin = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - begin
+        logger.removeHandler(handler)
+        handler.close()
+    total = args.threads * args.records
+    latencies.sort()
+    result = {'durability': mode, 'threads': args.threads, 'records': total, 'seconds': round(elapsed, 3),
+              'records_per_second': round(total / elapsed),
+              'latency_us_p50': round(1e6 * percentile(latencies, 50), 1),
+              'latency_us_p99': round(1e6 * percentile(latencies, 99), 1)}
+    if handler.group is not None:
+        result['syncs'] = handler.group.syncs
+        result['records_per_sync'] = round(total / handler.group.syncs, 1)
+    return result
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='durability benchmark')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--records', type=int, default=500, help='records per thread')
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--max-delay', type=float, default=durability.MAX_DELAY, help='group commit wait bound')
+    parser.add_argument('--dir', default='.', help='directory of the log file (on the disk to measure)')
+    args = parser.parse_args()
+    print(json.dumps([run(mode, args) for mode in durability.DURABILITY], indent=2))
+
+
+if __name__ == "__main__":
+    main()
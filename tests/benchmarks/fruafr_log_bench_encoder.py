@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of the syslog wire encoder
+
+Emits the same records over UDP to a local socket with
+logging.handlers.SysLogHandler and with encoder.FastSysLogHandler, and
+encodes them without sending (SysLogHandler's message building vs
+SyslogEncoder.encode).
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_encoder.py --messages 200000`
+
+Every case is run --repeat times and the median rate is reported.
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import logging
+import socket
+import time
+from logging import handlers
+
+from fruafr.log.lib import encoder
+
+
+def _stdlib_encode(handler: handlers.SysLogHandler, record: logging.LogRecord) -> bytes:
+    """The message building part of SysLogHandler.emit"""
+    msg = handler.format(record) + '\000'
+    prio = f"<{handler.encodePriority(handler.facility, handler.mapPriority(record.levelname))}>".encode('utf-8')
+    return prio + (handler.ident + msg).encode('utf-8')
+
+
+def run(case: str, messages: int, size: int, address: tuple) -> dict:
+    """Run a case and return its throughput"""
+    records = [logging.LogRecord('bench', level, __file__, 1, 'x' * size, None, None)
+               for level in (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR)]
+    if case.startswith('stdlib'):
+        handler = handlers.SysLogHandler(address, handlers.SysLogHandler.LOG_LOCAL0)
+    else:
+        handler = encoder.FastSysLogHandler(address, handlers.SysLogHandler.LOG_LOCAL0)
+    handler.ident = 'bench '
+    start = time.perf_counter()
+    if case == 'stdlib-encode':
+        for i in range(messages):
+            _stdlib_encode(handler, records[i & 3])
+    elif case == 'fast-encode':
+        for i in range(messages):
+            handler.encode_record(records[i & 3])
+    else:
+        for i in range(messages):
+            handler.emit(records[i & 3])
+    elapsed = time.perf_counter() - start
+    handler.close()
+    return {'case': case, 'messages': messages, 'rate': round(messages / elapsed)}
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='syslog encoder benchmark')
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    cases = ('stdlib-encode', 'fast-encode', 'stdlib-emit', 'fast-emit')
+    runs = {case: [] for case in cases}
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+        # the datagrams are dropped once the receive buffer is full
+        server.bind(('127.0.0.1', 0))
+        for _ in range(args.repeat):
+            for case in cases:
+                runs[case].append(run(case, args.messages, args.size, server.getsockname()))
+    results = [sorted(runs[case], key=lambda result: result['rate'])[len(runs[case]) // 2] for case in cases]
+    for stdlib, fast in ((results[0], results[1]), (results[2], results[3])):
+        fast['speedup'] = round(fast['rate'] / stdlib['rate'], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
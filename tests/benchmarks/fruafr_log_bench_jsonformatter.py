@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of the JSON Lines formatter
+
+Formats --records records with the fields of the default format and the
+CLI options (app, user, host, service) with:
+- logging.Formatter: the text line, for reference
+- json.dumps: a dict of the fields built and serialized per record
+- formatter.JsonFormatter: the precompiled template
+Reports the records per second and the nanoseconds per record. The
+json.dumps and JsonFormatter objects are checked to be the same.
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_jsonformatter.py --records 200000`
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import logging
+import time
+
+from fruafr.log.lib import formatter
+
+FIELDS = ['asctime', 'levelname', 'message']
+STATIC = {'app': 'web', 'user': 'bob', 'host': 'web-01', 'service': 'api'}
+
+
+class DumpsFormatter(logging.Formatter):
+    """The same fields with json.dumps per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.message = record.getMessage()
+        fields = {'asctime': self.formatTime(record, self.datefmt), 'levelname': record.levelname,
+                  'message': record.message}
+        fields.update(STATIC)
+        return json.dumps(fields, ensure_ascii=False, separators=(',', ':'))
+
+
+def records(count: int) -> list:
+    """Returns the records, one message in ten needs escaping"""
+    return [logging.LogRecord('bench', logging.INFO, __file__, 1,
+                              'request "%s" served in %d ms' if seq % 10 == 0 else 'request %s served in %d ms',
+                              (f"/api/items/{seq}", seq % 100), None)
+            for seq in range(count)]
+
+
+def run(case: str, fmt: logging.Formatter, batch: list) -> dict:
+    """Format the records"""
+    begin = time.perf_counter()
+    for record in batch:
+        fmt.format(record)
+    elapsed = time.perf_counter() - begin
+    return {'case': case, 'records': len(batch), 'seconds': round(elapsed, 3),
+            'records_per_second': round(len(batch) / elapsed), 'ns_per_record': round(elapsed * 1e9 / len(batch))}
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='JSON formatter benchmark')
+    parser.add_argument('--records', type=int, default=200000)
+    args = parser.parse_args()
+    batch = records(args.records)
+    json_formatter = formatter.JsonFormatter(FIELDS, None, STATIC)
+    dumps_formatter = DumpsFormatter()
+    for record in batch[:100]:
+        assert json.loads(json_formatter.format(record)) == json.loads(dumps_formatter.format(record))
+    cases = [('logging.Formatter (text)', logging.Formatter(' - '.join(f"%({field})s" for field in FIELDS))),
+             ('json.dumps', dumps_formatter),
+             ('formatter.JsonFormatter', json_formatter)]
+    print(json.dumps([run(case, fmt, batch) for case, fmt in cases], indent=2))
+
+
+if __name__ == "__main__":
+    main()
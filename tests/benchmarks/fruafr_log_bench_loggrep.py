@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of the search of rotated and compressed log files
+
+Writes a rotation of --files gzip files of --records records, then searches
+them with a single-threaded line by line search (decode and re.search of
+each line, as a Python grep would), and with loggrep.Console().process
+with 1 and --jobs processes. Reports the seconds and the lines found.
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_loggrep.py --files 16 --records 200000 --jobs 8`
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+from fruafr.log import loggrep
+from fruafr.log.lib import rotation
+
+PATTERN = r'ERROR .* timeout'
+
+
+def write_rotation(path: str, files: int, records: int) -> None:
+    """Write the rotated files of path (one error every 1000 records)"""
+    for number in range(files):
+        with gzip.open(f"{path}.20231013-{number:06d}.gz", 'wt', encoding='utf-8', compresslevel=6) as file:
+            for seq in range(records):
+                level = 'ERROR' if seq % 1000 == 0 else 'INFO'
+                file.write(f"2023-10-13 10:00:00,000 - {level} - request {seq} of file {number} served in 12 ms, timeout 30 s\n")
+    open(path, 'w', encoding='utf-8').close()
+
+
+def line_by_line(path: str) -> int:
+    """Single-threaded search decoding every line"""
+    regex = re.compile(PATTERN)
+    found = 0
+    for name in rotation.rotated_files(path) + [path]:
+        with gzip.open(name, 'rt', encoding='utf-8') if name.endswith('.gz') else open(name, encoding='utf-8') as file:
+            for line in file:
+                if regex.search(line):
+                    found += 1
+    return found
+
+
+def run_loggrep(path: str, jobs: int) -> int:
+    """loggrep with its output discarded"""
+    console = loggrep.Console()
+    stdout = os.dup(sys.stdout.fileno())
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    try:
+        return console.process(console.parse_args([PATTERN, path, '--rotated', '-j', str(jobs)]))
+    finally:
+        os.dup2(stdout, sys.stdout.fileno())
+        os.close(stdout)
+        os.close(devnull)
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='loggrep benchmark')
+    parser.add_argument('--files', type=int, default=16, help='rotated gzip files')
+    parser.add_argument('--records', type=int, default=200000, help='records per file')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    report = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = f"{tmp}/app.log"
+        write_rotation(path, args.files, args.records)
+        size = sum(os.path.getsize(name) for name in rotation.rotated_files(path))
+        cases = [('line by line', lambda: line_by_line(path)),
+                 ('loggrep -j 1', lambda: run_loggrep(path, 1)),
+                 (f"loggrep -j {args.jobs}", lambda: run_loggrep(path, args.jobs))]
+        for case, function in cases:
+            begin = time.perf_counter()
+            found = function()
+            elapsed = time.perf_counter() - begin
+            report.append({'case': case, 'files': args.files, 'records': args.files * args.records,
+                           'compressed_bytes': size, 'seconds': round(elapsed, 3), 'lines_found': found})
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of the memory-mapped log file writer
+
+Logs --records records of --size bytes through logging.FileHandler (a
+write system call per record), DurableFileHandler with durability none
+(the buffered writer: a write per 8 KiB buffer) and MmapFileHandler. The
+raw cases write the same records already encoded, without logging and
+formatting, to show the cost of the write path alone.
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_mmapfile.py --records 200000 --size 200 --dir .`
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from fruafr.log.lib import durability
+from fruafr.log.lib import mmapfile
+
+HANDLERS = {
+    'FileHandler': lambda path: logging.FileHandler(path, encoding='utf-8'),
+    'buffered': lambda path: durability.DurableFileHandler(path, encoding='utf-8', durability='none'),
+    'MmapFileHandler': lambda path: mmapfile.MmapFileHandler(path, encoding='utf-8'),
+}
+
+
+def run_logging(case: str, path: str, args: argparse.Namespace) -> float:
+    """Log the records through the handler of case, returns the elapsed time"""
+    handler = HANDLERS[case](path)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger = logging.getLogger(f"bench.{case}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    payload = 'x' * args.size
+    start = time.perf_counter()
+    for seq in range(args.records):
+        logger.info("%d %s", seq, payload)
+    handler.close()
+    elapsed = time.perf_counter() - start
+    logger.removeHandler(handler)
+    return elapsed
+
+
+def run_raw(case: str, path: str, args: argparse.Namespace) -> float:
+    """Write the encoded records with the write path of case, returns the elapsed time"""
+    records = [b"%d %s\n" % (seq, b'x' * args.size) for seq in range(args.records)]
+    start = time.perf_counter()
+    if case == 'MmapFileHandler':
+        handler = mmapfile.MmapFileHandler(path)
+        for data in records:
+            handler.write(data)
+        handler.close()
+    elif case == 'FileHandler':
+        with open(path, 'ab', buffering=0) as file:
+            for data in records:
+                file.write(data)
+    else:
+        with open(path, 'ab') as file:
+            for data in records:
+                file.write(data)
+    return time.perf_counter() - start
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='mmap writer benchmark')
+    parser.add_argument('--records', type=int, default=200000)
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--dir', default='.', help='directory of the log file')
+    args = parser.parse_args()
+    results = []
+    for kind, run in (('logging', run_logging), ('raw', run_raw)):
+        for case in HANDLERS:
+            with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+                path = f"{tmp}/bench.log"
+                elapsed = run(case, path, args)
+                size = os.path.getsize(path)
+            results.append({'case': case, 'path': kind, 'records': args.records, 'bytes': size,
+                            'seconds': round(elapsed, 3), 'records_per_second': round(args.records / elapsed)})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of the client side pacing over UDP
+
+Starts tinysyslogserver with a stats socket on an ephemeral unprivileged
+port and ships the same file with logtosyslog --file-input over UDP:
+unpaced, at a fixed --rate and with --adaptive. The loss is measured with
+the udp_messages counter of the stats socket.
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_pacing.py --messages 200000 --rate 20000`
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+from fruafr_log_loadharness import HOST, INTERPRETER, SCRIPT, SRC, free_port
+from fruafr.log.lib import pacing
+from fruafr.log.lib import stats
+
+CLIENT = f"{SRC}/fruafr/log/logtosyslog.py"
+
+
+def _env() -> dict:
+    """Returns the environment of the subprocesses"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (SRC, env.get('PYTHONPATH')) if p)
+    return env
+
+
+def start_server(tmp: str, port: int, server_args: list = None) -> tuple:
+    """Start tinysyslogserver (UDP) and wait for its stats socket
+    Returns:
+        tuple: (subprocess.Popen, stats socket path)
+    """
+    path = f"{tmp}/stats.sock"
+    server = subprocess.Popen([INTERPRETER, SCRIPT, '-a', HOST, '-p', str(port), '-F', f"{tmp}/server.log",
+                               '--stats', path] + (server_args or []),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=_env())
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            stats.query(path, 'stats')
+            return server, path
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError(server.stderr.read().decode()) from None
+            time.sleep(0.05)
+
+
+def run(case: str, path: str, port: int, stats_path: str, client_args: list) -> dict:
+    """Ship the file and return the loss measured by the server"""
+    received = pacing.stats_feedback(stats_path)
+    before = received()
+    p = subprocess.run([INTERPRETER, CLIENT, '--file-input', path, '-a', HOST, '-p', str(port),
+                        '--progress', '0'] + client_args,
+                       capture_output=True, text=True, check=True, env=_env())
+    report = json.loads(p.stdout)
+    time.sleep(pacing.SETTLE)
+    got = received() - before
+    result = {'case': case, 'sent': report['messages'], 'received': got,
+              'loss_percent': round(100.0 * (report['messages'] - got) / report['messages'], 2),
+              'send_rate': report['rate']}
+    if 'pacing' in report:
+        result['rate_reached'] = report['pacing']['rate']
+        result['sustained_rate'] = report['pacing']['sustained_rate']
+    return result
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='UDP pacing benchmark')
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=20000, help='fixed rate of the paced run')
+    parser.add_argument('--server-args', default='', help='additional tinysyslogserver arguments (quoted)')
+    args = parser.parse_args()
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = f"{tmp}/input.log"
+        with open(path, 'w', encoding='utf-8') as file:
+            for seq in range(args.messages):
+                file.write(f"pacing-{seq} {'x' * args.size}\n")
+        server, stats_path = start_server(tmp, port, args.server_args.split())
+        try:
+            results = [
+                run('unpaced', path, port, stats_path, []),
+                run('rate', path, port, stats_path, ['--rate', str(args.rate)]),
+                run('adaptive', path, port, stats_path, ['--adaptive', stats_path]),
+            ]
+        finally:
+            server.terminate()
+            server.communicate()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of RELP delivery against plain TCP syslog
+
+Starts tinysyslogserver with -t and --relp on ephemeral unprivileged ports
+and sends the same messages over plain TCP (octet counted, never
+acknowledged) and over RELP with several window sizes. The RELP messages
+are acknowledged once synced to the log file, so a RELP run only ends when
+everything is durable; the TCP run ends when the log file has all the
+messages (not synced).
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_relp.py --messages 20000 --windows 1,16,128,1024`
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import tempfile
+import time
+
+from fruafr_log_loadharness import HOST, INTERPRETER, SCRIPT, SRC, count_lines, free_port
+from fruafr.log.lib import framing
+from fruafr.log.lib import relp
+from fruafr.log.lib import syslogclient
+
+TIMEOUT = 60.0
+
+
+def start_server(logfile: str, tcp_port: int, relp_port: int, server_args: list = None) -> subprocess.Popen:
+    """Start tinysyslogserver (no UDP) and wait until both ports accept connections"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (SRC, env.get('PYTHONPATH')) if p)
+    server = subprocess.Popen([INTERPRETER, SCRIPT, '-a', HOST, '-p', str(tcp_port), '-F', logfile,
+                               '-nou', '-t', '--relp', str(relp_port)] + (server_args or []),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env)
+    deadline = time.monotonic() + 10
+    for port in (tcp_port, relp_port):
+        while True:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                if sock.connect_ex((HOST, port)) == 0:
+                    break
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError(server.stderr.read().decode())
+            time.sleep(0.05)
+    return server
+
+
+def run(case: str, messages: int, size: int, logfile: str, port: int, window: int = None) -> dict:
+    """Send the messages and return the throughput"""
+    before = count_lines(logfile)
+    payload = b'<14>bench ' + b'x' * max(size - 10, 0)
+    start = time.perf_counter()
+    if case == 'tcp':
+        connection = syslogclient.SyslogConnection((HOST, port), socket.SOCK_STREAM, flush_interval=0)
+        for _ in range(messages):
+            connection.send(framing.encode_octet_counted(payload))
+        connection.close()
+        # not acknowledged: wait until the server has written everything
+        deadline = time.monotonic() + TIMEOUT
+        while count_lines(logfile) - before < messages and time.monotonic() < deadline:
+            time.sleep(0.001)
+        result = {'case': case}
+    else:
+        client = relp.RelpClient((HOST, port), window, flush_interval=0)
+        for _ in range(messages):
+            client.send(payload)
+        client.close()
+        result = {'case': case, 'window': window, 'acked': client.acked}
+    elapsed = time.perf_counter() - start
+    result.update(messages=messages, delivered=count_lines(logfile) - before,
+                  rate=round(messages / elapsed))
+    return result
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='RELP delivery benchmark')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--windows', default='1,16,128,1024', help='comma separated RELP window sizes')
+    parser.add_argument('--server-args', default='', help='additional tinysyslogserver arguments (quoted), e.g. "--wal /tmp/bench"')
+    args = parser.parse_args()
+    tcp_port = free_port()
+    relp_port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        logfile = f"{tmp}/server.log"
+        server = start_server(logfile, tcp_port, relp_port, args.server_args.split())
+        try:
+            results = [run('tcp', args.messages, args.size, logfile, tcp_port)]
+            for window in (int(w) for w in args.windows.split(',')):
+                results.append(run('relp', args.messages, args.size, logfile, relp_port, window))
+        finally:
+            server.terminate()
+            server.communicate()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
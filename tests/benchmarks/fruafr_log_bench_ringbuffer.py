@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of the tinysyslogserver receive-side drop rate
+
+Compares the default model (one process receives, parses and writes UDP
+datagrams) with the shared-memory ring buffer pipeline (--workers N).
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_ringbuffer.py --messages 200000 --senders 4 --workers 2`
+
+The server is started on an unprivileged port and stopped at the end.
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from fruafr_log_loadharness import HOST, count_lines, free_port
+
+INTERPRETER = sys.executable
+PATH = os.path.dirname(__file__)
+SCRIPT = f"{PATH}/../../src/fruafr/log/tinysyslogserver.py"
+
+
+def send(port: int, count: int, size: int) -> None:
+    """Send count UDP datagrams of size bytes as fast as possible"""
+    payload = b'x' * size
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for _ in range(count):
+            sock.sendto(payload, (HOST, port))
+
+
+def run(workers: int, messages: int, senders: int, size: int) -> dict:
+    """Start the server, send the datagrams and measure the drop rate"""
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        logfile = f"{tmp}/server.log"
+        server = subprocess.Popen([INTERPRETER, SCRIPT, '-a', HOST, '-p', str(port),
+                                   '-F', logfile, '-w', str(workers)],
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        while b'Waiting for connections' not in server.stdout.readline():
+            pass
+        time.sleep(0.5)
+        per_sender = messages // senders
+        start = time.perf_counter()
+        procs = [multiprocessing.Process(target=send, args=(port, per_sender, size))
+                 for _ in range(senders)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        elapsed = time.perf_counter() - start
+        # wait for the server to write everything it has received
+        received = -1
+        while received != count_lines(logfile):
+            received = count_lines(logfile)
+            time.sleep(0.5)
+        server.terminate()
+        server.communicate()
+    sent = per_sender * senders
+    return {'workers': workers, 'sent': sent, 'received': received,
+            'drop_rate': round(100.0 * (sent - received) / sent, 2),
+            'send_rate': round(sent / elapsed)}
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='tinysyslogserver drop rate benchmark')
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--senders', type=int, default=2)
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+    results = [run(0, args.messages, args.senders, args.size),
+               run(args.workers, args.messages, args.senders, args.size)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
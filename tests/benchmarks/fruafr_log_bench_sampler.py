@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of the stack sampler overhead
+
+Logs the same records to a file with and without the stack sampler started
+(alternating, best of --rounds) and reports the throughput difference, as
+well as the average time spent in the sampler per sample.
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_sampler.py --records 200000 --interval 0.01`
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import logging
+import tempfile
+import time
+
+from fruafr.log.lib import sampler
+
+
+def workload(records: int) -> float:
+    """Log records to a temporary file and return the elapsed time"""
+    with tempfile.TemporaryDirectory() as tmp:
+        logger = logging.getLogger(f"bench-{tmp}")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        fileh = logging.FileHandler(f"{tmp}/out.log")
+        fileh.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        logger.addHandler(fileh)
+        start = time.perf_counter()
+        for i in range(records):
+            logger.info("127.0.0.1-<14>message %d", i)
+        elapsed = time.perf_counter() - start
+        fileh.close()
+    return elapsed
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='stack sampler overhead benchmark')
+    parser.add_argument('--records', type=int, default=200000)
+    parser.add_argument('--interval', type=float, default=sampler.INTERVAL)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+    profiler = sampler.StackSampler(args.interval)
+    baseline = sampled = float('inf')
+    for _ in range(args.rounds):
+        baseline = min(baseline, workload(args.records))
+        profiler.start()
+        sampled = min(sampled, workload(args.records))
+        profiler.stop()
+    print(json.dumps({
+        'records': args.records,
+        'interval': args.interval,
+        'baseline_rate': round(args.records / baseline),
+        'sampled_rate': round(args.records / sampled),
+        'overhead_percent': round(100.0 * (sampled - baseline) / baseline, 2),
+        'samples': profiler.samples,
+        'sample_cost_us': round(1e6 * profiler._sampling_time / max(profiler.samples, 1), 1),  # pylint: disable=protected-access
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Benchmark of the tinysyslogserver write-ahead log overhead
+
+Logs the same messages to a file with the server file handler and through
+the write-ahead log spool (batch written + fdatasync, log file fdatasync and
+commit every WAL_COMMIT_INTERVAL, and once at the end).
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_bench_wal.py --messages 200000`
+
+Both paths are run --repeat times, alternately, and the median rate of each
+is reported: single runs vary by more than the overhead measured.
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import logging
+import tempfile
+import time
+
+from fruafr.log import tinysyslogserver
+from fruafr.log.lib import wal
+
+
+def _logger(path: str) -> logging.Logger:
+    """Returns a logger writing to path"""
+    logger = logging.getLogger(f"bench-{path}")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    fileh = tinysyslogserver.BatchFileHandler(path)
+    fileh.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    logger.addHandler(fileh)
+    return logger
+
+
+def run(messages: int, size: int, batch: int, use_wal: bool) -> dict:
+    """Log the messages and return the throughput"""
+    payload = f"127.0.0.1-{'x' * size}"
+    with tempfile.TemporaryDirectory() as tmp:
+        logger = _logger(f"{tmp}/out.log")
+        spool = None
+        if use_wal:
+            spool = tinysyslogserver.WalSpool(wal.WriteAheadLog(f"{tmp}/out.wal"), logger, batch)
+        start = time.perf_counter()
+        for _ in range(messages):
+            if spool is not None:
+                spool.accept(payload)
+            else:
+                logger.info(payload)
+        if spool is not None:
+            spool.flush()
+            spool.commit()
+        elapsed = time.perf_counter() - start
+        for hdlr in logger.handlers:
+            hdlr.close()
+    return {'wal': use_wal, 'messages': messages, 'rate': round(messages / elapsed)}
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='write-ahead log overhead benchmark')
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=tinysyslogserver.WAL_BATCH)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    runs = [[], []]
+    for _ in range(args.repeat):
+        for use_wal in (False, True):
+            runs[use_wal].append(run(args.messages, args.size, args.batch, use_wal))
+    results = [sorted(mode, key=lambda result: result['rate'])[len(mode) // 2] for mode in runs]
+    results[1]['overhead_percent'] = round(100.0 * (results[0]['rate'] - results[1]['rate']) / results[0]['rate'], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+End-to-end load and loss harness for tinysyslogserver
+
+Starts the server on an ephemeral unprivileged port, drives it with
+concurrent UDP/TCP generator processes, then verifies the messages found
+in the server log file and reports as JSON:
+- sent/received counts and loss percentage per protocol
+- throughput
+- p50/p99 latency (send time embedded in the message -> %(created)f of the
+  server log record)
+- CPU time and maximum RSS of the server processes
+
+`PYTHONPATH=src python3 tests/benchmarks/fruafr_log_loadharness.py --udp-senders 2 --tcp-senders 2 --messages 20000 --size 200`
+
+It does not require sudo and is used by tests/test_fruafr_log_loadharness.py
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from fruafr.log.logreplay import count_lines
+
+INTERPRETER = sys.executable
+PATH = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.normpath(f"{PATH}/../../src")
+SCRIPT = f"{SRC}/fruafr/log/tinysyslogserver.py"
+HOST = '127.0.0.1'
+SERVER_FORMAT = '%(created)f %(message)s'
+SETTLE = 1.0
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def free_port() -> int:
+    """Returns an unprivileged port that is free for both UDP and TCP"""
+    while True:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp:
+            udp.bind((HOST, 0))
+            port = udp.getsockname()[1]
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as tcp:
+                try:
+                    tcp.bind((HOST, port))
+                except OSError:
+                    continue
+        return port
+
+
+def process_tree(pid: int) -> list:
+    """Returns the pid and the pids of all its descendants"""
+    pids = [pid]
+    for child in pids:
+        try:
+            with open(f"/proc/{child}/task/{child}/children", 'r', encoding='utf-8') as file:
+                pids += [int(p) for p in file.read().split()]
+        except OSError:
+            pass
+    return pids
+
+
+def cpu_rss(pids: list) -> tuple:
+    """Returns the CPU time (seconds) and the RSS (kB) of a list of processes"""
+    cpu = 0.0
+    rss = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", 'r', encoding='utf-8') as file:
+                fields = file.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        # utime and stime are fields 14 and 15 of /proc/pid/stat, rss is field 24
+        cpu += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+        rss += int(fields[21]) * PAGE_SIZE // 1024
+    return cpu, rss
+
+
+def generate(protocol: str, port: int, tag: str, count: int, size: int, rate: float) -> None:
+    """Send count messages to the server
+    Each message is: load-<tag>-<seq>-<send time> followed by padding up to size bytes
+    Args:
+        protocol (str): udp or tcp
+        port (int): the server port
+        tag (str): unique tag of the run and sender
+        count (int): number of messages
+        size (int): message size in bytes
+        rate (float): messages per second (0 sends as fast as possible)
+    """
+    if protocol == 'tcp':
+        sock = socket.create_connection((HOST, port))
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.connect((HOST, port))
+    start = time.perf_counter()
+    for seq in range(count):
+        if rate > 0:
+            delay = start + seq / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        message = f"load-{tag}-{seq}-{time.time():.6f} "
+        data = (message + 'x' * max(size - len(message), 0)).encode()
+        if protocol == 'tcp':
+            sock.sendall(b'%d %s' % (len(data), data))
+        else:
+            try:
+                sock.send(data)
+            except OSError:
+                pass
+    sock.close()
+
+
+def percentile(values: list, pct: float) -> float:
+    """Returns the pct percentile of sorted values"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+class Harness:
+    """Runs a load scenario against a tinysyslogserver subprocess"""
+
+    def __init__(self, udp_senders: int = 1, tcp_senders: int = 1, messages: int = 1000,
+                 size: int = 200, rate: float = 0, server_args: list = None) -> None:
+        """Harness constructor
+        Args:
+            udp_senders (int): number of UDP generator processes
+            tcp_senders (int): number of TCP generator processes
+            messages (int): number of messages per sender
+            size (int): message size in bytes
+            rate (float): messages per second per sender (0 is unlimited)
+            server_args (list): additional tinysyslogserver arguments
+        """
+        self.udp_senders = udp_senders
+        self.tcp_senders = tcp_senders
+        self.messages = messages
+        self.size = size
+        self.rate = rate
+        self.server_args = server_args or []
+
+    def _start_server(self, port: int, logfile: str) -> subprocess.Popen:
+        """Start the server and wait until it accepts connections"""
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (SRC, env.get('PYTHONPATH')) if p)
+        args = [INTERPRETER, SCRIPT, '-a', HOST, '-p', str(port), '-F', logfile,
+                '-f', SERVER_FORMAT] + self.server_args
+        if self.tcp_senders:
+            args.append('-t')
+        server = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+        while True:
+            line = server.stdout.readline()
+            if not line:
+                raise RuntimeError(server.stderr.read().decode())
+            if b'Waiting for connections' in line:
+                break
+        # the child processes are started after the message is printed
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                if not self.tcp_senders or sock.connect_ex((HOST, port)) == 0:
+                    break
+            time.sleep(0.05)
+        time.sleep(0.2)
+        return server
+
+    def _wait_settled(self, logfile: str) -> None:
+        """Wait until the server log file stops growing"""
+        count = count_lines(logfile)
+        stable_since = time.monotonic()
+        while time.monotonic() - stable_since < SETTLE:
+            time.sleep(0.1)
+            new_count = count_lines(logfile)
+            if new_count != count:
+                count = new_count
+                stable_since = time.monotonic()
+
+    def _parse(self, logfile: str, run: str) -> tuple:
+        """Returns the received sequence numbers per sender and the latencies"""
+        pattern = re.compile(rf"^(\d+\.\d+) \S*load-{run}-(udp|tcp)(\d+)-(\d+)-(\d+\.\d+) ")
+        received = {}
+        latencies = []
+        with open(logfile, 'r', encoding='utf-8', errors='replace') as file:
+            for line in file:
+                match = pattern.match(line)
+                if match is None:
+                    continue
+                created, protocol, sender, seq, sent = match.groups()
+                received.setdefault((protocol, int(sender)), set()).add(int(seq))
+                latencies.append(float(created) - float(sent))
+        return received, latencies
+
+    def run(self) -> dict:
+        """Run the scenario
+        Returns:
+            dict: the report
+        """
+        run = uuid.uuid4().hex[:8]
+        port = free_port()
+        with tempfile.TemporaryDirectory() as tmp:
+            logfile = f"{tmp}/server.log"
+            server = self._start_server(port, logfile)
+            try:
+                pids = process_tree(server.pid)
+                cpu_before, rss_max = cpu_rss(pids)
+                sampling = True
+
+                def sample_rss():
+                    nonlocal rss_max
+                    while sampling:
+                        rss_max = max(rss_max, cpu_rss(pids)[1])
+                        time.sleep(0.1)
+
+                sampler = threading.Thread(target=sample_rss, daemon=True)
+                sampler.start()
+                senders = [('udp', i) for i in range(self.udp_senders)] + \
+                          [('tcp', i) for i in range(self.tcp_senders)]
+                procs = [multiprocessing.Process(target=generate,
+                                                 args=(protocol, port, f"{run}-{protocol}{i}",
+                                                       self.messages, self.size, self.rate))
+                         for protocol, i in senders]
+                start = time.perf_counter()
+                for proc in procs:
+                    proc.start()
+                for proc in procs:
+                    proc.join()
+                send_elapsed = time.perf_counter() - start
+                self._wait_settled(logfile)
+                elapsed = time.perf_counter() - start - SETTLE
+                sampling = False
+                sampler.join()
+                cpu_after, rss = cpu_rss(pids)
+                rss_max = max(rss_max, rss)
+            finally:
+                server.terminate()
+                server.communicate()
+            received, latencies = self._parse(logfile, run)
+        return self._report(senders, received, latencies, send_elapsed, elapsed,
+                            cpu_after - cpu_before, rss_max)
+
+    def _report(self, senders: list, received: dict, latencies: list, send_elapsed: float,
+                elapsed: float, cpu: float, rss_max: int) -> dict:
+        """Build the report"""
+        report = {
+            'config': {'udp_senders': self.udp_senders, 'tcp_senders': self.tcp_senders,
+                       'messages_per_sender': self.messages, 'size': self.size,
+                       'rate_per_sender': self.rate, 'server_args': self.server_args},
+        }
+        total_received = 0
+        for protocol in ('udp', 'tcp'):
+            sent = self.messages * sum(1 for p, _ in senders if p == protocol)
+            if not sent:
+                continue
+            got = sum(len(seqs) for (p, _), seqs in received.items() if p == protocol)
+            total_received += got
+            report[protocol] = {'sent': sent, 'received': got,
+                                'loss_percent': round(100.0 * (sent - got) / sent, 3)}
+        latencies.sort()
+        report['send_seconds'] = round(send_elapsed, 3)
+        report['throughput'] = round(total_received / max(elapsed, 1e-6), 1)
+        report['latency_ms'] = {
+            'p50': None if not latencies else round(percentile(latencies, 50) * 1000, 3),
+            'p99': None if not latencies else round(percentile(latencies, 99) * 1000, 3),
+        }
+        report['server_cpu_seconds'] = round(cpu, 3)
+        report['server_cpu_percent'] = round(100.0 * cpu / max(elapsed, 1e-6), 1)
+        report['server_rss_kb_max'] = rss_max
+        return report
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(prog='tinysyslogserver load and loss harness')
+    parser.add_argument('--udp-senders', type=int, default=1)
+    parser.add_argument('--tcp-senders', type=int, default=1)
+    parser.add_argument('--messages', type=int, default=10000, help='messages per sender')
+    parser.add_argument('--size', type=int, default=200, help='message size in bytes')
+    parser.add_argument('--rate', type=float, default=0, help='messages per second per sender (0 is unlimited)')
+    parser.add_argument('--server-args', default='', help='additional tinysyslogserver arguments (quoted)')
+    args = parser.parse_args()
+    harness = Harness(args.udp_senders, args.tcp_senders, args.messages, args.size,
+                      args.rate, args.server_args.split())
+    print(json.dumps(harness.run(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
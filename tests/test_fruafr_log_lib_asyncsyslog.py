@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.asyncsyslog
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import asyncio
+import logging
+import socket
+import threading
+import unittest
+from logging import handlers
+from fruafr.log.lib import asyncsyslog
+
+
+def _record(message: str, level: int = logging.INFO) -> logging.LogRecord:
+    """Returns a record"""
+    return logging.LogRecord('test', level, __file__, 1, message, None, None)
+
+
+def _read_all(server: socket.socket, data: list) -> None:
+    """Read the connections until none is accepted within the server timeout"""
+    while True:
+        try:
+            conn, _ = server.accept()
+        except socket.timeout:
+            return
+        with conn:
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                data.append(chunk)
+
+
+class TestAsyncSysLogHandler(unittest.TestCase):
+    """Class TestAsyncSysLogHandler"""
+
+    def test_init(self):
+        """Test constructor"""
+        with self.assertRaises(TypeError):
+            asyncsyslog.AsyncSysLogHandler(514)
+
+    def test_udp_same_as_sysloghandler(self):
+        """Test that the datagrams are the ones of SysLogHandler"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.settimeout(5)
+            stdlib = handlers.SysLogHandler(server.getsockname())
+            stdlib.emit(_record('hello'))
+            stdlib.close()
+            handler = asyncsyslog.AsyncSysLogHandler(server.getsockname())
+
+            async def main():
+                handler.emit(_record('hello'))
+                await handler.aclose()
+
+            asyncio.run(main())
+            self.assertEqual(server.recv(1024), server.recv(1024))
+            self.assertEqual((handler.sent, handler.dropped), (1, 0))
+
+    def test_tcp_flushed_at_loop_shutdown(self):
+        """Test that the records queued are written when asyncio.run returns"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen()
+            server.settimeout(1)
+            data = []
+            reader = threading.Thread(target=_read_all, args=(server, data))
+            reader.start()
+            handler = asyncsyslog.AsyncSysLogHandler(server.getsockname(), socktype=socket.SOCK_STREAM)
+
+            async def main():
+                for i in range(50):
+                    handler.emit(_record(f"m{i}"))
+                # the first records are queued before the task ever runs
+                await asyncio.sleep(0)
+                for i in range(50, 100):
+                    handler.emit(_record(f"m{i}"))
+
+            asyncio.run(main())
+            reader.join(10)
+            handler.close()
+        self.assertEqual(b''.join(data), b''.join(b'<14>m%d\x00' % i for i in range(100)))
+        self.assertEqual(handler.sent, 100)
+
+    def test_bounded_queue(self):
+        """Test that the records beyond queue_size are dropped and counted, without waiting"""
+        handler = asyncsyslog.AsyncSysLogHandler(('127.0.0.1', 9), queue_size=5)
+
+        async def main():
+            # the task cannot run before main awaits
+            for i in range(8):
+                handler.emit(_record(f"m{i}"))
+            self.assertEqual((handler.pending, handler.dropped), (5, 3))
+            await handler.aclose()
+
+        asyncio.run(main())
+        self.assertEqual(handler.sent, 5)
+
+    def test_other_thread(self):
+        """Test records logged from another thread than the loop"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.settimeout(5)
+            handler = asyncsyslog.AsyncSysLogHandler(server.getsockname())
+
+            async def main():
+                handler.start()
+                await asyncio.to_thread(handler.emit, _record('from a thread'))
+                await asyncio.sleep(0.1)
+                await handler.aclose()
+
+            asyncio.run(main())
+            self.assertEqual(server.recv(1024), b'<14>from a thread\x00')
+
+    def test_close_without_loop(self):
+        """Test that close writes the records queued without a loop, and counts those it cannot"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.settimeout(5)
+            handler = asyncsyslog.AsyncSysLogHandler(server.getsockname())
+            handler.emit(_record('no loop'))
+            self.assertEqual(handler.pending, 1)
+            handler.close()
+            self.assertEqual(server.recv(1024), b'<14>no loop\x00')
+        self.assertEqual((handler.sent, handler.dropped), (1, 0))
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as closed:
+            closed.bind(('127.0.0.1', 0))
+            address = closed.getsockname()
+        handler = asyncsyslog.AsyncSysLogHandler(address, socktype=socket.SOCK_STREAM)
+        handler.emit(_record('never sent'))
+        logging.raiseExceptions = False
+        try:
+            handler.close()
+        finally:
+            logging.raiseExceptions = True
+        self.assertEqual(handler.dropped, 1)
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.atomicappend
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import unittest
+from fruafr.log.lib import atomicappend
+
+# small records and records larger than ATOMIC_SIZE (and than the 8 KiB buffer of FileHandler)
+SIZES = (50, 1000, 3 * atomicappend.ATOMIC_SIZE, 20000)
+LINE = re.compile(r'^(\d+)-(\d+) (\d+) (x*)$')
+
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    """Returns a logger writing the bare messages to handler"""
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+    return logger
+
+
+def _write(filename: str, writer: int, count: int) -> None:
+    """Log count records of the SIZES from a separate process"""
+    handler = atomicappend.AtomicAppendHandler(filename)
+    logger = _logger(f"atomicappend.writer{writer}", handler)
+    for seq in range(count):
+        size = SIZES[seq % len(SIZES)]
+        logger.info("%d-%d %d %s", writer, seq, size, 'x' * size)
+    handler.close()
+
+
+class TestAtomicAppendHandler(unittest.TestCase):
+    """Class TestAtomicAppendHandler"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.filename = f"{self._tmp.name}/test.log"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _read(self) -> list:
+        """Returns the lines of the log file"""
+        with open(self.filename, 'r', encoding='utf-8') as file:
+            return file.read().splitlines()
+
+    def test_concurrent_writers(self):
+        """Test that many processes appending records small and large tear no line"""
+        writers, count = 8, 200
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=_write, args=(self.filename, writer, count)) for writer in range(writers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        lines = self._read()
+        self.assertEqual(len(lines), writers * count)
+        seen = set()
+        for line in lines:
+            match = LINE.match(line)
+            self.assertIsNotNone(match, line[:80])
+            self.assertEqual(int(match.group(3)), len(match.group(4)))
+            seen.add((int(match.group(1)), int(match.group(2))))
+        self.assertEqual(len(seen), writers * count)
+
+    def test_batch(self):
+        """Test that a batch is written in order, packed in writes of at most ATOMIC_SIZE"""
+        handler = atomicappend.AtomicAppendHandler(self.filename)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler.setLevel(logging.INFO)
+        writes = []
+        append = handler._append
+        handler._append = lambda data: writes.append(data) or append(data)
+        records = [logging.LogRecord('test', logging.INFO, __file__, 1, 'r%d %s', (seq, 'x' * 100), None) for seq in range(100)]
+        records.insert(50, logging.LogRecord('test', logging.DEBUG, __file__, 1, 'ignored', None, None))
+        records.insert(60, logging.LogRecord('test', logging.INFO, __file__, 1, 'x' * 10000, None, None))
+        handler.emit_batch(records)
+        handler.close()
+        self.assertTrue(all(len(data) <= atomicappend.ATOMIC_SIZE for data in writes if b'x' * 10000 not in data))
+        self.assertTrue(all(data.endswith(b'\n') for data in writes))
+        self.assertLess(len(writes), 10)
+        lines = self._read()
+        self.assertEqual(len(lines), 101)
+        self.assertEqual(lines[0], f"r0 {'x' * 100}")
+        self.assertEqual(lines[59], 'x' * 10000)
+        self.assertEqual(lines[-1], f"r99 {'x' * 100}")
+
+    def test_emit_batch_durability(self):
+        """Test that a batch is synced once with fsync and group, and not with flush"""
+        syncs = []
+        fdatasync = os.fdatasync
+        os.fdatasync = lambda fd: syncs.append(fd) or fdatasync(fd)
+        try:
+            for durability, expected in (('flush', 0), ('fsync', 1), ('group', 1)):
+                syncs.clear()
+                handler = atomicappend.AtomicAppendHandler(self.filename, durability=durability)
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                handler.emit_batch([logging.LogRecord('test', logging.INFO, __file__, 1, 'r%d', (seq,), None) for seq in range(10)])
+                handler.close()
+                self.assertEqual(len(syncs), expected, durability)
+        finally:
+            os.fdatasync = fdatasync
+        self.assertEqual(len(self._read()), 30)
+
+    def test_mode(self):
+        """Test the append and write modes"""
+        for mode, expected in (('a', ['first', 'second']), ('w', ['second'])):
+            handler = atomicappend.AtomicAppendHandler(self.filename, 'w')
+            _logger('atomicappend.mode', handler).info('first')
+            handler.close()
+            handler = atomicappend.AtomicAppendHandler(self.filename, mode)
+            _logger('atomicappend.mode', handler).info('second')
+            handler.close()
+            self.assertEqual(self._read(), expected)
+        with self.assertRaises(ValueError):
+            atomicappend.AtomicAppendHandler(self.filename, 'r')
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
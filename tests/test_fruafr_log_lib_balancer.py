@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.balancer
+
+TestFailover runs three tinysyslogserver instances on ephemeral
+unprivileged ports (no sudo required)
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from fruafr.log.lib import balancer
+
+from .benchmarks import fruafr_log_loadharness as harness
+
+
+def _udp_servers(count: int) -> list:
+    """Returns count bound UDP sockets"""
+    servers = []
+    for _ in range(count):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(0.2)
+        servers.append(server)
+    return servers
+
+
+def _received(server: socket.socket) -> list:
+    """Returns the datagrams received by a UDP socket"""
+    datagrams = []
+    try:
+        while True:
+            datagrams.append(server.recv(65536))
+    except socket.timeout:
+        return datagrams
+
+
+class TestParseDestination(unittest.TestCase):
+    """Class TestParseDestination"""
+
+    def test_parse(self):
+        """Test the destination formats"""
+        self.assertEqual(balancer.parse_destination('host'), (('host', 514), 1))
+        self.assertEqual(balancer.parse_destination('host:5140'), (('host', 5140), 1))
+        self.assertEqual(balancer.parse_destination('host:5140:3'), (('host', 5140), 3))
+        self.assertEqual(balancer.parse_destination('host::3', 5140), (('host', 5140), 3))
+        self.assertEqual(balancer.parse_destination('[::1]:5140:2'), (('::1', 5140), 2))
+        self.assertEqual(balancer.parse_destination('/dev/log:2'), ('/dev/log', 2))
+        for invalid in ('', 'host:1:2:3', 'host:514:0', 'host:port'):
+            with self.assertRaises(ValueError):
+                balancer.parse_destination(invalid)
+
+
+class TestDestinationPool(unittest.TestCase):
+    """Class TestDestinationPool"""
+
+    def setUp(self):
+        self.servers = _udp_servers(3)
+
+    def tearDown(self):
+        for server in self.servers:
+            server.close()
+
+    def _pool(self, weights: list, strategy: str = 'roundrobin') -> balancer.DestinationPool:
+        """Returns a UDP pool over the servers"""
+        return balancer.DestinationPool([(server.getsockname(), weight) for server, weight
+                                         in zip(self.servers, weights)], strategy=strategy)
+
+    def test_init(self):
+        """Test constructor"""
+        with self.assertRaises(ValueError):
+            balancer.DestinationPool([])
+        with self.assertRaises(ValueError):
+            self._pool([1, 1, 1], strategy='random')
+
+    def test_weighted_round_robin(self):
+        """Test that the messages are spread according to the weights"""
+        pool = self._pool([1, 2, 3])
+        for i in range(60):
+            pool.send(b'm%d' % i)
+        self.assertEqual([len(_received(server)) for server in self.servers], [10, 20, 30])
+        self.assertEqual([state['sent'] for state in pool.state()], [10, 20, 30])
+        pool.close()
+
+    def test_hash(self):
+        """Test that a key always goes to the same destination"""
+        pool = self._pool([1, 1, 1], strategy='hash')
+        for i in range(30):
+            for key in ('app1', 'app2', 'app3', 'app4'):
+                pool.send(key.encode(), key)
+        for server in self.servers:
+            datagrams = _received(server)
+            # each key is only found on one server
+            for key in set(datagrams):
+                self.assertEqual(datagrams.count(key), 30)
+        pool.close()
+
+    def test_least_outstanding(self):
+        """Test that the destination with the smallest batch is picked"""
+        pool = balancer.DestinationPool([(server.getsockname(), 1) for server in self.servers],
+                                         socket.SOCK_STREAM, 'leastoutstanding', flush_interval=0)
+        pool.destinations[0].pending_bytes = 100
+        pool.destinations[1].pending_bytes = 10
+        pool.destinations[2].pending_bytes = 50
+        self.assertIs(pool._choose(pool.destinations, None), pool.destinations[1])
+        pool.destinations[1].weight = 10
+        pool.destinations[1].pending_bytes = 200
+        self.assertIs(pool._choose(pool.destinations, None), pool.destinations[1])
+
+    def test_failover_and_readmission(self):
+        """Test that a dead destination is skipped then re-admitted after its cooldown"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as alive, \
+             socket.socket(socket.AF_INET, socket.SOCK_STREAM) as dead:
+            alive.bind(('127.0.0.1', 0))
+            alive.listen()
+            dead.bind(('127.0.0.1', 0))
+            pool = balancer.DestinationPool([(dead.getsockname(), 1), (alive.getsockname(), 1)],
+                                             socket.SOCK_STREAM, flush_interval=0, cooldown=0.2)
+            for i in range(10):
+                pool.send(b'm%d\n' % i)
+            pool.flush()
+            states = pool.state()
+            self.assertFalse(states[0]['up'])
+            self.assertEqual(states[1]['sent'], 10)
+            conn, _ = alive.accept()
+            with conn:
+                conn.settimeout(5)
+                data = b''
+                while data.count(b'\n') < 10:
+                    data += conn.recv(65536)
+            self.assertEqual(sorted(data.split()), sorted(b'm%d' % i for i in range(10)))
+            # re-admission
+            dead.listen()
+            time.sleep(0.3)
+            pool.send(b'back\n')
+            pool.send(b'back\n')
+            pool.flush()
+            self.assertGreater(pool.state()[0]['sent'], 0)
+            self.assertEqual(pool.state()[0]['failures'], 0)
+            pool.close()
+
+    def test_all_down(self):
+        """Test that an error is raised when no destination is available"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as dead:
+            dead.bind(('127.0.0.1', 0))
+            pool = balancer.DestinationPool([(dead.getsockname(), 1)], socket.SOCK_STREAM, flush_interval=0)
+            pool.send(b'lost\n')
+            with self.assertRaises(OSError):
+                pool.flush()
+            self.assertEqual(pool.dropped, 1)
+
+    def test_handler(self):
+        """Test the logging handler and its hash key"""
+        pool = self._pool([1, 1, 1], strategy='hash')
+        handler = balancer.BalancedSysLogHandler(pool)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        for _ in range(5):
+            record = logging.LogRecord('test', logging.INFO, __file__, 1, 'hello', None, None)
+            record.hashkey = 'app1'
+            handler.handle(record)
+        counts = sorted(len(_received(server)) for server in self.servers)
+        self.assertEqual(counts, [0, 0, 5])
+        handler.close()
+
+
+class TestFailover(unittest.TestCase):
+    """Balancing over tinysyslogserver instances, one of them being killed"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.servers = []
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (harness.SRC, env.get('PYTHONPATH')) if p)
+        for i in range(3):
+            port = harness.free_port()
+            server = subprocess.Popen([sys.executable, harness.SCRIPT, '-a', harness.HOST, '-p', str(port), '-t',
+                                       '-F', f"{self.tmp.name}/server{i}.log", '-f', '%(message)s'],
+                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+            self.servers.append((server, port))
+        for server, port in self.servers:
+            while b'Waiting for connections' not in server.stdout.readline():
+                pass
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                    if sock.connect_ex((harness.HOST, port)) == 0:
+                        break
+                time.sleep(0.05)
+
+    def tearDown(self):
+        for server, _ in self.servers:
+            if server.poll() is None:
+                server.terminate()
+            server.communicate()
+        self.tmp.cleanup()
+
+    def _counts(self, expected: int) -> list:
+        """Wait until the servers have logged expected lines and return the count per server"""
+        deadline = time.monotonic() + 10
+        while True:
+            counts = [harness.count_lines(f"{self.tmp.name}/server{i}.log") for i in range(3)]
+            if sum(counts) >= expected or time.monotonic() > deadline:
+                return counts
+            time.sleep(0.1)
+
+    def test_distribution_and_failover(self):
+        """Test the even distribution and that no message is lost when a server is killed"""
+        pool = balancer.DestinationPool([((harness.HOST, port), 1) for _, port in self.servers],
+                                         socket.SOCK_STREAM, flush_interval=0)
+        for i in range(300):
+            pool.send(b'm%d\n' % i)
+        pool.flush()
+        self.assertEqual(self._counts(300), [100, 100, 100])
+        server, _ = self.servers[1]
+        server.terminate()
+        server.communicate()
+        for i in range(300, 600):
+            pool.send(b'm%d\n' % i)
+        pool.flush()
+        self.assertEqual(self._counts(600), [250, 100, 250])
+        self.assertEqual(pool.dropped, 0)
+        pool.close()
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
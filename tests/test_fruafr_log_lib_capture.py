@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.capture
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import tempfile
+import unittest
+from fruafr.log.lib import capture
+
+
+class TestCapture(unittest.TestCase):
+    """Class TestCapture"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp.name}/test.cap"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        """Test writing and reading records"""
+        writer = capture.CaptureWriter(self.path)
+        writer.write(b'<14>udp', capture.UDP, ('127.0.0.1', 40000), 1.5)
+        writer.write(b'<14>tcp', capture.TCP, ('10.0.0.1', 40001), 2.5)
+        writer.close()
+        records = list(capture.CaptureReader(self.path))
+        self.assertEqual(records, [(1.5, capture.UDP, ('127.0.0.1', 40000), b'<14>udp'),
+                                   (2.5, capture.TCP, ('10.0.0.1', 40001), b'<14>tcp')])
+
+    def test_append(self):
+        """Test that an existing capture is appended to"""
+        for i in range(2):
+            writer = capture.CaptureWriter(self.path)
+            writer.write(f"message{i}".encode())
+            writer.close()
+        self.assertEqual([r[3] for r in capture.CaptureReader(self.path)], [b'message0', b'message1'])
+
+    def test_truncated(self):
+        """Test that a truncated last record is ignored"""
+        writer = capture.CaptureWriter(self.path)
+        writer.write(b'complete')
+        writer.write(b'truncated')
+        writer.close()
+        with open(self.path, 'r+b') as file:
+            file.truncate(file.seek(0, 2) - 3)
+        self.assertEqual([r[3] for r in capture.CaptureReader(self.path)], [b'complete'])
+
+    def test_index(self):
+        """Test the offsets of index() and the chunks read from them"""
+        writer = capture.CaptureWriter(self.path)
+        for i in range(10):
+            writer.write(f"message{i}".encode(), capture.UDP, ('127.0.0.1', 40000), float(i))
+        writer.write(b'truncated')
+        writer.close()
+        with open(self.path, 'r+b') as file:
+            file.truncate(file.seek(0, 2) - 3)
+        reader = capture.CaptureReader(self.path)
+        offsets = reader.index(4)
+        self.assertEqual(len(offsets), 3)
+        self.assertEqual(offsets[0], len(capture.MAGIC))
+        self.assertEqual([r[0] for r in reader.records(offsets[1::2], 4)], [4.0, 5.0, 6.0, 7.0])
+        self.assertEqual([r[0] for r in reader.records(offsets[0::2], 4)], [0.0, 1.0, 2.0, 3.0, 8.0, 9.0])
+        self.assertEqual(len(reader.index()), 10)
+        with self.assertRaises(ValueError):
+            reader.index(0)
+
+    def test_not_a_capture(self):
+        """Test a file that is not a capture"""
+        with open(self.path, 'wb') as file:
+            file.write(b'hello world')
+        with self.assertRaises(ValueError):
+            capture.CaptureReader(self.path)
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
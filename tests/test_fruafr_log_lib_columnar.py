@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.columnar
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import logging
+import os
+import tempfile
+import unittest
+from fruafr.log.lib import columnar
+
+START = 1697184000.0
+LEVELS = (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR)
+
+
+def _record(seq: int, **extra) -> logging.LogRecord:
+    """Returns the record seq, logged seq seconds after START"""
+    record = logging.LogRecord('test', LEVELS[seq % len(LEVELS)], __file__, 1, "message %d é", (seq,), None)
+    record.created = START + seq
+    record.__dict__.update(extra)
+    return record
+
+
+class TestColumnarFileHandler(unittest.TestCase):
+    """Class TestColumnarFileHandler"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.filename = f"{self._tmp.name}/test.col"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write(self, count: int, block_records: int = 10, **extra) -> None:
+        """Write count records"""
+        handler = columnar.ColumnarFileHandler(self.filename, host='host0', block_records=block_records)
+        for seq in range(count):
+            handler.handle(_record(seq, **extra))
+        handler.close()
+
+    def test_write_read(self):
+        """Test the blocks and the columns of the records"""
+        self._write(25, app='api')
+        blocks = list(columnar.read_blocks(self.filename))
+        self.assertEqual([block.count for block in blocks], [10, 10, 5])
+        self.assertEqual(blocks[1].low, int((START + 10) * 1e9))
+        self.assertEqual(blocks[1].high, int((START + 19) * 1e9))
+        records = list(columnar.records(blocks))
+        self.assertEqual(len(records), 25)
+        self.assertEqual(records[13], (START + 13, logging.INFO, columnar.FACILITY_NONE, 'host0', 'api', 'message 13 é'))
+
+    def test_alignment(self):
+        """Test that the columns of 4 and 8 bytes are aligned"""
+        self.assertEqual(columnar.HEADER.size % 8, 0)
+        self._write(3, app='api')
+        with open(self.filename, 'rb') as file:
+            data = file.read()
+        _, _, count, hosts_size, apps_size, text_size, _, _, _ = columnar.HEADER.unpack_from(data)
+        dictionaries, ends, _, end = columnar._block_size(count, hosts_size, apps_size, text_size)
+        self.assertEqual((ends % 4, end, dictionaries), (0, len(data), columnar.HEADER.size + 14 * 3))
+        self.assertEqual(columnar.Block(data).message(2), 'message 2 é')
+
+    def test_block_delay(self):
+        """Test the write of a block after max_delay"""
+        handler = columnar.ColumnarFileHandler(self.filename, max_delay=0)
+        handler.handle(_record(0))
+        self.assertEqual(len(list(columnar.read_blocks(self.filename))), 1)
+        handler.max_delay = 3600
+        handler.handle(_record(1))
+        handler.service()
+        self.assertEqual(len(list(columnar.read_blocks(self.filename))), 1)
+        handler.sync()
+        self.assertEqual(len(list(columnar.read_blocks(self.filename))), 2)
+        handler.close()
+
+    def test_incomplete_block(self):
+        """Test a block being written at the end of the file"""
+        self._write(15)
+        size = os.path.getsize(self.filename)
+        with open(self.filename, 'r+b') as file:
+            file.truncate(size - 1)
+        self.assertEqual([block.count for block in columnar.read_blocks(self.filename)], [10])
+        with open(self.filename, 'wb') as file:
+            file.write(b'not a columnar file' * 10)
+        with self.assertRaises(ValueError):
+            list(columnar.read_blocks(self.filename))
+
+    def test_invalid(self):
+        """Test invalid arguments"""
+        with self.assertRaises(ValueError):
+            columnar.ColumnarFileHandler(self.filename, mode='r')
+        with self.assertRaises(ValueError):
+            columnar.ColumnarFileHandler(self.filename, block_records=columnar.MAX_RECORDS + 1)
+        with self.assertRaises(ValueError):
+            columnar.count_by([], 'message')
+
+
+class TestAggregation(unittest.TestCase):
+    """Class TestAggregation"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.filename = f"{self._tmp.name}/test.col"
+        handler = columnar.ColumnarFileHandler(self.filename, host='host0', block_records=7)
+        for seq in range(100):
+            handler.handle(_record(seq, host=f"host{seq % 3 // 2}", app=f"app{seq % 5}"))
+        handler.close()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _count(self, key: str, **kwargs) -> dict:
+        return columnar.count_by(columnar.read_blocks(self.filename), key, **kwargs)
+
+    def test_count_by(self):
+        """Test the counts by column"""
+        self.assertEqual(self._count('level'), {'DEBUG': 25, 'INFO': 25, 'WARNING': 25, 'ERROR': 25})
+        self.assertEqual(self._count('facility'), {'-': 100})
+        self.assertEqual(self._count('host'), {'host0': 67, 'host1': 33})
+        self.assertEqual(self._count('app'), {f"app{n}": 20 for n in range(5)})
+        self.assertEqual(self._count('time', interval=30), {START: 30, START + 30: 30, START + 60: 30, START + 90: 10})
+
+    def test_time_range(self):
+        """Test --since/--until, within the blocks and whole blocks"""
+        self.assertEqual(self._count('level', since=START + 10, until=START + 14), {'WARNING': 1, 'ERROR': 1, 'DEBUG': 1, 'INFO': 1})
+        self.assertEqual(sum(self._count('host', since=START + 3).values()), 97)
+        self.assertEqual(self._count('time', interval=50, until=START + 60), {START: 50, START + 50: 10})
+        self.assertEqual(self._count('app', since=START + 1000), {})
+        self.assertEqual(len(list(columnar.records(columnar.read_blocks(self.filename), START + 95))), 5)
+
+    def test_top(self):
+        """Test top"""
+        self.assertEqual(columnar.top(self._count('host'), 1), [('host0', 67)])
+        self.assertEqual(columnar.top({'b': 2, 'a': 2, 'c': 3}), [('c', 3), ('a', 2), ('b', 2)])
+
+
+class TestParseSyslog(unittest.TestCase):
+    """Class TestParseSyslog"""
+
+    def test_parse_syslog(self):
+        """Test the RFC 5424, RFC 3164 and bare syslog messages"""
+        self.assertEqual(columnar.parse_syslog('<14>1 2023-10-13T10:00:00.000Z web1 api 12 - - hello'),
+                         (1, logging.INFO, 'web1', 'api', 'hello'))
+        self.assertEqual(columnar.parse_syslog('<11>Oct 13 10:00:00 web2 worker[42]: failed'),
+                         (1, logging.ERROR, 'web2', 'worker', 'failed'))
+        self.assertEqual(columnar.parse_syslog('<134>1 2023-10-13T10:00:00Z - - - - - nil'),
+                         (16, logging.INFO, None, None, 'nil'))
+        self.assertEqual(columnar.parse_syslog('<130>bare'), (16, logging.CRITICAL, None, None, 'bare'))
+        self.assertEqual(columnar.parse_syslog('no priority'), (columnar.FACILITY_NONE, None, None, None, 'no priority'))
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.durability
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import logging
+import tempfile
+import threading
+import time
+import unittest
+from fruafr.log.lib import atomicappend
+from fruafr.log.lib import durability
+
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    """Returns a logger writing the bare messages to handler"""
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+    return logger
+
+
+class TestGroupCommit(unittest.TestCase):
+    """Class TestGroupCommit"""
+
+    def test_concurrent_commits(self):
+        """Test that the threads share the syncs and return once a sync covers their write"""
+        written = []
+        durable = [0]
+
+        def sync():
+            covered = len(written)
+            time.sleep(0.002)
+            durable[0] = covered
+
+        group = durability.GroupCommit(sync)
+        failures = []
+
+        def writer():
+            for _ in range(50):
+                with group.commit():
+                    written.append(None)
+                    index = len(written)
+                if durable[0] < index:
+                    failures.append(index)
+
+        threads = [threading.Thread(target=writer) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+        self.assertEqual(durable[0], 400)
+        self.assertLess(group.syncs, 200)
+
+    def test_lone_writer(self):
+        """Test that a lone writer syncs each record without waiting max_delay"""
+        syncs = []
+        group = durability.GroupCommit(lambda: syncs.append(None), max_delay=1)
+        start = time.monotonic()
+        for _ in range(20):
+            with group.commit():
+                pass
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual((len(syncs), group.syncs), (20, 20))
+
+    def test_sync_error(self):
+        """Test that a failed sync is raised and the next commit syncs again"""
+        errors = [OSError('disk')]
+
+        def sync():
+            if errors:
+                raise errors.pop()
+
+        group = durability.GroupCommit(sync)
+        with self.assertRaises(OSError):
+            with group.commit():
+                pass
+        with group.commit():
+            pass
+        self.assertEqual(group.syncs, 1)
+
+
+class TestDurableFileHandler(unittest.TestCase):
+    """Class TestDurableFileHandler"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.filename = f"{self._tmp.name}/test.log"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _read(self) -> str:
+        """Returns the content of the log file"""
+        with open(self.filename, 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def test_modes(self):
+        """Test when the records reach the file"""
+        for mode in durability.DURABILITY:
+            handler = durability.DurableFileHandler(self.filename, 'w', 'utf-8', mode)
+            logger = _logger(f"durability.{mode}", handler)
+            logger.info('first')
+            logger.info('second')
+            self.assertEqual(self._read(), '' if mode == 'none' else 'first\nsecond\n', mode)
+            handler.close()
+            self.assertEqual(self._read(), 'first\nsecond\n', mode)
+        with self.assertRaises(ValueError):
+            durability.DurableFileHandler(self.filename, durability='always')
+
+    def test_group_threads(self):
+        """Test the group commit of threads logging through one handler"""
+        handler = durability.DurableFileHandler(self.filename, encoding='utf-8', durability='group')
+        logger = _logger('durability.group', handler)
+        threads = [threading.Thread(target=lambda n=n: [logger.info("%d-%d", n, seq) for seq in range(100)]) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        syncs = handler.group.syncs
+        handler.close()
+        lines = self._read().splitlines()
+        self.assertEqual(sorted(lines), sorted(f"{n}-{seq}" for n in range(8) for seq in range(100)))
+        self.assertLess(syncs, 800)
+
+    def test_atomic_append(self):
+        """Test the durability of AtomicAppendHandler"""
+        handler = atomicappend.AtomicAppendHandler(self.filename, durability='group')
+        logger = _logger('durability.atomic', handler)
+        logger.info('first')
+        self.assertEqual(handler.group.syncs, 1)
+        handler.close()
+        handler = atomicappend.AtomicAppendHandler(self.filename, durability='fsync')
+        _logger('durability.atomic', handler).info('second')
+        handler.close()
+        self.assertEqual(self._read(), 'first\nsecond\n')
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.encoder
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import logging
+import re
+import socket
+import time
+import unittest
+from logging import handlers
+from fruafr.log.lib import common
+from fruafr.log.lib import encoder
+
+
+class TestSyslogEncoder(unittest.TestCase):
+    """Class TestSyslogEncoder"""
+
+    def test_init(self):
+        """Test constructor"""
+        with self.assertRaises(TypeError):
+            encoder.SyslogEncoder('user')
+        with self.assertRaises(ValueError):
+            encoder.SyslogEncoder(rfc='3339')
+
+    def test_pri_prefixes(self):
+        """Test the <PRI> table of every facility and severity"""
+        self.assertEqual(len(encoder.PRI_PREFIXES), len(common.SYSLOG_FACILITIES) * 8)
+        self.assertEqual(encoder.PRI_PREFIXES[(handlers.SysLogHandler.LOG_LOCAL7, 7)], b'<191>')
+        self.assertEqual(encoder.PRI_PREFIXES[(handlers.SysLogHandler.LOG_KERN, 0)], b'<0>')
+
+    def test_same_as_sysloghandler(self):
+        """Test that the default format is the one of SysLogHandler"""
+        stdlib = handlers.SysLogHandler(('127.0.0.1', 9))
+        stdlib.ident = 'id: '
+        self.addCleanup(stdlib.close)
+        fast = encoder.SyslogEncoder(handlers.SysLogHandler.LOG_LOCAL3, ident='id: ')
+        for level in (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL, 5):
+            record = logging.LogRecord('test', level, __file__, 1, 'héllo', None, None)
+            levelname = record.levelname
+            prio = stdlib.encodePriority(handlers.SysLogHandler.LOG_LOCAL3, stdlib.mapPriority(levelname))
+            expected = f"<{prio}>id: héllo\000".encode()
+            self.assertEqual(fast.encode(levelname, 'héllo'), expected)
+
+    def test_rfc3164(self):
+        """Test the RFC 3164 header"""
+        fast = encoder.SyslogEncoder(rfc='3164', hostname='host', app_name='app', procid=42,
+                                     append_nul=False)
+        created = time.mktime((2023, 10, 3, 9, 5, 7, 0, 0, -1)) + 0.5
+        self.assertEqual(fast.encode('INFO', 'hello', created), b'<14>Oct  3 09:05:07 host app[42]: hello')
+
+    def test_rfc5424(self):
+        """Test the RFC 5424 header"""
+        fast = encoder.SyslogEncoder(handlers.SysLogHandler.LOG_LOCAL0, '5424', hostname='host',
+                                     app_name='app', procid=42, append_nul=False)
+        created = time.mktime((2023, 10, 3, 9, 5, 7, 0, 0, -1)) + 0.25
+        message = fast.encode('ERROR', 'hello', created)
+        self.assertRegex(message, rb'^<131>1 2023-10-03T09:05:07\.250000[+-]\d\d:\d\d host app 42 - - hello$')
+        # the cached second is reused, the fraction is not
+        self.assertIn(b'09:05:07.750000', fast.encode('ERROR', 'hello', created + 0.5))
+        self.assertIn(b'09:05:08.000000', fast.encode('ERROR', 'hello', created + 0.75))
+
+
+class TestFastSysLogHandler(unittest.TestCase):
+    """Class TestFastSysLogHandler"""
+
+    def test_emit_udp(self):
+        """Test that the datagrams are the ones of SysLogHandler"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.settimeout(5)
+            record = logging.LogRecord('test', logging.WARNING, __file__, 1, 'hello %s', ('world',), None)
+            for handler_class in (handlers.SysLogHandler, encoder.FastSysLogHandler):
+                handler = handler_class(server.getsockname(), handlers.SysLogHandler.LOG_DAEMON)
+                handler.ident = 'prog '
+                handler.emit(record)
+                handler.close()
+            self.assertEqual(server.recv(1024), server.recv(1024))
+
+    def test_ident_updates_encoder(self):
+        """Test that changing ident, append_nul or facility rebuilds the encoder"""
+        handler = encoder.FastSysLogHandler(('127.0.0.1', 9), rfc='3164', app_name='app')
+        self.addCleanup(handler.close)
+        handler.ident = 'id '
+        handler.append_nul = False
+        handler.facility = handlers.SysLogHandler.LOG_LOCAL1
+        record = logging.LogRecord('test', logging.INFO, __file__, 1, 'hello', None, None)
+        self.assertTrue(re.match(rb'^<142>\w{3} [ \d]\d \d\d:\d\d:\d\d \S+ app\[\d+\]: id hello$',
+                                 handler.encode_record(record)))
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.follow
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import os
+import tempfile
+import unittest
+from fruafr.log.lib import follow
+
+
+class TestCheckpoints(unittest.TestCase):
+    """Class TestCheckpoints"""
+
+    def test_save_load(self):
+        """Test that the positions are saved and loaded"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/checkpoint"
+            checkpoints = follow.Checkpoints(path)
+            self.assertIsNone(checkpoints.get('app.log'))
+            checkpoints.set('app.log', {'dev': 1, 'ino': 2, 'offset': 3})
+            checkpoints.save()
+            self.assertEqual(os.listdir(tmp), ['checkpoint'])
+            self.assertEqual(follow.Checkpoints(path).get('app.log'), {'dev': 1, 'ino': 2, 'offset': 3})
+        with self.assertRaises(TypeError):
+            follow.Checkpoints(None)
+
+
+class TestFileFollower(unittest.TestCase):
+    """Class TestFileFollower"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp.name}/app.log"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _append(self, data: bytes, path: str = None) -> None:
+        """Append data to the followed file"""
+        with open(path or self.path, 'ab') as file:
+            file.write(data)
+
+    def test_missing_file(self):
+        """Test that a file created later is followed"""
+        follower = follow.FileFollower(self.path)
+        self.assertEqual(follower.read(), [])
+        self.assertIsNone(follower.position)
+        self._append(b'line1\n')
+        self.assertEqual(follower.read(), [b'line1'])
+        follower.close()
+
+    def test_partial_line(self):
+        """Test that a line is only returned once terminated"""
+        self._append(b'line1\nli')
+        follower = follow.FileFollower(self.path)
+        self.assertEqual(follower.read(), [b'line1'])
+        self.assertEqual(follower.read(), [])
+        self.assertEqual(follower.offset, 6)
+        self.assertEqual(follower.lag, 2)
+        self._append(b'ne2\n')
+        self.assertEqual(follower.read(), [b'line2'])
+        self.assertEqual(follower.lag, 0)
+        follower.close()
+
+    def test_block_size(self):
+        """Test that the lines are read in blocks, a long line included"""
+        self._append(b'a' * 10 + b'\n' + b'b' * 10 + b'\n' + b'c' * 30 + b'\n')
+        follower = follow.FileFollower(self.path, block_size=16)
+        self.assertEqual(follower.read(), [b'a' * 10])
+        self.assertEqual(follower.read(), [b'b' * 10])
+        self.assertEqual(follower.read(), [b'c' * 30])
+        self.assertEqual(follower.read(), [])
+        follower.close()
+
+    def test_rotation(self):
+        """Test that the old file is read to its end before the new one"""
+        self._append(b'line1\n')
+        follower = follow.FileFollower(self.path)
+        self.assertEqual(follower.read(), [b'line1'])
+        os.rename(self.path, f"{self.path}.1")
+        self._append(b'line2\nunterminated', f"{self.path}.1")
+        self._append(b'line3\n')
+        self.assertEqual(follower.lag, 24)
+        self.assertEqual(follower.read(), [b'line2'])
+        self.assertEqual(follower.read(), [b'unterminated'])
+        self.assertEqual(follower.read(), [b'line3'])
+        self.assertEqual(follower.rotations, 1)
+        follower.close()
+
+    def test_truncation(self):
+        """Test that a truncated file is read from its beginning"""
+        self._append(b'line1\nline2\n')
+        follower = follow.FileFollower(self.path)
+        self.assertEqual(follower.read(), [b'line1', b'line2'])
+        with open(self.path, 'wb') as file:
+            file.write(b'new\n')
+        self.assertEqual(follower.read(), [b'new'])
+        self.assertEqual(follower.truncations, 1)
+        follower.close()
+
+    def test_resume(self):
+        """Test that a follower resumes from a position, the rotated file included"""
+        self._append(b'line1\nline2\n')
+        follower = follow.FileFollower(self.path, block_size=6)
+        self.assertEqual(follower.read(), [b'line1'])
+        position = follower.position
+        follower.close()
+        follower = follow.FileFollower(self.path, position)
+        self.assertEqual(follower.read(), [b'line2'])
+        follower.close()
+        # rotated while stopped
+        os.rename(self.path, f"{self.path}.1")
+        self._append(b'line3\n')
+        follower = follow.FileFollower(self.path, position)
+        self.assertEqual(follower.read(), [b'line2'])
+        self.assertEqual(follower.read(), [b'line3'])
+        follower.close()
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,9 @@ Test of fruafr.log.lib.formatter
 # License: MIT License
 # Author: David HEURTEVENT <david@heurtevent.org>
 
+import json
+import logging
+import sys
 import unittest
 from fruafr.log.lib import formatter
 from fruafr.log.lib import common
@@ -110,6 +113,62 @@ class TestFormatter(unittest.TestCase):
         self.assertIn(m, repr(self.formatter))
 
 
+class TestJsonFormatter(unittest.TestCase):
+    """Class TestJsonFormatter"""
+
+    def _record(self, msg: str = 'hello %s', args: tuple = ('world',)) -> logging.LogRecord:
+        """Returns a record"""
+        return logging.LogRecord('app.db', logging.WARNING, '/src/app.py', 12, msg, args, None, 'query')
+
+    def test_format(self):
+        """Test the fields, the static fields and the types"""
+        fields = ['asctime', 'levelname', 'levelno', 'name', 'lineno', 'created', 'funcName', 'message', 'taskName']
+        json_formatter = formatter.JsonFormatter(fields, '%H:%M', {'app': 'web', 'user': '50%', 'lineno': 'static'})
+        record = self._record()
+        line = json_formatter.format(record)
+        self.assertNotIn('\n', line)
+        self.assertEqual(list(json.loads(line).items()), [
+            ('asctime', logging.Formatter(None, '%H:%M').formatTime(record, '%H:%M')), ('levelname', 'WARNING'),
+            ('levelno', 30), ('name', 'app.db'), ('created', record.created), ('funcName', 'query'),
+            ('message', 'hello world'), ('taskName', getattr(record, 'taskName', None)),
+            ('app', 'web'), ('user', '50%'), ('lineno', 'static')])
+        self.assertEqual(json.loads(formatter.JsonFormatter().format(record))['message'], 'hello world')
+        self.assertEqual(formatter.JsonFormatter([]).format(record), '{}')
+        with self.assertRaises(ValueError):
+            formatter.JsonFormatter(['clientip'])
+
+    def test_escaping(self):
+        """Test the strings that need escaping, the same as json.dumps"""
+        json_formatter = formatter.JsonFormatter(['name', 'message'])
+        for message in ('quote " backslash \\ tab \t', 'line\nbreak\r', 'control \x00\x1f', 'accents é 日本 \U0001F600', '%(message)s %%'):
+            record = self._record(message, None)
+            record.name = message
+            self.assertEqual(json_formatter.format(record), json.dumps({'name': message, 'message': message}, ensure_ascii=False, separators=(',', ':')))
+        self.assertEqual(formatter.encode_value(float('nan')), 'null')
+        self.assertEqual(formatter.encode_value(True), 'true')
+        self.assertEqual(formatter.encode_value(('a', 1)), '"(\'a\', 1)"')
+
+    def test_exception(self):
+        """Test the exception and the stack"""
+        json_formatter = formatter.JsonFormatter(['message'])
+        record = self._record()
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record.exc_info = sys.exc_info()
+        record.stack_info = 'Stack (most recent call last):\n  frame'
+        fields = json.loads(json_formatter.format(record))
+        self.assertEqual(fields['message'], 'hello world')
+        self.assertIn('ValueError: boom', fields['exc_info'])
+        self.assertEqual(fields['stack_info'], record.stack_info)
+
+    def test_format_fields(self):
+        """Test the fields of a format string"""
+        self.assertEqual(formatter.format_fields('%(asctime)s %(clientip)-15s %(levelname)s:%(message)s %(asctime)s'),
+                         ['asctime', 'levelname', 'message'])
+        self.assertEqual(formatter.format_fields(None), [])
+
+
 def main():
     """Main"""
     unittest.main()
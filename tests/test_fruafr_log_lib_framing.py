@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.framing
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import unittest
+from fruafr.log.lib import framing
+
+
+class TestFraming(unittest.TestCase):
+    """Class TestFraming"""
+
+    def setUp(self):
+        self.decoder = framing.FrameDecoder()
+
+    def test_encode_octet_counted(self):
+        """Test encode_octet_counted"""
+        self.assertEqual(framing.encode_octet_counted(b'<14>hello'), b'9 <14>hello')
+
+    def test_non_transparent(self):
+        """Test LF and NUL delimited frames"""
+        self.assertEqual(self.decoder.feed(b'<14>one\x00<14>two\n<14>thr'), [b'<14>one', b'<14>two'])
+        self.assertEqual(self.decoder.feed(b'ee\n'), [b'<14>three'])
+        self.assertEqual(self.decoder.flush(), [])
+
+    def test_octet_counting(self):
+        """Test octet counted frames split across reads"""
+        data = framing.encode_octet_counted(b'<14>a\nb') + framing.encode_octet_counted(b'<14>c')
+        self.assertEqual(self.decoder.feed(data[:6]), [])
+        self.assertEqual(self.decoder.feed(data[6:]), [b'<14>a\nb', b'<14>c'])
+
+    def test_flush(self):
+        """Test the last frame without trailer"""
+        self.assertEqual(self.decoder.feed(b'<14>last'), [])
+        self.assertEqual(self.decoder.flush(), [b'<14>last'])
+
+    def test_max_frame(self):
+        """Test that a frame without trailer is cut at max_frame"""
+        decoder = framing.FrameDecoder(max_frame=4)
+        self.assertEqual(decoder.feed(b'<abcdefg'), [b'<abc', b'defg'])
+
+    def test_max_frame_octet_counting(self):
+        """Test that an octet count above max_frame is cut and the rest of the frame discarded"""
+        decoder = framing.FrameDecoder(max_frame=4)
+        self.assertEqual(decoder.feed(b'9999999999 <14>'), [b'<14>'])
+        self.assertEqual(decoder.feed(b'x' * 100000), [])
+        self.assertEqual(len(decoder._buf), 0)
+        decoder = framing.FrameDecoder(max_frame=4)
+        self.assertEqual(decoder.feed(b'6 <14>ab3 <1>'), [b'<14>', b'<1>'])
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.latency
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import json
+import logging
+import os
+import socket
+import subprocess
+import tempfile
+import time
+import unittest
+from fruafr.log.lib import latency
+from fruafr.log.lib import stats
+
+from .benchmarks import fruafr_log_loadharness as harness
+
+CLIENT = f"{harness.SRC}/fruafr/log/logtosyslog.py"
+
+
+def _tracker() -> tuple:
+    """Returns a tracker and its counters"""
+    counters = stats.ServerStats(1, stats.COUNTERS + latency.COUNTERS)
+    return latency.LatencyTracker(counters.slot(0)), counters
+
+
+class TestTrailer(unittest.TestCase):
+    """Class TestTrailer"""
+
+    def test_stamp_split(self):
+        """Test that split removes the trailer added by stamp"""
+        message = latency.stamp('hello world', 'a1', 42, 1700000000123456789)
+        self.assertEqual(message, 'hello world lat=a1:42:1700000000123456789')
+        self.assertEqual(latency.split(message.encode()), (b'hello world', (b'a1', 42, 1700000000123456789)))
+        self.assertEqual(latency.split(message.encode() + b'\x00')[0], b'hello world')
+        self.assertEqual(latency.split(b'hello lat=x'), (b'hello lat=x', None))
+
+    def test_receive_time(self):
+        """Test the kernel receive timestamp of a datagram"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server, \
+             socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+            self.assertTrue(latency.enable_timestamps(server))
+            server.bind(('127.0.0.1', 0))
+            before = time.time_ns()
+            client.sendto(b'x', server.getsockname())
+            _, ancdata, _, _ = server.recvmsg(16, latency.CMSG_SIZE)
+            received = latency.receive_time(ancdata)
+            after = time.time_ns()
+        self.assertTrue(before <= received <= after)
+        self.assertNotEqual(latency.receive_time([]), 0)
+
+    def test_stamp_filter(self):
+        """Test that the filter stamps the messages of a run in sequence"""
+        stamp = latency.LatencyStamp('ab')
+        record = logging.LogRecord('test', logging.INFO, __file__, 1, 'hello %s', ('world',), None)
+        stamp.filter(record)
+        self.assertRegex(record.getMessage(), r'^hello world lat=ab:0:\d+$')
+        record = logging.LogRecord('test', logging.INFO, __file__, 1, 'again', None, None)
+        stamp.filter(record)
+        self.assertRegex(record.getMessage(), r'^again lat=ab:1:\d+$')
+
+
+class TestLatencyTracker(unittest.TestCase):
+    """Class TestLatencyTracker"""
+
+    def test_stages(self):
+        """Test the histograms of the stages"""
+        tracker, counters = _tracker()
+        now = time.time_ns()
+        data, token = tracker.received(b'hello lat=1:0:%d' % (now - 3000000), '127.0.0.1', now - 1000000)
+        self.assertEqual(data, b'hello')
+        tracker.written(token)
+        snapshot = counters.snapshot()
+        # 2 ms of network latency: bucket of 2048 us
+        self.assertEqual(snapshot['latency_network_11'], 1)
+        self.assertEqual(snapshot['latency_queue_count'], 1)
+        self.assertGreaterEqual(snapshot['latency_queue_sum_us'], 1000)
+        self.assertEqual(snapshot['latency_write_count'], 1)
+        # not stamped
+        self.assertEqual(tracker.received(b'hello', '127.0.0.1', now), (b'hello', None))
+
+    def test_sequence(self):
+        """Test the gaps and the late messages of the runs"""
+        tracker, counters = _tracker()
+        now = time.time_ns()
+        for source, run, seq in (('a', b'1', 0), ('a', b'1', 1), ('a', b'1', 4), ('a', b'1', 2),
+                                 ('b', b'1', 0), ('a', b'2', 0), ('a', b'1', 5)):
+            tracker.received(b'm lat=%s:%d:%d' % (run, seq, now), source, now)
+        summary = latency.summarize(counters.snapshot())['latency']
+        self.assertEqual((summary['messages'], summary['gaps'], summary['late'], summary['lost']), (7, 2, 1, 1))
+
+    def test_summarize(self):
+        """Test the summary of the stats snapshot"""
+        tracker, counters = _tracker()
+        for microseconds in (10, 10, 10, 1000):
+            tracker.observe('write', microseconds * 1000)
+        result = latency.summarize(counters.snapshot())
+        self.assertNotIn('latency_write_4', result)
+        self.assertEqual(result['udp_messages'], 0)
+        write = result['latency']['write']
+        self.assertEqual((write['count'], write['mean_us'], write['p50_us'], write['p99_us']), (4, 257.5, 16, 1024))
+        self.assertEqual(write['histogram'], {'16': 3, '1024': 1})
+        self.assertIsNone(result['latency']['network']['p50_us'])
+        self.assertEqual(latency.summarize({'udp_messages': 1}), {'udp_messages': 1})
+
+
+class TestServerLatency(unittest.TestCase):
+    """Class TestServerLatency"""
+
+    def test_end_to_end(self):
+        """Test logtosyslog --latency against tinysyslogserver --latency over UDP and TCP"""
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (harness.SRC, env.get('PYTHONPATH')) if p)
+        with tempfile.TemporaryDirectory() as tmp:
+            port = str(harness.free_port())
+            path = f"{tmp}/stats.sock"
+            server = subprocess.Popen([harness.INTERPRETER, harness.SCRIPT, '-a', harness.HOST, '-p', port, '-t',
+                                       '-F', f"{tmp}/server.log", '--stats', path, '--latency'],
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+            try:
+                deadline = time.monotonic() + 10
+                while not os.path.exists(path) and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                for protocol in ([], ['--tcp']):
+                    subprocess.run([harness.INTERPRETER, CLIENT, '--stdin', '--latency', '-a', harness.HOST,
+                                    '-p', port] + protocol,
+                                   input=''.join(f"line{i}\n" for i in range(20)), text=True, check=True, env=env)
+                deadline = time.monotonic() + 5
+                while time.monotonic() < deadline:
+                    summary = json.loads(stats.query(path, 'stats'))['latency']
+                    if summary['write']['count'] == 40:
+                        break
+                    time.sleep(0.05)
+            finally:
+                server.terminate()
+                server.communicate()
+            self.assertEqual((summary['messages'], summary['lost']), (40, 0))
+            self.assertEqual(summary['network']['count'], 40)
+            self.assertEqual(summary['queue']['count'], 40)
+            self.assertEqual(summary['write']['count'], 40)
+            with open(f"{tmp}/server.log", 'r', encoding='utf-8') as file:
+                lines = file.read()
+            self.assertEqual(lines.count('logtosyslog line19\n'), 2)
+            self.assertNotIn(' lat=', lines)
+
+    def test_requires_stats(self):
+        """Test that --latency requires --stats"""
+        p = subprocess.run([harness.INTERPRETER, harness.SCRIPT, '-p', str(harness.free_port()), '--latency'],
+                           capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=harness.SRC))
+        self.assertIn('--latency requires --stats', p.stderr)
+        self.assertEqual(p.returncode, 1)
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
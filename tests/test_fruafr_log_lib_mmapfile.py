@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.mmapfile
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import logging
+import mmap
+import multiprocessing
+import os
+import tempfile
+import unittest
+from fruafr.log.lib import mmapfile
+
+EXTENT = 2 * mmap.ALLOCATIONGRANULARITY
+
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    """Returns a logger writing the bare messages to handler"""
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+    return logger
+
+
+def _crash(filename: str) -> None:
+    """Log records, then exit without closing the handler"""
+    logger = _logger('mmapfile.crash', mmapfile.MmapFileHandler(filename, extent_size=EXTENT))
+    for seq in range(100):
+        logger.info("crashed %d", seq)
+    os._exit(0)
+
+
+class TestMmapFileHandler(unittest.TestCase):
+    """Class TestMmapFileHandler"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.filename = f"{self._tmp.name}/test.log"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _read(self) -> str:
+        """Returns the content of the log file"""
+        with open(self.filename, 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def test_extents(self):
+        """Test records spanning several extents, and a record larger than an extent"""
+        handler = mmapfile.MmapFileHandler(self.filename, extent_size=EXTENT)
+        logger = _logger('mmapfile.extents', handler)
+        expected = [f"record {seq} {'x' * 100}" for seq in range(500)]
+        expected.insert(250, 'y' * (3 * EXTENT))
+        for line in expected:
+            logger.info(line)
+        # preallocated beyond the committed length
+        self.assertGreater(os.path.getsize(self.filename), handler.committed)
+        handler.close()
+        self.assertEqual(self._read(), ''.join(f"{line}\n" for line in expected))
+        self.assertFalse(os.path.exists(self.filename + mmapfile.MARKER_SUFFIX))
+
+    def test_live_end(self):
+        """Test that a reader finds the end of the records while the file is written"""
+        with open(self.filename, 'w', encoding='utf-8') as file:
+            file.write('previous\n')
+        handler = mmapfile.MmapFileHandler(self.filename, extent_size=EXTENT)
+        logger = _logger('mmapfile.live', handler)
+        logger.info('first')
+        logger.info('second')
+        end = mmapfile.live_end(self.filename)
+        self.assertEqual(end, len('previous\nfirst\nsecond\n'))
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(file.read(end), b'previous\nfirst\nsecond\n')
+        with self.assertRaises(BlockingIOError):
+            mmapfile.MmapFileHandler(self.filename)
+        with self.assertRaises(BlockingIOError):
+            mmapfile.recover(self.filename)
+        handler.close()
+        self.assertEqual(mmapfile.live_end(self.filename), end)
+        # write mode
+        handler = mmapfile.MmapFileHandler(self.filename, 'w', extent_size=EXTENT)
+        _logger('mmapfile.live', handler).info('only')
+        handler.close()
+        self.assertEqual(self._read(), 'only\n')
+
+    def test_crash_recovery(self):
+        """Test that the preallocated tail left by a crashed writer is removed"""
+        expected = ''.join(f"crashed {seq}\n" for seq in range(100))
+        for reopen in (True, False):
+            process = multiprocessing.get_context('fork').Process(target=_crash, args=(self.filename,))
+            process.start()
+            process.join()
+            self.assertEqual(os.path.getsize(self.filename), EXTENT)
+            self.assertEqual(mmapfile.live_end(self.filename), len(expected))
+            if reopen:
+                handler = mmapfile.MmapFileHandler(self.filename, extent_size=EXTENT)
+                _logger('mmapfile.recovered', handler).info('after')
+                handler.close()
+                self.assertEqual(self._read(), expected + 'after\n')
+            else:
+                self.assertEqual(mmapfile.recover(self.filename), len(expected))
+                self.assertEqual(self._read(), expected)
+            os.unlink(self.filename)
+
+    def test_invalid(self):
+        """Test the invalid options"""
+        with self.assertRaises(ValueError):
+            mmapfile.MmapFileHandler(self.filename, extent_size=1000)
+        with self.assertRaises(ValueError):
+            mmapfile.MmapFileHandler(self.filename, 'r')
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
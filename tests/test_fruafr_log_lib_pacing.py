@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.pacing
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import os
+import tempfile
+import time
+import unittest
+from fruafr.log.lib import pacing
+from fruafr.log.lib import stats
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Class TestTokenBucket"""
+
+    def test_init(self):
+        """Test constructor"""
+        with self.assertRaises(ValueError):
+            pacing.TokenBucket(-1)
+        self.assertEqual(pacing.TokenBucket(1000).burst, 100)
+        self.assertEqual(pacing.TokenBucket(5).burst, 1)
+        self.assertEqual(pacing.TokenBucket(1000, 10).burst, 10)
+
+    def test_rate(self):
+        """Test that the messages after the burst are spaced to the rate"""
+        bucket = pacing.TokenBucket(2000, burst=10)
+        start = time.monotonic()
+        for _ in range(410):
+            bucket.wait()
+        elapsed = time.monotonic() - start
+        # 400 messages after the burst at 2000/s
+        self.assertGreater(elapsed, 0.18)
+        self.assertLess(elapsed, 0.4)
+
+    def test_unlimited(self):
+        """Test that a rate of 0 never waits"""
+        bucket = pacing.TokenBucket(0)
+        start = time.monotonic()
+        for _ in range(100000):
+            bucket.wait()
+        self.assertLess(time.monotonic() - start, 0.5)
+
+
+class TestAdaptivePacer(unittest.TestCase):
+    """Class TestAdaptivePacer"""
+
+    def test_init(self):
+        """Test constructor"""
+        with self.assertRaises(TypeError):
+            pacing.AdaptivePacer(None)
+        self.assertEqual(pacing.AdaptivePacer(lambda: 0).rate, pacing.START_RATE)
+
+    def test_find_capacity(self):
+        """Test that the rate converges under a receiver capacity and is reported"""
+        capacity = 4000.0
+        # a receive buffer of 50 messages drained at capacity messages per second
+        receiver = {'received': 0, 'queued': 0.0, 'last': time.monotonic()}
+        pacer = pacing.AdaptivePacer(lambda: receiver['received'], rate=1000, interval=0.05)
+
+        def send():
+            now = time.monotonic()
+            receiver['queued'] = max(0.0, receiver['queued'] - capacity * (now - receiver['last']))
+            receiver['last'] = now
+            if receiver['queued'] + 1 <= 50:
+                receiver['queued'] += 1
+                receiver['received'] += 1
+
+        deadline = time.monotonic() + 1.5
+        while time.monotonic() < deadline:
+            pacer.wait()
+            send()
+        self.assertGreater(pacer.adjustments, 5)
+        self.assertLess(pacer.rate, capacity * 2)
+        self.assertGreater(pacer.sustained_rate, 1000)
+        self.assertLessEqual(pacer.sustained_rate, capacity * 1.2)
+        report = pacer.report(settle=0)
+        self.assertEqual(report['sent'], pacer.sent)
+        self.assertEqual(report['lost'], pacer.sent - receiver['received'])
+
+    def test_stats_feedback(self):
+        """Test the feedback read from a stats socket"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'stats.sock')
+            server = stats.StatsServer(path, {'stats': lambda: {'udp_messages': 12, 'ring_dropped': 2}})
+            server.start()
+            try:
+                self.assertEqual(pacing.stats_feedback(path)(), 10)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.relp
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import logging
+import os
+import socket
+import socketserver
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from fruafr.log.lib import relp
+
+from .benchmarks import fruafr_log_loadharness as harness
+
+
+class _Collector(socketserver.ThreadingTCPServer):
+    """RELP server storing the messages, closing the first connections after drop_after messages"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drop_after: int = 0, drops: int = 0) -> None:
+        super().__init__(('127.0.0.1', 0), _CollectorHandler)
+        self.messages = []
+        self.syncs = 0
+        self.drop_after = drop_after
+        self.drops = drops
+        self.lock = threading.Lock()
+
+
+class _CollectorHandler(socketserver.BaseRequestHandler):
+    """Handler of _Collector"""
+
+    def handle(self):
+        received = []
+
+        def sync():
+            with self.server.lock:
+                self.server.syncs += 1
+
+        session = relp.RelpSession(received.append, sync)
+        while not session.closed:
+            data = self.request.recv(65536)
+            if not data:
+                break
+            response = session.feed(data)
+            with self.server.lock:
+                self.server.messages += received
+                if self.server.drops and len(self.server.messages) >= self.server.drop_after:
+                    # lose the acknowledgements of this read
+                    self.server.drops -= 1
+                    return
+            received.clear()
+            self.request.sendall(response)
+
+
+class TestFrameParser(unittest.TestCase):
+    """Class TestFrameParser"""
+
+    def test_encode_frame(self):
+        """Test encode_frame"""
+        self.assertEqual(relp.encode_frame(3, 'syslog', b'<14>hi'), b'3 syslog 6 <14>hi\n')
+        self.assertEqual(relp.encode_frame(4, 'close'), b'4 close 0\n')
+
+    def test_split_frames(self):
+        """Test frames split across reads, LF in the data included"""
+        parser = relp.FrameParser()
+        data = relp.encode_frame(1, 'syslog', b'a\nb') + relp.encode_frame(2, 'rsp')
+        for i in range(len(data)):
+            parser = relp.FrameParser()
+            self.assertEqual(parser.feed(data[:i]) + parser.feed(data[i:]),
+                             [(1, 'syslog', b'a\nb'), (2, 'rsp', b'')])
+
+    def test_invalid(self):
+        """Test that a stream that is not RELP raises ValueError"""
+        with self.assertRaises(ValueError):
+            relp.FrameParser().feed(b'<14>hello\n')
+        with self.assertRaises(ValueError):
+            relp.FrameParser().feed(b'1 syslog 2 abc\n')
+        with self.assertRaises(ValueError):
+            relp.FrameParser(max_frame=10).feed(b'1 syslog 11 ')
+
+
+class TestRelpSession(unittest.TestCase):
+    """Class TestRelpSession"""
+
+    def test_acknowledged_after_sync(self):
+        """Test that the responses of a read are returned after one sync"""
+        events = []
+        session = relp.RelpSession(lambda data: events.append(data), lambda: events.append('sync'))
+        response = session.feed(relp.encode_frame(1, 'open', relp.OFFERS)
+                                + relp.encode_frame(2, 'syslog', b'one')
+                                + relp.encode_frame(3, 'syslog', b'two'))
+        self.assertEqual(events, [b'one', b'two', 'sync'])
+        frames = relp.FrameParser().feed(response)
+        self.assertEqual([(txnr, command) for txnr, command, _ in frames], [(1, 'rsp'), (2, 'rsp'), (3, 'rsp')])
+        self.assertTrue(frames[0][2].startswith(b'200 OK\n'))
+        self.assertEqual(frames[2][2], b'200 OK')
+        self.assertEqual(session.feed(relp.encode_frame(4, 'close')), b'4 rsp 0\n')
+        self.assertTrue(session.closed)
+
+    def test_not_open(self):
+        """Test that the messages are refused before open"""
+        session = relp.RelpSession(self.fail)
+        self.assertEqual(session.feed(relp.encode_frame(1, 'syslog', b'one')),
+                         relp.encode_frame(1, 'rsp', b'500 session not open'))
+
+
+class TestRelpClient(unittest.TestCase):
+    """Class TestRelpClient"""
+
+    def _collector(self, drop_after: int = 0, drops: int = 0) -> _Collector:
+        server = _Collector(drop_after, drops)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_init(self):
+        """Test constructor"""
+        with self.assertRaises(TypeError):
+            relp.RelpClient('127.0.0.1')
+        with self.assertRaises(ValueError):
+            relp.RelpClient(('127.0.0.1', 514), window=0)
+
+    def test_window(self):
+        """Test that the messages are acknowledged and the window is never exceeded"""
+        server = self._collector()
+        client = relp.RelpClient(server.server_address, window=8, flush_interval=0)
+        for i in range(100):
+            client.send(b'm%d' % i)
+            self.assertLessEqual(client.pending, 8)
+        client.close()
+        self.assertEqual(server.messages, [b'm%d' % i for i in range(100)])
+        self.assertEqual((client.acked, client.dropped, client.retransmitted), (100, 0, 0))
+        # acknowledged in batches
+        self.assertLess(server.syncs, 100)
+
+    def test_retransmit_after_reconnect(self):
+        """Test that the unacknowledged messages are sent again on a new session"""
+        server = self._collector(drop_after=10, drops=1)
+        client = relp.RelpClient(server.server_address, window=4, flush_interval=0)
+        for i in range(20):
+            client.send(b'm%d' % i)
+        client.close()
+        self.assertEqual(client.reconnections, 1)
+        self.assertGreater(client.retransmitted, 0)
+        # at-least-once: every message is there, in order once the duplicates are removed
+        self.assertEqual(list(dict.fromkeys(server.messages)), [b'm%d' % i for i in range(20)])
+
+    def test_unreachable(self):
+        """Test that the messages never acknowledged are counted in dropped"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(('127.0.0.1', 0))
+            address = sock.getsockname()
+        client = relp.RelpClient(address, flush_interval=0, retries=0)
+        with self.assertRaises(OSError):
+            client.send(b'one')
+        self.assertEqual(client.pending, 1)
+        with self.assertRaises(OSError):
+            client.close()
+        self.assertEqual(client.dropped, 1)
+
+
+class TestRelpSysLogHandler(unittest.TestCase):
+    """Class TestRelpSysLogHandler"""
+
+    def test_emit(self):
+        """Test that the records are sent without NUL and acknowledged on close"""
+        server = _Collector()
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        handler = relp.RelpSysLogHandler(server.server_address, window=2)
+        handler.ident = 'prog '
+        for i in range(5):
+            handler.emit(logging.LogRecord('test', logging.INFO, __file__, 1, 'hello %d', (i,), None))
+        handler.close()
+        self.assertEqual(server.messages, [b'<14>prog hello %d' % i for i in range(5)])
+
+
+class TestTinySysLogServerRelp(unittest.TestCase):
+    """Class TestTinySysLogServerRelp (tinysyslogserver --relp, no sudo required)"""
+
+    def _start(self, tmp: str, port: int) -> subprocess.Popen:
+        """Start tinysyslogserver with a RELP listener and the write-ahead log"""
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (harness.SRC, env.get('PYTHONPATH')) if p)
+        server = subprocess.Popen([harness.INTERPRETER, harness.SCRIPT, '-a', harness.HOST, '-nou',
+                                   '--relp', str(port), '-F', f"{tmp}/server.log", '--wal', f"{tmp}/wal"],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                if sock.connect_ex((harness.HOST, port)) == 0:
+                    break
+            time.sleep(0.05)
+        return server
+
+    def test_acknowledged_when_written(self):
+        """Test that the acknowledged messages are in the log file, across a server restart"""
+        with tempfile.TemporaryDirectory() as tmp:
+            logfile = f"{tmp}/server.log"
+            port = harness.free_port()
+            server = self._start(tmp, port)
+            client = relp.RelpClient((harness.HOST, port), window=16, flush_interval=0)
+            try:
+                for i in range(50):
+                    client.send(b'<14>first-%d' % i)
+                client.flush()
+                self.assertEqual(harness.count_lines(logfile), 50)
+                server.terminate()
+                server.communicate()
+                server = None
+                server = self._start(tmp, port)
+                for i in range(50):
+                    client.send(b'<14>second-%d' % i)
+                client.close()
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.communicate()
+            self.assertEqual(client.acked, 100)
+            self.assertEqual(client.reconnections, 1)
+            with open(logfile, 'r', encoding='utf-8') as file:
+                lines = file.read()
+            for i in range(50):
+                self.assertIn(f"<14>second-{i}\n", lines)
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.ringbuffer
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import multiprocessing
+import unittest
+from fruafr.log.lib import ringbuffer
+
+
+def _produce(ring, count):
+    """Write count records to the ring (runs in a child process)"""
+    for i in range(count):
+        while not ring.put(f"message{i}".encode(), b'127.0.0.1'):
+            pass
+
+
+class TestRingBuffer(unittest.TestCase):
+    """Class TestRingBuffer"""
+
+    def setUp(self):
+        self.ring = ringbuffer.RingBuffer(256)
+
+    def tearDown(self):
+        self.ring.close()
+        self.ring.unlink()
+
+    def test_init(self):
+        """Test constructor"""
+        self.assertEqual(self.ring.capacity, 256)
+        self.assertEqual(self.ring.used, 0)
+        self.assertEqual(self.ring.dropped, 0)
+        with self.assertRaises(ValueError):
+            ringbuffer.RingBuffer(8)
+
+    def test_put_get(self):
+        """Test a record round trip"""
+        self.assertTrue(self.ring.put(b'hello', b'10.0.0.1'))
+        self.assertEqual(self.ring.get(0), (b'10.0.0.1', b'hello'))
+        self.assertIsNone(self.ring.get(0))
+
+    def test_wrap_around(self):
+        """Test records crossing the end of the data area"""
+        for i in range(100):
+            data = b'x' * (i % 40)
+            self.assertTrue(self.ring.put(data, b'meta'))
+            self.assertEqual(self.ring.get(0), (b'meta', data))
+        self.assertEqual(self.ring.used, 0)
+
+    def test_full(self):
+        """Test that records are dropped and counted when the ring is full"""
+        stored = 0
+        while self.ring.put(b'y' * 50):
+            stored += 1
+        self.assertGreater(stored, 0)
+        self.assertEqual(self.ring.dropped, 1)
+        self.assertEqual(len(self.ring.get_batch(100, 0)), stored)
+
+    def test_cross_process(self):
+        """Test a producer in another process"""
+        count = 500
+        producer = multiprocessing.Process(target=_produce, args=(self.ring, count))
+        producer.start()
+        received = []
+        while len(received) < count:
+            received += [data for _, data in self.ring.get_batch(timeout=5)]
+        producer.join()
+        self.assertEqual(received, [f"message{i}".encode() for i in range(count)])
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
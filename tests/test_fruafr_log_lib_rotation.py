@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.rotation
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import gzip
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from fruafr.log.lib import rotation
+
+LINE = 'x' * 60
+
+
+def _logger(name: str, filename: str, **kwargs) -> tuple:
+    """Returns a logger writing to a ConcurrentRotatingFileHandler and the handler"""
+    handler = rotation.ConcurrentRotatingFileHandler(filename, encoding='utf-8', **kwargs)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+    return logger, handler
+
+
+def _lines(filename: str) -> list:
+    """Returns the lines of the log file and of its rotated files"""
+    lines = []
+    for path in rotation.rotated_files(filename) + [filename]:
+        opener = gzip.open if path.endswith(rotation.COMPRESSED) else open
+        with opener(path, 'rt', encoding='utf-8') as file:
+            lines += file.read().splitlines()
+    return lines
+
+
+def _write(filename: str, writer: int, count: int) -> None:
+    """Log count lines from a separate process"""
+    logger, handler = _logger(f"rotation.writer{writer}", filename, max_bytes=2000)
+    for seq in range(count):
+        logger.info("%d-%d %s", writer, seq, LINE)
+    handler.close()
+
+
+class TestConcurrentRotatingFileHandler(unittest.TestCase):
+    """Class TestConcurrentRotatingFileHandler"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.filename = f"{self._tmp.name}/test.log"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_size(self):
+        """Test that the size rotation keeps every line and the file size under max_bytes"""
+        logger, handler = _logger('rotation.size', self.filename, max_bytes=1000)
+        for seq in range(100):
+            logger.info("%d %s", seq, LINE)
+        handler.close()
+        backups = rotation.rotated_files(self.filename)
+        self.assertGreater(len(backups), 5)
+        for path in backups + [self.filename]:
+            self.assertLessEqual(os.path.getsize(path), 1000)
+        self.assertEqual(_lines(self.filename), [f"{seq} {LINE}" for seq in range(100)])
+
+    def test_backup_count(self):
+        """Test that the oldest rotated files beyond backup_count are removed"""
+        logger, handler = _logger('rotation.count', self.filename, max_bytes=500, backup_count=2)
+        for seq in range(100):
+            logger.info("%d %s", seq, LINE)
+        handler.close()
+        self.assertEqual(len(rotation.rotated_files(self.filename)), 2)
+        self.assertEqual(_lines(self.filename)[-1], f"99 {LINE}")
+
+    def test_period(self):
+        """Test that a file last written in a previous period is rotated and named after it"""
+        logger, handler = _logger('rotation.period', self.filename, when='H')
+        logger.info('old')
+        past = time.time() - 7200
+        os.utime(self.filename, (past, past))
+        logger.info('new')
+        logger.info('again')
+        handler.close()
+        backups = rotation.rotated_files(self.filename)
+        self.assertEqual(len(backups), 1)
+        start = past - (past + time.localtime(past).tm_gmtoff) % 3600
+        self.assertTrue(backups[0].endswith(time.strftime(rotation.SUFFIX_FORMAT, time.localtime(start))))
+        self.assertEqual(_lines(self.filename), ['old', 'new', 'again'])
+
+    def test_concurrent_writers(self):
+        """Test that processes rotating the same file lose no line"""
+        context = multiprocessing.get_context('fork')
+        writers = [context.Process(target=_write, args=(self.filename, writer, 200)) for writer in range(4)]
+        for process in writers:
+            process.start()
+        for process in writers:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        lines = _lines(self.filename)
+        self.assertEqual(len(lines), 800)
+        self.assertEqual(sorted(lines), sorted(f"{writer}-{seq} {LINE}" for writer in range(4) for seq in range(200)))
+        for path in rotation.rotated_files(self.filename):
+            self.assertLessEqual(os.path.getsize(path), 2000)
+
+    def test_compress(self):
+        """Test that the rotated files are compressed in the background"""
+        logger, handler = _logger('rotation.compress', self.filename, max_bytes=500, compress=True)
+        for seq in range(30):
+            logger.info("%d %s", seq, LINE)
+        handler.close()
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            backups = rotation.rotated_files(self.filename)
+            if all(path.endswith(rotation.COMPRESSED) for path in backups):
+                break
+            time.sleep(0.05)
+        self.assertTrue(backups)
+        self.assertTrue(all(path.endswith(rotation.COMPRESSED) for path in backups))
+        self.assertEqual(_lines(self.filename), [f"{seq} {LINE}" for seq in range(30)])
+
+    def test_invalid(self):
+        """Test the invalid options"""
+        with self.assertRaises(ValueError):
+            rotation.ConcurrentRotatingFileHandler(self.filename, max_bytes=-1)
+        with self.assertRaises(ValueError):
+            rotation.ConcurrentRotatingFileHandler(self.filename, when='W')
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.sampler
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import signal
+import tempfile
+import time
+import unittest
+from fruafr.log.lib import sampler
+
+
+def _busy_loop(seconds: float) -> None:
+    """Burn CPU for the given time"""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+class TestStackSampler(unittest.TestCase):
+    """Class TestStackSampler"""
+
+    def setUp(self):
+        self.sampler = sampler.StackSampler(0.001)
+
+    def tearDown(self):
+        self.sampler.stop()
+
+    def test_init(self):
+        """Test constructor"""
+        self.assertFalse(self.sampler.running)
+        self.assertEqual(self.sampler.samples, 0)
+        with self.assertRaises(ValueError):
+            sampler.StackSampler(0)
+
+    def test_start_stop(self):
+        """Test that the previous SIGPROF handler is restored"""
+        previous = signal.getsignal(signal.SIGPROF)
+        self.sampler.start()
+        self.assertTrue(self.sampler.running)
+        self.sampler.stop()
+        self.assertFalse(self.sampler.running)
+        self.assertEqual(signal.getsignal(signal.SIGPROF), previous)
+
+    def test_collapsed(self):
+        """Test that the busy function is found in the collapsed stacks"""
+        self.sampler.start()
+        _busy_loop(0.2)
+        self.sampler.stop()
+        self.assertGreater(self.sampler.samples, 0)
+        collapsed = self.sampler.collapsed()
+        self.assertIn('_busy_loop (test_fruafr_log_lib_sampler.py:', collapsed)
+        for line in collapsed.splitlines():
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(stack)
+            self.assertGreater(int(count), 0)
+        self.assertNotIn('_sample (sampler.py:', collapsed)
+
+    def test_dump_reset(self):
+        """Test dump and reset"""
+        self.sampler.start()
+        _busy_loop(0.05)
+        self.sampler.stop()
+        with tempfile.TemporaryDirectory() as tmp:
+            self.sampler.dump(f"{tmp}/out.folded")
+            with open(f"{tmp}/out.folded", 'r', encoding='utf-8') as file:
+                self.assertEqual(file.read(), self.sampler.collapsed())
+        self.sampler.reset()
+        self.assertEqual(self.sampler.samples, 0)
+        self.assertEqual(self.sampler.collapsed(), '')
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.spool
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import os
+import tempfile
+import unittest
+from fruafr.log.lib import spool
+
+
+class TestSegmentSpool(unittest.TestCase):
+    """Class TestSegmentSpool"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = f"{self.tmp.name}/spool"
+        self.spool = spool.SegmentSpool(self.directory, segment_size=64)
+
+    def tearDown(self):
+        self.spool.close()
+        self.tmp.cleanup()
+
+    def _reopen(self):
+        """Simulate a restart"""
+        self.spool.close()
+        self.spool = spool.SegmentSpool(self.directory, segment_size=64)
+
+    def _drain(self, max_records: int = 3) -> list:
+        """Read and consume every record"""
+        records = []
+        while True:
+            batch = self.spool.read(max_records)
+            if not batch:
+                return records
+            records += batch
+            self.spool.consume()
+
+    def test_init(self):
+        """Test constructor"""
+        self.assertEqual(len(self.spool), 0)
+        self.assertEqual(self.spool.read(), [])
+        with self.assertRaises(TypeError):
+            spool.SegmentSpool(None)
+        with open(f"{self.directory}/00000000000000000001.seg", 'wb') as file:
+            file.write(b'x' * 32)
+        with self.assertRaises(ValueError):
+            spool.SegmentSpool(self.directory)
+
+    def test_fifo_across_segments(self):
+        """Test the order of the records spread over several segments"""
+        records = [b'record%d' % i for i in range(20)]
+        for record in records:
+            self.spool.append(record)
+        self.assertEqual(len(self.spool), 20)
+        self.assertGreater(len(os.listdir(self.directory)), 1)
+        # read without consume returns the same records
+        self.assertEqual(self.spool.read(2), records[:2])
+        self.assertEqual(self.spool.read(2), records[:2])
+        self.assertEqual(self._drain(), records)
+        self.assertEqual(len(self.spool), 0)
+        # the consumed segments are deleted
+        self.assertLessEqual(len(os.listdir(self.directory)), 1)
+
+    def test_resume_after_restart(self):
+        """Test that the records not consumed are found after a restart"""
+        self.spool.extend([b'a', b'b', b'c', b'd'])
+        self.assertEqual(self.spool.read(2), [b'a', b'b'])
+        self.spool.consume()
+        self.assertEqual(self.spool.read(1), [b'c'])
+        self._reopen()
+        self.assertEqual(len(self.spool), 2)
+        self.spool.append(b'e')
+        self.assertEqual(self._drain(), [b'c', b'd', b'e'])
+        self._reopen()
+        self.assertEqual(len(self.spool), 0)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_prepend(self):
+        """Test that prepended records are read first"""
+        self.spool.extend([b'c', b'd', b'e'])
+        self.assertEqual(self.spool.read(1), [b'c'])
+        self.spool.consume()
+        self.spool.prepend([b'a', b'b'])
+        self.assertEqual(len(self.spool), 4)
+        self._reopen()
+        self.assertEqual(self._drain(1), [b'a', b'b', b'd', b'e'])
+
+    def test_torn_tail(self):
+        """Test that a torn record is discarded"""
+        self.spool.extend([b'message1', b'message2'])
+        self.spool.close()
+        path = os.path.join(self.directory, os.listdir(self.directory)[0])
+        with open(path, 'r+b') as file:
+            file.seek(-1, os.SEEK_END)
+            file.write(b'X')
+            file.write(spool.RECORD.pack(100, 0) + b'partial')
+        self._reopen()
+        self.assertEqual(len(self.spool), 1)
+        self.assertEqual(self._drain(), [b'message1'])
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.stats
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import json
+import multiprocessing
+import sys
+import tempfile
+import threading
+import unittest
+from fruafr.log.lib import stats
+
+
+def _count(slot, count):
+    """Increment a counter in a child process"""
+    for _ in range(count):
+        slot.add('udp_messages')
+        slot.add('udp_bytes', 10)
+
+
+class TestServerStats(unittest.TestCase):
+    """Class TestServerStats"""
+
+    def test_init(self):
+        """Test constructor"""
+        counters = stats.ServerStats(2)
+        self.assertEqual(counters.counters, stats.COUNTERS)
+        self.assertEqual(set(counters.snapshot().values()), {0})
+        with self.assertRaises(ValueError):
+            stats.ServerStats(0)
+        with self.assertRaises(IndexError):
+            counters.slot(2)
+
+    def test_snapshot_across_processes(self):
+        """Test that the counters of the child processes are summed"""
+        counters = stats.ServerStats(2)
+        procs = [multiprocessing.Process(target=_count, args=(counters.slot(i), 100)) for i in range(2)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        snapshot = counters.snapshot()
+        self.assertEqual(snapshot['udp_messages'], 200)
+        self.assertEqual(snapshot['udp_bytes'], 2000)
+
+
+class TestStatsServer(unittest.TestCase):
+    """Class TestStatsServer"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp.name}/stats.sock"
+        self.server = stats.StatsServer(self.path, {'stats': lambda: {'a': 1}, 'text': lambda: 'hello\n'})
+        self.server.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_threaded_slot(self):
+        """Test that a threaded slot does not lose increments made by several threads"""
+        counters = stats.ServerStats(1)
+        slot = counters.slot(0, threaded=True)
+        interval = sys.getswitchinterval()
+        # switch threads as often as possible to expose lost updates
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=_count, args=(slot, 20000)) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(counters.snapshot()['udp_messages'], 80000)
+        self.assertEqual(counters.snapshot()['udp_bytes'], 800000)
+
+    def test_commands(self):
+        """Test the commands"""
+        self.assertEqual(json.loads(stats.query(self.path, 'stats')), {'a': 1})
+        self.assertEqual(stats.query(self.path, 'text'), 'hello\n')
+        self.assertIn('unknown command', stats.query(self.path, 'other'))
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.syslogclient
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import logging
+import os
+from logging import handlers
+import socket
+import tempfile
+import time
+import unittest
+from fruafr.log.lib import framing
+from fruafr.log.lib import syslogclient
+
+
+def _read_until(conn: socket.socket, expected: bytes, timeout: float = 5.0) -> bytes:
+    """Read from a stream socket until expected is received"""
+    conn.settimeout(timeout)
+    data = b''
+    while expected not in data:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class TestSyslogConnection(unittest.TestCase):
+    """Class TestSyslogConnection"""
+
+    def test_init(self):
+        """Test constructor"""
+        with self.assertRaises(TypeError):
+            syslogclient.SyslogConnection(514)
+        connection = syslogclient.SyslogConnection(('127.0.0.1', 514))
+        self.assertFalse(connection.connected)
+
+    def test_udp_single_socket(self):
+        """Test that the datagrams go through one socket"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.settimeout(5)
+            connection = syslogclient.SyslogConnection(server.getsockname())
+            connection.send(b'one')
+            sock = connection._sock
+            connection.send(b'two')
+            self.assertIs(sock, connection._sock)
+            first, address1 = server.recvfrom(1024)
+            second, address2 = server.recvfrom(1024)
+            self.assertEqual((first, second), (b'one', b'two'))
+            self.assertEqual(address1, address2)
+            connection.close()
+            self.assertFalse(connection.connected)
+
+    def test_tcp_buffered_and_timer_flush(self):
+        """Test that the stream data is buffered then flushed by the timer"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen()
+            connection = syslogclient.SyslogConnection(server.getsockname(), socket.SOCK_STREAM,
+                                                       flush_interval=0.05)
+            connection.send(b'one\n')
+            connection.send(b'two\n')
+            conn, _ = server.accept()
+            with conn:
+                self.assertEqual(_read_until(conn, b'two\n'), b'one\ntwo\n')
+            connection.close()
+
+    def test_tcp_reconnect(self):
+        """Test that a closed connection is reopened transparently"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen()
+            connection = syslogclient.SyslogConnection(server.getsockname(), socket.SOCK_STREAM,
+                                                       flush_interval=0)
+            connection.send(b'one\n')
+            connection.flush()
+            conn, _ = server.accept()
+            self.assertEqual(_read_until(conn, b'one\n'), b'one\n')
+            conn.close()
+            # the first send after the peer closed may still succeed: keep sending
+            deadline = time.monotonic() + 5
+            while connection.reconnections == 0 and time.monotonic() < deadline:
+                connection.send(b'two\n')
+                connection.flush()
+                time.sleep(0.05)
+            self.assertEqual(connection.reconnections, 1)
+            conn, _ = server.accept()
+            with conn:
+                self.assertIn(b'two\n', _read_until(conn, b'two\n'))
+            connection.close()
+
+    def test_tcp_keeps_buffer_until_sent(self):
+        """Test that the buffer is kept while the collector is down and sent once it is back"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            # bound but not listening: the connections are refused
+            server.bind(('127.0.0.1', 0))
+            connection = syslogclient.SyslogConnection(server.getsockname(), socket.SOCK_STREAM,
+                                                       flush_interval=0, retries=0, max_buffered=10)
+            connection.send(b'one\n')
+            connection.send(b'two\n')
+            with self.assertRaises(OSError):
+                connection.flush()
+            self.assertEqual(connection.pending, 2)
+            connection.send(b'three\n')
+            with self.assertRaises(OSError):
+                connection.flush()
+            # the oldest message went over max_buffered
+            self.assertEqual((connection.pending, connection.dropped), (2, 1))
+            server.listen()
+            connection.flush()
+            conn, _ = server.accept()
+            with conn:
+                self.assertEqual(_read_until(conn, b'three\n'), b'two\nthree\n')
+            connection.close()
+            self.assertEqual(connection.dropped, 1)
+
+    def test_close_counts_lost_messages(self):
+        """Test that the messages still buffered when the close fails are counted"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.bind(('127.0.0.1', 0))
+            connection = syslogclient.SyslogConnection(server.getsockname(), socket.SOCK_STREAM,
+                                                       flush_interval=0, retries=0)
+            connection.send(b'one\n')
+            with self.assertRaises(OSError):
+                connection.close()
+            self.assertEqual((connection.pending, connection.dropped), (0, 1))
+
+    def test_unix_fallback(self):
+        """Test that a UNIX socket of the other type is used"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/log.sock"
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as server:
+                server.bind(path)
+                server.settimeout(5)
+                connection = syslogclient.SyslogConnection(path, socket.SOCK_STREAM, flush_interval=0)
+                connection.send(b'one')
+                connection.flush()
+                self.assertEqual(connection.socktype, socket.SOCK_DGRAM)
+                self.assertEqual(server.recv(1024), b'one')
+                connection.close()
+
+
+class TestStreamingSysLogHandler(unittest.TestCase):
+    """Class TestStreamingSysLogHandler"""
+
+    def test_encode_record(self):
+        """Test the wire format"""
+        handler = syslogclient.StreamingSysLogHandler(('127.0.0.1', 514), socktype=socket.SOCK_STREAM)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        record = logging.LogRecord('test', logging.WARNING, __file__, 1, 'hello', None, None)
+        self.assertEqual(handler.encode_record(record), b'<12>hello\x00')
+        handler.append_nul = False
+        handler.ident = 'prog: '
+        self.assertEqual(handler.encode_record(record), b'<12>prog: hello')
+        handler.close()
+
+    def test_emit_udp(self):
+        """Test that the records are sent"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.settimeout(5)
+            handler = syslogclient.StreamingSysLogHandler(server.getsockname(),
+                                                          handlers.SysLogHandler.LOG_LOCAL0, socket.SOCK_DGRAM)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            record = logging.LogRecord('test', logging.INFO, __file__, 1, 'hello', None, None)
+            handler.handle(record)
+            self.assertEqual(server.recv(1024), b'<134>hello\x00')
+            handler.close()
+
+
+class TestFileShipper(unittest.TestCase):
+    """Class TestFileShipper"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp.name}/input.log"
+        with open(self.path, 'wb') as file:
+            file.write(b'line0\r\n\nline1\n' + b''.join(b'line%d\n' % i for i in range(2, 1000)) + b'last')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_init(self):
+        """Test constructor"""
+        with self.assertRaises(TypeError):
+            syslogclient.FileShipper(None)
+
+    def test_ship_tcp(self):
+        """Test octet counted framing of all the lines, small chunks included"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen()
+            connection = syslogclient.SyslogConnection(server.getsockname(), socket.SOCK_STREAM,
+                                                       flush_interval=0, max_inflight=1024)
+            reports = []
+            shipper = syslogclient.FileShipper(connection, b'<13>prog ', chunk_size=100)
+            report = shipper.ship(self.path, reports.append, interval=0)
+            connection.close()
+            conn, _ = server.accept()
+            with conn:
+                data = _read_until(conn, b'last')
+        frames = framing.FrameDecoder().feed(data)
+        self.assertEqual(report['messages'], 1001)
+        self.assertEqual(report['percent'], 100.0)
+        self.assertTrue(reports)
+        self.assertEqual(len(frames), 1001)
+        self.assertEqual(frames[0], b'<13>prog line0')
+        self.assertEqual(frames[1], b'<13>prog line1')
+        self.assertEqual(frames[-1], b'<13>prog last')
+        self.assertTrue(data.startswith(b'14 <13>prog line0'))
+
+    def test_ship_udp(self):
+        """Test one datagram per line"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            server.settimeout(5)
+            connection = syslogclient.SyslogConnection(server.getsockname(), flush_interval=0)
+            report = syslogclient.FileShipper(connection).ship(self.path)
+            connection.close()
+            self.assertEqual(report['messages'], 1001)
+            self.assertEqual(server.recv(1024), b'line0')
+            self.assertEqual(server.recv(1024), b'line1')
+
+
+class TestBackgroundSender(unittest.TestCase):
+    """Class TestBackgroundSender"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = f"{self.tmp.name}/spool"
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.address = self.server.getsockname()
+
+    def tearDown(self):
+        self.server.close()
+        self.tmp.cleanup()
+
+    def _sender(self, queue_size: int = 100) -> syslogclient.BackgroundSender:
+        """Returns a sender to the (not listening yet) server"""
+        connection = syslogclient.SyslogConnection(self.address, socket.SOCK_STREAM,
+                                                   flush_interval=0, retries=0)
+        return syslogclient.BackgroundSender(connection, self.directory, queue_size)
+
+    def _receive(self, expected: bytes) -> bytes:
+        """Accept the connection and read until expected"""
+        self.server.settimeout(5)
+        conn, _ = self.server.accept()
+        with conn:
+            return _read_until(conn, expected)
+
+    def test_init(self):
+        """Test constructor"""
+        with self.assertRaises(TypeError):
+            syslogclient.BackgroundSender(None)
+
+    def test_submit_does_not_block(self):
+        """Test that an unreachable destination does not slow down the caller"""
+        sender = self._sender(queue_size=10)
+        start = time.perf_counter()
+        for i in range(100):
+            sender.submit(b'm%d\n' % i)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(sender.backlog, 100)
+        self.assertGreater(len(sender.spool), 0)
+        sender.close(timeout=0)
+
+    def test_outage_then_recovery(self):
+        """Test that the messages are delivered in order once the destination is back"""
+        sender = self._sender(queue_size=10)
+        messages = [b'm%d\n' % i for i in range(50)]
+        for message in messages:
+            sender.submit(message)
+        time.sleep(0.2)
+        self.assertGreater(sender.failures, 0)
+        self.server.listen()
+        self.assertTrue(sender.wait(timeout=10))
+        data = self._receive(b'm49\n')
+        self.assertEqual(data, b''.join(messages))
+        self.assertEqual(sender.sent, 50)
+        sender.close()
+
+    def test_resume_on_startup(self):
+        """Test that the messages left by a previous run are delivered first"""
+        sender = self._sender()
+        sender.submit(b'first\n')
+        sender.close(timeout=0.1)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        self.server.listen()
+        sender = self._sender()
+        sender.submit(b'second\n')
+        self.assertTrue(sender.wait(timeout=10))
+        self.assertEqual(self._receive(b'second\n'), b'first\nsecond\n')
+        sender.close()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_without_spool(self):
+        """Test that the messages are dropped when the queue is full without a spool"""
+        connection = syslogclient.SyslogConnection(self.address, socket.SOCK_STREAM,
+                                                   flush_interval=0, retries=0)
+        sender = syslogclient.BackgroundSender(connection, None, queue_size=5)
+        for i in range(20):
+            sender.submit(b'm%d\n' % i)
+        self.assertGreaterEqual(sender.dropped, 14)
+        sender.close(timeout=0)
+        self.assertEqual(sender.dropped, 20)
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.timeindex
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import logging
+import os
+import tempfile
+import unittest
+from fruafr.log.lib import durability
+from fruafr.log.lib import timeindex
+
+START = 1700000000.0
+FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def _record(seq: int, message: str = None) -> logging.LogRecord:
+    """Returns a record created seq seconds after START"""
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, message or f"record {seq}", None, None)
+    record.created = START + seq
+    record.msecs = 0
+    return record
+
+
+class TestTimestampParser(unittest.TestCase):
+    """Class TestTimestampParser"""
+
+    def test_formats(self):
+        """Test the time of lines written with several formats"""
+        record = _record(0)
+        record.created += 0.25
+        record.msecs = 250
+        for fmt, datefmt, precision in ((FORMAT, None, 0.001),
+                                        ('%(levelname)s [%(asctime)s] %(name)s: %(message)s', '%d/%m/%Y %H:%M:%S', 1),
+                                        ('%(asctime)s %(message)s', '%b %d %Y %H:%M:%S', 1),
+                                        ('%(created)f %(message)s', None, 0.000001)):
+            line = logging.Formatter(fmt, datefmt).format(record).encode()
+            parsed = timeindex.TimestampParser(fmt, datefmt)(line)
+            self.assertIsNotNone(parsed, line)
+            self.assertLessEqual(abs(parsed - record.created), precision, line)
+        parser = timeindex.TimestampParser(FORMAT)
+        self.assertIsNone(parser(b'  continuation of a multiline message\n'))
+        self.assertIsNone(parser(b'2023-99-99 00:00:00,000 - INFO - bad date\n'))
+        with self.assertRaises(ValueError):
+            timeindex.TimestampParser('%(message)s')
+
+
+class TestTimeIndex(unittest.TestCase):
+    """Class TestTimeIndex"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.filename = f"{self._tmp.name}/test.log"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write(self, records: range, **kwargs) -> None:
+        """Log records through an indexed DurableFileHandler"""
+        handler = durability.DurableFileHandler(self.filename, encoding='utf-8',
+                                                index=timeindex.TimeIndexWriter(self.filename, **kwargs))
+        handler.setFormatter(logging.Formatter(FORMAT))
+        for seq in records:
+            handler.handle(_record(seq, f"record {seq} é"))
+        handler.close()
+
+    def _line_at(self, offset: int) -> bytes:
+        """Returns the line starting at offset"""
+        with open(self.filename, 'rb') as file:
+            file.seek(offset)
+            return file.readline()
+
+    def test_every_records(self):
+        """Test the entries every N records and the lookup of a time"""
+        self._write(range(0, 50), every_records=10)
+        self._write(range(50, 100), every_records=10)
+        entries = timeindex.load(self.filename)
+        # the records are counted from the last entry of the writer
+        self.assertEqual([time_ns for time_ns, _ in entries], [int((START + seq) * 1e9) for seq in (0, 10, 20, 30, 40, 59, 69, 79, 89, 99)])
+        for time_ns, offset in entries:
+            self.assertIn(f"record {int(time_ns / 1e9 - START)} é".encode(), self._line_at(offset))
+        self.assertEqual(timeindex.lookup(entries, START - 10), 0)
+        self.assertIn(b'record 30 ', self._line_at(timeindex.lookup(entries, START + 35)))
+        self.assertIn(b'record 20 ', self._line_at(timeindex.lookup(entries, START + 30)))
+        self.assertIn(b'record 99 ', self._line_at(timeindex.lookup(entries, START + 1000)))
+
+    def test_every_bytes(self):
+        """Test the entries every K bytes"""
+        self._write(range(100), every_bytes=500)
+        entries = timeindex.load(self.filename)
+        offsets = [offset for _, offset in entries]
+        self.assertGreater(len(offsets), 5)
+        self.assertTrue(all(b - a <= 500 + 60 for a, b in zip(offsets, offsets[1:])))
+
+    def test_rebuild(self):
+        """Test that a missing index is rebuilt from the log file"""
+        self._write(range(100), every_records=7)
+        written = timeindex.load(self.filename)
+        os.unlink(timeindex.index_path(self.filename))
+        self.assertIsNone(timeindex.load(self.filename))
+        count = timeindex.rebuild(self.filename, timeindex.TimestampParser(FORMAT), every_records=7)
+        self.assertEqual(count, len(written))
+        self.assertEqual(timeindex.load(self.filename), written)
+
+    def test_new_log_file(self):
+        """Test that the index of a previous log file is dropped"""
+        self._write(range(100), every_records=10)
+        os.unlink(self.filename)
+        self._write(range(200, 205), every_records=10)
+        self.assertEqual(timeindex.load(self.filename), [(int((START + 200) * 1e9), 0)])
+        with open(timeindex.index_path(self.filename), 'wb') as file:
+            file.write(b'garbage')
+        self.assertIsNone(timeindex.load(self.filename))
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.lib.wal
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import os
+import tempfile
+import unittest
+from fruafr.log.lib import wal
+
+
+class TestWriteAheadLog(unittest.TestCase):
+    """Class TestWriteAheadLog"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp.name}/test.wal"
+        self.wal = wal.WriteAheadLog(self.path, sync=False)
+
+    def tearDown(self):
+        self.wal.close()
+        self.tmp.cleanup()
+
+    def _reopen(self):
+        """Simulate a restart"""
+        self.wal.close()
+        self.wal = wal.WriteAheadLog(self.path, sync=False)
+
+    def test_init(self):
+        """Test constructor"""
+        self.assertEqual(self.wal.committed, wal.HEADER.size)
+        self.assertEqual(self.wal.end, wal.HEADER.size)
+        with open(f"{self.tmp.name}/bad.wal", 'wb') as file:
+            file.write(b'x' * 32)
+        with self.assertRaises(ValueError):
+            wal.WriteAheadLog(f"{self.tmp.name}/bad.wal")
+
+    def test_recover_uncommitted(self):
+        """Test that uncommitted records are replayed after a restart"""
+        self.wal.append(b'message1')
+        self.wal.append(b'message2')
+        lsn = self.wal.write()
+        self.wal.commit(lsn)
+        self.wal.append(b'message3')
+        self.wal.write()
+        self._reopen()
+        self.assertEqual(list(self.wal.recover()), [b'message3'])
+
+    def test_torn_tail(self):
+        """Test that a torn or corrupted tail is discarded"""
+        self.wal.append(b'message1')
+        self.wal.append(b'message2')
+        end = self.wal.write()
+        # corrupt the last byte of message2 and add a partial record
+        with open(self.path, 'r+b') as file:
+            file.seek(end - 1)
+            file.write(b'X')
+            file.write(b'\x10\x00')
+        self._reopen()
+        self.assertEqual(list(self.wal.recover()), [b'message1'])
+        self.assertEqual(os.path.getsize(self.path), self.wal.end)
+
+    def test_truncate(self):
+        """Test that the file is truncated once committed and large enough"""
+        self.wal._truncate_size = 100
+        for _ in range(20):
+            self.wal.append(b'x' * 10)
+        self.wal.commit(self.wal.write())
+        self.assertEqual(os.path.getsize(self.path), wal.HEADER.size)
+        self._reopen()
+        self.assertEqual(list(self.wal.recover()), [])
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
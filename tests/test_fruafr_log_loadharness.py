@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of the tinysyslogserver load and loss harness (tests/benchmarks/fruafr_log_loadharness.py)
+
+Runs a small scenario on an ephemeral unprivileged port (no sudo required)
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import unittest
+
+from .benchmarks import fruafr_log_loadharness as harness
+
+
+class TestLoadHarness(unittest.TestCase):
+    """Class TestLoadHarness"""
+
+    def test_free_port(self):
+        """Test that the port is unprivileged"""
+        self.assertGreater(harness.free_port(), 1023)
+
+    def test_percentile(self):
+        """Test percentile"""
+        values = list(range(100))
+        self.assertEqual(harness.percentile(values, 50), 50)
+        self.assertEqual(harness.percentile(values, 99), 99)
+        self.assertIsNone(harness.percentile([], 50))
+
+    def test_run(self):
+        """Test a small UDP/TCP scenario"""
+        report = harness.Harness(udp_senders=2, tcp_senders=1, messages=200, size=100, rate=1000).run()
+        # TCP is reliable
+        self.assertEqual(report['tcp'], {'sent': 200, 'received': 200, 'loss_percent': 0.0})
+        self.assertEqual(report['udp']['sent'], 400)
+        self.assertLessEqual(report['udp']['received'], 400)
+        self.assertGreater(report['udp']['received'], 0)
+        self.assertGreater(report['throughput'], 0)
+        self.assertLessEqual(report['latency_ms']['p50'], report['latency_ms']['p99'])
+        self.assertGreaterEqual(report['server_cpu_seconds'], 0)
+        self.assertGreater(report['server_rss_kb_max'], 0)
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
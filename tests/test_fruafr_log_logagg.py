@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Test of fruafr.log.logagg
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import datetime
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import unittest
+
+from fruafr.log.lib import columnar
+
+INTERPRETER = 'python3'
+PATH = os.path.dirname(__file__)
+SCRIPT = f"{PATH}/../src/fruafr/log/logagg.py"
+START = datetime.datetime(2023, 10, 13, 10, 0, 0).timestamp()
+
+
+class TestLogAgg(unittest.TestCase):
+    """Class LogAgg tests"""
+
+    def _execute(self, add_args: list) -> object:
+        """Append the args to the command line and execute the command and return the result
+        Args:
+            add_args(list): list of additional arguments and options to append to the command line
+        Returns:
+            The output object of subprocess.run
+        """
+        cmd_line_args = [INTERPRETER, SCRIPT] + add_args
+        return subprocess.run(cmd_line_args, capture_output=True, text=True, check=False)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = f"{self.tmp.name}/test.col"
+        handler = columnar.ColumnarFileHandler(self.filename, host='web1', app='api', block_records=50)
+        for seq in range(300):
+            record = logging.LogRecord('test', logging.ERROR if seq % 10 == 0 else logging.INFO,
+                                       __file__, 1, "request %d", (seq,), None)
+            record.created = START + seq
+            if seq % 3 == 0:
+                record.host = 'web2'
+            handler.handle(record)
+        handler.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_by_level(self):
+        """Test --by level"""
+        p = self._execute([self.filename, '--by', 'level'])
+        self.assertEqual('', p.stderr)
+        self.assertEqual(p.stdout.splitlines(), ['270 INFO', ' 30 ERROR'])
+
+    def test_top_json(self):
+        """Test --by host --top --json"""
+        p = self._execute([self.filename, '--by', 'host', '--top', '1', '--json'])
+        self.assertEqual(json.loads(p.stdout), {'web1': 200})
+
+    def test_histogram(self):
+        """Test --by time with --since and --until"""
+        p = self._execute([self.filename, '--interval', '120', '--since', '2023-10-13T10:01:00', '--until', str(START + 250)])
+        self.assertEqual('', p.stderr)
+        self.assertEqual(p.stdout.splitlines(), [' 60 2023-10-13 10:00:00', '120 2023-10-13 10:02:00', ' 10 2023-10-13 10:04:00'])
+
+    def test_time_of_day(self):
+        """Test --since HH:MM:SS (today), the syntax of logread and loggrep"""
+        p = self._execute([self.filename, '--by', 'level', '--since', '23:59:59'])
+        self.assertEqual('', p.stderr)
+        self.assertEqual(p.stdout, '')
+
+    def test_dump(self):
+        """Test --dump"""
+        p = self._execute([self.filename, '--dump', '--since', str(START + 298)])
+        self.assertEqual(p.stdout.splitlines(), ['2023-10-13 10:04:58,000 INFO - web1 api request 298',
+                                                 '2023-10-13 10:04:59,000 INFO - web1 api request 299'])
+
+    def test_invalid(self):
+        """Test invalid arguments and files"""
+        p = self._execute([self.filename, '--since', 'yesterday'])
+        self.assertIn("Invalid time: yesterday", p.stderr)
+        p = self._execute([f"{self.tmp.name}/missing.col"])
+        self.assertIn("Cannot read", p.stderr)
+        with open(f"{self.tmp.name}/text.log", 'w', encoding='utf-8') as file:
+            file.write('2023-10-13 10:00:00,000 - INFO - not columnar\n' * 5)
+        p = self._execute([f"{self.tmp.name}/text.log"])
+        self.assertIn("is not a columnar log file", p.stderr)
+        self.assertEqual(p.returncode, 1)
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
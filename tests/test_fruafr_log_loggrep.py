@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Test of fruafr.log.loggrep
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import datetime
+import gzip
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import unittest
+
+from fruafr.log import loggrep
+from fruafr.log.lib import timeindex
+
+INTERPRETER = 'python3'
+PATH = os.path.dirname(__file__)
+SCRIPT = f"{PATH}/../src/fruafr/log/loggrep.py"
+START = datetime.datetime(2023, 10, 13, 10, 0, 0).timestamp()
+
+
+def _line(seq: int, message: str = None) -> str:
+    """Returns the line of the record logged seq seconds after START"""
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, message or f"record {seq} {'even' if seq % 2 == 0 else 'odd'}", None, None)
+    record.created = START + seq
+    record.msecs = 0
+    return logging.Formatter(loggrep.FORMAT).format(record) + '\n'
+
+
+class TestLogGrep(unittest.TestCase):
+    """Class LogGrep tests"""
+
+    def _execute(self, add_args: list) -> object:
+        """Append the args to the command line and execute the command and return the result
+        Args:
+            add_args(list): list of additional arguments and options to append to the command line
+        Returns:
+            The output object of subprocess.run
+        """
+        cmd_line_args = [INTERPRETER, SCRIPT] + add_args
+        return subprocess.run(cmd_line_args, capture_output=True, text=True, check=False)
+
+    def _write(self, name: str, seqs: range, compress: bool = False) -> str:
+        """Write a log file of the records logged seqs seconds after START, returns its path"""
+        path = f"{self.tmp.name}/{name}"
+        with (gzip.open if compress else open)(path, 'wt', encoding='utf-8') as file:
+            file.write(''.join(_line(seq) for seq in seqs))
+        return path
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # a rotation: two compressed files, one uncompressed, then the log file
+        self._write('app.log.20231013-100100.gz', range(0, 100), compress=True)
+        self._write('app.log.20231013-100200.gz', range(100, 200), compress=True)
+        self._write('app.log.20231013-100300', range(200, 300))
+        self.path = self._write('app.log', range(300, 400))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _messages(self, stdout: str) -> list:
+        """Returns the record numbers of the output lines"""
+        return [int(re.search(r'record (\d+)', line).group(1)) for line in stdout.splitlines()]
+
+    def test_help(self):
+        """Test command line with help"""
+        p = self._execute(['-h'])
+        self.assertEqual('', p.stderr)
+        self.assertIn("usage: CLI - Search log files in parallel", p.stdout)
+
+    def test_search(self):
+        """Test the search of the rotated files, in order, with several processes"""
+        p = self._execute([r'record \d*7 odd', self.path, '--rotated', '-j', '3'])
+        self.assertEqual('', p.stderr)
+        self.assertEqual(self._messages(p.stdout), list(range(7, 400, 10)))
+        self.assertTrue(p.stdout.startswith(f"{self.tmp.name}/app.log.20231013-100100.gz:{_line(7)}"))
+        p = self._execute(['RECORD 12 EVEN', self.path, '--rotated', '-i', '-j', '1', '--no-filename'])
+        self.assertEqual(p.stdout, _line(12))
+        p = self._execute(['0 even', self.path])
+        self.assertEqual(p.stdout, ''.join(_line(seq) for seq in range(300, 400, 10)))
+        p = self._execute(['record 3.0', self.path, '-F'])
+        self.assertEqual(p.stdout, '')
+
+    def test_chunks(self):
+        """Test the chunks of the uncompressed files: every line once, in order"""
+        p = self._execute(['record', self.path, '--chunksize', '100', '-j', '4'])
+        self.assertEqual(p.stdout, ''.join(_line(seq) for seq in range(300, 400)))
+        tasks = loggrep.Console()._tasks(loggrep.Console().parse_args(['x', self.path, '--chunksize', '500']), None, None, None)
+        self.assertGreater(len(tasks), 5)
+        self.assertTrue(all(task.end == following.start for task, following in zip(tasks, tasks[1:])))
+
+    def test_time_range(self):
+        """Test the time range: pruned compressed files, bisected uncompressed files, filtered lines"""
+        args = ['odd', self.path, '--rotated', '--since', str(START + 150), '--until', str(START + 260)]
+        p = self._execute(args)
+        self.assertEqual('', p.stderr)
+        self.assertEqual(self._messages(p.stdout), list(range(151, 260, 2)))
+        console = loggrep.Console()
+        parsed = console.parse_args(args)
+        tasks = console._tasks(parsed, timeindex.TimestampParser(loggrep.FORMAT), START + 150, START + 260)
+        # the first compressed file and the log file are skipped
+        self.assertEqual([os.path.basename(task.path) for task in tasks], ['app.log.20231013-100200.gz', 'app.log.20231013-100300'])
+        p = self._execute(['record', self.path, '--rotated', '--since', str(START + 1000)])
+        self.assertEqual(p.stdout, '')
+        p = self._execute(['record', self.path, '--since', 'yesterday'])
+        self.assertIn("Invalid time: yesterday", p.stderr)
+
+    def test_spill(self):
+        """Test the results spilled to a temporary file"""
+        original = loggrep.RESULT_SIZE
+        loggrep.RESULT_SIZE = 100
+        try:
+            loggrep.init_worker(b'record', 0, loggrep.FORMAT, None, None, None)
+            lines, data, spill = loggrep.search(loggrep.Task(self.path, 0, os.path.getsize(self.path), False, b'x:'))
+            self.assertEqual((lines, data), (100, b''))
+            with open(spill, 'rb') as file:
+                self.assertEqual(file.read(), b''.join(b'x:' + _line(seq).encode() for seq in range(300, 400)))
+            os.unlink(spill)
+        finally:
+            loggrep.RESULT_SIZE = original
+
+    def test_errors(self):
+        """Test the invalid arguments"""
+        p = self._execute(['(', self.path])
+        self.assertIn("Invalid pattern", p.stderr)
+        self.assertEqual(p.returncode, 1)
+        p = self._execute(['x', f"{self.tmp.name}/missing.log"])
+        self.assertIn("Cannot read", p.stderr)
+        p = self._execute(['x', self.path, '-j', '0'])
+        self.assertIn("--jobs and --chunksize must be positive", p.stderr)
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
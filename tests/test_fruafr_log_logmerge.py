@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+"""
+Test of fruafr.log.logmerge
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import datetime
+import gzip
+import logging
+import os
+import subprocess
+import tempfile
+import unittest
+
+from fruafr.log import logmerge
+from fruafr.log.lib import timeindex
+
+INTERPRETER = 'python3'
+PATH = os.path.dirname(__file__)
+SCRIPT = f"{PATH}/../src/fruafr/log/logmerge.py"
+START = datetime.datetime(2023, 10, 13, 10, 0, 0).timestamp()
+CREATED = '%(created)f %(message)s'
+CUSTOM, CUSTOM_DATE = '%(levelname)s [%(asctime)s] %(message)s', '%d/%m/%Y %H:%M:%S'
+
+
+def _line(seconds: float, message: str, fmt: str = logmerge.FORMAT, datefmt: str = None) -> str:
+    """Returns the line of a record logged seconds after START"""
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, message, None, None)
+    record.created = START + seconds
+    record.msecs = int(seconds * 1000) % 1000
+    return logging.Formatter(fmt, datefmt).format(record) + '\n'
+
+
+class TestLogMerge(unittest.TestCase):
+    """Class LogMerge tests"""
+
+    def _execute(self, add_args: list) -> object:
+        """Append the args to the command line and execute the command and return the result
+        Args:
+            add_args(list): list of additional arguments and options to append to the command line
+        Returns:
+            The output object of subprocess.run
+        """
+        cmd_line_args = [INTERPRETER, SCRIPT] + add_args
+        return subprocess.run(cmd_line_args, capture_output=True, text=True, check=False)
+
+    def _write(self, name: str, lines: list, compress: bool = False) -> str:
+        """Write a log file, returns its path"""
+        path = f"{self.tmp.name}/{name}"
+        with (gzip.open if compress else open)(path, 'wt', encoding='utf-8') as file:
+            file.write(''.join(lines))
+        return path
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.api = self._write('api.log', [_line(seq, f"api {seq}") for seq in range(0, 10, 2)])
+        self.worker = self._write('worker.log', [_line(seq + 0.5, f"worker {seq}", CREATED) for seq in range(0, 10, 3)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_help(self):
+        """Test command line with help"""
+        p = self._execute(['-h'])
+        self.assertEqual('', p.stderr)
+        self.assertIn("usage: CLI - Merge log files by time", p.stdout)
+
+    def test_merge(self):
+        """Test the merge of files with their own format, with the source tags"""
+        p = self._execute([self.api, self.worker, '-f', logmerge.FORMAT, '-f', CREATED])
+        self.assertEqual('', p.stderr)
+        messages = [line.rsplit(' ', 2)[-2:] for line in p.stdout.splitlines()]
+        self.assertEqual([' '.join(message) for message in messages],
+                         ['api 0', 'worker 0', 'api 2', 'worker 3', 'api 4', 'api 6', 'worker 6', 'api 8', 'worker 9'])
+        lines = p.stdout.splitlines()
+        self.assertEqual(lines[0], 'api.log ' + _line(0, 'api 0').rstrip('\n'))
+        self.assertEqual(lines[1], 'worker.log ' + _line(0.5, 'worker 0', CREATED).rstrip('\n'))
+        p = self._execute([self.api, self.worker, '-f', logmerge.FORMAT, '-f', CREATED, '-t', 'A', '--tagsep', '|'])
+        self.assertTrue(p.stdout.startswith('A|'))
+        self.assertIn('\nworker.log|', p.stdout)
+        p = self._execute([self.api, self.worker, '-f', logmerge.FORMAT, '-f', CREATED, '--notag'])
+        self.assertTrue(p.stdout.startswith(_line(0, 'api 0')))
+
+    def test_multiline_and_ties(self):
+        """Test that continuation lines stay with their record, and the order of equal times"""
+        first = self._write('first.log', [_line(1, 'first 1'), 'Traceback\n', '  line\n', _line(2, 'first 2')])
+        second = self._write('second.log', [_line(1, 'second 1'), _line(1.5, 'second 1.5')])
+        p = self._execute([first, second, '--notag'])
+        self.assertEqual(p.stdout, ''.join([_line(1, 'first 1'), 'Traceback\n', '  line\n', _line(1, 'second 1'),
+                                            _line(1.5, 'second 1.5'), _line(2, 'first 2')]))
+        p = self._execute([first, second, '-t', 'F', '-t', 'S'])
+        self.assertIn('F Traceback\nF   line\nS ', p.stdout)
+
+    def test_gzip_and_rotated(self):
+        """Test gzip inputs and the rotated files"""
+        self._write('api.log.20231013-095900.gz', [_line(-30, 'api old')], compress=True)
+        self._write('api.log.20231013-095959', [_line(-10, 'api older')])
+        p = self._execute([self.api, '--rotated', '--notag'])
+        self.assertTrue(p.stdout.startswith(_line(-30, 'api old') + _line(-10, 'api older') + _line(0, 'api 0')))
+        custom = self._write('custom.log.gz', [_line(seq + 0.25, f"custom {seq}", CUSTOM, CUSTOM_DATE) for seq in range(3)], compress=True)
+        p = self._execute([custom, self.worker, '-f', CUSTOM, '-df', CUSTOM_DATE, '-f', CREATED, '--notag'])
+        self.assertEqual('', p.stderr)
+        self.assertEqual([line.split(' ')[-2] for line in p.stdout.splitlines()], ['custom', 'worker', 'custom', 'custom', 'worker', 'worker', 'worker'])
+
+    def test_lazy(self):
+        """Test that the inputs are read lazily"""
+        parser = timeindex.TimestampParser(logmerge.FORMAT)
+        big = self._write('big.log', [_line(seq, f"big {seq}") for seq in range(10000)])
+        merged = logmerge.merge([logmerge.read_records([big], parser, 0), logmerge.read_records([self.api], parser, 1)])
+        first = [next(merged) for _ in range(4)]
+        self.assertEqual([record[2][0].decode().split(' - ')[-1] for record in first], ['big 0\n', 'api 0\n', 'big 1\n', 'big 2\n'])
+        merged.close()
+
+    def test_errors(self):
+        """Test the invalid arguments"""
+        p = self._execute([self.api, '-f', '%(message)s'])
+        self.assertIn("has no %(asctime)s or %(created)f field", p.stderr)
+        self.assertEqual(p.returncode, 1)
+        p = self._execute([f"{self.tmp.name}/missing.log"])
+        self.assertIn("Cannot read", p.stderr)
+        self.assertEqual(p.returncode, 1)
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
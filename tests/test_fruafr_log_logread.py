@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.logread
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import datetime
+import logging
+import mmap
+import os
+import subprocess
+import tempfile
+import unittest
+
+from fruafr.log import logread
+from fruafr.log.lib import mmapfile
+from fruafr.log.lib import timeindex
+
+INTERPRETER = 'python3'
+PATH = os.path.dirname(__file__)
+SCRIPT = f"{PATH}/../src/fruafr/log/logread.py"
+START = datetime.datetime(2023, 10, 13, 10, 0, 0).timestamp()
+LINES = 10000
+
+
+def _line(seq: int, fmt: str = logread.FORMAT, datefmt: str = None) -> str:
+    """Returns the line of the record logged seq seconds after START"""
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, f"record {seq}", None, None)
+    record.created = START + seq
+    record.msecs = 0
+    return logging.Formatter(fmt, datefmt).format(record) + '\n'
+
+
+class TestLogRead(unittest.TestCase):
+    """Class LogRead tests"""
+
+    def _execute(self, add_args: list) -> object:
+        """Append the args to the command line and execute the command and return the result
+        Args:
+            add_args(list): list of additional arguments and options to append to the command line
+        Returns:
+            The output object of subprocess.run
+        """
+        cmd_line_args = [INTERPRETER, SCRIPT] + add_args
+        return subprocess.run(cmd_line_args, capture_output=True, text=True, check=False)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp.name}/test.log"
+        # every 100th record has a continuation line
+        self.lines = [_line(seq) + ('  continued\n' if seq % 100 == 0 else '') for seq in range(LINES)]
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write(''.join(self.lines))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_help(self):
+        """Test command line with help"""
+        p = self._execute(['-h'])
+        self.assertEqual('', p.stderr)
+        self.assertIn("usage: CLI - Read the last lines or a time range of a log file", p.stdout)
+
+    def test_tail(self):
+        """Test the last lines"""
+        p = self._execute([self.path, '-n', '3'])
+        self.assertEqual(p.stdout, ''.join(self.lines[-3:]))
+        self.assertEqual(self._execute([self.path, '-n', '0']).stdout, '')
+        self.assertEqual(self._execute([self.path, '-n', str(2 * LINES)]).stdout, ''.join(self.lines))
+
+    def test_range(self):
+        """Test the lines of a time range"""
+        p = self._execute([self.path, '--since', '2023-10-13 10:02:00', '--until', '2023-10-13T10:07:00'])
+        self.assertEqual('', p.stderr)
+        self.assertEqual(p.stdout, ''.join(self.lines[120:420]))
+        # the continuation line of record 100 is not in the range, the one of 400 is
+        p = self._execute([self.path, '--since', str(START + 100.5), '--until', str(START + 400.5), '-n', '3'])
+        self.assertEqual(p.stdout, ''.join(self.lines[399:401]))
+        self.assertEqual(self._execute([self.path, '--since', str(START + LINES)]).stdout, '')
+        self.assertEqual(self._execute([self.path, '--until', str(START)]).stdout, '')
+        self.assertEqual(self._execute([self.path, '--since', str(START - 1)]).stdout, ''.join(self.lines))
+
+    def test_bisect_probes(self):
+        """Test that the bisection parses O(log n) lines"""
+        parser = timeindex.TimestampParser(logread.FORMAT)
+        calls = []
+
+        def counting(line):
+            calls.append(line)
+            return parser(line)
+
+        with open(self.path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for seq in (0, 1, 4321, LINES - 1):
+                calls.clear()
+                offset = logread.bisect_time(data, 0, len(data), START + seq, counting)
+                self.assertEqual(offset, len(''.join(self.lines[:seq]).encode()))
+                self.assertLess(len(calls), 60)
+
+    def test_formats_and_index(self):
+        """Test other writer formats, and the time index"""
+        fmt, datefmt = '%(levelname)s [%(asctime)s] %(message)s', '%d/%m/%Y %H:%M:%S'
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write(''.join(_line(seq, fmt, datefmt) for seq in range(1000)))
+        timeindex.rebuild(self.path, timeindex.TimestampParser(fmt, datefmt), every_records=10)
+        p = self._execute([self.path, '-f', fmt, '-df', datefmt, '--since', str(START + 500), '--until', str(START + 503)])
+        self.assertEqual(p.stdout, ''.join(_line(seq, fmt, datefmt) for seq in range(500, 503)))
+        p = self._execute([self.path, '-f', '%(message)s', '--since', '10:00'])
+        self.assertIn("--since and --until require %(asctime)s or %(created)f in the format", p.stderr)
+        self.assertEqual(p.returncode, 1)
+        p = self._execute([self.path, '--since', 'yesterday'])
+        self.assertIn("Invalid time: yesterday", p.stderr)
+
+    def test_live_mmap_file(self):
+        """Test a file being written by MmapFileHandler (preallocated tail)"""
+        path = f"{self.tmp.name}/mmap.log"
+        handler = mmapfile.MmapFileHandler(path, extent_size=16 * mmap.ALLOCATIONGRANULARITY)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        for seq in range(10):
+            handler.handle(logging.LogRecord('test', logging.INFO, __file__, 1, f"live {seq}", None, None))
+        try:
+            self.assertGreater(os.path.getsize(path), handler.committed)
+            p = self._execute([path, '-n', '2'])
+            self.assertEqual(p.stdout, 'live 8\nlive 9\n')
+        finally:
+            handler.close()
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
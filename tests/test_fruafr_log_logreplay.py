@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# pylint: disable=line-too-long
+# pylint: disable=protected-access
+"""
+Test of fruafr.log.logreplay
+
+The capture is replayed to a UDP socket opened by the test
+"""
+# Copyright 2023 by David Heurtevent.
+# SPDX_LICENSE: MIT
+# License: MIT License
+# Author: David HEURTEVENT <david@heurtevent.org>
+
+import json
+import os
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import unittest
+
+from fruafr.log.lib import capture
+
+INTERPRETER = 'python3'
+PATH = os.path.dirname(__file__)
+SCRIPT = f"{PATH}/../src/fruafr/log/logreplay.py"
+
+
+class TestLogReplay(unittest.TestCase):
+    """Class LogReplay tests"""
+
+    def _execute(self, add_args: list) -> object:
+        """Append the args to the command line and execute the command and return the result
+        Args:
+            add_args(list): list of additional arguments and options to append to the command line
+        Returns:
+            The output object of subprocess.run
+        """
+        cmd_line_args = [INTERPRETER, SCRIPT] + add_args
+        return subprocess.run(cmd_line_args, capture_output=True, text=True, check=False)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp.name}/test.cap"
+        writer = capture.CaptureWriter(self.path)
+        for i in range(20):
+            writer.write(f"<14>message{i}".encode(), capture.UDP, ('127.0.0.1', 1), 1000.0 + i * 0.01)
+        writer.close()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(2)
+        self.port = str(self.sock.getsockname()[1])
+
+    def tearDown(self):
+        self.sock.close()
+        self.tmp.cleanup()
+
+    def test_help(self):
+        """Test command line with help"""
+        p = self._execute(['-h'])
+        self.assertEqual('', p.stderr)
+        self.assertIn('usage: CLI - Replay a syslog capture file', p.stdout)
+
+    def test_not_a_capture(self):
+        """Test with a file that is not a capture"""
+        p = self._execute([SCRIPT])
+        self.assertIn('is not a capture file', p.stderr)
+
+    def test_replay(self):
+        """Test the replay at 2x speed with 2 sender processes"""
+        p = self._execute([self.path, '-p', self.port, '-S', '2', '-j', '2'])
+        report = json.loads(p.stdout)
+        self.assertEqual(report['sent'], 20)
+        self.assertEqual(report['errors'], 0)
+        received = {self.sock.recv(1024) for _ in range(20)}
+        self.assertEqual(received, {f"<14>message{i}".encode() for i in range(20)})
+
+    def test_replay_asap(self):
+        """Test the replay as fast as possible"""
+        p = self._execute([self.path, '--addr', '127.0.0.1', '--port', self.port, '--asap'])
+        report = json.loads(p.stdout)
+        self.assertEqual(report['sent'], 20)
+        self.assertGreater(report['rate'], 0)
+
+    def test_replay_reset(self):
+        """Test a TCP collector resetting the connection: the replay reports errors and ends"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen()
+            server.settimeout(5)
+
+            def reset():
+                conn, _ = server.accept()
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                conn.close()
+
+            thread = threading.Thread(target=reset)
+            thread.start()
+            p = subprocess.run([INTERPRETER, SCRIPT, self.path, '-p', str(server.getsockname()[1]),
+                                '-t', '-S', '2'],
+                               capture_output=True, text=True, check=False, timeout=30)
+            thread.join()
+        report = json.loads(p.stdout)
+        self.assertGreater(report['errors'], 0)
+        self.assertEqual(report['sent'] + report['errors'], 20)
+
+
+def main():
+    """Main"""
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ Test of fruafr.log.logtoconsole
 # Author: David HEURTEVENT <david@heurtevent.org>
 
 import unittest
+import json
 import os
 import subprocess
 
@@ -303,6 +304,17 @@ class TestLogToConsole(unittest.TestCase):
         self.assertIn(";", stderr)
         self.assertIn("test1;127.0.0.1", stderr)
 
+    def test_output_format_jsonl(self):
+        """Test --output-format jsonl"""
+        p = self._execute(['test "1"', '--output-format', 'jsonl', '-A', 'web', '-U', 'bob'])
+        fields = json.loads(p.stderr)
+        self.assertEqual(list(fields), ['asctime', 'levelname', 'message', 'app', 'user'])
+        self.assertEqual((fields['levelname'], fields['message'], fields['app'], fields['user']), ('INFO', 'test "1"', 'web', 'bob'))
+        p = self._execute(['test1', '--output-format', 'jsonl', '-f', '%(levelno)s %(message)s', '-o', 'user', '-A', 'web', '-U', 'bob'])
+        self.assertEqual(json.loads(p.stderr), {'levelno': 20, 'message': 'test1', 'user': 'bob'})
+        p = self._execute(['test1', '--output-format', 'xml'])
+        self.assertIn("invalid choice: 'xml'", p.stderr)
+
 
 def main():
     """Main"""
@@ -10,9 +10,13 @@ Test of fruafr.log.logtofile
 # Author: David HEURTEVENT <david@heurtevent.org>
 
 import unittest
+import glob
+import json
 import os
 import subprocess
 
+from fruafr.log.lib import columnar
+
 INTERPRETER = 'python3'
 PATH = os.path.dirname(__file__)
 SCRIPT = f"{PATH}/../src/fruafr/log/logtofile.py"
@@ -497,6 +501,98 @@ class TestLogToFile(unittest.TestCase):
         self.assertIn(";", stderr)
         self.assertIn("test1;127.0.0.1", stderr)
 
+    def test_rotation(self):
+        """Test the rotation of the log file by size over several invocations"""
+        try:
+            for n in range(6):
+                p = self._execute([f"rotation{n}", '-F', TEST_LOG_FILE, '--maxbytes', '20', '--backupcount', '3'])
+                self.assertEqual('', p.stderr)
+            rotated = sorted(glob.glob(f"{TEST_LOG_FILE}.*-*"))
+            self.assertEqual(len(rotated), 3)
+            self.assertGreater(self._check_in_file("rotation5"), -1)
+            self.assertEqual(len(self._read_test_log_file()), 1)
+            self.assertGreater(self._check_in_file("rotation4", rotated[-1]), -1)
+        finally:
+            for path in glob.glob(f"{TEST_LOG_FILE}.*"):
+                os.remove(path)
+        # invalid values
+        p = self._execute(['test1', '-F', TEST_LOG_FILE, '--maxbytes', '-1'])
+        self.assertIn("--maxbytes and --backupcount must be positive", p.stderr)
+        self.assertEqual(p.returncode, 1)
+        p = self._execute(['test1', '-F', TEST_LOG_FILE, '--when', 'W'])
+        self.assertIn("invalid choice", p.stderr)
+
+    def test_atomic(self):
+        """Test concurrent invocations appending large messages with --atomic"""
+        messages = [f"atomic{n}-" + str(n) * 20000 for n in range(8)]
+        processes = [subprocess.Popen([INTERPRETER, SCRIPT, message, '-F', TEST_LOG_FILE, '--atomic', '-f', '%(message)s'],
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+                     for message in messages]
+        for process in processes:
+            self.assertEqual(process.communicate()[1], '')
+        self.assertEqual(sorted(line.rstrip('\n') for line in self._read_test_log_file()), messages)
+        p = self._execute(['test1', '-F', TEST_LOG_FILE, '--atomic', '--maxbytes', '100'])
+        self.assertIn("--atomic is not supported with --maxbytes or --when", p.stderr)
+        self.assertEqual(p.returncode, 1)
+
+    def test_durability(self):
+        """Test the durability policies"""
+        for durability in ('none', 'flush', 'fsync', 'group'):
+            p = self._execute([f"durable-{durability}", '-F', TEST_LOG_FILE, '--durability', durability])
+            self.assertEqual('', p.stderr)
+            self.assertGreater(self._check_in_file(f"durable-{durability}"), -1)
+        p = self._execute(['durable-atomic', '-F', TEST_LOG_FILE, '--durability', 'fsync', '--atomic'])
+        self.assertEqual('', p.stderr)
+        self.assertEqual(len(self._read_test_log_file()), 5)
+        p = self._execute(['test1', '-F', TEST_LOG_FILE, '--durability', 'fsync', '--when', 'D'])
+        self.assertIn("--durability is not supported with --maxbytes or --when", p.stderr)
+        self.assertEqual(p.returncode, 1)
+        p = self._execute(['test1', '-F', TEST_LOG_FILE, '--durability', 'always'])
+        self.assertIn("invalid choice", p.stderr)
+
+    def test_index(self):
+        """Test the time index, and its rebuild when it is missing"""
+        index = f"{TEST_LOG_FILE}.idx"
+        try:
+            for n in range(3):
+                p = self._execute([f"indexed{n}", '-F', TEST_LOG_FILE, '--index', '--indexbytes', '1'])
+                self.assertEqual('', p.stderr)
+            self.assertEqual(os.path.getsize(index), 16 + 3 * 16)
+            os.remove(index)
+            p = self._execute(['indexed3', '-F', TEST_LOG_FILE, '--index', '--indexbytes', '1'])
+            self.assertEqual('', p.stderr)
+            self.assertEqual(os.path.getsize(index), 16 + 4 * 16)
+            p = self._execute(['test1', '-F', TEST_LOG_FILE, '--index', '--noasctime'])
+            self.assertIn("--index requires %(asctime)s or %(created)f in the format", p.stderr)
+            self.assertEqual(p.returncode, 1)
+        finally:
+            if os.path.exists(index):
+                os.remove(index)
+
+    def test_output_format_jsonl(self):
+        """Test --output-format jsonl"""
+        for n in range(2):
+            p = self._execute([f"json{n}", '-F', TEST_LOG_FILE, '--output-format', 'jsonl', '-S', 'api'])
+            self.assertEqual('', p.stderr)
+        with open(TEST_LOG_FILE, 'r', encoding='utf-8') as file:
+            lines = [json.loads(line) for line in file]
+        self.assertEqual([(line['message'], line['service']) for line in lines], [('json0', 'api'), ('json1', 'api')])
+        p = self._execute(['test1', '-F', TEST_LOG_FILE, '--output-format', 'jsonl', '--index'])
+        self.assertIn("--index is not supported", p.stderr)
+
+    def test_output_format_columnar(self):
+        """Test --output-format columnar"""
+        for n, level in enumerate(['info', 'error', 'error']):
+            p = self._execute([f"col{n}", '-F', TEST_LOG_FILE, '--output-format', 'columnar', '-L', level, '-H', 'web1', '-A', 'api'])
+            self.assertEqual('', p.stderr)
+        blocks = list(columnar.read_blocks(TEST_LOG_FILE))
+        self.assertEqual(len(blocks), 3)
+        self.assertEqual(columnar.count_by(blocks, 'level'), {'INFO': 1, 'ERROR': 2})
+        self.assertEqual(columnar.count_by(blocks, 'host'), {'web1': 3})
+        self.assertEqual([record[4:] for record in columnar.records(blocks)], [('api', 'col0'), ('api', 'col1'), ('api', 'col2')])
+        p = self._execute(['test1', '-F', TEST_LOG_FILE, '--output-format', 'columnar', '--atomic'])
+        self.assertIn("--output-format columnar is not supported", p.stderr)
+
 def main():
     """Main"""
     unittest.main()
@@ -17,7 +17,15 @@ The UDP/TCP connection is not tested in this test suite
 
 import unittest
 import os
+import signal
+import json
+import socket
 import subprocess
+import tempfile
+import threading
+import time
+from fruafr.log import logtosyslog
+from fruafr.log.lib import relp
 
 INTERPRETER = 'python3'
 PATH = os.path.dirname(__file__)
@@ -26,11 +34,12 @@ SCRIPT = f"{PATH}/../src/fruafr/log/logtosyslog.py"
 class TestLogToSysLog(unittest.TestCase):
     """Class LogToSysLog tests"""
 
-    def _execute(self, add_args: list, sudo: bool = False) -> object:
+    def _execute(self, add_args: list, sudo: bool = False, stdin: str = None) -> object:
         """Append the args to the command line and execute the command and return the result
         Args:
             add_args(list): list of additional arguments and options to append to the command line
             sudo(bool): whether to run the command in sudo mode
+            stdin(str): the standard input of the command
         Returns:
             The output object of subprocess.run
         """
@@ -43,7 +52,7 @@ class TestLogToSysLog(unittest.TestCase):
         cmd_line_args.append(SCRIPT)
         cmd_line_args += add_args
         # Execute the command and return the result
-        p = subprocess.run(cmd_line_args, capture_output=True, text=True, check=False)
+        p = subprocess.run(cmd_line_args, capture_output=True, text=True, check=False, input=stdin)
         return p
 
     def test_missing_message(self):
@@ -474,6 +483,270 @@ class TestLogToSysLog(unittest.TestCase):
         self.assertIn(";", stderr)
         self.assertIn("test1;127.0.0.1", stderr)
 
+    def test_stdin(self):
+        """Test --stdin: one message per line, templated and prefixed with the program"""
+        p = self._execute(['--stdin', '--program', 'prog1', '--options', 'message,ip',
+                           '--ip', '127.0.0.1', '--verbose', '--dryrun'],
+                          stdin='line1\n\nline2\n')
+        stdout = p.stdout
+        stderr = p.stderr
+        self.assertEqual('', stdout)
+        lines = stderr.splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("prog1 line1 - 127.0.0.1", lines[0])
+        self.assertIn("prog1 line2 - 127.0.0.1", lines[1])
+
+    def test_stdin_tcp(self):
+        """Test --stdin over one tcp connection"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen()
+            port = str(server.getsockname()[1])
+            p = self._execute(['--stdin', '-a', '127.0.0.1', '-p', port, '--tcp', '-f', '%(message)s'],
+                              stdin='line1\nline2\n')
+            self.assertEqual('', p.stderr)
+            conn, _ = server.accept()
+            with conn:
+                conn.settimeout(5)
+                data = b''
+                while True:
+                    chunk = conn.recv(65536)
+                    if not chunk:
+                        break
+                    data += chunk
+            # a second connection would still be waiting in the backlog
+            server.settimeout(0.1)
+            with self.assertRaises(socket.timeout):
+                server.accept()
+        self.assertIn(b'line1', data)
+        self.assertIn(b'line2', data)
+        self.assertEqual(data.count(b'\x00'), 2)
+
+    def test_stdin_tcp_unreachable(self):
+        """Test --stdin when the collector never accepts: the lost lines are reported"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.bind(('127.0.0.1', 0))
+            port = str(server.getsockname()[1])
+            p = self._execute(['--stdin', '-a', '127.0.0.1', '-p', port, '--tcp'],
+                              stdin='a\nb\nc\n')
+        self.assertIn('3 syslog messages not sent', p.stderr)
+        self.assertEqual(p.returncode, 1)
+
+    def test_file_input(self):
+        """Test --file-input over tcp: octet counted frames and JSON report"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/input.log"
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('line1\nline2\n')
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+                server.bind(('127.0.0.1', 0))
+                server.listen()
+                port = str(server.getsockname()[1])
+                p = self._execute(['--file-input', path, '-a', '127.0.0.1', '-p', port, '--tcp',
+                                   '-P', 'prog1', '-L', 'warning', '-F', 'local0'])
+                self.assertEqual('', p.stderr)
+                conn, _ = server.accept()
+                with conn:
+                    conn.settimeout(5)
+                    data = conn.recv(65536)
+        self.assertEqual(data, b'16 <132>prog1 line116 <132>prog1 line2')
+        report = json.loads(p.stdout)
+        self.assertEqual(report['messages'], 2)
+        self.assertEqual(report['bytes'], 12)
+        # missing file
+        p = self._execute(['--file-input', '/nonexistent', '-a', '127.0.0.1', '-p', '514', '--tcp'])
+        self.assertIn('/nonexistent is not a file', p.stderr)
+        self.assertEqual(p.returncode, 1)
+
+    def test_async_spool(self):
+        """Test --async: a message sent during an outage is delivered by the next run, not with --file-input or --follow"""
+        with tempfile.TemporaryDirectory() as tmp:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+                server.bind(('127.0.0.1', 0))
+                port = str(server.getsockname()[1])
+                args = ['-a', '127.0.0.1', '-p', port, '--tcp', '-f', '%(message)s',
+                        '--async', '--spool', f"{tmp}/spool", '--draintimeout', '0.2']
+                p = self._execute(['first'] + args)
+                self.assertEqual('', p.stderr)
+                self.assertEqual(p.returncode, 0)
+                self.assertEqual(len(os.listdir(f"{tmp}/spool")), 1)
+                server.listen()
+                p = self._execute(['second'] + args)
+                self.assertEqual('', p.stderr)
+                conn, _ = server.accept()
+                with conn:
+                    conn.settimeout(5)
+                    data = conn.recv(65536)
+            self.assertEqual(os.listdir(f"{tmp}/spool"), [])
+        self.assertEqual(data, b'<14>logtosyslog first\x00<14>logtosyslog second\x00')
+        for args in (['--file-input', f"{PATH}/__init__.py", '--async'], ['--follow', f"{PATH}/__init__.py", '--spool', '/tmp']):
+            p = self._execute(['-a', '127.0.0.1', '-p', '514'] + args)
+            self.assertIn('--async and --spool cannot be used with --file-input or --follow', p.stderr)
+            self.assertEqual(p.returncode, 1)
+
+    def test_dest(self):
+        """Test --dest: the lines are spread over the destinations"""
+        servers = []
+        for _ in range(2):
+            server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            server.bind(('127.0.0.1', 0))
+            server.settimeout(5)
+            servers.append(server)
+        dests = []
+        for server in servers:
+            dests += ['--dest', f"127.0.0.1:{server.getsockname()[1]}"]
+        p = self._execute(['--stdin', '-f', '%(message)s'] + dests, stdin='line1\nline2\nline3\nline4\n')
+        self.assertEqual('', p.stderr)
+        received = []
+        for server in servers:
+            with server:
+                received.append([server.recv(1024), server.recv(1024)])
+        self.assertEqual(received, [[b'<14>logtosyslog line1\x00', b'<14>logtosyslog line3\x00'],
+                                    [b'<14>logtosyslog line2\x00', b'<14>logtosyslog line4\x00']])
+        # invalid destination
+        p = self._execute(['test1', '--dest', 'host:port'])
+        self.assertIn('invalid destination host:port', p.stderr)
+        self.assertEqual(p.returncode, 1)
+
+    def test_rfc(self):
+        """Test --rfc: the program is the APP-NAME of the header"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.settimeout(5)
+            port = str(server.getsockname()[1])
+            p = self._execute(['hello', '-a', '127.0.0.1', '-p', port, '-P', 'prog1', '--rfc', '5424',
+                               '-f', '%(message)s'])
+            self.assertEqual('', p.stderr)
+            self.assertRegex(server.recv(1024),
+                             rb'^<14>1 \d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{6}[+-]\d\d:\d\d \S+ prog1 \d+ - - hello\x00$')
+            p = self._execute(['--stdin', '-a', '127.0.0.1', '-p', port, '-P', 'prog1', '--rfc', '3164',
+                               '-f', '%(message)s'], stdin='line1\n')
+            self.assertEqual('', p.stderr)
+            self.assertRegex(server.recv(1024), rb'^<14>\w{3} [ \d]\d \d\d:\d\d:\d\d \S+ prog1\[\d+\]: line1\x00$')
+        p = self._execute(['--file-input', SCRIPT, '--rfc', '3164'])
+        self.assertIn('--rfc cannot be used with --file-input or --follow', p.stderr)
+
+    def test_relp(self):
+        """Test --relp: the lines are acknowledged by the server"""
+        received = []
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen()
+            server.settimeout(5)
+            port = str(server.getsockname()[1])
+
+            def serve():
+                conn, _ = server.accept()
+                with conn:
+                    session = relp.RelpSession(received.append)
+                    while not session.closed:
+                        data = conn.recv(65536)
+                        if not data:
+                            break
+                        conn.sendall(session.feed(data))
+
+            thread = threading.Thread(target=serve, daemon=True)
+            thread.start()
+            p = self._execute(['--stdin', '-a', '127.0.0.1', '-p', port, '--relp', '--window', '2',
+                               '-f', '%(message)s'], stdin='line1\nline2\nline3\n')
+            thread.join(5)
+        self.assertEqual('', p.stderr)
+        self.assertEqual(p.returncode, 0)
+        self.assertEqual(received, [b'<14>logtosyslog line1', b'<14>logtosyslog line2',
+                                    b'<14>logtosyslog line3'])
+        # nobody acknowledges
+        p = self._execute(['--stdin', '-a', '127.0.0.1', '-p', port, '--relp'], stdin='a\nb\n')
+        self.assertIn('2 syslog messages not acknowledged', p.stderr)
+        self.assertEqual(p.returncode, 1)
+        p = self._execute(['hello', '--relp', '--async'])
+        self.assertIn('--relp cannot be used with', p.stderr)
+
+    def test_rate(self):
+        """Test --rate: the lines are spaced, --adaptive needs the stats socket"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            port = str(server.getsockname()[1])
+            start = time.monotonic()
+            p = self._execute(['--stdin', '-a', '127.0.0.1', '-p', port, '--rate', '1000', '--burst', '10'],
+                              stdin='line\n' * 210)
+            elapsed = time.monotonic() - start
+        self.assertEqual('', p.stderr)
+        # 200 lines after the burst at 1000/s
+        self.assertGreater(elapsed, 0.19)
+        p = self._execute(['--stdin', '-a', '127.0.0.1', '-p', port, '--adaptive', '/nonexistent.sock'],
+                          stdin='line\n')
+        self.assertIn('/nonexistent.sock:', p.stderr)
+        self.assertEqual(p.returncode, 1)
+        p = self._execute(['--stdin', '-a', '/dev/log', '--adaptive', '/nonexistent.sock'], stdin='line\n')
+        self.assertIn('--adaptive requires a UDP, TCP or RELP destination', p.stderr)
+        console = logtosyslog.Console()
+        self.assertEqual(console._stats_counter(console.parse_args(['--stdin', '-a', '127.0.0.1'])), 'udp_messages')
+        self.assertEqual(console._stats_counter(console.parse_args(['--stdin', '-a', '127.0.0.1', '--tcp'])), 'tcp_messages')
+        self.assertEqual(console._stats_counter(console.parse_args(['--stdin', '-a', '127.0.0.1', '--relp'])), 'relp_messages')
+
+    def test_latency(self):
+        """Test --latency: the messages of the run are stamped in sequence"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.settimeout(5)
+            port = str(server.getsockname()[1])
+            p = self._execute(['--stdin', '-a', '127.0.0.1', '-p', port, '--latency', '-f', '%(message)s'],
+                              stdin='line1\nline2\n')
+            self.assertEqual('', p.stderr)
+            first = server.recv(1024)
+            second = server.recv(1024)
+        self.assertRegex(first, rb'^<14>logtosyslog line1 lat=([0-9a-f]+):0:\d+\x00$')
+        self.assertRegex(second, rb'^<14>logtosyslog line2 lat=([0-9a-f]+):1:\d+\x00$')
+        p = self._execute(['--file-input', __file__, '-a', '127.0.0.1', '-p', port, '--latency'])
+        self.assertIn('--latency cannot be used', p.stderr)
+        self.assertEqual(p.returncode, 1)
+
+    def test_follow(self):
+        """Test --follow: the lines appended are shipped and a restart does not send them again"""
+        with tempfile.TemporaryDirectory() as tmp, \
+             socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen()
+            server.settimeout(5)
+            path = f"{tmp}/app.log"
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('line1\n')
+            args = [INTERPRETER, SCRIPT, '--follow', path, '--checkpoint', f"{tmp}/checkpoint",
+                    '-a', '127.0.0.1', '-p', str(server.getsockname()[1]), '--tcp',
+                    '--pollinterval', '0.05', '--progress', '0']
+            data = b''
+            for line in ('line2', 'line3'):
+                p = subprocess.Popen(args, stderr=subprocess.PIPE, text=True)
+                self.addCleanup(p.kill)
+                # the connection is opened with the first lines to send
+                with open(path, 'a', encoding='utf-8') as file:
+                    file.write(f"{line}\n")
+                conn, _ = server.accept()
+                with conn:
+                    conn.settimeout(5)
+                    while f"{line}".encode() not in data:
+                        received = conn.recv(65536)
+                        if not received:
+                            break
+                        data += received
+                    p.send_signal(signal.SIGTERM)
+                    self.assertEqual(p.communicate()[1], '')
+                    self.assertEqual(p.returncode, 0)
+            with open(f"{tmp}/checkpoint", 'r', encoding='utf-8') as file:
+                checkpoint = json.load(file)
+        self.assertEqual(checkpoint[path]['offset'], 18)
+        self.assertEqual(data, b'21 <14>logtosyslog line121 <14>logtosyslog line221 <14>logtosyslog line3')
+
+    def test_output_format_jsonl(self):
+        """Test --output-format jsonl: the program and the options are fields"""
+        p = self._execute(['test1', '--output-format', 'jsonl', '-P', 'testprog', '-A', 'web', '-v', '-d'])
+        fields = json.loads(p.stderr)
+        self.assertEqual((fields['message'], fields['program'], fields['app']), ('test1', 'testprog', 'web'))
+        p = self._execute(['--stdin', '--output-format', 'jsonl', '-A', 'web', '-v', '-d'], stdin='line1\nline2\n')
+        self.assertEqual([json.loads(line)['message'] for line in p.stderr.splitlines()], ['line1', 'line2'])
+        p = self._execute(['test1', '--output-format', 'jsonl', '--latency', '-v', '-d'])
+        self.assertIn("--output-format jsonl cannot be used", p.stderr)
+
 
 def main():
     """Main"""